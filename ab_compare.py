@@ -0,0 +1,448 @@
+import argparse
+import random
+import shlex
+import sys
+import threading
+import numpy as np
+import client_rest
+import client_rpc
+from errors import STATUS_OK
+from multiprocess_load import make_client
+from request_policy import RequestPolicy, add_policy_arguments, policy_options_from_args
+from rest_stream import DECODE_MODES
+from rest_transport import BACKENDS, DEFAULT_POOL_SIZE
+from scheduler import run_open_loop, save_summary_to_json
+from workload import compile_plan, load_plan, load_spec
+
+SUMMARY_VERSION = 1
+OPERATIONS = ("register", "query")
+# Metric name, operation (None for all requests), percentile (None for throughput).
+METRICS = (
+    ("register_p50", "register", 50),
+    ("register_p99", "register", 99),
+    ("query_p50", "query", 50),
+    ("query_p99", "query", 99),
+    ("throughput", None, None),
+)
+
+class TrialSamples:
+    """
+    Keeps the latency and status of every request of one trial.
+
+    Has the record/record_result interface of LiveReporter, so it can be passed as the
+    reporter of run_tasks or run_open_loop; open-loop latencies then count from the
+    intended send time, like everywhere else.
+    """
+
+    def __init__(self):
+        self._samples = {op: [] for op in OPERATIONS}
+        self._lock = threading.Lock()
+
+    def record(self, op, latency, status):
+        """
+        Records one finished request. Safe to call from any thread.
+
+        Args:
+            op (str): 'register' or 'query'.
+            latency (float): Response time in seconds.
+            status (int): Status code of the request, STATUS_OK on success.
+        """
+        with self._lock:
+            self._samples[op].append((latency, status))
+
+    def record_result(self, op, result):
+        """
+        Records the result tuple of a client's register or query call.
+
+        Args:
+            op (str): 'register' or 'query'.
+            result (tuple): The call's result: the response time and the status code first.
+        """
+        self.record(op, result[0], result[1])
+
+    def trial(self, elapsed):
+        """
+        Args:
+            elapsed (float): Duration of the trial in seconds.
+
+        Returns:
+            dict: Latencies of the successful requests (np.ndarray) and failed requests per operation,
+                and the trial's throughput of successful requests.
+        """
+        trial = {"elapsed": elapsed, "requests": 0}
+        succeeded = 0
+        for op, samples in self._samples.items():
+            records = np.array(samples, dtype=float).reshape(-1, 2)
+            # A failed request's latency is that of its error or deadline, not of a response; keeping it
+            # would let a side that fails fast look faster.
+            ok = records[:, 1] == STATUS_OK
+            trial[op] = {"latencies": records[ok, 0], "failed": int(np.count_nonzero(~ok))}
+            trial["requests"] += len(records)
+            succeeded += int(np.count_nonzero(ok))
+        trial["throughput"] = succeeded / elapsed if elapsed else 0.0
+        return trial
+
+def side_parser():
+    """
+    Returns:
+        argparse.ArgumentParser: Parser for the configuration of one side of the comparison.
+    """
+    parser = argparse.ArgumentParser(prog="--a/--b", description="One side of an A/B comparison.")
+    parser.add_argument("transport", choices=["grpc", "rest"])
+    parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    parser.add_argument("--label", default=None, help="Name of this side in the output.")
+    parser.add_argument("--cert", default=None, help="Path to a self-signed certificate.")
+    parser.add_argument("--insecure", action="store_true")
+    parser.add_argument("--http-backend", choices=BACKENDS, default="requests", help="REST transport backend.")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="REST connections per host.")
+    parser.add_argument("--decode-mode", choices=DECODE_MODES, default=None, help="REST stream decoder (default: iter_lines + json).")
+    add_policy_arguments(parser)
+    client_rpc.add_channel_arguments(parser)
+    return parser
+
+def parse_side(value):
+    """
+    Args:
+        value (str): Command line of one side, e.g. 'grpc --server-url host:50050 --deadline 2'.
+
+    Returns:
+        argparse.Namespace: The parsed configuration.
+    """
+    side = side_parser().parse_args(shlex.split(value))
+    if side.server_url is None:
+        side.server_url = "<your_ec_domain>:50050" if side.transport == "grpc" else "https://<your_ec_domain>:8081"
+    return side
+
+def default_labels(side_a, side_b):
+    """
+    Args:
+        side_a (argparse.Namespace): Configuration of side A.
+        side_b (argparse.Namespace): Configuration of side B.
+
+    Returns:
+        tuple: Labels of both sides: their --label, else the transport when it differs, else 'a' and 'b'.
+    """
+    if side_a.transport != side_b.transport:
+        defaults = side_a.transport, side_b.transport
+    else:
+        defaults = "a", "b"
+    return side_a.label or defaults[0], side_b.label or defaults[1]
+
+class TrialRunner:
+    """
+    Replays the same plan against one side, reusing its connection across trials.
+    """
+
+    def __init__(self, side, header, plan_requests):
+        """
+        Args:
+            side (argparse.Namespace): The side's configuration as returned by parse_side.
+            header (dict): The plan header.
+            plan_requests (list): The planned requests.
+        """
+        self.side = side
+        self.header = header
+        self.plan_requests = plan_requests
+        session_options = {"backend": side.http_backend, "pool_size": side.pool_size}
+        self.module, self.client = make_client(side.transport, side.server_url, side.cert, side.insecure, session_options,
+                                               client_rpc.channel_options_from_args(side))
+        if side.transport == "grpc":
+            client_rpc.query_aggregated_mission_control(self.client, 0)
+        else:
+            client_rest.query_aggregated_mission_control(self.client, side.server_url, 0)
+
+    def run(self):
+        """
+        Runs the plan once.
+
+        Returns:
+            dict: The trial, see TrialSamples.trial.
+        """
+        if self.side.transport == "grpc":
+            tasks = client_rpc.tasks_from_plan(self.client, self.plan_requests)
+        else:
+            tasks = client_rest.tasks_from_plan(self.client, self.side.server_url, self.plan_requests,
+                                                decode_mode=self.side.decode_mode)
+        samples = TrialSamples()
+        policy = RequestPolicy(**policy_options_from_args(self.side))
+        try:
+            if self.header["open_loop"]:
+                summary = run_open_loop(tasks, [planned["offset"] for planned in self.plan_requests],
+                                        policy.wrap(self.module.execute_task),
+                                        max_workers=self.header["concurrency"] or 1000, reporter=samples)
+                elapsed = summary["elapsed"]
+            else:
+                elapsed = self.module.run_tasks(tasks, max_workers=self.header["concurrency"], reporter=samples,
+                                                policy=policy)[-1]
+        finally:
+            policy.close()
+        return samples.trial(elapsed)
+
+def trial_order(rounds, seed):
+    """
+    Interleaves the trials: every round runs A and B once, in a seeded random order, so
+    drift in the server or the network over the run hits both sides alike.
+
+    Args:
+        rounds (int): Number of trials per side.
+        seed (int): Seed of the order.
+
+    Returns:
+        list: 'a' and 'b', in the order the trials run.
+    """
+    rng = random.Random(seed)
+    order = []
+    for _ in range(rounds):
+        pair = ["a", "b"]
+        rng.shuffle(pair)
+        order.extend(pair)
+    return order
+
+def metric_value(trials, op, percentile):
+    """
+    Args:
+        trials (list): Trials of one side.
+        op (str): Operation of a latency metric, None for throughput.
+        percentile (float): Latency percentile, None for throughput.
+
+    Returns:
+        float: The percentile of all the trials' latencies pooled, or their mean throughput; NaN without samples.
+    """
+    if not trials:
+        return float("nan")
+    if percentile is None:
+        return float(np.mean([trial["throughput"] for trial in trials]))
+    latencies = np.concatenate([trial[op]["latencies"] for trial in trials])
+    return float(np.percentile(latencies, percentile)) if len(latencies) else float("nan")
+
+def bootstrap_metric(trials, op, percentile, resamples, rng):
+    """
+    Two-level bootstrap of a metric: resamples the trials, then the requests within each
+    drawn trial, so both the trial-to-trial and the within-trial variation end up in the
+    interval.
+
+    Args:
+        trials (list): Trials of one side.
+        op (str): Operation of a latency metric, None for throughput.
+        percentile (float): Latency percentile, None for throughput.
+        resamples (int): Number of bootstrap resamples.
+        rng (np.random.Generator): Random number generator.
+
+    Returns:
+        np.ndarray: The metric of every resample.
+    """
+    estimates = np.empty(resamples)
+    if percentile is None:
+        throughputs = np.array([trial["throughput"] for trial in trials])
+        for index in range(resamples):
+            estimates[index] = throughputs[rng.integers(len(throughputs), size=len(throughputs))].mean()
+        return estimates
+
+    latencies = [trial[op]["latencies"] for trial in trials]
+    for index in range(resamples):
+        drawn = [latencies[trial] for trial in rng.integers(len(latencies), size=len(latencies))]
+        pooled = np.concatenate([sample[rng.integers(len(sample), size=len(sample))] for sample in drawn])
+        estimates[index] = np.percentile(pooled, percentile) if len(pooled) else np.nan
+    return estimates
+
+def classify_delta(metric, low, high, threshold):
+    """
+    Classifies the confidence interval of a relative delta (B - A) / A.
+
+    Args:
+        metric (str): Metric name; a higher value is worse, except for throughput.
+        low (float): Lower bound of the interval.
+        high (float): Upper bound of the interval.
+        threshold (float): Relative change that counts as a regression.
+
+    Returns:
+        str: 'regression' when B is worse than A by more than the threshold with confidence,
+            'worse' when B is worse but possibly by less than the threshold, 'improvement'
+            when B is better, and 'no change' when the interval contains zero.
+    """
+    if metric == "throughput":
+        low, high = -high, -low
+    if low > threshold:
+        return "regression"
+    if low > 0:
+        return "worse"
+    if high < 0:
+        return "improvement"
+    return "no change"
+
+def compare(trials_a, trials_b, threshold, confidence=0.95, resamples=2000, seed=None, gate=None):
+    """
+    Compares the trials of both sides metric by metric.
+
+    Args:
+        trials_a (list): Trials of side A, the baseline.
+        trials_b (list): Trials of side B, the candidate.
+        threshold (float): Relative change of a metric that counts as a regression.
+        confidence (float): Confidence level of the intervals.
+        resamples (int): Number of bootstrap resamples.
+        seed (int): Seed of the bootstrap.
+        gate (list): Metrics whose regression fails the comparison, by default all of them.
+
+    Returns:
+        dict: Per metric, the values of both sides, the relative delta with its confidence
+            interval and the classification ('missing' when side A measured it but side B did
+            not); the failed requests of both sides, which are left out of the latencies and
+            the throughput; and the overall 'pass'/'fail' verdict.
+    """
+    rng = np.random.default_rng(seed)
+    alpha = (1 - confidence) / 2
+    gate = gate or [name for name, _, _ in METRICS]
+    metrics = {}
+    for name, op, percentile in METRICS:
+        value_a, value_b = metric_value(trials_a, op, percentile), metric_value(trials_b, op, percentile)
+        if np.isnan(value_b) and not np.isnan(value_a):
+            # E.g. every query of side B failed: a gated metric that B cannot show fails the comparison.
+            metrics[name] = {"a": value_a, "b": None, "delta": None, "ci_low": None, "ci_high": None,
+                             "result": "missing", "gated": name in gate}
+            continue
+        if np.isnan(value_a) or np.isnan(value_b) or value_a == 0:
+            continue
+        estimates_a = bootstrap_metric(trials_a, op, percentile, resamples, rng)
+        estimates_b = bootstrap_metric(trials_b, op, percentile, resamples, rng)
+        deltas = (estimates_b - estimates_a) / estimates_a
+        low, high = np.nanquantile(deltas, [alpha, 1 - alpha])
+        metrics[name] = {
+            "a": value_a,
+            "b": value_b,
+            "delta": (value_b - value_a) / value_a,
+            "ci_low": float(low),
+            "ci_high": float(high),
+            "result": classify_delta(name, low, high, threshold),
+            "gated": name in gate,
+        }
+    failures = {side: {op: sum(trial[op]["failed"] for trial in trials) for op in OPERATIONS}
+                for side, trials in (("a", trials_a), ("b", trials_b))}
+    failed = [name for name, metric in metrics.items() if metric["gated"] and metric["result"] in ("regression", "missing")]
+    return {"metrics": metrics, "failures": failures, "regressions": failed, "verdict": "fail" if failed else "pass"}
+
+def trial_summary(trial):
+    """
+    Args:
+        trial (dict): A trial as returned by TrialRunner.run.
+
+    Returns:
+        dict: The trial without its raw latencies, for the JSON output.
+    """
+    summary = {"elapsed": trial["elapsed"], "requests": trial["requests"], "throughput": trial["throughput"]}
+    for op in OPERATIONS:
+        latencies = trial[op]["latencies"]
+        summary[op] = {"requests": len(latencies) + trial[op]["failed"], "failed": trial[op]["failed"]}
+        if len(latencies):
+            summary[op].update({"p50": float(np.percentile(latencies, 50)), "p99": float(np.percentile(latencies, 99))})
+    return summary
+
+def print_comparison(comparison, labels, threshold, confidence):
+    """
+    Prints one line per metric and the verdict.
+
+    Args:
+        comparison (dict): As returned by compare.
+        labels (tuple): Labels of side A and B.
+        threshold (float): The regression threshold.
+        confidence (float): Confidence level of the intervals.
+    """
+    print(f"{labels[1]} vs {labels[0]} ({confidence:.0%} CI, regression threshold {threshold:.1%}):")
+    for name, metric in comparison["metrics"].items():
+        unit = "req/s" if name == "throughput" else "s"
+        if metric["result"] == "missing":
+            print(f"{name:>13}: {metric['a']:.4f} -> no successful requests, missing"
+                  f"{'' if metric['gated'] else ' (not gated)'}")
+            continue
+        print(f"{name:>13}: {metric['a']:.4f} -> {metric['b']:.4f} {unit}, {metric['delta']:+.1%} "
+              f"[{metric['ci_low']:+.1%}, {metric['ci_high']:+.1%}] {metric['result']}"
+              f"{'' if metric['gated'] else ' (not gated)'}")
+    for side, label in zip(("a", "b"), labels):
+        failures = comparison["failures"][side]
+        if any(failures.values()):
+            print(f"{label}: " + ", ".join(f"{count} {op}" for op, count in failures.items()) +
+                  " requests failed and are not in the latencies or the throughput")
+    if comparison["regressions"]:
+        print(f"FAIL: {', '.join(comparison['regressions'])} regressed by more than {threshold:.1%} or could not be measured")
+    else:
+        print("PASS")
+
+def main():
+    """
+    Main function to run interleaved A/B trials of one workload and judge the difference.
+    """
+    parser = argparse.ArgumentParser(description="Compare two configurations with interleaved trials of the same workload.",
+                                     epilog="Run 'python ab_compare.py --side-help' for the options of --a and --b.")
+    parser.add_argument("workload", nargs="?", help="A plan (.jsonl) written by workload.py, or a workload spec to compile.")
+    parser.add_argument("--a", default=None, help="Baseline, e.g. 'grpc --server-url host:50050'.")
+    parser.add_argument("--b", default=None, help="Candidate, e.g. 'rest --server-url https://host:8081'.")
+    parser.add_argument("--side-help", action="store_true", help="Show the options of --a and --b and exit.")
+    parser.add_argument("--trials", type=int, default=10, help="Trials per side.")
+    parser.add_argument("--warmup-trials", type=int, default=1, help="Trials per side run first and discarded.")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Relative change that counts as a regression.")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--resamples", type=int, default=2000, help="Bootstrap resamples.")
+    parser.add_argument("--gate", default=",".join(name for name, _, _ in METRICS),
+                        help="Comma-separated metrics whose regression fails the run.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the trial order and the bootstrap.")
+    args = parser.parse_args()
+    if args.side_help:
+        side_parser().print_help()
+        return
+    if args.workload is None or args.a is None or args.b is None:
+        parser.error("the workload, --a and --b are required")
+    if args.trials < 1:
+        parser.error("--trials must be at least 1")
+    if args.warmup_trials < 0:
+        parser.error("--warmup-trials must not be negative")
+    gate = args.gate.split(",")
+    unknown = set(gate) - {name for name, _, _ in METRICS}
+    if unknown:
+        parser.error(f"unknown metrics in --gate: {', '.join(sorted(unknown))}")
+
+    sides = {"a": parse_side(args.a), "b": parse_side(args.b)}
+    labels = default_labels(sides["a"], sides["b"])
+    if args.workload.endswith(".jsonl"):
+        header, plan_requests = load_plan(args.workload)
+    else:
+        header, plan_requests = compile_plan(load_spec(args.workload))
+
+    print("Making 1st request for TLS handshake!")
+    runners = {name: TrialRunner(side, header, plan_requests) for name, side in sides.items()}
+    trials = {"a": [], "b": []}
+    order = trial_order(args.warmup_trials + args.trials, args.seed)
+    for index, name in enumerate(order):
+        trial = runners[name].run()
+        warmup = index < 2 * args.warmup_trials
+        label = labels[0] if name == "a" else labels[1]
+        print(f"Trial {index + 1}/{len(order)} {label}{' (warm-up)' if warmup else ''}: "
+              f"{trial['throughput']:.1f} req/s, " +
+              ", ".join(f"{op} p99 {np.percentile(trial[op]['latencies'], 99):.4f}s"
+                        for op in OPERATIONS if len(trial[op]["latencies"])))
+        if not warmup:
+            trials[name].append(trial)
+
+    comparison = compare(trials["a"], trials["b"], args.threshold, args.confidence, args.resamples, args.seed, gate)
+    print_comparison(comparison, labels, args.threshold, args.confidence)
+
+    summary = {
+        "version": SUMMARY_VERSION,
+        "workload": args.workload,
+        "plan": {"requests": header["requests"], "concurrency": header["concurrency"], "open_loop": header["open_loop"],
+                 "seed": header["spec"]["seed"]},
+        "sides": {name: {"label": label, "config": vars(sides[name])} for name, label in zip(("a", "b"), labels)},
+        "trials_per_side": args.trials,
+        "warmup_trials": args.warmup_trials,
+        "order": order,
+        "threshold": args.threshold,
+        "confidence": args.confidence,
+        "resamples": args.resamples,
+        "seed": args.seed,
+        **comparison,
+        "trials": {name: [trial_summary(trial) for trial in side_trials] for name, side_trials in trials.items()},
+    }
+    save_summary_to_json(summary, filename=f"ab_{labels[0]}_vs_{labels[1]}.json")
+    if comparison["verdict"] == "fail":
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
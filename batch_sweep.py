@@ -0,0 +1,262 @@
+import argparse
+import base64
+import concurrent.futures
+import json
+import os
+import random
+import time
+import client_rest
+import client_rpc
+from errors import STATUS_OK
+from external_coordinator_pb2 import PairHistory, RegisterMissionControlRequest
+from histogram import LatencyHistogram
+from multiprocess_load import make_client
+from node_corpus import NodeCorpus
+from request_policy import RequestPolicy, add_policy_arguments, policy_options_from_args, print_policy_stats
+
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+# gRPC's default limit on received messages, which the coordinator keeps.
+DEFAULT_MAX_MESSAGE_SIZE = 4 * 1024 * 1024
+
+def make_pair(transport, node_from, node_to):
+    """
+    Builds one pair history with random history data for the given transport.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        node_from (bytes): Compressed public key of the source node.
+        node_to (bytes): Compressed public key of the destination node.
+
+    Returns:
+        tuple: The pair (PairHistory or dict) and its size in bytes inside a register request.
+    """
+    if transport == 'grpc':
+        pair = PairHistory(node_from=node_from, node_to=node_to, history=client_rpc.generate_random_history())
+        # Repeated fields concatenate, so a request is exactly the sum of its one-pair encodings.
+        return pair, RegisterMissionControlRequest(pairs=[pair]).ByteSize()
+    pair = {
+        "nodeFrom": base64.b64encode(node_from).decode("utf-8"),
+        "nodeTo": base64.b64encode(node_to).decode("utf-8"),
+        "history": client_rest.generate_random_history(),
+    }
+    # The pair plus its ", " list separator.
+    return pair, len(json.dumps(pair)) + 2
+
+def split_snapshot(pairs, sizes, max_message_size):
+    """
+    Splits a snapshot into as few register requests as fit under the message size limit.
+
+    Args:
+        pairs (list): The pairs of the snapshot.
+        sizes (list): Encoded size of every pair.
+        max_message_size (int): Largest allowed request in bytes.
+
+    Returns:
+        list: Lists of pairs, one per request.
+    """
+    chunks, chunk, chunk_size = [], [], 0
+    for pair, size in zip(pairs, sizes):
+        if chunk and chunk_size + size > max_message_size:
+            chunks.append(chunk)
+            chunk, chunk_size = [], 0
+        chunk.append(pair)
+        chunk_size += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def prepare_snapshots(transport, batch_size, num_snapshots, keys, max_message_size):
+    """
+    Builds and serializes the register requests of every snapshot of one batch size.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        batch_size (int): Pairs per snapshot.
+        num_snapshots (int): Number of snapshots to send.
+        keys (callable): Returns a random (node_from, node_to) pair of keys.
+        max_message_size (int): Largest allowed request in bytes.
+
+    Returns:
+        list: For every snapshot, the list of serialized requests it is split into.
+    """
+    module = client_rpc if transport == 'grpc' else client_rest
+    snapshots = []
+    for _ in range(num_snapshots):
+        pairs, sizes = zip(*(make_pair(transport, *keys()) for _ in range(batch_size)))
+        chunks = split_snapshot(pairs, sizes, max_message_size)
+        snapshots.append([module.serialize_register_request(list(chunk)) for chunk in chunks])
+    return snapshots
+
+def register_task(module, client, server_url, payload):
+    """
+    Args:
+        module (module): client_rpc or client_rest.
+        client (PreSerializedStub or requests.Session): The stub or session to send with.
+        server_url (str): The server URL (REST only).
+        payload (bytes): A serialized register request.
+
+    Returns:
+        tuple: The register task for the module's execute_task. Pairs are counted per
+            snapshot, so the task's pair count is 0.
+    """
+    if module is client_rpc:
+        return ('register', client, payload, 0, 0)
+    return ('register', client, server_url, payload, 0, 0)
+
+def send_snapshot(execute, module, client, server_url, payloads):
+    """
+    Sends the requests of one snapshot back to back, as a node pushing its history would.
+
+    Args:
+        execute (callable): Sends one task, e.g. the module's execute_task wrapped by a RequestPolicy.
+        module (module): client_rpc or client_rest.
+        client (PreSerializedStub or requests.Session): The stub or session to send with.
+        server_url (str): The server URL (REST only).
+        payloads (list): The serialized register requests of the snapshot.
+
+    Returns:
+        tuple: Time to send the whole snapshot and whether every request succeeded.
+    """
+    start_time = time.perf_counter()
+    ok = True
+    for payload in payloads:
+        result = execute(register_task(module, client, server_url, payload))
+        ok = result[1] == STATUS_OK and ok
+    return time.perf_counter() - start_time, ok
+
+def run_batch_size(module, client, server_url, snapshots, batch_size, concurrency, policy=None):
+    """
+    Sends all snapshots of one batch size and measures ingestion throughput.
+
+    Args:
+        module (module): client_rpc or client_rest.
+        client (PreSerializedStub or requests.Session): The stub or session to send with.
+        server_url (str): The server URL (REST only).
+        snapshots (list): Serialized snapshots as returned by prepare_snapshots.
+        batch_size (int): Pairs per snapshot.
+        concurrency (int): Number of snapshots sent at the same time.
+        policy (RequestPolicy): Optional deadline and retry policy.
+
+    Returns:
+        dict: Throughput and latency of this batch size.
+    """
+    execute = policy.wrap(module.execute_task) if policy is not None else module.execute_task
+    histogram = LatencyHistogram()
+    failed = 0
+    start_time = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        send = lambda payloads: send_snapshot(execute, module, client, server_url, payloads)
+        for latency, ok in executor.map(send, snapshots):
+            histogram.record(latency)
+            failed += not ok
+    elapsed = time.perf_counter() - start_time
+
+    entries = batch_size * (len(snapshots) - failed)
+    num_bytes = sum(len(payload) for payloads in snapshots for payload in payloads)
+    return {
+        "batch_size": batch_size,
+        "snapshots": len(snapshots),
+        "requests_per_snapshot": len(snapshots[0]),
+        "bytes_per_snapshot": num_bytes / len(snapshots),
+        "failed_snapshots": failed,
+        "elapsed": elapsed,
+        "entries_per_second": entries / elapsed,
+        "bytes_per_second": num_bytes / elapsed,
+        "latency": histogram.to_dict(),
+    }
+
+def run_sweep(transport, client, server_url, batch_sizes, num_snapshots, concurrency, max_message_size, corpus=None,
+              key_pool_size=1000, policy=None):
+    """
+    Measures register throughput and latency for every batch size.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        client (PreSerializedStub or requests.Session): The stub or session to send with.
+        server_url (str): The server URL (REST only).
+        batch_sizes (list): Pairs per snapshot to try, in order.
+        num_snapshots (int): Snapshots sent per batch size.
+        concurrency (int): Number of snapshots sent at the same time.
+        max_message_size (int): Largest allowed request in bytes.
+        corpus (NodeCorpus): Optional key corpus to draw nodes from.
+        key_pool_size (int): Without a corpus, number of random keys pairs are drawn from.
+        policy (RequestPolicy): Optional deadline and retry policy.
+
+    Returns:
+        list: One result dict per batch size, see run_batch_size.
+    """
+    if corpus is not None:
+        keys = corpus.random_pair
+    else:
+        # Generating two keys per pair would dominate the run for large batches.
+        pool = [client_rpc.generate_random_node() for _ in range(key_pool_size)]
+        keys = lambda: tuple(random.sample(pool, 2))
+
+    module = client_rpc if transport == 'grpc' else client_rest
+    results = []
+    for batch_size in batch_sizes:
+        snapshots = prepare_snapshots(transport, batch_size, num_snapshots, keys, max_message_size)
+        result = run_batch_size(module, client, server_url, snapshots, batch_size, concurrency, policy)
+        latency = LatencyHistogram.from_dict(result["latency"]).summary()
+        print(f"Batch Size: {batch_size}, Requests per Snapshot: {result['requests_per_snapshot']}, "
+              f"Entries/s: {result['entries_per_second']:.0f}, MB/s: {result['bytes_per_second'] / 1e6:.2f}, "
+              f"Latency p50 {latency['p50']:.4f}s, p99 {latency['p99']:.4f}s, Failed Snapshots: {result['failed_snapshots']}")
+        results.append(result)
+    return results
+
+def save_sweep_to_json(results, transport, max_message_size, directory="data", filename=None):
+    """
+    Saves the sweep results to a JSON file.
+
+    Args:
+        results (list): Results as returned by run_sweep.
+        transport (str): Either 'grpc' or 'rest'.
+        max_message_size (int): Largest allowed request in bytes.
+        directory (str): Directory to save the file in.
+        filename (str): Name of the JSON file, by default '<transport>_batch_sweep.json'.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    filepath = os.path.join(directory, filename or f"{transport}_batch_sweep.json")
+    best = max(results, key=lambda result: result["entries_per_second"])
+    with open(filepath, 'w') as f:
+        json.dump({"max_message_size": max_message_size, "best_batch_size": best["batch_size"], "batch_sweep": results}, f, indent=4)
+    print(f"Best Batch Size: {best['batch_size']} ({best['entries_per_second']:.0f} entries/s)")
+    print(f"Data saved to {filepath}")
+
+def main():
+    """
+    Main function to sweep RegisterMissionControl batch sizes and save the throughput curve.
+    """
+    parser = argparse.ArgumentParser(description="Measure register throughput across batch sizes.")
+    parser.add_argument("transport", choices=["grpc", "rest"])
+    parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    parser.add_argument("--batch-sizes", default=",".join(map(str, DEFAULT_BATCH_SIZES)), help="Comma-separated pairs per snapshot.")
+    parser.add_argument("--snapshots", type=int, default=5, help="Snapshots sent per batch size.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Snapshots sent at the same time.")
+    parser.add_argument("--max-message-size", type=int, default=DEFAULT_MAX_MESSAGE_SIZE,
+                        help="Snapshots are split into requests no larger than this many bytes.")
+    parser.add_argument("--corpus", default=None, help="Node-key corpus built with node_corpus.py.")
+    parser.add_argument("--key-pool-size", type=int, default=1000, help="Random keys to draw pairs from without a corpus.")
+    parser.add_argument("--cert", default=None, help="Path to a self-signed certificate.")
+    parser.add_argument("--insecure", action="store_true")
+    add_policy_arguments(parser)
+    args = parser.parse_args()
+
+    server_url = args.server_url
+    if server_url is None:
+        server_url = "<your_ec_domain>:50050" if args.transport == "grpc" else "https://<your_ec_domain>:8081"
+    _, client = make_client(args.transport, server_url, args.cert, args.insecure)
+    corpus = NodeCorpus(args.corpus) if args.corpus else None
+
+    policy = RequestPolicy(**policy_options_from_args(args))
+    try:
+        results = run_sweep(args.transport, client, server_url, [int(size) for size in args.batch_sizes.split(",")],
+                            args.snapshots, args.concurrency, args.max_message_size, corpus, args.key_pool_size, policy)
+    finally:
+        policy.close()
+    print_policy_stats(policy.stats)
+    save_sweep_to_json(results, args.transport, args.max_message_size)
+
+if __name__ == '__main__':
+    main()
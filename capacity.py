@@ -0,0 +1,345 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import threading
+import time
+from errors import STATUS_OK
+from histogram import LatencyHistogram
+from multiprocess_load import make_client, prepare_worker_tasks
+from node_corpus import NodeCorpus
+from request_policy import RequestPolicy, add_policy_arguments, policy_options_from_args, print_policy_stats
+from rest_stream import DECODE_MODES
+from rest_transport import BACKENDS, DEFAULT_POOL_SIZE
+from scheduler import constant_arrivals, run_open_loop
+from workload import parse_ratio
+
+SUMMARY_VERSION = 1
+MODES = ("rate", "concurrency")
+DEFAULT_MIXES = ("register", "query", "1:1")
+# A rate step only passes if the requests it sent also finished at (nearly) that rate.
+THROUGHPUT_TOLERANCE = 0.9
+
+def parse_mix(mix):
+    """
+    Args:
+        mix (str): 'register', 'query', a 'register:query' ratio or a register fraction.
+
+    Returns:
+        float: Fraction of requests that are registers.
+    """
+    if mix == "register":
+        return 1.0
+    if mix == "query":
+        return 0.0
+    return parse_ratio(mix)
+
+def build_task_pools(transport, client, server_url, pool_size, mc_entries_per_register, corpus=None, decode_mode=None):
+    """
+    Prepares register and query tasks once, to be drawn from by every step of the search.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        client: The stub or session returned by make_client.
+        server_url (str): The server address.
+        pool_size (int): Approximate number of tasks per operation.
+        mc_entries_per_register (int): Number of entries per register request.
+        corpus (NodeCorpus): Optional pre-generated key corpus to draw nodes from.
+        decode_mode (str): REST stream decoder mode, None for the iter_lines() decoder.
+
+    Returns:
+        dict: Lists of 'register' and 'query' tasks.
+    """
+    tasks = prepare_worker_tasks(transport, client, server_url, 2 * pool_size, mc_entries_per_register, corpus, decode_mode)
+    pools = {"register": [], "query": []}
+    for task in tasks:
+        pools[task[0]].append(task)
+    return pools
+
+def pick_task(pools, register_fraction, rng):
+    """
+    Args:
+        pools (dict): Task pools as returned by build_task_pools.
+        register_fraction (float): Fraction of requests that are registers.
+        rng (random.Random): Random number generator.
+
+    Returns:
+        tuple: A register or query task.
+    """
+    op = "register" if rng.random() < register_fraction else "query"
+    return rng.choice(pools[op])
+
+def run_rate_step(pools, register_fraction, execute, rate, window, max_workers):
+    """
+    Runs one open-loop step at a fixed arrival rate.
+
+    Args:
+        pools (dict): Task pools as returned by build_task_pools.
+        register_fraction (float): Fraction of requests that are registers.
+        execute (callable): Function sending a single task, e.g. client_rpc.execute_task.
+        rate (float): Target requests per second.
+        window (float): Length of the step in seconds.
+        max_workers (int): Thread pool size of the open-loop scheduler.
+
+    Returns:
+        dict: Per-operation latency histograms (from the intended send time), completed
+            and failed counts, and the elapsed time including draining the step.
+    """
+    rng = random.Random(int(rate))
+    arrivals = constant_arrivals(rate, window)
+    tasks = [pick_task(pools, register_fraction, rng) for _ in arrivals]
+    summary = run_open_loop(tasks, arrivals, execute, max_workers=max_workers)
+    step = {"elapsed": summary["elapsed"]}
+    for op in ("register", "query"):
+        latency = summary[op]["latency"]
+        step[op] = {"latency": latency, "completed": latency.count, "failed": summary[op]["failed"]}
+    return step
+
+def run_concurrency_step(pools, register_fraction, execute, concurrency, window):
+    """
+    Runs one closed-loop step: each virtual user sends its next request as soon as the last one finished.
+
+    Args:
+        pools (dict): Task pools as returned by build_task_pools.
+        register_fraction (float): Fraction of requests that are registers.
+        execute (callable): Function sending a single task, e.g. client_rpc.execute_task.
+        concurrency (int): Number of virtual users.
+        window (float): Length of the step in seconds.
+
+    Returns:
+        dict: Per-operation latency histograms, completed and failed counts, and the elapsed time.
+    """
+    step = {op: {"latency": LatencyHistogram(), "completed": 0, "failed": 0} for op in ("register", "query")}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + window
+
+    def virtual_user(user):
+        rng = random.Random(user)
+        while time.perf_counter() < deadline:
+            task = pick_task(pools, register_fraction, rng)
+            send_time = time.perf_counter()
+            failed = execute(task)[1] != STATUS_OK
+            op = step[task[0]]
+            op["latency"].record(time.perf_counter() - send_time)
+            with lock:
+                op["completed"] += 1
+                op["failed"] += failed
+
+    start_time = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(virtual_user, range(concurrency)))
+    step["elapsed"] = time.perf_counter() - start_time
+    return step
+
+def evaluate_step(mode, load, step, latency_slo, percentile, error_slo):
+    """
+    Checks one step against the latency and error-rate SLOs.
+
+    Args:
+        mode (str): 'rate' or 'concurrency'.
+        load (float): Target rate or number of virtual users of the step.
+        step (dict): The step as returned by run_rate_step or run_concurrency_step.
+        latency_slo (float): Largest allowed latency percentile, in seconds.
+        percentile (float): The latency percentile the SLO applies to, e.g. 99.
+        error_slo (float): Largest allowed fraction of failed requests.
+
+    Returns:
+        dict: Throughput, error rate and latency per operation, and whether and why the step breached the SLOs.
+    """
+    elapsed = max(step["elapsed"], 1e-9)
+    result = {"load": load, "elapsed": elapsed, "breaches": []}
+    completed = failed = 0
+    for op in ("register", "query"):
+        stats = step[op]
+        summary = stats["latency"].summary()
+        result[op] = {
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "throughput": (stats["completed"] - stats["failed"]) / elapsed,
+            "error_rate": stats["failed"] / stats["completed"] if stats["completed"] else 0.0,
+            "latency": summary,
+            "slo_latency": stats["latency"].percentile(percentile),
+        }
+        completed += stats["completed"]
+        failed += stats["failed"]
+        if result[op]["slo_latency"] > latency_slo:
+            result["breaches"].append(f"{op} p{percentile:g} {result[op]['slo_latency']:.4f}s > {latency_slo:.4f}s")
+
+    result["throughput"] = (completed - failed) / elapsed
+    result["error_rate"] = failed / completed if completed else 0.0
+    if result["error_rate"] > error_slo:
+        result["breaches"].append(f"error rate {result['error_rate']:.4f} > {error_slo:.4f}")
+    if mode == "rate" and completed / elapsed < THROUGHPUT_TOLERANCE * load:
+        result["breaches"].append(f"completed {completed / elapsed:.1f} req/s < {THROUGHPUT_TOLERANCE:g} x {load:g} req/s")
+    result["passed"] = not result["breaches"]
+    return result
+
+def find_capacity(run_step, start, factor, max_load, refine_steps, integer=False):
+    """
+    Raises the load geometrically until a step breaches the SLOs, then bisects between
+    the last passing and the first breaching load.
+
+    Args:
+        run_step (callable): Runs and evaluates one step at the given load, see evaluate_step.
+        start (float): Load of the first step.
+        factor (float): Load multiplier between steps of the ramp.
+        max_load (float): Highest load to try.
+        refine_steps (int): Bisection steps after the first breach.
+        integer (bool): Round loads to whole numbers (virtual users).
+
+    Returns:
+        tuple: The highest passing step (None if even the first one breached) and all steps in the order run.
+    """
+    steps, best, breached = [], None, None
+    load = start
+    while load <= max_load:
+        result = run_step(load)
+        steps.append(result)
+        if not result["passed"]:
+            breached = load
+            break
+        best = result
+        # Rounding can keep a small load where it is, e.g. 4 users x 1.1.
+        load = max(load + 1, round(load * factor)) if integer else load * factor
+
+    low = best["load"] if best is not None else 0
+    for _ in range(refine_steps if breached is not None else 0):
+        load = (low + breached) / 2
+        if integer:
+            load = int(load)
+            if load <= low:
+                break
+        result = run_step(load)
+        steps.append(result)
+        if result["passed"]:
+            low, best = load, result
+        else:
+            breached = load
+    return best, steps
+
+def print_step(mix, result):
+    """
+    Prints one line per evaluated step.
+
+    Args:
+        mix (str): The register:query mix of the step.
+        result (dict): The step as returned by evaluate_step.
+    """
+    status = "ok" if result["passed"] else "BREACH: " + "; ".join(result["breaches"])
+    print(f"Mix {mix}, Load {result['load']:g}: {result['throughput']:.1f} req/s, "
+          f"register p99 {result['register']['latency']['p99']:.4f}s, query p99 {result['query']['latency']['p99']:.4f}s, "
+          f"error rate {result['error_rate']:.4f} -> {status}")
+
+def save_capacity_to_json(summary, directory="data", filename="capacity.json"):
+    """
+    Saves the capacity summary to a JSON file.
+
+    Args:
+        summary (dict): The summary built by main.
+        directory (str): Directory to save the file in.
+        filename (str): Name of the JSON file.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    filepath = os.path.join(directory, filename)
+    with open(filepath, 'w') as f:
+        json.dump(summary, f, indent=4)
+    print(f"Data saved to {filepath}")
+
+def main():
+    """
+    Main function to search for the highest load that meets the SLOs, for every register:query mix.
+    """
+    parser = argparse.ArgumentParser(description="Find the maximum sustainable throughput of the coordinator under SLOs.")
+    parser.add_argument("transport", choices=["grpc", "rest"])
+    parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    parser.add_argument("--mode", choices=MODES, default="rate", help="Step the open-loop arrival rate or the number of closed-loop users.")
+    parser.add_argument("--mixes", default=",".join(DEFAULT_MIXES), help="Comma-separated 'register', 'query' or 'register:query' mixes.")
+    parser.add_argument("--start", type=float, default=None, help="Load of the first step (default 50 req/s or 4 users).")
+    parser.add_argument("--factor", type=float, default=2.0, help="Load multiplier between steps.")
+    parser.add_argument("--max-load", type=float, default=100000, help="Highest load to try.")
+    parser.add_argument("--refine", type=int, default=4, help="Bisection steps between the last pass and the first breach.")
+    parser.add_argument("--window", type=float, default=10.0, help="Seconds per step.")
+    parser.add_argument("--latency-slo", type=float, default=0.2, help="Latency SLO in seconds.")
+    parser.add_argument("--slo-percentile", type=float, default=99, help="Latency percentile the SLO applies to.")
+    parser.add_argument("--error-slo", type=float, default=0.01, help="Largest allowed fraction of failed requests.")
+    parser.add_argument("--entries-per-register", type=int, default=3)
+    parser.add_argument("--pool-tasks", type=int, default=1000, help="Prepared tasks per operation, reused across steps.")
+    parser.add_argument("--max-workers", type=int, default=1000, help="Thread pool size in 'rate' mode.")
+    parser.add_argument("--corpus", default=None, help="Node-key corpus built with node_corpus.py.")
+    parser.add_argument("--cert", default=None, help="Path to a self-signed certificate.")
+    parser.add_argument("--insecure", action="store_true")
+    parser.add_argument("--http-backend", choices=BACKENDS, default="requests", help="REST transport backend.")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="REST connections per host.")
+    parser.add_argument("--decode-mode", choices=DECODE_MODES, default=None, help="REST stream decoder (default: iter_lines + json).")
+    add_policy_arguments(parser)
+    args = parser.parse_args()
+    if args.factor <= 1:
+        parser.error("--factor must be greater than 1")
+
+    server_url = args.server_url
+    if server_url is None:
+        server_url = "<your_ec_domain>:50050" if args.transport == "grpc" else "https://<your_ec_domain>:8081"
+    session_options = {"backend": args.http_backend, "pool_size": args.pool_size}
+    module, client = make_client(args.transport, server_url, args.cert, args.insecure, session_options)
+    corpus = NodeCorpus(args.corpus) if args.corpus else None
+
+    print("Making 1st request for TLS handshake!")
+    pools = build_task_pools(args.transport, client, server_url, args.pool_tasks, args.entries_per_register, corpus,
+                             args.decode_mode)
+    integer = args.mode == "concurrency"
+    start = args.start if args.start is not None else (4 if integer else 50)
+    policy = RequestPolicy(**policy_options_from_args(args))
+    execute = policy.wrap(module.execute_task)
+
+    results = []
+    try:
+        for mix in args.mixes.split(","):
+            register_fraction = parse_mix(mix)
+
+            def run_step(load):
+                if args.mode == "rate":
+                    step = run_rate_step(pools, register_fraction, execute, load, args.window, args.max_workers)
+                else:
+                    step = run_concurrency_step(pools, register_fraction, execute, int(load), args.window)
+                result = evaluate_step(args.mode, load, step, args.latency_slo, args.slo_percentile, args.error_slo)
+                print_step(mix, result)
+                return result
+
+            best, steps = find_capacity(run_step, start, args.factor, args.max_load, args.refine, integer=integer)
+            knee = None
+            if best is not None:
+                knee = {
+                    "load": best["load"],
+                    "max_sustainable_rps": best["throughput"],
+                    "register_rps": best["register"]["throughput"],
+                    "query_rps": best["query"]["throughput"],
+                    "register_latency": best["register"]["latency"],
+                    "query_latency": best["query"]["latency"],
+                    "error_rate": best["error_rate"],
+                }
+                print(f"Mix {mix}: max sustainable {knee['max_sustainable_rps']:.1f} req/s "
+                      f"(register {knee['register_rps']:.1f}, query {knee['query_rps']:.1f}) at load {knee['load']:g}")
+            else:
+                print(f"Mix {mix}: the first step already breached the SLOs")
+            results.append({"mix": mix, "register_fraction": register_fraction, "knee": knee, "steps": steps})
+    finally:
+        policy.close()
+    print_policy_stats(policy.stats)
+
+    save_capacity_to_json({
+        "version": SUMMARY_VERSION,
+        "timestamp": int(time.time()),
+        "transport": args.transport,
+        "server_url": server_url,
+        "mode": args.mode,
+        "window": args.window,
+        "slo": {"latency": args.latency_slo, "percentile": args.slo_percentile, "error_rate": args.error_slo},
+        "entries_per_register": args.entries_per_register,
+        "request_policy": policy.stats.summary(),
+        "mixes": results,
+    }, filename=f"{args.transport}_capacity.json")
+
+if __name__ == '__main__':
+    main()
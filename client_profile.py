@@ -0,0 +1,409 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+from histogram import LatencyHistogram
+
+OPERATIONS = ("register", "query")
+PHASES = ("encode", "send", "wait", "receive", "decode")
+ENCODE, SEND, WAIT, RECEIVE, DECODE = range(len(PHASES))
+# Seconds between process CPU samples, and the sleep whose overshoot measures how long
+# a ready thread waits for the GIL (or an event loop callback waits for the loop).
+CPU_INTERVAL = 1.0
+LAG_PROBE_INTERVAL = 0.01
+# Saturation thresholds for the run summary.
+SATURATED_CPU = 0.9
+SATURATED_SAMPLE_SHARE = 0.1
+SATURATED_LAG = 0.01
+SATURATED_QUEUE_LAG = 0.01
+SATURATED_CLIENT_SHARE = 0.2
+DEFAULT_STACK_RATE = 100
+
+class PhaseTimer:
+    """
+    Splits the client time of one request into PHASES with perf_counter_ns.
+
+    encode is building the request in the client, send is handing it to the transport,
+    wait is the time to the first response message, receive is the time spent blocked
+    reading the rest of the response and decode is processing the response messages
+    in the client. Where a transport does not expose a boundary the time goes to the
+    later phase: requests sends and waits for the headers in one call, so REST send
+    time is part of wait, and a blocking gRPC unary call is all wait.
+    """
+
+    __slots__ = ("start", "last", "phases")
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter_ns()
+        self.phases = [0] * len(PHASES)
+
+    def mark(self, phase):
+        """
+        Ends the current phase.
+
+        Args:
+            phase (int): ENCODE, SEND, WAIT, RECEIVE or DECODE, the phase the time since the last mark belongs to.
+
+        Returns:
+            int: perf_counter_ns() at the mark.
+        """
+        now = time.perf_counter_ns()
+        self.phases[phase] += now - self.last
+        self.last = now
+        return now
+
+    def since_start(self, now):
+        """
+        Args:
+            now (int): A perf_counter_ns() value.
+
+        Returns:
+            float: Seconds from the start of the request to now.
+        """
+        return (now - self.start) / 1e9
+
+    def elapsed(self):
+        """
+        Returns:
+            float: Seconds from the start of the request to the last mark.
+        """
+        return (self.last - self.start) / 1e9
+
+class ClientProfile:
+    """
+    Where the load generator spent its time during a run.
+
+    Request threads only append their PhaseTimer's phases to a deque, which is
+    thread-safe without a lock; the phases are summed per operation when the
+    monitor samples the process or a summary is taken. Client overhead (encode +
+    decode) per request, queue lag (how late a request started compared to when it
+    should have), scheduling lag (how late a sleeping thread or coroutine woke up) and process
+    CPU samples are what tell a saturated client apart from a slow coordinator.
+    """
+
+    def __init__(self):
+        self.requests = {op: 0 for op in OPERATIONS}
+        self.phase_ns = {op: [0] * len(PHASES) for op in OPERATIONS}
+        self.total_ns = {op: 0 for op in OPERATIONS}
+        self.client_overhead = LatencyHistogram()
+        self.queue_lag = LatencyHistogram()
+        self.scheduling_lag = LatencyHistogram()
+        self.cpu_samples = 0
+        self.saturated_samples = 0
+        self.cpu_seconds = 0.0
+        self.sampled_seconds = 0.0
+        self.peak_cpu = 0.0
+        self._events = collections.deque()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        self.aggregate()
+        state = self.__dict__.copy()
+        del state["_lock"]
+        del state["_events"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._events = collections.deque()
+        self._lock = threading.Lock()
+
+    def record(self, op, timer):
+        """
+        Records the phases of a finished request. Safe to call from any thread.
+
+        Args:
+            op (str): 'register' or 'query'.
+            timer (PhaseTimer): The request's timer, after its last mark.
+        """
+        self._events.append((op, timer.phases, timer.last - timer.start))
+
+    def record_queue_lag(self, seconds):
+        """
+        Args:
+            seconds (float): How long a request waited in the client before it was sent.
+        """
+        self.queue_lag.record(max(seconds, 0.0))
+
+    def record_cpu(self, cpu_seconds, wall_seconds):
+        """
+        Records a process CPU sample.
+
+        Args:
+            cpu_seconds (float): CPU time of the process (all threads) during the sample.
+            wall_seconds (float): Length of the sample.
+        """
+        utilisation = cpu_seconds / wall_seconds if wall_seconds else 0.0
+        with self._lock:
+            self.cpu_samples += 1
+            self.saturated_samples += utilisation >= SATURATED_CPU
+            self.cpu_seconds += cpu_seconds
+            self.sampled_seconds += wall_seconds
+            self.peak_cpu = max(self.peak_cpu, utilisation)
+
+    def aggregate(self):
+        """
+        Folds the requests recorded since the last call into the per-phase totals.
+        """
+        with self._lock:
+            while self._events:
+                op, phases, total_ns = self._events.popleft()
+                self.requests[op] += 1
+                self.total_ns[op] += total_ns
+                sums = self.phase_ns[op]
+                for phase, duration in enumerate(phases):
+                    sums[phase] += duration
+                self.client_overhead.record((phases[ENCODE] + phases[DECODE]) / 1e9)
+
+    def merge(self, other):
+        """
+        Adds the measurements of another ClientProfile, e.g. of another worker process.
+
+        Args:
+            other (ClientProfile): The profile to add.
+
+        Returns:
+            ClientProfile: This object.
+        """
+        self.aggregate()
+        other.aggregate()
+        with self._lock:
+            for op in OPERATIONS:
+                self.requests[op] += other.requests[op]
+                self.total_ns[op] += other.total_ns[op]
+                self.phase_ns[op] = [mine + theirs for mine, theirs in zip(self.phase_ns[op], other.phase_ns[op])]
+            self.cpu_samples += other.cpu_samples
+            self.saturated_samples += other.saturated_samples
+            self.cpu_seconds += other.cpu_seconds
+            self.sampled_seconds += other.sampled_seconds
+            self.peak_cpu = max(self.peak_cpu, other.peak_cpu)
+        for name in ("client_overhead", "queue_lag", "scheduling_lag"):
+            getattr(self, name).merge(getattr(other, name))
+        return self
+
+    def saturation(self):
+        """
+        Returns:
+            list: Why the client looks saturated, empty if it does not.
+        """
+        self.aggregate()
+        reasons = []
+        if self.cpu_samples and self.saturated_samples / self.cpu_samples >= SATURATED_SAMPLE_SHARE:
+            reasons.append(f"process CPU at {SATURATED_CPU:.0%}+ of a core in {self.saturated_samples / self.cpu_samples:.0%} "
+                           f"of samples (peak {self.peak_cpu:.0%})")
+        if self.scheduling_lag.count and self.scheduling_lag.percentile(99) >= SATURATED_LAG:
+            reasons.append(f"threads woke up {self.scheduling_lag.percentile(99) * 1000:.1f}ms late at p99")
+        if self.queue_lag.count and self.queue_lag.percentile(99) >= SATURATED_QUEUE_LAG:
+            reasons.append(f"requests were sent {self.queue_lag.percentile(99) * 1000:.1f}ms late at p99")
+        total_ns = sum(self.total_ns.values())
+        client_ns = sum(phases[ENCODE] + phases[DECODE] for phases in self.phase_ns.values())
+        if total_ns and client_ns / total_ns >= SATURATED_CLIENT_SHARE:
+            reasons.append(f"{client_ns / total_ns:.0%} of request time was spent encoding and decoding in the client")
+        return reasons
+
+    def summary(self):
+        """
+        Returns:
+            dict: Mean seconds per phase and operation, client overhead, queue and
+                scheduling lag, process CPU and the saturation verdict.
+        """
+        self.aggregate()
+        summary = {"phases": {}}
+        for op in OPERATIONS:
+            requests = max(self.requests[op], 1)
+            summary["phases"][op] = {phase: self.phase_ns[op][index] / requests / 1e9 for index, phase in enumerate(PHASES)}
+            summary["phases"][op]["total"] = self.total_ns[op] / requests / 1e9
+            summary["phases"][op]["requests"] = self.requests[op]
+        summary["client_overhead"] = self.client_overhead.summary()
+        summary["queue_lag"] = self.queue_lag.summary()
+        summary["scheduling_lag"] = self.scheduling_lag.summary()
+        summary["cpu"] = {
+            "mean": self.cpu_seconds / self.sampled_seconds if self.sampled_seconds else 0.0,
+            "peak": self.peak_cpu,
+            "samples": self.cpu_samples,
+            "saturated_samples": self.saturated_samples,
+            "cores": os.cpu_count(),
+        }
+        reasons = self.saturation()
+        summary["saturated"] = bool(reasons)
+        summary["saturation_reasons"] = reasons
+        return summary
+
+class StackSampler:
+    """
+    Statistical profiler of the load generator's own threads.
+
+    A background thread walks the Python stack of every other thread at a fixed
+    rate and counts the collapsed stacks, which can be written in the folded format
+    read by flamegraph.pl and speedscope. Unlike cProfile it adds no cost to the
+    profiled calls, so it can stay attached to the hot path of a full-rate run.
+    """
+
+    def __init__(self, rate=DEFAULT_STACK_RATE):
+        """
+        Args:
+            rate (float): Samples per second.
+        """
+        self.interval = 1 / rate
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def save(self, path):
+        """
+        Writes the stacks in folded format, one 'frame;frame;... count' line per stack.
+
+        Args:
+            path (str): File to write.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"{self.samples} stack samples saved to {path}")
+
+class ClientProfiler:
+    """
+    Runs the background samplers feeding a ClientProfile: process CPU, the scheduling
+    lag of a sleeping thread and, optionally, a StackSampler.
+    """
+
+    def __init__(self, stacks_path=None, stack_rate=DEFAULT_STACK_RATE):
+        """
+        Args:
+            stacks_path (str): Attach a StackSampler and write its folded stacks here on stop.
+            stack_rate (float): Stack samples per second.
+        """
+        self.profile = ClientProfile()
+        self.stacks_path = stacks_path
+        self.sampler = StackSampler(stack_rate) if stacks_path else None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Returns:
+            ClientProfiler: This object.
+        """
+        self._thread = threading.Thread(target=self._run, name="client-profiler", daemon=True)
+        self._thread.start()
+        if self.sampler is not None:
+            self.sampler.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler.save(self.stacks_path)
+        self.profile.aggregate()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        sample_start, cpu_start = time.perf_counter(), time.process_time()
+        while not self._stop.is_set():
+            before = time.perf_counter()
+            time.sleep(LAG_PROBE_INTERVAL)
+            now = time.perf_counter()
+            self.profile.scheduling_lag.record(max(now - before - LAG_PROBE_INTERVAL, 0.0))
+            if now - sample_start >= CPU_INTERVAL:
+                cpu = time.process_time()
+                self.profile.record_cpu(cpu - cpu_start, now - sample_start)
+                self.profile.aggregate()
+                sample_start, cpu_start = now, cpu
+        # The last, partial sample, so short runs get one too.
+        now = time.perf_counter()
+        self.profile.record_cpu(time.process_time() - cpu_start, now - sample_start)
+
+async def monitor_event_loop(profile, stop):
+    """
+    Measures event loop lag: how late a sleeping coroutine gets to run again.
+
+    Args:
+        profile (ClientProfile): Where the lag is recorded, as scheduling lag.
+        stop (asyncio.Event): Set to end the monitor.
+    """
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        profile.scheduling_lag.record(max(time.perf_counter() - before - LAG_PROBE_INTERVAL, 0.0))
+
+def print_client_profile(profile):
+    """
+    Prints where the client spent its time and warns when it was the bottleneck.
+
+    Args:
+        profile (ClientProfile): The profile of a run.
+    """
+    summary = profile.summary()
+    for op, phases in summary["phases"].items():
+        if phases["requests"]:
+            print(f"{op.capitalize()} Client Time: " + ", ".join(f"{phase} {phases[phase] * 1000:.2f}ms" for phase in PHASES)
+                  + f" (mean of {phases['requests']} requests)")
+    cpu = summary["cpu"]
+    print(f"Client CPU: mean {cpu['mean']:.0%}, peak {cpu['peak']:.0%} of a core ({cpu['cores']} cores), "
+          f"scheduling lag p99 {summary['scheduling_lag']['p99'] * 1000:.1f}ms, "
+          f"client overhead p99 {summary['client_overhead']['p99'] * 1000:.2f}ms per request")
+    if summary["saturated"]:
+        print("WARNING: the load generator was saturated (" + "; ".join(summary["saturation_reasons"]) + "). "
+              "Latency and throughput include client-side delays and do not describe the coordinator; "
+              "add processes or hosts (multiprocess_load.py) and rerun.")
+
+def add_profile_arguments(parser):
+    """
+    Adds the self-profiling options to a command line parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument("--no-self-profile", action="store_true", help="Do not measure the client's own phases, CPU and lag.")
+    parser.add_argument("--profile-stacks", default=None, help="Sample the client's stacks and write them (folded format) here.")
+    parser.add_argument("--profile-rate", type=float, default=DEFAULT_STACK_RATE, help="Stack samples per second.")
+
+def profiler_from_args(args):
+    """
+    Args:
+        args (argparse.Namespace): Parsed options added by add_profile_arguments.
+
+    Returns:
+        ClientProfiler: An unstarted profiler, or None when self-profiling is disabled.
+    """
+    if args.no_self_profile:
+        return None
+    return ClientProfiler(stacks_path=args.profile_stacks, stack_rate=args.profile_rate)
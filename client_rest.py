@@ -1,52 +1,90 @@
+import argparse
 import os
-import requests
 import json
 import base64
+import itertools
 import random
 import time
 import concurrent.futures
 from ecdsa import SigningKey, SECP256k1
+from client_profile import DECODE, RECEIVE, WAIT, ClientProfiler, PhaseTimer, print_client_profile
+from consistency import rest_pairs, rest_register_pairs
+from errors import STATUS_OK, ErrorCounts, StreamError, classify_exception
+from histogram import LatencyHistogram
+from live_reporter import LiveReporter
+from node_corpus import DISTRIBUTIONS, NodeCorpus
+from request_policy import RequestPolicy, print_policy_stats
+from stream_metrics import StreamMetrics, StreamStats
+from timeseries import TimeSeriesWriter
+from rest_stream import decode_stream
+from rest_transport import create_session
+
+REGISTER_HEADERS = {'Content-Type': 'application/json'}
+# Per-request log lines; off by default as printing them slows the hot path under load.
+LOG_REQUESTS = False
+# Set to a consistency.ConsistencyChecker to cross-check query results against the registered pairs.
+CONSISTENCY_CHECKER = None
+# Set to a client_profile.ClientProfile to break the client time of every request into phases.
+CLIENT_PROFILE = None
+
+def get_self_signed_session(cert: str, **transport_options):
+    return create_session(verify=cert, **transport_options)
+
+def get_trusted_ca_session(**transport_options):
+    return create_session(verify=True, **transport_options)
+
+def get_insecure_session(**transport_options):
+    return create_session(verify=False, **transport_options)
+
+def serialize_register_request(pairs):
+    """
+    Args:
+        pairs (list): List of node pairs to register, with base64-encoded node keys.
 
+    Returns:
+        bytes: The JSON body of the register request.
+    """
+    return json.dumps({"pairs": pairs}).encode("utf-8")
 
-def get_self_signed_session(cert: str):
-    session = requests.Session()
-    session.verify = cert
-    return session
-
-def get_trusted_ca_session():
-    session = requests.Session()
-    session.verify = True
-    return session
-
-def get_insecure_session():
-    session = requests.Session()
-    session.verify = False
-    return session
-
-def register_mission_control(session, server_url, pairs, request_num):
+def register_mission_control(session, server_url, body, request_num, timeout=None, content_encoding=None):
     """
     Registers mission control data via HTTP POST with multiple node pairs.
 
     Args:
         session (requests.Session): The HTTP session to use for the request.
         server_url (str): The server URL.
-        pairs (list): List of node pairs to register.
+        body (bytes): The request body, as returned by serialize_register_request.
         request_num (int): The request number for logging purposes.
+        timeout (float): Seconds to wait for the connection and for each read, None to wait forever.
+        content_encoding (str): 'gzip' or 'deflate' when the body is already compressed with it.
 
     Returns:
-        tuple: Response time and status code.
+        tuple: Response time and status code (the HTTP status, or see errors.classify_exception).
     """
     url = f"{server_url}/v1/register_mission_control"
-    payload = {"pairs": pairs}
-    headers = {'Content-Type': 'application/json'}
-    start_time = time.time()
-    response = session.post(url, headers=headers, data=json.dumps(payload))
-    end_time = time.time() - start_time
-    if request_num > 0:
+    headers = REGISTER_HEADERS if content_encoding is None else {**REGISTER_HEADERS, 'Content-Encoding': content_encoding}
+    timer = PhaseTimer()
+    try:
+        response = session.post(url, headers=headers, data=body, timeout=timeout)
+        timer.mark(WAIT)
+    except Exception as e:
+        timer.mark(WAIT)
+        if CLIENT_PROFILE is not None:
+            CLIENT_PROFILE.record('register', timer)
+        if LOG_REQUESTS:
+            print(f"Failed to register mission control: {e}")
+        return timer.elapsed(), classify_exception(e)
+    end_time = timer.elapsed()
+    if CLIENT_PROFILE is not None:
+        CLIENT_PROFILE.record('register', timer)
+    # Compressed bodies only come from compression_bench.py, which does not verify results.
+    if CONSISTENCY_CHECKER is not None and response.status_code == STATUS_OK and content_encoding is None:
+        CONSISTENCY_CHECKER.record_register(rest_register_pairs(body), timer.last / 1e9)
+    if LOG_REQUESTS and request_num > 0:
         print(f"register_request_response_{request_num}")
     return end_time, response.status_code
 
-def query_aggregated_mission_control(session, server_url, request_num):
+def query_aggregated_mission_control(session, server_url, request_num, decode_mode=None, timeout=None):
     """
     Queries aggregated mission control data via HTTP GET.
 
@@ -54,31 +92,66 @@ def query_aggregated_mission_control(session, server_url, request_num):
         session (requests.Session): The HTTP session to use for the request.
         server_url (str): The server URL.
         request_num (int): The request number for logging purposes.
+        decode_mode (str): None to parse every line with json via iter_lines(), or one of
+            rest_stream.DECODE_MODES to use the buffer-reusing stream decoder.
+        timeout (float): Seconds to wait for the connection and for each read, None to wait forever.
 
     Returns:
-        tuple: Response time and status code.
+        tuple: Response time (until the stream is drained), status code (the HTTP status,
+            or see errors.classify_exception) and the StreamStats of the stream.
     """
     url = f"{server_url}/v1/query_aggregated_mission_control"
-    start_time = time.time()
-    response = session.get(url, stream=True)
-    end_time = time.time() - start_time
-    if response.status_code != 200:
-        return end_time, response.status_code
-
-    pairs = []
+    timer = PhaseTimer()
+    stats = StreamStats()
+    check = CONSISTENCY_CHECKER.begin_query(timer.start / 1e9) if CONSISTENCY_CHECKER is not None and request_num > 0 else None
     try:
-        for line in response.iter_lines():
-            if line:
-                chunk = json.loads(line)
-                pairs.extend(chunk['result']['pairs'])
-
-        if request_num > 0:
+        response = session.get(url, stream=True, timeout=timeout)
+        timer.mark(WAIT)
+        if response.status_code != STATUS_OK:
+            end_time = timer.elapsed()
+            if CLIENT_PROFILE is not None:
+                CLIENT_PROFILE.record('query', timer)
+            return end_time, response.status_code, stats.finish(end_time)
+
+        # Checked queries need the pairs themselves, so they always take the iter_lines path.
+        if decode_mode is not None and check is None:
+            decode_stream(response, timer, stats, decode_mode)
+        else:
+            # Checked messages are kept and cross-checked once the stream is drained, off the clock.
+            checked = []
+            for line in response.iter_lines():
+                received_at = timer.mark(RECEIVE)
+                if line:
+                    chunk = json.loads(line)
+                    if 'error' in chunk:
+                        raise StreamError(chunk['error'])
+                    pairs = chunk['result'].get('pairs', [])
+                    # The line plus the newline delimiter that iter_lines strips.
+                    stats.add_message(timer.since_start(received_at), len(pairs), len(line) + 1)
+                    if check is not None:
+                        checked.append((pairs, received_at))
+                timer.mark(DECODE)
+            timer.mark(RECEIVE)
+
+        end_time = timer.elapsed()
+        if check is not None:
+            for pairs, received_at in checked:
+                check.check(rest_pairs(pairs), received_at / 1e9)
+            check.finish()
+        if LOG_REQUESTS and request_num > 0:
             print(f"query_request_response_{request_num}")
     except Exception as e:
-        print(f"Failed to process streaming response: {e}")
-        return end_time, 500
-
-    return end_time, 200
+        timer.mark(RECEIVE)
+        end_time = timer.elapsed()
+        if CLIENT_PROFILE is not None:
+            CLIENT_PROFILE.record('query', timer)
+        if LOG_REQUESTS:
+            print(f"Failed to process streaming response: {e}")
+        return end_time, classify_exception(e), stats.finish(end_time)
+
+    if CLIENT_PROFILE is not None:
+        CLIENT_PROFILE.record('query', timer)
+    return end_time, STATUS_OK, stats.finish(end_time)
 
 def generate_random_node():
     """
@@ -116,17 +189,25 @@ def generate_random_history():
         "success_amt_msat": success_amt_sat * 1000,
     }
 
-def save_data_to_json(register_response_times, query_response_times, register_failure_rate, query_failure_rate, mc_entries_registered, mc_entries_per_register, directory="data", filename="rest_response_times.json"):
+def save_data_to_json(register_histogram, query_histogram, register_failure_rate, query_failure_rate,
+                      mc_entries_registered, mc_entries_per_register, query_stream_metrics=None, errors=None, elapsed=None,
+                      transport_stats=None, policy_stats=None, client_profile=None, directory="data", filename="rest_response_times.json"):
     """
-    Saves response times and failure rates to a JSON file.
+    Saves response time histograms and failure rates to a JSON file.
 
     Args:
-        register_response_times (list): List of register request response times.
-        query_response_times (list): List of query request response times.
+        register_histogram (LatencyHistogram): Histogram of register request response times.
+        query_histogram (LatencyHistogram): Histogram of query request response times.
         register_failure_rate (float): Failure rate for register requests.
         query_failure_rate (float): Failure rate for query requests.
         mc_entries_registered (int): Number of mission control entries registered.
         mc_entries_per_register (int): Number of entries per register request.
+        query_stream_metrics (StreamMetrics): Optional streaming metrics of the query requests.
+        errors (ErrorCounts): Optional failed requests by kind of failure.
+        elapsed (float): Optional duration of the run in seconds, to derive throughput and goodput.
+        transport_stats (TransportStats): Optional connection and TLS handshake counters.
+        policy_stats (PolicyStats): Optional retry and hedging counters.
+        client_profile (ClientProfile): Optional self-profile of the client.
         directory (str): Directory to save the file in.
         filename (str): Name of the JSON file.
     """
@@ -136,85 +217,280 @@ def save_data_to_json(register_response_times, query_response_times, register_fa
     filepath = os.path.join(directory, filename)
 
     data = {
-        "register_response_times": register_response_times,
-        "query_response_times": query_response_times,
+        "register_histogram": register_histogram.to_dict(),
+        "query_histogram": query_histogram.to_dict(),
         "register_failure_rate": register_failure_rate,
         "query_failure_rate": query_failure_rate,
         "mc_entries_per_register": mc_entries_per_register,
         "mc_entries_registered": mc_entries_registered,
     }
+    if query_stream_metrics is not None:
+        data["query_stream_metrics"] = query_stream_metrics.to_dict()
+    if errors is not None:
+        data["errors"] = errors.to_dict()
+    if policy_stats is not None:
+        data["request_policy"] = policy_stats.summary()
+    if client_profile is not None:
+        data["client_profile"] = client_profile.summary()
+    if elapsed:
+        requests_sent = register_histogram.count + query_histogram.count
+        failed = round(register_failure_rate * register_histogram.count + query_failure_rate * query_histogram.count)
+        data["elapsed"] = elapsed
+        data["throughput"] = requests_sent / elapsed
+        data["goodput"] = (requests_sent - failed) / elapsed
+    if transport_stats is not None:
+        data["transport_stats"] = transport_stats.to_dict()
 
     with open(filepath, 'w') as f:
         json.dump(data, f, indent=4)
     print(f"Data saved to {filepath}")
 
-def main():
+def generate_tasks(session, server_url, mc_entries_per_register, verbose=False, corpus=None, decode_mode=None,
+                   first_request=1):
     """
-    Main function to perform RESTful register and query operations and save the results.
-    """
-    server_url = "https://<your_ec_domain>:8081"
-    session = get_trusted_ca_session()
-
-    num_requests, mc_entries_per_register = 12, 3
-    register_response_times, query_response_times = [], []
-    register_failed_requests, query_failed_requests = 0, 0
-    tasks = []
+    Lazily generates random pairs and an endless random mix of register and query tasks.
 
-    # Generate pairs and prepare tasks.
-    for request in range(num_requests):
-        print("Preparing request:", request+1)
+    Args:
+        session (requests.Session): The HTTP session the tasks will be sent with.
+        server_url (str): The server URL.
+        mc_entries_per_register (int): Number of entries per register request.
+        verbose (bool): Whether to log every prepared request.
+        corpus (NodeCorpus): Optional pre-generated key corpus to draw nodes from instead of
+            generating a fresh key per node.
+        decode_mode (str): Stream decoder used by query tasks, see query_aggregated_mission_control.
+        first_request (int): Request number of the first task.
+
+    Yields:
+        tuple: Tasks of the form ('register', session, server_url, body, request_num, num_pairs)
+            or ('query', session, server_url, request_num, decode_mode), where body is the
+            serialized register request.
+    """
+    for request in itertools.count(first_request - 1):
+        if verbose:
+            print("Preparing request:", request+1)
         if random.choice(['register', 'query']) == 'register':
             pairs = []
             for _ in range(mc_entries_per_register):
-                node_from = generate_random_node()
-                node_to = generate_random_node()
+                if corpus is not None:
+                    node_from, node_to = (base64.b64encode(node).decode("utf-8") for node in corpus.random_pair())
+                else:
+                    node_from = generate_random_node()
+                    node_to = generate_random_node()
                 history = generate_random_history()
                 pairs.append({
                     "nodeFrom": node_from,
                     "nodeTo": node_to,
                     "history": history
                 })
-            tasks.append(('register', session, server_url, pairs, request+1))
+            yield ('register', session, server_url, serialize_register_request(pairs), request+1, len(pairs))
         else:
-            tasks.append(('query', session, server_url, request+1))
+            yield ('query', session, server_url, request+1, decode_mode)
 
-    # Submit all tasks at once.
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+def prepare_tasks(session, server_url, num_requests, mc_entries_per_register, verbose=False, corpus=None, decode_mode=None):
+    """
+    Generates random pairs and prepares a random mix of register and query tasks.
+
+    Args:
+        session (requests.Session): The HTTP session the tasks will be sent with.
+        server_url (str): The server URL.
+        num_requests (int): Number of requests to prepare.
+        mc_entries_per_register (int): Number of entries per register request.
+        verbose (bool): Whether to log every prepared request.
+        corpus (NodeCorpus): Optional pre-generated key corpus to draw nodes from instead of
+            generating a fresh key per node.
+        decode_mode (str): Stream decoder used by query tasks, see query_aggregated_mission_control.
+
+    Returns:
+        list: Tasks as yielded by generate_tasks.
+    """
+    tasks = generate_tasks(session, server_url, mc_entries_per_register, verbose, corpus, decode_mode)
+    return list(itertools.islice(tasks, num_requests))
+
+def tasks_from_plan(session, server_url, plan_requests, decode_mode=None):
+    """
+    Builds tasks from the requests of a compiled workload plan (see workload.py).
+
+    Args:
+        session (requests.Session): The HTTP session the tasks will be sent with.
+        server_url (str): The server URL.
+        plan_requests (list): Planned requests as returned by workload.load_plan.
+        decode_mode (str): Stream decoder used by query tasks, see query_aggregated_mission_control.
+
+    Returns:
+        list: Tasks in the same form as prepare_tasks returns.
+    """
+    history_fields = ("fail_time", "fail_amt_sat", "fail_amt_msat", "success_time", "success_amt_sat", "success_amt_msat")
+    tasks = []
+    for request, planned in enumerate(plan_requests):
+        if planned["op"] == 'register':
+            pairs = [{"nodeFrom": node_from, "nodeTo": node_to, "history": dict(zip(history_fields, history))}
+                     for node_from, node_to, history in planned["pairs"]]
+            tasks.append(('register', session, server_url, serialize_register_request(pairs), request+1, len(pairs)))
+        else:
+            tasks.append(('query', session, server_url, request+1, decode_mode))
+    return tasks
+
+def execute_task(task, timeout=None):
+    """
+    Sends the request described by a task prepared by prepare_tasks.
+
+    Args:
+        task (tuple): A register or query task.
+        timeout (float): Seconds to wait for the connection and for each read, None to wait forever.
+
+    Returns:
+        tuple: The result of the register or query call.
+    """
+    if task[0] == 'register':
+        return register_mission_control(task[1], task[2], task[3], task[4], timeout)
+    return query_aggregated_mission_control(task[1], task[2], task[3], task[4], timeout)
+
+def run_tasks(tasks, max_workers=None, reporter=None, recorder=None, policy=None):
+    """
+    Submits all tasks at once to a thread pool and collects their results.
+
+    Args:
+        tasks (list): Tasks as returned by prepare_tasks.
+        max_workers (int): Thread pool size, None for the executor default.
+        reporter (LiveReporter): Optional live reporter fed as requests finish.
+        recorder (TimeSeriesWriter): Optional per-request time series fed as requests finish.
+        policy (RequestPolicy): Optional deadline, retry and hedging policy.
+
+    Returns:
+        tuple: Register and query response time histograms, failed register requests,
+            failed query requests, the streaming metrics of the query requests, the
+            failed requests by kind (ErrorCounts) and the duration of the run.
+    """
+    register_histogram, query_histogram = LatencyHistogram(), LatencyHistogram()
+    query_stream_metrics = StreamMetrics()
+    errors = ErrorCounts()
+    register_failed_requests, query_failed_requests = 0, 0
+
+    execute = policy.wrap(execute_task) if policy is not None else execute_task
+    start_time = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = []
         for task in tasks:
-            if task[0] == 'register':
-                future = executor.submit(register_mission_control, task[1], task[2], task[3], task[4])
-                futures.append(('register', future))
-            else:
-                future = executor.submit(query_aggregated_mission_control, task[1], task[2], task[3])
-                futures.append(('query', future))
+            future = executor.submit(execute, task)
+            if reporter is not None:
+                future.add_done_callback(lambda done, op=task[0]: reporter.record_result(op, done.result()))
+            if recorder is not None:
+                future.add_done_callback(lambda done, task=task: recorder.record_result(task, done.result()))
+            futures.append((task[0], future))
 
-        print(f"All {num_requests} requests sent in parallel!")
+        print(f"All {len(tasks)} requests sent in parallel!")
 
         for task_type, future in futures:
             result = future.result()
+            errors.record(task_type, result[1])
             if task_type == 'register':
-                register_response_times.append(result[0])
-                if result[1] is None:
+                register_histogram.record(result[0])
+                if result[1] != STATUS_OK:
                     register_failed_requests += 1
             else:
-                query_response_times.append(result[0])
-                if result[1] == 500:
+                query_histogram.record(result[0])
+                query_stream_metrics.record(result[2])
+                if result[1] != STATUS_OK:
                     query_failed_requests += 1
+    elapsed = time.perf_counter() - start_time
+
+    return (register_histogram, query_histogram, register_failed_requests, query_failed_requests, query_stream_metrics,
+            errors, elapsed)
 
-    register_failure_rate = register_failed_requests / len(register_response_times)
-    query_failure_rate = query_failed_requests / len(query_response_times)
-    mc_entries_registered = len(register_response_times) * mc_entries_per_register
-    print(f"Total Register Requests: {len(register_response_times)}, Failed Register Requests: {register_failed_requests}, Register Failure Rate: {register_failure_rate:.4f}")
-    print(f"Total Query Requests: {len(query_response_times)}, Failed Query Requests: {query_failed_requests}, Query Failure Rate: {query_failure_rate:.4f}")
+def report_results(register_histogram, query_histogram, register_failed_requests, query_failed_requests,
+                   query_stream_metrics, errors, elapsed, mc_entries_per_register, filename="rest_response_times.json",
+                   transport_stats=None, policy_stats=None, client_profile=None, mc_entries_registered=None, directory="data"):
+    """
+    Prints a summary of the run and saves the results to a JSON file.
+
+    Args:
+        register_histogram (LatencyHistogram): Histogram of register request response times.
+        query_histogram (LatencyHistogram): Histogram of query request response times.
+        register_failed_requests (int): Number of failed register requests.
+        query_failed_requests (int): Number of failed query requests.
+        query_stream_metrics (StreamMetrics): Streaming metrics of the query requests, or None.
+        errors (ErrorCounts): Failed requests by kind of failure, or None.
+        elapsed (float): Duration of the run in seconds, or None.
+        mc_entries_per_register (int): Number of entries per register request.
+        filename (str): Name of the JSON file.
+        transport_stats (TransportStats): Connection and TLS handshake counters of the session(s), or None.
+        policy_stats (PolicyStats): Retry and hedging counters, or None.
+        client_profile (ClientProfile): The client's self-profile, or None.
+        mc_entries_registered (int): Entries registered by the successful register requests, when
+            they differ in size; derived from mc_entries_per_register if None.
+        directory (str): Directory to save the file in.
+    """
+    register_failure_rate = register_failed_requests / max(register_histogram.count, 1)
+    query_failure_rate = query_failed_requests / max(query_histogram.count, 1)
+    if mc_entries_registered is None:
+        mc_entries_registered = (register_histogram.count - register_failed_requests) * mc_entries_per_register
+    print(f"Total Register Requests: {register_histogram.count}, Failed Register Requests: {register_failed_requests}, Register Failure Rate: {register_failure_rate:.4f}")
+    print(f"Total Query Requests: {query_histogram.count}, Failed Query Requests: {query_failed_requests}, Query Failure Rate: {query_failure_rate:.4f}")
+    for name, histogram in (("Register", register_histogram), ("Query", query_histogram)):
+        summary = histogram.summary()
+        print(f"{name} Latency: p50 {summary['p50']:.4f}s, p90 {summary['p90']:.4f}s, p99 {summary['p99']:.4f}s, "
+              f"p99.9 {summary['p99.9']:.4f}s, max {summary['max']:.4f}s")
+    if query_stream_metrics is not None and query_stream_metrics.streams:
+        summary = query_stream_metrics.summary()
+        print(f"Query Streams: time to first message p50 {summary['time_to_first_message']['p50']:.4f}s, "
+              f"stream time p50 {summary['stream_time']['p50']:.4f}s, {summary['chunks_per_stream']:.1f} chunks, "
+              f"{summary['pairs_per_stream']:.1f} pairs and {summary['bytes_per_stream']:.0f} bytes per stream, "
+              f"{summary['transfer_bytes_per_second'] / 1e6:.2f} MB/s after the first message")
+    if elapsed:
+        requests_sent = register_histogram.count + query_histogram.count
+        succeeded = requests_sent - register_failed_requests - query_failed_requests
+        print(f"Throughput: {requests_sent / elapsed:.1f} req/s, Goodput: {succeeded / elapsed:.1f} req/s "
+              f"({succeeded} of {requests_sent} requests succeeded in {elapsed:.2f}s)")
+    if errors is not None:
+        for op, counts in errors.to_dict().items():
+            if counts:
+                print(f"{op.capitalize()} Errors: " + ", ".join(f"{label} {count}" for label, count in counts.items()))
+    if policy_stats is not None:
+        print_policy_stats(policy_stats)
     print(f"Mission Contorl Entries Registered: {mc_entries_registered}")
     print(f"Mission Contorl Entries per Register: {mc_entries_per_register}")
+    if transport_stats is not None:
+        print(f"Connections Opened: {transport_stats.connections}, TLS Handshakes: {transport_stats.tls_handshakes} "
+              f"({transport_stats.tls_resumed} resumed)")
+    if client_profile is not None:
+        print_client_profile(client_profile)
 
     # Save data to JSON file.
     save_data_to_json(
-        register_response_times=register_response_times, query_response_times=query_response_times, register_failure_rate=register_failure_rate,
-        query_failure_rate=query_failure_rate, mc_entries_registered=mc_entries_registered, mc_entries_per_register=mc_entries_per_register
+        register_histogram=register_histogram, query_histogram=query_histogram, register_failure_rate=register_failure_rate,
+        query_failure_rate=query_failure_rate, mc_entries_registered=mc_entries_registered, mc_entries_per_register=mc_entries_per_register,
+        query_stream_metrics=query_stream_metrics, errors=errors, elapsed=elapsed, transport_stats=transport_stats,
+        policy_stats=policy_stats, client_profile=client_profile, directory=directory, filename=filename,
     )
 
+def main():
+    """
+    Main function to perform RESTful register and query operations and save the results.
+    """
+    parser = argparse.ArgumentParser(description="Register and query mission control over REST.")
+    parser.add_argument("--corpus", default=None, help="Node-key corpus built with node_corpus.py, instead of a new key per node.")
+    parser.add_argument("--corpus-distribution", choices=DISTRIBUTIONS, default="uniform")
+    args = parser.parse_args()
+    corpus = NodeCorpus(args.corpus, distribution=args.corpus_distribution) if args.corpus else None
+
+    server_url = "https://<your_ec_domain>:8081"
+    session = get_trusted_ca_session()
+
+    num_requests, mc_entries_per_register = 12, 3
+
+    # Generate pairs and prepare tasks.
+    tasks = prepare_tasks(session, server_url, num_requests, mc_entries_per_register, corpus=corpus)
+
+    # Submit all tasks at once.
+    global CLIENT_PROFILE
+    policy = RequestPolicy()
+    profiler = ClientProfiler()
+    CLIENT_PROFILE = profiler.profile
+    with profiler, LiveReporter() as reporter, TimeSeriesWriter("data/rest_requests") as recorder:
+        results = run_tasks(tasks, reporter=reporter, recorder=recorder, policy=policy)
+
+    report_results(*results, mc_entries_per_register=mc_entries_per_register, transport_stats=session.transport_stats,
+                   policy_stats=policy.stats, client_profile=profiler.profile)
+
 if __name__ == '__main__':
     main()
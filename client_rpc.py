@@ -1,20 +1,64 @@
+import argparse
 import os
 import grpc
 import time
 import random
 import concurrent.futures
 import json
+import base64
+import itertools
 from ecdsa import SigningKey, SECP256k1
+from client_profile import DECODE, ENCODE, RECEIVE, SEND, WAIT, ClientProfiler, PhaseTimer, print_client_profile
+from consistency import grpc_pairs, grpc_register_pairs
+from errors import STATUS_OK, ErrorCounts, classify_exception
+from histogram import LatencyHistogram
+from live_reporter import LiveReporter
+from node_corpus import DISTRIBUTIONS, NodeCorpus
+from request_policy import RequestPolicy, print_policy_stats
+from stream_metrics import StreamMetrics, StreamStats
+from timeseries import TimeSeriesWriter
 from external_coordinator_pb2_grpc import ExternalCoordinatorStub
-from external_coordinator_pb2 import RegisterMissionControlRequest, QueryAggregatedMissionControlRequest, PairHistory, PairData
+from external_coordinator_pb2 import RegisterMissionControlRequest, RegisterMissionControlResponse, QueryAggregatedMissionControlRequest, PairHistory, PairData
+
+REGISTER_METHOD = '/ecrpc.ExternalCoordinator/RegisterMissionControl'
+GRPC_COMPRESSION = {"none": grpc.Compression.NoCompression, "gzip": grpc.Compression.Gzip, "deflate": grpc.Compression.Deflate}
+# Per-request log lines; off by default as printing them slows the hot path under load.
+LOG_REQUESTS = False
+# Set to a consistency.ConsistencyChecker to cross-check query results against the registered pairs.
+CONSISTENCY_CHECKER = None
+# Set to a client_profile.ClientProfile to break the client time of every request into phases.
+CLIENT_PROFILE = None
+
+class PreSerializedStub(ExternalCoordinatorStub):
+    """
+    ExternalCoordinatorStub whose RegisterMissionControl sends request bytes as they are.
+
+    Register requests are serialized once when the tasks are prepared (see
+    serialize_register_request), so protobuf encoding is not part of the measured latency.
+    """
 
-def get_self_signed_channel(target: str, cert: str):
+    def __init__(self, channel):
+        """
+        Args:
+            channel (grpc.Channel or grpc.aio.Channel): The channel to send requests on.
+        """
+        super().__init__(channel)
+        self.channel = channel
+        self.RegisterMissionControl = channel.unary_unary(
+            REGISTER_METHOD,
+            request_serializer=None,
+            response_deserializer=RegisterMissionControlResponse.FromString,
+        )
+
+def get_self_signed_channel(target: str, cert: str, options=None, compression=None):
     """
     Creates a secure gRPC channel using a self-signed certificate.
 
     Args:
         target (str): The server address (e.g., 'localhost:50051').
         cert (str): Path to the self-signed certificate file.
+        options (list): Optional channel arguments, see channel_options.
+        compression (grpc.Compression): Compression of the requests sent on the channel, None for none.
 
     Returns:
         grpc.Channel: A secure gRPC channel.
@@ -22,21 +66,85 @@ def get_self_signed_channel(target: str, cert: str):
     with open(cert, 'rb') as f:
         trusted_certs = f.read()
     credentials = grpc.ssl_channel_credentials(root_certificates=trusted_certs)
-    return grpc.secure_channel(target, credentials)
+    return grpc.secure_channel(target, credentials, options=options, compression=compression)
 
-def get_trusted_ca_channel(target: str):
+def get_trusted_ca_channel(target: str, options=None, compression=None):
     """
     Creates a secure gRPC channel using certificates from a trusted CA.
 
     Args:
         target (str): The server address (e.g., 'example.com:50051').
+        options (list): Optional channel arguments, see channel_options.
+        compression (grpc.Compression): Compression of the requests sent on the channel, None for none.
 
     Returns:
         grpc.Channel: A secure gRPC channel.
     """
     # Use default system-trusted CA certificates
     credentials = grpc.ssl_channel_credentials()
-    return grpc.secure_channel(target, credentials)
+    return grpc.secure_channel(target, credentials, options=options, compression=compression)
+
+def get_insecure_channel(target: str, options=None, compression=None):
+    """
+    Creates a plaintext gRPC channel, e.g. for a coordinator running locally.
+
+    Args:
+        target (str): The server address (e.g., 'localhost:50051').
+        options (list): Optional channel arguments, see channel_options.
+        compression (grpc.Compression): Compression of the requests sent on the channel, None for none.
+
+    Returns:
+        grpc.Channel: An insecure gRPC channel.
+    """
+    return grpc.insecure_channel(target, options=options, compression=compression)
+
+def channel_options(flow_control_window=None, max_message_size=None, bdp_probe=True, own_connection=False):
+    """
+    Builds the channel arguments for the HTTP/2 flow control and message size settings.
+
+    Args:
+        flow_control_window (int): Bytes a stream may receive before the client reads them,
+            None for gRPC's default.
+        max_message_size (int): Largest message in bytes the channel receives, None for 4 MiB.
+        bdp_probe (bool): Let gRPC grow the window from bandwidth-delay estimates; off pins
+            the window at flow_control_window.
+        own_connection (bool): Do not share the TCP connection with other channels to the same target.
+
+    Returns:
+        list: (name, value) channel arguments.
+    """
+    options = []
+    if flow_control_window is not None:
+        options.append(("grpc.http2.lookahead_bytes", flow_control_window))
+    if max_message_size is not None:
+        options.append(("grpc.max_receive_message_length", max_message_size))
+    if not bdp_probe:
+        options.append(("grpc.http2.bdp_probe", 0))
+    if own_connection:
+        options.append(("grpc.use_local_subchannel_pool", 1))
+    return options
+
+def add_channel_arguments(parser):
+    """
+    Adds the gRPC flow control and message size options to a command line parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument("--flow-control-window", type=int, default=None, help="gRPC stream flow-control window in bytes.")
+    parser.add_argument("--max-message-size", type=int, default=None, help="Largest gRPC message received, in bytes.")
+    parser.add_argument("--no-bdp-probe", action="store_true", help="Keep the gRPC flow-control window fixed.")
+
+def channel_options_from_args(args):
+    """
+    Args:
+        args (argparse.Namespace): Parsed options added by add_channel_arguments.
+
+    Returns:
+        dict: Keyword arguments for channel_options.
+    """
+    return {"flow_control_window": args.flow_control_window, "max_message_size": args.max_message_size,
+            "bdp_probe": not args.no_bdp_probe}
 
 def generate_random_node():
     """
@@ -74,65 +182,118 @@ def generate_random_history():
         success_amt_msat=success_amt_sat * 1000,
     )
 
-def register_mission_control(stub, pairs, request_num):
+def serialize_register_request(pairs):
+    """
+    Args:
+        pairs (list): List of PairHistory objects to register.
+
+    Returns:
+        bytes: The wire bytes of the RegisterMissionControlRequest.
+    """
+    return RegisterMissionControlRequest(pairs=pairs).SerializeToString()
+
+def register_mission_control(stub, payload, request_num, timeout=None):
     """
     Sends a RegisterMissionControlRequest to the server.
 
     Args:
-        stub (ExternalCoordinatorStub): The gRPC stub for the External Coordinator service.
-        pairs (list): List of PairHistory objects to register.
+        stub (PreSerializedStub): The gRPC stub for the External Coordinator service.
+        payload (bytes): The request, as returned by serialize_register_request.
         request_num (int): The request number for logging purposes.
+        timeout (float): Deadline of the call in seconds, None to wait forever.
 
     Returns:
-        tuple: Response time and the server response.
+        tuple: Response time and status code (STATUS_OK, or see errors.classify_exception).
     """
-    start_time = time.time()
-    request = RegisterMissionControlRequest(pairs=pairs)
-    response = stub.RegisterMissionControl(request)
-    end_time = time.time() - start_time
-    if request_num > 0:
+    timer = PhaseTimer()
+    try:
+        stub.RegisterMissionControl(payload, timeout=timeout)
+        timer.mark(WAIT)
+    except Exception as e:
+        timer.mark(WAIT)
+        if CLIENT_PROFILE is not None:
+            CLIENT_PROFILE.record('register', timer)
+        if LOG_REQUESTS:
+            print(f"Failed to register mission control: {e}")
+        return timer.elapsed(), classify_exception(e)
+
+    end_time = timer.elapsed()
+    if CLIENT_PROFILE is not None:
+        CLIENT_PROFILE.record('register', timer)
+    if CONSISTENCY_CHECKER is not None:
+        CONSISTENCY_CHECKER.record_register(grpc_register_pairs(payload), timer.last / 1e9)
+    if LOG_REQUESTS and request_num > 0:
         print(f"register_request_response_{request_num}: {end_time:0.2f}")
-    return end_time, response
+    return end_time, STATUS_OK
 
-def query_aggregated_mission_control(stub, request_num):
+def query_aggregated_mission_control(stub, request_num, timeout=None):
     """
     Sends a QueryAggregatedMissionControlRequest to the server.
 
     Args:
-        stub (ExternalCoordinatorStub): The gRPC stub for the External Coordinator service.
+        stub (PreSerializedStub): The gRPC stub for the External Coordinator service.
         request_num (int): The request number for logging purposes.
+        timeout (float): Deadline of the whole stream in seconds, None to wait forever.
 
     Returns:
-        tuple: Response time and status code.
+        tuple: Response time (until the stream is drained), status code (STATUS_OK, or
+            see errors.classify_exception) and the StreamStats of the stream.
     """
-    start_time = time.time()
+    timer = PhaseTimer()
     request = QueryAggregatedMissionControlRequest()
-    pairs = []
+    stats = StreamStats()
+    check = CONSISTENCY_CHECKER.begin_query(timer.start / 1e9) if CONSISTENCY_CHECKER is not None and request_num > 0 else None
+    # Checked messages are kept and cross-checked once the stream is drained, off the clock.
+    checked = []
+    timer.mark(ENCODE)
     try:
-        for response in stub.QueryAggregatedMissionControl(request):
-            pairs.extend(response.pairs)
+        responses = stub.QueryAggregatedMissionControl(request, timeout=timeout)
+        timer.mark(SEND)
+        for response in responses:
+            received_at = timer.mark(RECEIVE if stats.chunks else WAIT)
+            stats.add_message(timer.since_start(received_at), len(response.pairs), response.ByteSize())
+            if check is not None:
+                checked.append((response.pairs, received_at))
+            timer.mark(DECODE)
+        timer.mark(RECEIVE if stats.chunks else WAIT)
     except Exception as e:
-        print(f"Failed to process streaming response: {e}")
-        end_time = time.time() - start_time
-        return end_time, 500
-
-    end_time = time.time() - start_time
-    if request_num > 0:
+        timer.mark(RECEIVE if stats.chunks else WAIT)
+        end_time = timer.elapsed()
+        if CLIENT_PROFILE is not None:
+            CLIENT_PROFILE.record('query', timer)
+        if LOG_REQUESTS:
+            print(f"Failed to process streaming response: {e}")
+        return end_time, classify_exception(e), stats.finish(end_time)
+
+    end_time = timer.elapsed()
+    if CLIENT_PROFILE is not None:
+        CLIENT_PROFILE.record('query', timer)
+    if check is not None:
+        for pairs, received_at in checked:
+            check.check(grpc_pairs(pairs), received_at / 1e9)
+        check.finish()
+    if LOG_REQUESTS and request_num > 0:
         print(f"query_request_response_{request_num}: {end_time:0.2f}")
-    return end_time, 200
+    return end_time, STATUS_OK, stats.finish(end_time)
 
-def save_data_to_json(register_response_times, query_response_times, register_failure_rate, query_failure_rate,
-                      mc_entries_registered, mc_entries_per_register, directory="data", filename="grpc_response_times.json"):
+def save_data_to_json(register_histogram, query_histogram, register_failure_rate, query_failure_rate,
+                      mc_entries_registered, mc_entries_per_register, query_stream_metrics=None, errors=None, elapsed=None,
+                      policy_stats=None, client_profile=None, directory="data", filename="grpc_response_times.json"):
     """
-    Saves response times and failure rates to a JSON file.
+    Saves response time histograms and failure rates to a JSON file.
 
     Args:
-        register_response_times (list): List of register request response times.
-        query_response_times (list): List of query request response times.
+        register_histogram (LatencyHistogram): Histogram of register request response times.
+        query_histogram (LatencyHistogram): Histogram of query request response times.
         register_failure_rate (float): Failure rate for register requests.
         query_failure_rate (float): Failure rate for query requests.
         mc_entries_registered (int): Number of mission control entries registered.
         mc_entries_per_register (int): Number of entries per register request.
+        query_stream_metrics (StreamMetrics): Optional streaming metrics of the query requests.
+        errors (ErrorCounts): Optional failed requests by kind of failure.
+        elapsed (float): Optional duration of the run in seconds, to derive throughput and goodput.
+        policy_stats (PolicyStats): Optional retry and hedging counters.
+        client_profile (ClientProfile): Optional self-profile of the client.
         directory (str): Directory to save the file in.
         filename (str): Name of the JSON file.
     """
@@ -142,87 +303,272 @@ def save_data_to_json(register_response_times, query_response_times, register_fa
     filepath = os.path.join(directory, filename)
 
     data = {
-        "register_response_times": register_response_times,
-        "query_response_times": query_response_times,
+        "register_histogram": register_histogram.to_dict(),
+        "query_histogram": query_histogram.to_dict(),
         "register_failure_rate": register_failure_rate,
         "query_failure_rate": query_failure_rate,
         "mc_entries_per_register": mc_entries_per_register,
         "mc_entries_registered": mc_entries_registered,
     }
+    if query_stream_metrics is not None:
+        data["query_stream_metrics"] = query_stream_metrics.to_dict()
+    if errors is not None:
+        data["errors"] = errors.to_dict()
+    if policy_stats is not None:
+        data["request_policy"] = policy_stats.summary()
+    if client_profile is not None:
+        data["client_profile"] = client_profile.summary()
+    if elapsed:
+        requests_sent = register_histogram.count + query_histogram.count
+        failed = round(register_failure_rate * register_histogram.count + query_failure_rate * query_histogram.count)
+        data["elapsed"] = elapsed
+        data["throughput"] = requests_sent / elapsed
+        data["goodput"] = (requests_sent - failed) / elapsed
 
     with open(filepath, 'w') as f:
         json.dump(data, f, indent=4)
     print(f"Data saved to {filepath}")
 
-def main():
-    """
-    Main function to perform gRPC register and query operations and save the results.
+def generate_tasks(stub, mc_entries_per_register, verbose=False, corpus=None, first_request=1):
     """
-    server_url = "<your_ec_domain>:50050"
-    channel = get_trusted_ca_channel(server_url)
-
-    stub = ExternalCoordinatorStub(channel)
-
-    # Make an initial request to the server for establishing TLS handshake excluding it
-    # from the performance results.
-    print("Making 1st request for TLS handshake!")
-    query_aggregated_mission_control(stub=stub, request_num=0)
-
-    num_requests, mc_entries_per_register = 12, 3
-    register_response_times, query_response_times = [], []
-    register_failed_requests, query_failed_requests = 0, 0
-    tasks = []
+    Lazily generates random pairs and an endless random mix of register and query tasks.
 
-    # Generate pairs and prepare tasks.
-    for request in range(num_requests):
-        print("Preparing request:", request+1)
+    Args:
+        stub (PreSerializedStub): The gRPC stub the tasks will be sent with.
+        mc_entries_per_register (int): Number of entries per register request.
+        verbose (bool): Whether to log every prepared request.
+        corpus (NodeCorpus): Optional pre-generated key corpus to draw nodes from instead of
+            generating a fresh key per node.
+        first_request (int): Request number of the first task.
+
+    Yields:
+        tuple: Tasks of the form ('register', stub, payload, request_num, num_pairs) or
+            ('query', stub, request_num), where payload is the serialized register request.
+    """
+    for request in itertools.count(first_request - 1):
+        if verbose:
+            print("Preparing request:", request+1)
         if random.choice(['register', 'query']) == 'register':
             pairs = []
             for _ in range(mc_entries_per_register):
-                node_from = generate_random_node()
-                node_to = generate_random_node()
+                if corpus is not None:
+                    node_from, node_to = corpus.random_pair()
+                else:
+                    node_from = generate_random_node()
+                    node_to = generate_random_node()
                 history = generate_random_history()
                 pairs.append(PairHistory(node_from=node_from, node_to=node_to, history=history))
-            tasks.append(('register', stub, pairs, request+1))
+            yield ('register', stub, serialize_register_request(pairs), request+1, len(pairs))
+        else:
+            yield ('query', stub, request + 1)
+
+def prepare_tasks(stub, num_requests, mc_entries_per_register, verbose=False, corpus=None):
+    """
+    Generates random pairs and prepares a random mix of register and query tasks.
+
+    Args:
+        stub (PreSerializedStub): The gRPC stub the tasks will be sent with.
+        num_requests (int): Number of requests to prepare.
+        mc_entries_per_register (int): Number of entries per register request.
+        verbose (bool): Whether to log every prepared request.
+        corpus (NodeCorpus): Optional pre-generated key corpus to draw nodes from instead of
+            generating a fresh key per node.
+
+    Returns:
+        list: Tasks as yielded by generate_tasks.
+    """
+    return list(itertools.islice(generate_tasks(stub, mc_entries_per_register, verbose, corpus), num_requests))
+
+def tasks_from_plan(stub, plan_requests):
+    """
+    Builds tasks from the requests of a compiled workload plan (see workload.py).
+
+    Args:
+        stub (PreSerializedStub): The gRPC stub the tasks will be sent with.
+        plan_requests (list): Planned requests as returned by workload.load_plan.
+
+    Returns:
+        list: Tasks in the same form as prepare_tasks returns.
+    """
+    tasks = []
+    for request, planned in enumerate(plan_requests):
+        if planned["op"] == 'register':
+            pairs = []
+            for node_from, node_to, history in planned["pairs"]:
+                fail_time, fail_amt_sat, fail_amt_msat, success_time, success_amt_sat, success_amt_msat = history
+                pairs.append(PairHistory(
+                    node_from=base64.b64decode(node_from), node_to=base64.b64decode(node_to),
+                    history=PairData(fail_time=fail_time, fail_amt_sat=fail_amt_sat, fail_amt_msat=fail_amt_msat,
+                                     success_time=success_time, success_amt_sat=success_amt_sat, success_amt_msat=success_amt_msat),
+                ))
+            tasks.append(('register', stub, serialize_register_request(pairs), request + 1, len(pairs)))
         else:
             tasks.append(('query', stub, request + 1))
+    return tasks
 
-    # Submit all tasks at once.
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+def execute_task(task, timeout=None):
+    """
+    Sends the request described by a task prepared by prepare_tasks.
+
+    Args:
+        task (tuple): A register or query task.
+        timeout (float): Deadline of the call in seconds, None to wait forever.
+
+    Returns:
+        tuple: The result of the register or query call.
+    """
+    if task[0] == 'register':
+        return register_mission_control(task[1], task[2], task[3], timeout)
+    return query_aggregated_mission_control(task[1], task[2], timeout)
+
+def run_tasks(tasks, max_workers=None, reporter=None, recorder=None, policy=None):
+    """
+    Submits all tasks at once to a thread pool and collects their results.
+
+    Args:
+        tasks (list): Tasks as returned by prepare_tasks.
+        max_workers (int): Thread pool size, None for the executor default.
+        reporter (LiveReporter): Optional live reporter fed as requests finish.
+        recorder (TimeSeriesWriter): Optional per-request time series fed as requests finish.
+        policy (RequestPolicy): Optional deadline, retry and hedging policy.
+
+    Returns:
+        tuple: Register and query response time histograms, failed register requests,
+            failed query requests, the streaming metrics of the query requests, the
+            failed requests by kind (ErrorCounts) and the duration of the run.
+    """
+    register_histogram, query_histogram = LatencyHistogram(), LatencyHistogram()
+    query_stream_metrics = StreamMetrics()
+    errors = ErrorCounts()
+    register_failed_requests, query_failed_requests = 0, 0
+
+    execute = policy.wrap(execute_task) if policy is not None else execute_task
+    start_time = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = []
         for task in tasks:
-            if task[0] == 'register':
-                future = executor.submit(register_mission_control, task[1], task[2], task[3])
-                futures.append(('register', future))
-            else:
-                future = executor.submit(query_aggregated_mission_control, task[1], task[2])
-                futures.append(('query', future))
+            future = executor.submit(execute, task)
+            if reporter is not None:
+                future.add_done_callback(lambda done, op=task[0]: reporter.record_result(op, done.result()))
+            if recorder is not None:
+                future.add_done_callback(lambda done, task=task: recorder.record_result(task, done.result()))
+            futures.append((task[0], future))
 
-        print(f"All {num_requests} requests sent in parallel!")
+        print(f"All {len(tasks)} requests sent in parallel!")
 
         for task_type, future in futures:
             result = future.result()
+            errors.record(task_type, result[1])
             if task_type == 'register':
-                register_response_times.append(result[0])
-                if result[1] is None:
+                register_histogram.record(result[0])
+                if result[1] != STATUS_OK:
                     register_failed_requests += 1
             else:
-                query_response_times.append(result[0])
-                if result[1] == 500:
+                query_histogram.record(result[0])
+                query_stream_metrics.record(result[2])
+                if result[1] != STATUS_OK:
                     query_failed_requests += 1
+    elapsed = time.perf_counter() - start_time
+
+    return (register_histogram, query_histogram, register_failed_requests, query_failed_requests, query_stream_metrics,
+            errors, elapsed)
+
+def report_results(register_histogram, query_histogram, register_failed_requests, query_failed_requests,
+                   query_stream_metrics, errors, elapsed, mc_entries_per_register, filename="grpc_response_times.json",
+                   policy_stats=None, client_profile=None, mc_entries_registered=None, directory="data"):
+    """
+    Prints a summary of the run and saves the results to a JSON file.
 
-    register_failure_rate = register_failed_requests / len(register_response_times)
-    query_failure_rate = query_failed_requests / len(query_response_times)
-    mc_entries_registered = len(register_response_times) * mc_entries_per_register
-    print(f"Total Register Requests: {len(register_response_times)}, Failed Register Requests: {register_failed_requests}, Register Failure Rate: {register_failure_rate:.4f}")
-    print(f"Total Query Requests: {len(query_response_times)}, Failed Query Requests: {query_failed_requests}, Query Failure Rate: {query_failure_rate:.4f}")
+    Args:
+        register_histogram (LatencyHistogram): Histogram of register request response times.
+        query_histogram (LatencyHistogram): Histogram of query request response times.
+        register_failed_requests (int): Number of failed register requests.
+        query_failed_requests (int): Number of failed query requests.
+        query_stream_metrics (StreamMetrics): Streaming metrics of the query requests, or None.
+        errors (ErrorCounts): Failed requests by kind of failure, or None.
+        elapsed (float): Duration of the run in seconds, or None.
+        mc_entries_per_register (int): Number of entries per register request.
+        filename (str): Name of the JSON file.
+        policy_stats (PolicyStats): Retry and hedging counters, or None.
+        client_profile (ClientProfile): The client's self-profile, or None.
+        mc_entries_registered (int): Entries registered by the successful register requests, when
+            they differ in size; derived from mc_entries_per_register if None.
+        directory (str): Directory to save the file in.
+    """
+    register_failure_rate = register_failed_requests / max(register_histogram.count, 1)
+    query_failure_rate = query_failed_requests / max(query_histogram.count, 1)
+    if mc_entries_registered is None:
+        mc_entries_registered = (register_histogram.count - register_failed_requests) * mc_entries_per_register
+    print(f"Total Register Requests: {register_histogram.count}, Failed Register Requests: {register_failed_requests}, Register Failure Rate: {register_failure_rate:.4f}")
+    print(f"Total Query Requests: {query_histogram.count}, Failed Query Requests: {query_failed_requests}, Query Failure Rate: {query_failure_rate:.4f}")
+    for name, histogram in (("Register", register_histogram), ("Query", query_histogram)):
+        summary = histogram.summary()
+        print(f"{name} Latency: p50 {summary['p50']:.4f}s, p90 {summary['p90']:.4f}s, p99 {summary['p99']:.4f}s, "
+              f"p99.9 {summary['p99.9']:.4f}s, max {summary['max']:.4f}s")
+    if query_stream_metrics is not None and query_stream_metrics.streams:
+        summary = query_stream_metrics.summary()
+        print(f"Query Streams: time to first message p50 {summary['time_to_first_message']['p50']:.4f}s, "
+              f"stream time p50 {summary['stream_time']['p50']:.4f}s, {summary['chunks_per_stream']:.1f} chunks, "
+              f"{summary['pairs_per_stream']:.1f} pairs and {summary['bytes_per_stream']:.0f} bytes per stream, "
+              f"{summary['transfer_bytes_per_second'] / 1e6:.2f} MB/s after the first message")
+    if elapsed:
+        requests_sent = register_histogram.count + query_histogram.count
+        succeeded = requests_sent - register_failed_requests - query_failed_requests
+        print(f"Throughput: {requests_sent / elapsed:.1f} req/s, Goodput: {succeeded / elapsed:.1f} req/s "
+              f"({succeeded} of {requests_sent} requests succeeded in {elapsed:.2f}s)")
+    if errors is not None:
+        for op, counts in errors.to_dict().items():
+            if counts:
+                print(f"{op.capitalize()} Errors: " + ", ".join(f"{label} {count}" for label, count in counts.items()))
+    if policy_stats is not None:
+        print_policy_stats(policy_stats)
     print(f"Mission Contorl Entries Registered: {mc_entries_registered}")
+    if client_profile is not None:
+        print_client_profile(client_profile)
 
     # Save data to JSON file.
     save_data_to_json(
-        register_response_times=register_response_times, query_response_times=query_response_times, register_failure_rate=register_failure_rate,
+        register_histogram=register_histogram, query_histogram=query_histogram, register_failure_rate=register_failure_rate,
         query_failure_rate=query_failure_rate, mc_entries_registered=mc_entries_registered, mc_entries_per_register=mc_entries_per_register,
+        query_stream_metrics=query_stream_metrics, errors=errors, elapsed=elapsed, policy_stats=policy_stats, client_profile=client_profile,
+        directory=directory, filename=filename,
     )
 
+def main():
+    """
+    Main function to perform gRPC register and query operations and save the results.
+    """
+    parser = argparse.ArgumentParser(description="Register and query mission control over gRPC.")
+    parser.add_argument("--corpus", default=None, help="Node-key corpus built with node_corpus.py, instead of a new key per node.")
+    parser.add_argument("--corpus-distribution", choices=DISTRIBUTIONS, default="uniform")
+    args = parser.parse_args()
+    corpus = NodeCorpus(args.corpus, distribution=args.corpus_distribution) if args.corpus else None
+
+    server_url = "<your_ec_domain>:50050"
+    channel = get_trusted_ca_channel(server_url)
+
+    stub = PreSerializedStub(channel)
+
+    # Make an initial request to the server for establishing TLS handshake excluding it
+    # from the performance results.
+    print("Making 1st request for TLS handshake!")
+    query_aggregated_mission_control(stub=stub, request_num=0)
+
+    num_requests, mc_entries_per_register = 12, 3
+
+    # Generate pairs and prepare tasks.
+    tasks = prepare_tasks(stub, num_requests, mc_entries_per_register, corpus=corpus)
+
+    # Submit all tasks at once.
+    global CLIENT_PROFILE
+    policy = RequestPolicy()
+    profiler = ClientProfiler()
+    CLIENT_PROFILE = profiler.profile
+    with profiler, LiveReporter() as reporter, TimeSeriesWriter("data/grpc_requests") as recorder:
+        results = run_tasks(tasks, reporter=reporter, recorder=recorder, policy=policy)
+
+    report_results(*results, mc_entries_per_register=mc_entries_per_register, policy_stats=policy.stats,
+                   client_profile=profiler.profile)
+
 if __name__ == '__main__':
     main()
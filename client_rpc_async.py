@@ -0,0 +1,315 @@
+import asyncio
+import itertools
+import random
+import time
+import grpc
+from client_profile import DECODE, ENCODE, RECEIVE, SEND, WAIT, ClientProfiler, PhaseTimer, monitor_event_loop
+from external_coordinator_pb2 import QueryAggregatedMissionControlRequest, PairHistory
+from client_rpc import PreSerializedStub, generate_random_node, generate_random_history, report_results, serialize_register_request
+from errors import STATUS_OK, ErrorCounts, classify_exception
+from histogram import LatencyHistogram
+from live_reporter import LiveReporter
+from request_policy import DEFAULT_DEADLINE
+from stream_metrics import StreamMetrics, StreamStats
+from timeseries import TimeSeriesWriter
+
+# Every channel gets its own subchannel pool so that channels pointing at the
+# same target do not collapse onto one shared HTTP/2 connection.
+CHANNEL_OPTIONS = [("grpc.use_local_subchannel_pool", 1)]
+# Per-request log lines; off by default as printing them slows the hot path under load.
+LOG_REQUESTS = False
+# Set to a client_profile.ClientProfile to break the client time of every request into phases.
+CLIENT_PROFILE = None
+
+class ChannelPool:
+    """
+    A fixed set of grpc.aio channels handed out round-robin.
+
+    Each channel is a separate HTTP/2 connection, so spreading calls across the
+    pool avoids the per-connection stream limit and single-socket bottleneck.
+    """
+
+    def __init__(self, channels):
+        """
+        Args:
+            channels (list): List of grpc.aio.Channel objects.
+        """
+        self.channels = channels
+        self.stubs = [PreSerializedStub(channel) for channel in channels]
+        self._next = itertools.cycle(self.stubs)
+
+    def next_stub(self):
+        """
+        Returns:
+            PreSerializedStub: The stub of the next channel in round-robin order.
+        """
+        return next(self._next)
+
+    async def close(self):
+        """
+        Closes every channel in the pool.
+        """
+        await asyncio.gather(*(channel.close() for channel in self.channels))
+
+def get_self_signed_channel_pool(target: str, cert: str, size: int):
+    """
+    Creates a pool of secure grpc.aio channels using a self-signed certificate.
+
+    Args:
+        target (str): The server address (e.g., 'localhost:50051').
+        cert (str): Path to the self-signed certificate file.
+        size (int): Number of channels (HTTP/2 connections) in the pool.
+
+    Returns:
+        ChannelPool: A pool of secure aio channels.
+    """
+    with open(cert, 'rb') as f:
+        trusted_certs = f.read()
+    credentials = grpc.ssl_channel_credentials(root_certificates=trusted_certs)
+    return ChannelPool([grpc.aio.secure_channel(target, credentials, options=CHANNEL_OPTIONS) for _ in range(size)])
+
+def get_trusted_ca_channel_pool(target: str, size: int):
+    """
+    Creates a pool of secure grpc.aio channels using certificates from a trusted CA.
+
+    Args:
+        target (str): The server address (e.g., 'example.com:50051').
+        size (int): Number of channels (HTTP/2 connections) in the pool.
+
+    Returns:
+        ChannelPool: A pool of secure aio channels.
+    """
+    credentials = grpc.ssl_channel_credentials()
+    return ChannelPool([grpc.aio.secure_channel(target, credentials, options=CHANNEL_OPTIONS) for _ in range(size)])
+
+def get_insecure_channel_pool(target: str, size: int):
+    """
+    Creates a pool of plaintext grpc.aio channels.
+
+    Args:
+        target (str): The server address (e.g., 'localhost:50051').
+        size (int): Number of channels (HTTP/2 connections) in the pool.
+
+    Returns:
+        ChannelPool: A pool of insecure aio channels.
+    """
+    return ChannelPool([grpc.aio.insecure_channel(target, options=CHANNEL_OPTIONS) for _ in range(size)])
+
+async def register_mission_control(stub, payload, request_num, timeout=None):
+    """
+    Sends a RegisterMissionControlRequest to the server.
+
+    Args:
+        stub (PreSerializedStub): The gRPC aio stub for the External Coordinator service.
+        payload (bytes): The request, as returned by client_rpc.serialize_register_request.
+        request_num (int): The request number for logging purposes.
+        timeout (float): Deadline of the call in seconds, None to wait forever.
+
+    Returns:
+        tuple: Response time and status code (STATUS_OK, or see errors.classify_exception).
+    """
+    timer = PhaseTimer()
+    try:
+        await stub.RegisterMissionControl(payload, timeout=timeout)
+        timer.mark(WAIT)
+    except Exception as e:
+        timer.mark(WAIT)
+        if CLIENT_PROFILE is not None:
+            CLIENT_PROFILE.record('register', timer)
+        if LOG_REQUESTS:
+            print(f"Failed to register mission control: {e}")
+        return timer.elapsed(), classify_exception(e)
+
+    end_time = timer.elapsed()
+    if CLIENT_PROFILE is not None:
+        CLIENT_PROFILE.record('register', timer)
+    if LOG_REQUESTS and request_num > 0:
+        print(f"register_request_response_{request_num}: {end_time:0.2f}")
+    return end_time, STATUS_OK
+
+async def query_aggregated_mission_control(stub, request_num, timeout=None):
+    """
+    Sends a QueryAggregatedMissionControlRequest to the server.
+
+    Args:
+        stub (PreSerializedStub): The gRPC aio stub for the External Coordinator service.
+        request_num (int): The request number for logging purposes.
+        timeout (float): Deadline of the whole stream in seconds, None to wait forever.
+
+    Returns:
+        tuple: Response time (until the stream is drained), status code (STATUS_OK, or
+            see errors.classify_exception) and the StreamStats of the stream.
+    """
+    timer = PhaseTimer()
+    request = QueryAggregatedMissionControlRequest()
+    stats = StreamStats()
+    timer.mark(ENCODE)
+    try:
+        responses = stub.QueryAggregatedMissionControl(request, timeout=timeout)
+        timer.mark(SEND)
+        async for response in responses:
+            received_at = timer.mark(RECEIVE if stats.chunks else WAIT)
+            stats.add_message(timer.since_start(received_at), len(response.pairs), response.ByteSize())
+            timer.mark(DECODE)
+        timer.mark(RECEIVE if stats.chunks else WAIT)
+    except Exception as e:
+        timer.mark(RECEIVE if stats.chunks else WAIT)
+        end_time = timer.elapsed()
+        if CLIENT_PROFILE is not None:
+            CLIENT_PROFILE.record('query', timer)
+        if LOG_REQUESTS:
+            print(f"Failed to process streaming response: {e}")
+        return end_time, classify_exception(e), stats.finish(end_time)
+
+    end_time = timer.elapsed()
+    if CLIENT_PROFILE is not None:
+        CLIENT_PROFILE.record('query', timer)
+    if LOG_REQUESTS and request_num > 0:
+        print(f"query_request_response_{request_num}: {end_time:0.2f}")
+    return end_time, STATUS_OK, stats.finish(end_time)
+
+def prepare_tasks(num_requests, mc_entries_per_register, corpus=None):
+    """
+    Builds the same random register/query mix as client_rpc.main.
+
+    Args:
+        num_requests (int): Number of requests to prepare.
+        mc_entries_per_register (int): Number of entries per register request.
+        corpus (NodeCorpus): Optional pre-generated key corpus to draw nodes from.
+
+    Returns:
+        list: Tasks of the form ('register', payload, request_num, num_pairs) or ('query', request_num),
+            where payload is the serialized register request.
+    """
+    tasks = []
+    for request in range(num_requests):
+        if random.choice(['register', 'query']) == 'register':
+            pairs = []
+            for _ in range(mc_entries_per_register):
+                if corpus is not None:
+                    node_from, node_to = corpus.random_pair()
+                else:
+                    node_from = generate_random_node()
+                    node_to = generate_random_node()
+                history = generate_random_history()
+                pairs.append(PairHistory(node_from=node_from, node_to=node_to, history=history))
+            tasks.append(('register', serialize_register_request(pairs), request+1, len(pairs)))
+        else:
+            tasks.append(('query', request+1))
+    return tasks
+
+async def run_tasks(pool, tasks, concurrency, reporter=None, recorder=None, timeout=None):
+    """
+    Runs all tasks over the channel pool with at most `concurrency` calls in flight.
+
+    Args:
+        pool (ChannelPool): The channel pool to spread calls across.
+        tasks (list): Tasks as returned by prepare_tasks.
+        concurrency (int): Maximum number of in-flight calls.
+        reporter (LiveReporter): Optional live reporter fed as requests finish.
+        recorder (TimeSeriesWriter): Optional per-request time series fed as requests finish.
+        timeout (float): Deadline of every call in seconds, None to wait forever.
+
+    Returns:
+        list: (task_type, result) tuples in task order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_task(task):
+        async with semaphore:
+            stub = pool.next_stub()
+            if task[0] == 'register':
+                result = await register_mission_control(stub, task[1], task[2], timeout)
+            else:
+                result = await query_aggregated_mission_control(stub, task[1], timeout)
+            if reporter is not None:
+                reporter.record_result(task[0], result)
+            if recorder is not None:
+                recorder.record_result(task, result)
+            return task[0], result
+
+    return await asyncio.gather(*(run_task(task) for task in tasks))
+
+async def run(pool, num_requests, mc_entries_per_register, concurrency, corpus=None, reporter=None, recorder=None,
+              timeout=None, profiler=None):
+    """
+    Performs the register and query operations over the pool and saves the results.
+
+    Args:
+        pool (ChannelPool): The channel pool to use.
+        num_requests (int): Number of requests to send.
+        mc_entries_per_register (int): Number of entries per register request.
+        concurrency (int): Maximum number of in-flight calls.
+        corpus (NodeCorpus): Optional pre-generated key corpus to draw nodes from.
+        reporter (LiveReporter): Optional live reporter fed as requests finish.
+        recorder (TimeSeriesWriter): Optional per-request time series fed as requests finish.
+        timeout (float): Deadline of every call in seconds, None to wait forever.
+        profiler (ClientProfiler): Optional unstarted self-profiler; the event loop lag is
+            measured alongside its thread samplers.
+    """
+    global CLIENT_PROFILE
+    # Warm every channel up so the TLS handshakes are excluded from the results.
+    print(f"Making 1st request on {len(pool.stubs)} channels for TLS handshake!")
+    await asyncio.gather(*(query_aggregated_mission_control(stub, 0) for stub in pool.stubs))
+
+    print(f"Preparing {num_requests} requests")
+    tasks = prepare_tasks(num_requests, mc_entries_per_register, corpus)
+
+    print(f"Sending {num_requests} requests with up to {concurrency} in flight!")
+    if profiler is not None:
+        CLIENT_PROFILE = profiler.profile
+        profiler.start()
+        stop_monitor = asyncio.Event()
+        monitor = asyncio.create_task(monitor_event_loop(profiler.profile, stop_monitor))
+    start_time = time.perf_counter()
+    results = await run_tasks(pool, tasks, concurrency, reporter, recorder, timeout)
+    elapsed = time.perf_counter() - start_time
+    if profiler is not None:
+        stop_monitor.set()
+        await monitor
+        profiler.stop()
+
+    register_histogram, query_histogram = LatencyHistogram(), LatencyHistogram()
+    query_stream_metrics = StreamMetrics()
+    errors = ErrorCounts()
+    register_failed_requests, query_failed_requests = 0, 0
+    for task_type, result in results:
+        errors.record(task_type, result[1])
+        if task_type == 'register':
+            register_histogram.record(result[0])
+            if result[1] != STATUS_OK:
+                register_failed_requests += 1
+        else:
+            query_histogram.record(result[0])
+            query_stream_metrics.record(result[2])
+            if result[1] != STATUS_OK:
+                query_failed_requests += 1
+
+    report_results(register_histogram, query_histogram, register_failed_requests, query_failed_requests,
+                   query_stream_metrics, errors, elapsed, mc_entries_per_register=mc_entries_per_register,
+                   client_profile=profiler.profile if profiler is not None else None)
+
+async def async_main():
+    """
+    Async entry point: opens the channel pool, runs the load and closes the pool.
+    """
+    server_url = "<your_ec_domain>:50050"
+    num_channels, concurrency = 8, 1000
+    num_requests, mc_entries_per_register = 50000, 3
+
+    pool = get_trusted_ca_channel_pool(server_url, num_channels)
+    try:
+        with LiveReporter() as reporter, TimeSeriesWriter("data/grpc_async_requests") as recorder:
+            await run(pool, num_requests, mc_entries_per_register, concurrency, reporter=reporter, recorder=recorder,
+                      timeout=DEFAULT_DEADLINE, profiler=ClientProfiler())
+    finally:
+        await pool.close()
+
+def main():
+    """
+    Main function to perform asyncio gRPC register and query operations and save the results.
+    """
+    asyncio.run(async_main())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+import argparse
+import concurrent.futures
+import gzip
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+import zlib
+import client_rest
+import client_rpc
+from batch_sweep import DEFAULT_MAX_MESSAGE_SIZE, prepare_snapshots
+from errors import STATUS_OK
+from histogram import LatencyHistogram
+from multiprocess_load import make_client
+from node_corpus import NodeCorpus
+from request_policy import DEFAULT_DEADLINE
+from scheduler import save_summary_to_json
+
+SUMMARY_VERSION = 1
+COMPRESSIONS = ("none", "gzip", "deflate")
+DEFAULT_BATCH_SIZES = (1, 10, 100, 1000)
+# Content codings the REST client asks for; 'none' has to be explicit, requests asks for gzip and deflate by default.
+ACCEPT_ENCODING = {"none": "identity", "gzip": "gzip", "deflate": "deflate"}
+UPSTREAM, DOWNSTREAM = 0, 1
+
+def _relay(source, destination, counters, direction):
+    try:
+        while True:
+            data = source.recv(65536)
+            if not data:
+                break
+            destination.sendall(data)
+            with counters.get_lock():
+                counters[direction] += len(data)
+    except OSError:
+        pass
+    finally:
+        try:
+            destination.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+def _serve_proxy(upstream, port_pipe, counters):
+    listener = socket.create_server(("127.0.0.1", 0))
+    port_pipe.send(listener.getsockname()[1])
+    while True:
+        client, _ = listener.accept()
+        server = socket.create_connection(upstream)
+        for sock in (client, server):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=_relay, args=(client, server, counters, UPSTREAM), daemon=True).start()
+        threading.Thread(target=_relay, args=(server, client, counters, DOWNSTREAM), daemon=True).start()
+
+class WireCounter:
+    """
+    A local TCP relay in front of the server that counts the bytes crossing it.
+
+    The relay runs in its own process, so its CPU time is not charged to the
+    client. Everything on the connection is counted: framing, headers and TLS
+    records as well as the payloads.
+    """
+
+    def __init__(self, upstream):
+        """
+        Args:
+            upstream (tuple): The server's (host, port).
+        """
+        self.upstream = upstream
+        self.port = None
+        self._counters = None
+        self._process = None
+
+    def start(self):
+        """
+        Starts the relay process.
+
+        Returns:
+            WireCounter: This object.
+        """
+        context = multiprocessing.get_context("spawn")
+        self._counters = context.Array("q", 2)
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(target=_serve_proxy, args=(self.upstream, sender, self._counters), daemon=True)
+        self._process.start()
+        self.port = receiver.recv()
+        return self
+
+    def stop(self):
+        """
+        Stops the relay process.
+        """
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+
+    def read(self):
+        """
+        Returns:
+            tuple: Bytes sent to and received from the server so far.
+        """
+        with self._counters.get_lock():
+            return self._counters[UPSTREAM], self._counters[DOWNSTREAM]
+
+def process_cpu_seconds(pid):
+    """
+    Args:
+        pid (int): A process on this host.
+
+    Returns:
+        float: User plus system CPU seconds the process has used, None if it cannot be read.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces, the fields after it do not.
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def server_address(server_url):
+    """
+    Args:
+        server_url (str): The server address, 'host:port' or 'scheme://host:port'.
+
+    Returns:
+        tuple: The server's (host, port).
+    """
+    address = server_url.rpartition("://")[2].partition("/")[0]
+    host, _, port = address.rpartition(":")
+    return host, int(port)
+
+def relay_url(transport, server_url, port):
+    """
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        server_url (str): The server address.
+        port (int): Port of the WireCounter relay.
+
+    Returns:
+        str: The address to send requests to instead of the server's.
+    """
+    if transport == 'grpc':
+        return f"127.0.0.1:{port}"
+    return f"{server_url.partition('://')[0]}://127.0.0.1:{port}"
+
+def compress_body(body, compression):
+    """
+    Args:
+        body (bytes): A serialized REST register request.
+        compression (str): One of COMPRESSIONS.
+
+    Returns:
+        bytes: The body encoded with the HTTP content coding of the same name.
+    """
+    if compression == "gzip":
+        return gzip.compress(body)
+    if compression == "deflate":
+        return zlib.compress(body)
+    return body
+
+def make_cell_client(transport, server_url, compression, cert, insecure, host):
+    """
+    Creates a stub or session that compresses its requests, and for REST only accepts responses, one way.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        server_url (str): The relay address to send requests to.
+        compression (str): One of COMPRESSIONS.
+        cert (str): Optional path to a self-signed certificate.
+        insecure (bool): Use a plaintext channel (gRPC) or skip verification (REST).
+        host (str): The server's host name, for TLS through the relay.
+
+    Returns:
+        PreSerializedStub or requests.Session: The client of the cell.
+    """
+    if transport == 'grpc':
+        algorithm = client_rpc.GRPC_COMPRESSION[compression]
+        # Responses are compressed however the server is configured to; gRPC clients accept every algorithm.
+        options = [("grpc.ssl_target_name_override", host), ("grpc.use_local_subchannel_pool", 1)]
+        if insecure:
+            channel = client_rpc.get_insecure_channel(server_url, options, algorithm)
+        elif cert:
+            channel = client_rpc.get_self_signed_channel(server_url, cert, options, algorithm)
+        else:
+            channel = client_rpc.get_trusted_ca_channel(server_url, options, algorithm)
+        return client_rpc.PreSerializedStub(channel)
+    # The URL points at the relay; SNI and certificate verification still use the server's name.
+    _, session = make_client(transport, server_url, cert, insecure, {"server_hostname": host})
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING[compression]
+    return session
+
+def measure_phase(send, items, concurrency, wire, server_pid):
+    """
+    Sends items concurrently and measures latency, wire bytes and CPU time.
+
+    Args:
+        send (callable): Sends one item and returns the client's result tuple.
+        items (list): What to send.
+        concurrency (int): Requests in flight at a time.
+        wire (WireCounter): The relay the client talks through.
+        server_pid (int): Server process to charge CPU time to, None if not local.
+
+    Returns:
+        tuple: Phase summary (requests, failures, wire bytes, CPU seconds, latency) and the results.
+    """
+    histogram, failed = LatencyHistogram(), 0
+    sent_before, received_before = wire.read()
+    server_cpu_before = process_cpu_seconds(server_pid) if server_pid else None
+    client_cpu_before, start_time = time.process_time(), time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, items))
+    elapsed = time.perf_counter() - start_time
+    client_cpu = time.process_time() - client_cpu_before
+    server_cpu_after = process_cpu_seconds(server_pid) if server_pid else None
+    sent_after, received_after = wire.read()
+    for result in results:
+        histogram.record(result[0])
+        failed += result[1] != STATUS_OK
+    return {
+        "requests": len(items),
+        "failed": failed,
+        "elapsed": elapsed,
+        "wire_bytes_sent": sent_after - sent_before,
+        "wire_bytes_received": received_after - received_before,
+        "client_cpu": client_cpu,
+        "server_cpu": server_cpu_after - server_cpu_before if server_cpu_before is not None and server_cpu_after is not None else None,
+        "latency": histogram.summary(),
+    }, results
+
+def run_cell(transport, client, server_url, compression, snapshots, batch_size, queries, concurrency, wire, server_pid,
+             timeout=None):
+    """
+    Runs the registers and then the queries of one compression and batch size.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        client (PreSerializedStub or requests.Session): The client of the cell, see make_cell_client.
+        server_url (str): The relay address to send requests to.
+        compression (str): One of COMPRESSIONS.
+        snapshots (list): Serialized register requests, as returned by batch_sweep.prepare_snapshots.
+        batch_size (int): Pairs per register request.
+        queries (int): Number of queries.
+        concurrency (int): Requests in flight at a time.
+        wire (WireCounter): The relay the client talks through.
+        server_pid (int): Server process to charge CPU time to, None if not local.
+        timeout (float): Deadline of every request in seconds, None to wait forever.
+
+    Returns:
+        dict: The register and query phases with their payload bytes and compression ratios.
+    """
+    payloads = [payload for payloads in snapshots for payload in payloads]
+    if transport == 'grpc':
+        register = lambda payload: client_rpc.register_mission_control(client, payload, 0, timeout)
+        query = lambda _: client_rpc.query_aggregated_mission_control(client, 0, timeout)
+    else:
+        # Bodies are compressed up front, as gRPC's are serialized up front, so neither is timed.
+        payloads = [compress_body(payload, compression) for payload in payloads]
+        content_encoding = None if compression == "none" else compression
+        register = lambda body: client_rest.register_mission_control(client, server_url, body, 0, timeout,
+                                                                      content_encoding=content_encoding)
+        query = lambda _: client_rest.query_aggregated_mission_control(client, server_url, 0, timeout=timeout)
+
+    cell = {"compression": compression, "batch_size": batch_size}
+    cell["register"], _ = measure_phase(register, payloads, concurrency, wire, server_pid)
+    cell["register"]["payload_bytes"] = sum(len(payload) for payloads in snapshots for payload in payloads)
+    cell["register"]["pairs"] = batch_size * len(snapshots)
+    cell["query"], results = measure_phase(query, range(queries), concurrency, wire, server_pid)
+    cell["query"]["payload_bytes"] = sum(result[2].bytes for result in results)
+    cell["query"]["pairs"] = sum(result[2].pairs for result in results)
+    for phase, direction in (("register", "wire_bytes_sent"), ("query", "wire_bytes_received")):
+        stats = cell[phase]
+        stats["compression_ratio"] = stats["payload_bytes"] / stats[direction] if stats[direction] else None
+        stats["wire_bytes_per_pair"] = stats[direction] / stats["pairs"] if stats["pairs"] else None
+    return cell
+
+def print_cell(cell):
+    """
+    Prints one line per phase of a cell.
+
+    Args:
+        cell (dict): The cell as returned by run_cell.
+    """
+    for phase, direction in (("register", "wire_bytes_sent"), ("query", "wire_bytes_received")):
+        stats = cell[phase]
+        ratio = f"{stats['compression_ratio']:.2f}x" if stats["compression_ratio"] else "-"
+        per_pair = f"{stats['wire_bytes_per_pair']:.1f} B/pair" if stats["wire_bytes_per_pair"] else "-"
+        server_cpu = f"{stats['server_cpu']:.2f}s" if stats["server_cpu"] is not None else "-"
+        print(f"{cell['compression']:>7} batch {cell['batch_size']:>6} {phase:>8}: {stats[direction] / 1e6:8.2f} MB on the wire "
+              f"({ratio}, {per_pair}), client CPU {stats['client_cpu']:.2f}s, server CPU {server_cpu}, "
+              f"p50 {stats['latency']['p50']:.4f}s, p99 {stats['latency']['p99']:.4f}s, {stats['failed']} failed")
+
+def run_matrix(transport, server_url, compressions, batch_sizes, registers, queries, concurrency, cert=None, insecure=False,
+               server_pid=None, corpus=None, key_pool_size=1000, max_message_size=DEFAULT_MAX_MESSAGE_SIZE, timeout=None):
+    """
+    Runs the same workload for every combination of compression and batch size.
+
+    The register requests of a batch size are built once and sent in every
+    compression's cell, so the cells send identical payloads. Re-registering the
+    same pairs does not grow the store, so the queries of a batch size also get
+    the same snapshot back whatever the compression.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        server_url (str): The server address.
+        compressions (list): Compressions to try, from COMPRESSIONS.
+        batch_sizes (list): Pairs per register request to try.
+        registers (int): Register requests per cell.
+        queries (int): Queries per cell.
+        concurrency (int): Requests in flight at a time.
+        cert (str): Optional path to a self-signed certificate.
+        insecure (bool): Use a plaintext channel (gRPC) or skip verification (REST).
+        server_pid (int): Local server process to measure the CPU time of, None if not local.
+        corpus (NodeCorpus): Optional key corpus to draw nodes from.
+        key_pool_size (int): Without a corpus, number of random keys pairs are drawn from.
+        max_message_size (int): Largest register request in bytes.
+        timeout (float): Deadline of every request in seconds, None to wait forever.
+
+    Returns:
+        list: One dict per cell, see run_cell.
+    """
+    if corpus is not None:
+        keys = corpus.random_pair
+    else:
+        pool = [client_rpc.generate_random_node() for _ in range(key_pool_size)]
+        keys = lambda: tuple(random.sample(pool, 2))
+
+    upstream = server_address(server_url)
+    wire = WireCounter(upstream).start()
+    relayed_url = relay_url(transport, server_url, wire.port)
+    cells = []
+    try:
+        for batch_size in batch_sizes:
+            snapshots = prepare_snapshots(transport, batch_size, registers, keys, max_message_size)
+            for compression in compressions:
+                client = make_cell_client(transport, relayed_url, compression, cert, insecure, upstream[0])
+                # Connection setup is not part of the cell.
+                if transport == 'grpc':
+                    status = client_rpc.query_aggregated_mission_control(client, 0, timeout)[1]
+                else:
+                    status = client_rest.query_aggregated_mission_control(client, relayed_url, 0, timeout=timeout)[1]
+                if status != STATUS_OK:
+                    raise RuntimeError(f"Warm-up query of the {compression} cell with batch size {batch_size} "
+                                       f"failed with status {status}")
+                cell = run_cell(transport, client, relayed_url, compression, snapshots, batch_size, queries, concurrency,
+                                wire, server_pid, timeout)
+                print_cell(cell)
+                cells.append(cell)
+    finally:
+        wire.stop()
+    return cells
+
+def main():
+    """
+    Main function to measure wire size, CPU time and latency across compressions and batch sizes.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark compression of register and query payloads.")
+    parser.add_argument("transport", choices=["grpc", "rest"])
+    parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    parser.add_argument("--compressions", default=",".join(COMPRESSIONS), help="Comma-separated, from: " + ", ".join(COMPRESSIONS))
+    parser.add_argument("--batch-sizes", default=",".join(map(str, DEFAULT_BATCH_SIZES)), help="Comma-separated pairs per register request.")
+    parser.add_argument("--registers", type=int, default=20, help="Register requests per cell.")
+    parser.add_argument("--queries", type=int, default=10, help="Queries per cell.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at a time.")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID of a server on this host, to measure its CPU time.")
+    parser.add_argument("--corpus", default=None, help="Node-key corpus built with node_corpus.py.")
+    parser.add_argument("--key-pool-size", type=int, default=1000, help="Random keys to draw pairs from without a corpus.")
+    parser.add_argument("--max-message-size", type=int, default=DEFAULT_MAX_MESSAGE_SIZE,
+                        help="Register requests are split to stay under this many bytes.")
+    parser.add_argument("--cert", default=None, help="Path to a self-signed certificate.")
+    parser.add_argument("--insecure", action="store_true")
+    # No retries: retried requests would be counted as wire bytes of the cell.
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE, help="Seconds per request, 0 to wait forever.")
+    args = parser.parse_args()
+
+    server_url = args.server_url
+    if server_url is None:
+        server_url = "<your_ec_domain>:50050" if args.transport == "grpc" else "https://<your_ec_domain>:8081"
+    compressions = args.compressions.split(",")
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    corpus = NodeCorpus(args.corpus) if args.corpus else None
+
+    cells = run_matrix(args.transport, server_url, compressions, batch_sizes, args.registers, args.queries, args.concurrency,
+                       args.cert, args.insecure, args.server_pid, corpus, args.key_pool_size, args.max_message_size,
+                       args.deadline or None)
+    save_summary_to_json({
+        "version": SUMMARY_VERSION,
+        "timestamp": int(time.time()),
+        "transport": args.transport,
+        "server_url": server_url,
+        "registers": args.registers,
+        "queries": args.queries,
+        "concurrency": args.concurrency,
+        "deadline": args.deadline,
+        "cells": cells,
+    }, filename=f"{args.transport}_compression.json")
+
+if __name__ == '__main__':
+    main()
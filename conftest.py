@@ -0,0 +1,66 @@
+import shutil
+import socket
+import subprocess
+import pytest
+import standin_server
+
+def free_port():
+    """
+    Returns:
+        int: A TCP port on localhost that was free a moment ago.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def standin():
+    """
+    Runs a plaintext stand-in coordinator with the REST gateway for one test.
+
+    Yields:
+        dict: The gRPC address, the REST URL and the MissionControlStore.
+    """
+    grpc_address = f"127.0.0.1:{free_port()}"
+    server, http_server, store = standin_server.serve(grpc_address, ("127.0.0.1", 0), chunk_size=100)
+    yield {"grpc_address": grpc_address, "rest_url": f"http://127.0.0.1:{http_server.server_address[1]}", "store": store}
+    server.stop(0)
+    http_server.shutdown()
+    http_server.server_close()
+
+@pytest.fixture(scope="session")
+def certificate(tmp_path_factory):
+    """
+    Creates a self-signed certificate for localhost with openssl.
+
+    Returns:
+        tuple: Paths of the certificate and its private key.
+    """
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is not installed")
+    directory = tmp_path_factory.mktemp("tls")
+    cert, key = str(directory / "cert.pem"), str(directory / "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                    "-addext", "subjectAltName=DNS:localhost", "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+@pytest.fixture
+def tls_standin(certificate, monkeypatch):
+    """
+    Runs a stand-in coordinator serving TLS with the self-signed certificate for one test.
+
+    Yields:
+        dict: The gRPC address, the REST URL, the MissionControlStore and the certificate path.
+    """
+    cert, key = certificate
+    # requests lets these override a session's verify path, and the session would then reject the certificate.
+    monkeypatch.delenv("REQUESTS_CA_BUNDLE", raising=False)
+    monkeypatch.delenv("CURL_CA_BUNDLE", raising=False)
+    grpc_address = f"localhost:{free_port()}"
+    server, http_server, store = standin_server.serve(grpc_address, ("127.0.0.1", 0), chunk_size=100, cert=cert, key=key)
+    yield {"grpc_address": grpc_address, "rest_url": f"https://localhost:{http_server.server_address[1]}", "store": store,
+           "cert": cert}
+    server.stop(0)
+    http_server.shutdown()
+    http_server.server_close()
@@ -0,0 +1,603 @@
+import base64
+import json
+import os
+import threading
+import time
+import numpy as np
+from external_coordinator_pb2 import RegisterMissionControlRequest
+from histogram import LatencyHistogram
+
+NODE_KEY_SIZE = 33
+# A node key zero-padded to five 64-bit words for hashing.
+KEY_WORDS = 5
+INITIAL_CAPACITY = 1 << 16
+MAX_LOAD = 0.5
+# Registered pairs buffered before they are inserted into the index in one batch.
+FLUSH_PAIRS = 10000
+EMPTY = np.uint64(0)
+
+def _mix(values):
+    # splitmix64 finalizer; uint64 arithmetic wraps around.
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xbf58476d1ce4e5b9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+def hash_keys(keys):
+    """
+    Args:
+        keys (bytes): Concatenated 33-byte node keys.
+
+    Returns:
+        np.ndarray: A uint64 hash of every key.
+    """
+    count = len(keys) // NODE_KEY_SIZE
+    padded = np.zeros((count, KEY_WORDS * 8), dtype=np.uint8)
+    padded[:, :NODE_KEY_SIZE] = np.frombuffer(keys, dtype=np.uint8).reshape(count, NODE_KEY_SIZE)
+    words = padded.view("<u8")
+    hashes = np.zeros(count, dtype=np.uint64)
+    for word in range(KEY_WORDS):
+        hashes = _mix(hashes ^ words[:, word])
+    return hashes
+
+def pair_fingerprints(from_keys, to_keys):
+    """
+    Hashes (node_from, node_to) pairs into 64-bit fingerprints. Never returns 0, which marks an empty slot.
+
+    Args:
+        from_keys (bytes): Concatenated 33-byte source node keys.
+        to_keys (bytes): Concatenated 33-byte destination node keys, in the same order.
+
+    Returns:
+        np.ndarray: One uint64 fingerprint per pair.
+    """
+    fingerprints = _mix(hash_keys(from_keys) ^ _mix(hash_keys(to_keys) + np.uint64(1)))
+    fingerprints[fingerprints == EMPTY] = 1
+    return fingerprints
+
+class PairColumns:
+    """
+    A batch of pairs as columns: fingerprints and the four history fields that are checked.
+
+    Times are unix seconds; amounts are msat truncated to 32 bits, which is enough to
+    tell a registered history from a different one.
+    """
+
+    __slots__ = ("fingerprints", "fail_time", "fail_amt", "success_time", "success_amt")
+
+    def __init__(self, from_keys, to_keys, histories):
+        """
+        Args:
+            from_keys (bytes): Concatenated 33-byte source node keys.
+            to_keys (bytes): Concatenated 33-byte destination node keys.
+            histories (list): (fail_time, fail_amt_msat, success_time, success_amt_msat) per pair.
+        """
+        self.fingerprints = pair_fingerprints(from_keys, to_keys)
+        columns = np.array(histories, dtype=np.int64).reshape(-1, 4).T
+        self.fail_time, self.success_time = columns[0].astype(np.uint32), columns[2].astype(np.uint32)
+        self.fail_amt, self.success_amt = columns[1].astype(np.uint32), columns[3].astype(np.uint32)
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def select(self, mask):
+        """
+        Args:
+            mask (np.ndarray): Boolean mask or indices of the pairs to keep.
+
+        Returns:
+            PairColumns: The selected pairs.
+        """
+        selected = PairColumns.__new__(PairColumns)
+        for name in PairColumns.__slots__:
+            setattr(selected, name, getattr(self, name)[mask])
+        return selected
+
+def grpc_pairs(pairs):
+    """
+    Args:
+        pairs (list): PairHistory messages, e.g. the pairs of a register request or query response.
+
+    Returns:
+        tuple: Concatenated source keys, concatenated destination keys and the
+            (fail_time, fail_amt_msat, success_time, success_amt_msat) of every pair.
+    """
+    histories = [(pair.history.fail_time, pair.history.fail_amt_msat, pair.history.success_time,
+                  pair.history.success_amt_msat) for pair in pairs]
+    return b"".join(pair.node_from for pair in pairs), b"".join(pair.node_to for pair in pairs), histories
+
+def grpc_register_pairs(payload):
+    """
+    Args:
+        payload (bytes): A serialized RegisterMissionControlRequest.
+
+    Returns:
+        tuple: The registered pairs, see grpc_pairs.
+    """
+    return grpc_pairs(RegisterMissionControlRequest.FromString(payload).pairs)
+
+def rest_pairs(pairs):
+    """
+    Args:
+        pairs (list): Pairs as JSON objects, with base64 node keys and snake_case or
+            camelCase history fields (the gateway accepts both and returns camelCase).
+
+    Returns:
+        tuple: The pairs, see grpc_pairs.
+    """
+    histories = []
+    for pair in pairs:
+        history = pair["history"]
+        if "failTime" in history:
+            histories.append((int(history.get("failTime", 0)), int(history.get("failAmtMsat", 0)),
+                              int(history.get("successTime", 0)), int(history.get("successAmtMsat", 0))))
+        else:
+            histories.append((int(history.get("fail_time", 0)), int(history.get("fail_amt_msat", 0)),
+                              int(history.get("success_time", 0)), int(history.get("success_amt_msat", 0))))
+    # 33-byte keys are 44 base64 characters without padding, so all keys decode in one go.
+    from_keys = base64.b64decode("".join(pair["nodeFrom"] for pair in pairs))
+    to_keys = base64.b64decode("".join(pair["nodeTo"] for pair in pairs))
+    return from_keys, to_keys, histories
+
+def rest_register_pairs(body):
+    """
+    Args:
+        body (bytes): The JSON body of a register request.
+
+    Returns:
+        tuple: The registered pairs, see grpc_pairs.
+    """
+    return rest_pairs(json.loads(body)["pairs"])
+
+class AckTimes:
+    """
+    Sorted, growable array of acknowledgement times, to count the pairs acknowledged
+    before a query was sent with a binary search instead of a scan of the index.
+
+    Acknowledgements arrive almost in order, so a batch is merged into the short tail
+    of times later than its earliest one rather than re-sorting the whole array.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        """
+        Args:
+            capacity (int): Initial number of times the array holds.
+        """
+        self.count = 0
+        self._times = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self._times.nbytes
+
+    def add(self, times):
+        """
+        Args:
+            times (np.ndarray): Acknowledgement times, in any order.
+        """
+        if not len(times):
+            return
+        times = np.sort(times)
+        needed = self.count + len(times)
+        if needed > len(self._times):
+            grown = np.zeros(max(needed, 2 * len(self._times)), dtype=np.float64)
+            grown[:self.count] = self._times[:self.count]
+            self._times = grown
+        start = int(np.searchsorted(self._times[:self.count], times[0], side="right"))
+        self._times[start:needed] = np.sort(np.concatenate((self._times[start:self.count], times)))
+        self.count = needed
+
+    def count_until(self, time):
+        """
+        Args:
+            time (float): A unix time.
+
+        Returns:
+            int: How many times are at or before it.
+        """
+        return int(np.searchsorted(self._times[:self.count], time, side="right"))
+
+class PairIndex:
+    """
+    Open-addressing hash table of registered pairs in flat numpy arrays.
+
+    A pair takes 44 bytes per slot: its 64-bit fingerprint, the expected aggregated
+    history, the times its first and its latest register were acknowledged and how
+    long it took to become visible. Inserts and lookups probe a whole batch at once,
+    so the cost per pair is a few vectorised operations rather than Python objects
+    and dict entries. The first acknowledgements are also kept sorted in AckTimes.
+    Not thread-safe; ConsistencyChecker serialises access.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        """
+        Args:
+            capacity (int): Initial number of slots, a power of two.
+        """
+        self.count = 0
+        self.ack_times = AckTimes()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+        self.fail_time = np.zeros(capacity, dtype=np.uint32)
+        self.fail_amt = np.zeros(capacity, dtype=np.uint32)
+        self.success_time = np.zeros(capacity, dtype=np.uint32)
+        self.success_amt = np.zeros(capacity, dtype=np.uint32)
+        self.acked_at = np.zeros(capacity, dtype=np.float64)
+        self.first_acked_at = np.zeros(capacity, dtype=np.float64)
+        self.visible_after = np.full(capacity, np.nan, dtype=np.float32)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        columns = (self.keys, self.fail_time, self.fail_amt, self.success_time, self.success_amt,
+                   self.acked_at, self.first_acked_at, self.visible_after)
+        return sum(column.nbytes for column in columns) + self.ack_times.nbytes
+
+    def find(self, fingerprints):
+        """
+        Args:
+            fingerprints (np.ndarray): Pair fingerprints to look up.
+
+        Returns:
+            np.ndarray: The slot of every pair, -1 for pairs that are not in the index.
+        """
+        mask = np.uint64(self.capacity - 1)
+        probes = (fingerprints & mask).astype(np.int64)
+        slots = np.full(len(fingerprints), -1, dtype=np.int64)
+        pending = np.arange(len(fingerprints))
+        while len(pending):
+            stored = self.keys[probes[pending]]
+            hit = stored == fingerprints[pending]
+            slots[pending[hit]] = probes[pending[hit]]
+            pending = pending[~hit & (stored != EMPTY)]
+            probes[pending] = (probes[pending] + 1) & (self.capacity - 1)
+        return slots
+
+    def _place(self, pairs, acked_at, first_acked_at):
+        # Pairs must be absent from the index and distinct; a free slot claimed by several goes to the first.
+        probes = (pairs.fingerprints & np.uint64(self.capacity - 1)).astype(np.int64)
+        pending = np.arange(len(pairs))
+        while len(pending):
+            free = pending[self.keys[probes[pending]] == EMPTY]
+            slots, first = np.unique(probes[free], return_index=True)
+            placed = free[first]
+            self.keys[slots] = pairs.fingerprints[placed]
+            self.fail_time[slots], self.fail_amt[slots] = pairs.fail_time[placed], pairs.fail_amt[placed]
+            self.success_time[slots], self.success_amt[slots] = pairs.success_time[placed], pairs.success_amt[placed]
+            self.acked_at[slots], self.first_acked_at[slots] = acked_at[placed], first_acked_at[placed]
+            pending = np.setdiff1d(pending, placed, assume_unique=True)
+            probes[pending] = (probes[pending] + 1) & (self.capacity - 1)
+        self.count += len(pairs)
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while needed > capacity * MAX_LOAD:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        occupied = np.flatnonzero(self.keys != EMPTY)
+        old = PairColumns.__new__(PairColumns)
+        old.fingerprints, old.fail_time, old.fail_amt = self.keys[occupied], self.fail_time[occupied], self.fail_amt[occupied]
+        old.success_time, old.success_amt = self.success_time[occupied], self.success_amt[occupied]
+        acked_at, first_acked_at = self.acked_at[occupied], self.first_acked_at[occupied]
+        visible_after = self.visible_after[occupied]
+        self._allocate(capacity)
+        self.count = 0
+        self._place(old, acked_at, first_acked_at)
+        self.visible_after[self.find(old.fingerprints)] = visible_after
+
+    def insert(self, pairs, acked_at):
+        """
+        Adds registered pairs, or folds them into the expected history of pairs already in the index.
+
+        The expected history is aggregated like the coordinator does: the latest failure
+        and the latest success win independently.
+
+        Args:
+            pairs (PairColumns): The registered pairs.
+            acked_at (np.ndarray): When the register request of each pair was acknowledged.
+        """
+        _, first = np.unique(pairs.fingerprints, return_index=True)
+        repeated = np.setdiff1d(np.arange(len(pairs)), first, assume_unique=True)
+        batch, batch_acked_at = pairs.select(first), acked_at[first]
+        slots = self.find(batch.fingerprints)
+        known = slots >= 0
+        if known.any():
+            existing, update = slots[known], batch.select(known)
+            newer = update.fail_time >= self.fail_time[existing]
+            self.fail_time[existing[newer]], self.fail_amt[existing[newer]] = update.fail_time[newer], update.fail_amt[newer]
+            newer = update.success_time >= self.success_time[existing]
+            self.success_time[existing[newer]] = update.success_time[newer]
+            self.success_amt[existing[newer]] = update.success_amt[newer]
+            self.acked_at[existing] = batch_acked_at[known]
+
+        self._grow(self.count + np.count_nonzero(~known))
+        self._place(batch.select(~known), batch_acked_at[~known], batch_acked_at[~known])
+        self.ack_times.add(batch_acked_at[~known])
+        if len(repeated):
+            # The same pair registered more than once: fold the repeats in as updates.
+            self.insert(pairs.select(repeated), acked_at[repeated])
+
+class QueryCheck:
+    """
+    Running cross-check of one query stream against the index.
+    """
+
+    def __init__(self, checker, sent_at):
+        """
+        Args:
+            checker (ConsistencyChecker): The checker holding the index.
+            sent_at (float): When the query was sent; registers acknowledged before
+                this must be visible in the stream (read-your-writes).
+        """
+        self.checker = checker
+        self.sent_at = sent_at
+        self.pairs = 0
+        self.matched = 0
+        self.stale = 0
+        self.corrupt = 0
+        self.unknown = 0
+
+    def check(self, pairs, received_at):
+        """
+        Cross-checks one stream message.
+
+        Args:
+            pairs (tuple): The pairs in the message, see grpc_pairs.
+            received_at (float): When the message was received.
+        """
+        counts = self.checker.check(pairs, self.sent_at, received_at)
+        self.pairs += counts["pairs"]
+        self.matched += counts["matched"]
+        self.stale += counts["stale"]
+        self.corrupt += counts["corrupt"]
+        self.unknown += counts["unknown"]
+
+    def finish(self):
+        """
+        Completes the check once the whole stream was received successfully.
+        """
+        self.checker.finish_query(self)
+
+class ConsistencyChecker:
+    """
+    Verifies query results against everything this client registered.
+
+    Every acknowledged register is added to a PairIndex. Every pair streamed back by a
+    query is looked up in it: a pair whose history is older than what was registered is
+    stale, one with the registered times but different amounts is corrupt, and one the
+    client never registered (from other clients or earlier runs) is unknown. A query
+    sent after a register was acknowledged must return that register's pairs; the ones
+    it does not return are missing. The time from acknowledgement to the first query
+    message containing a pair is its visibility latency.
+
+    The register and query functions of the clients feed the checker through their
+    module-level CONSISTENCY_CHECKER.
+    """
+
+    def __init__(self, every=1):
+        """
+        Args:
+            every (int): Check one in this many queries, to keep the checker off the
+                critical path when every query streams millions of pairs.
+        """
+        self.index = PairIndex()
+        self.every = max(every, 1)
+        self.registered = 0
+        self.queries = 0
+        self.checked_queries = 0
+        self.violating_queries = 0
+        self.totals = {"pairs": 0, "matched": 0, "stale": 0, "corrupt": 0, "unknown": 0, "missing": 0}
+        self.visibility = LatencyHistogram()
+        self.check_seconds = 0.0
+        self._pending = self._new_pending()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_pending():
+        return {"from_keys": bytearray(), "to_keys": bytearray(), "histories": [], "acked_at": []}
+
+    def record_register(self, pairs, acked_at):
+        """
+        Queues the pairs of an acknowledged register request for the index.
+
+        Registers only append to a buffer; the buffer is hashed and inserted in one batch
+        when the next query message is checked or it fills up, as numpy has a high fixed
+        cost per call.
+
+        Args:
+            pairs (tuple): The registered pairs, see grpc_pairs.
+            acked_at (float): When the register request was acknowledged.
+        """
+        from_keys, to_keys, histories = pairs
+        with self._lock:
+            self._pending["from_keys"] += from_keys
+            self._pending["to_keys"] += to_keys
+            self._pending["histories"] += histories
+            self._pending["acked_at"] += [acked_at] * len(histories)
+            self.registered += len(histories)
+            if len(self._pending["histories"]) >= FLUSH_PAIRS:
+                self._flush()
+
+    def _flush(self):
+        # Called with the lock held.
+        pending = self._pending
+        if pending["histories"]:
+            self._pending = self._new_pending()
+            pairs = PairColumns(bytes(pending["from_keys"]), bytes(pending["to_keys"]), pending["histories"])
+            self.index.insert(pairs, np.array(pending["acked_at"], dtype=np.float64))
+
+    def begin_query(self, sent_at):
+        """
+        Args:
+            sent_at (float): When the query was sent.
+
+        Returns:
+            QueryCheck: The check to feed the stream to, or None if this query is not sampled.
+        """
+        with self._lock:
+            self.queries += 1
+            if (self.queries - 1) % self.every:
+                return None
+        return QueryCheck(self, sent_at)
+
+    def check(self, pairs, sent_at, received_at):
+        """
+        Looks up a batch of streamed pairs and records when they first became visible.
+
+        Args:
+            pairs (tuple): Pairs received in one stream message, see grpc_pairs.
+            sent_at (float): When the query was sent.
+            received_at (float): When the message was received.
+
+        Returns:
+            dict: The number of pairs, pairs first registered before the query was sent that match the
+                registered history, stale and corrupt pairs of registers acknowledged before the query was
+                sent, and unknown pairs.
+        """
+        start_time = time.thread_time()
+        pairs = PairColumns(*pairs)
+        with self._lock:
+            self._flush()
+            index = self.index
+            slots = index.find(pairs.fingerprints)
+            known = slots >= 0
+            slots, pairs = slots[known], pairs.select(known)
+            expected_times = index.fail_time[slots], index.success_time[slots]
+            current = (pairs.fail_time >= expected_times[0]) & (pairs.success_time >= expected_times[1])
+            corrupt = (((pairs.fail_time == expected_times[0]) & (pairs.fail_amt != index.fail_amt[slots]))
+                       | ((pairs.success_time == expected_times[1]) & (pairs.success_amt != index.success_amt[slots])))
+            up_to_date = current & ~corrupt
+
+            first_seen = slots[up_to_date & np.isnan(index.visible_after[slots])]
+            delays = np.maximum(received_at - index.acked_at[first_seen], 0.0)
+            index.visible_after[first_seen] = delays
+            # A pair first registered before the query was sent must be returned; its history
+            # can only be judged if its latest register was acknowledged before as well.
+            expected = index.first_acked_at[slots] <= sent_at
+            judged = index.acked_at[slots] <= sent_at
+            stale, corrupt = ~current & judged, corrupt & judged
+            counts = {
+                "pairs": len(known),
+                "matched": int(np.count_nonzero(expected & ~stale & ~corrupt)),
+                "stale": int(np.count_nonzero(stale)),
+                "corrupt": int(np.count_nonzero(corrupt)),
+                "unknown": int(np.count_nonzero(~known)),
+            }
+        for delay in delays.tolist():
+            self.visibility.record(delay)
+        with self._lock:
+            self.check_seconds += time.thread_time() - start_time
+        return counts
+
+    def finish_query(self, query):
+        """
+        Adds a completely received query to the totals; pairs first registered before it
+        was sent that it did not return count as missing.
+
+        Args:
+            query (QueryCheck): The finished check.
+        """
+        start_time = time.thread_time()
+        with self._lock:
+            self._flush()
+            expected = self.index.ack_times.count_until(query.sent_at)
+            missing = max(expected - query.matched - query.stale - query.corrupt, 0)
+            self.checked_queries += 1
+            self.violating_queries += bool(query.stale or query.corrupt or missing)
+            for name in ("pairs", "matched", "stale", "corrupt", "unknown"):
+                self.totals[name] += getattr(query, name)
+            self.totals["missing"] += missing
+            self.check_seconds += time.thread_time() - start_time
+
+    def summary(self):
+        """
+        Returns:
+            dict: Registered and checked counts, read-your-writes violations, the visibility
+                latency and the checker's own cost (CPU seconds and index memory).
+        """
+        with self._lock:
+            self._flush()
+            never_visible = int(np.count_nonzero((self.index.keys != EMPTY) & np.isnan(self.index.visible_after)))
+            return {
+                "registered_pairs": self.registered,
+                "indexed_pairs": len(self.index),
+                "queries": self.queries,
+                "checked_queries": self.checked_queries,
+                "violating_queries": self.violating_queries,
+                "checked_pairs": self.totals["pairs"],
+                "matched_pairs": self.totals["matched"],
+                "stale_pairs": self.totals["stale"],
+                "corrupt_pairs": self.totals["corrupt"],
+                "missing_pairs": self.totals["missing"],
+                "unknown_pairs": self.totals["unknown"],
+                "never_visible_pairs": never_visible,
+                "visibility_latency": self.visibility.summary(),
+                "check_seconds": self.check_seconds,
+                "index_bytes": self.index.nbytes,
+            }
+
+def print_consistency_summary(checker):
+    """
+    Prints the result of the read-your-writes check.
+
+    Args:
+        checker (ConsistencyChecker): The checker of a run.
+    """
+    summary = checker.summary()
+    visibility = summary["visibility_latency"]
+    print(f"Consistency: {summary['checked_queries']} of {summary['queries']} queries checked, "
+          f"{summary['violating_queries']} violated read-your-writes; {summary['missing_pairs']} missing, "
+          f"{summary['stale_pairs']} stale and {summary['corrupt_pairs']} corrupt pairs, "
+          f"{summary['unknown_pairs']} pairs from other writers")
+    print(f"Register to Visibility: p50 {visibility['p50']:.4f}s, p99 {visibility['p99']:.4f}s, max {visibility['max']:.4f}s "
+          f"over {visibility['count']} of {summary['indexed_pairs']} pairs")
+    print(f"Checker Cost: {summary['check_seconds']:.2f}s CPU, {summary['index_bytes'] / 1e6:.1f} MB index")
+
+def save_consistency_to_json(checker, directory="data", filename="consistency.json"):
+    """
+    Saves the checker summary to a JSON file.
+
+    Args:
+        checker (ConsistencyChecker): The checker of a run.
+        directory (str): Directory to save the file in.
+        filename (str): Name of the JSON file.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    filepath = os.path.join(directory, filename)
+    with open(filepath, 'w') as f:
+        json.dump(checker.summary(), f, indent=4)
+    print(f"Consistency summary saved to {filepath}")
+
+def add_consistency_arguments(parser):
+    """
+    Adds the query-result verification options to a command line parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument("--verify", action="store_true", help="Cross-check query results against the registered pairs.")
+    parser.add_argument("--verify-every", type=int, default=1, help="Check one in N queries.")
+
+def checker_from_args(args):
+    """
+    Args:
+        args (argparse.Namespace): Parsed options added by add_consistency_arguments.
+
+    Returns:
+        ConsistencyChecker: A checker, or None when verification was not requested.
+    """
+    if not args.verify:
+        return None
+    return ConsistencyChecker(every=args.verify_every)
@@ -0,0 +1,564 @@
+import argparse
+import collections
+import os
+import socket
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener, wait
+import numpy as np
+import client_rest
+import client_rpc
+from client_profile import ClientProfiler
+from errors import STATUS_OK
+from histogram import LatencyHistogram
+from multiprocess_load import make_client, merge_results, pack_results, prepare_worker_tasks, shard_requests
+from request_policy import RequestPolicy, add_policy_arguments, policy_options_from_args
+from rest_stream import DECODE_MODES
+from rest_transport import BACKENDS, DEFAULT_POOL_SIZE
+from scheduler import run_open_loop, save_summary_to_json
+from timeseries import COLUMNS, FORMATS, TimeSeriesWriter, load_timeseries
+from workload import load_plan, plan_entries, entries_registered
+
+OPERATIONS = ("register", "query")
+DEFAULT_PORT = 7070
+CLOCK_PROBES = 16
+PROGRESS_INTERVAL = 1.0
+START_DELAY = 2.0
+CONNECT_TIMEOUT = 60.0
+
+def parse_address(value, default_host=""):
+    """
+    Args:
+        value (str): 'host:port', ':port' or 'port'.
+        default_host (str): Host used when the value only has a port.
+
+    Returns:
+        tuple: The (host, port) address.
+    """
+    host, _, port = value.rpartition(":")
+    return host or default_host, int(port)
+
+def estimate_clock_offset(conn, probes=CLOCK_PROBES):
+    """
+    Estimates how far an agent's wall clock is ahead of the controller's.
+
+    Each probe asks the agent for its time and assumes the reply was taken halfway
+    through the round trip, as NTP does. The probe with the shortest round trip has
+    the least room for asymmetric delays, so it wins.
+
+    Args:
+        conn (Connection): Control connection to the agent.
+        probes (int): Number of round trips.
+
+    Returns:
+        tuple: The offset in seconds (agent minus controller) and its uncertainty,
+            i.e. half the shortest round trip.
+    """
+    best_offset, best_round_trip = 0.0, None
+    for _ in range(probes):
+        sent = time.time()
+        conn.send(("clock",))
+        _, agent_time = conn.recv()
+        received = time.time()
+        if best_round_trip is None or received - sent < best_round_trip:
+            best_offset, best_round_trip = agent_time - (sent + received) / 2, received - sent
+    return best_offset, best_round_trip / 2
+
+class AgentProgress:
+    """
+    Ships per-window latency histograms and counters of an agent to the controller.
+
+    Request threads only append to a deque; a background thread drains it every
+    interval and sends one mergeable window over the control connection.
+    """
+
+    def __init__(self, conn, interval=PROGRESS_INTERVAL):
+        """
+        Args:
+            conn (Connection): Control connection to the controller.
+            interval (float): Seconds per window.
+        """
+        self.conn = conn
+        self.interval = interval
+        self._events = collections.deque()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, op, latency, status):
+        """
+        Records one finished request. Safe to call from any thread.
+
+        Args:
+            op (str): 'register' or 'query'.
+            latency (float): Response time in seconds.
+            status (int): Status code of the request, STATUS_OK on success.
+        """
+        self._events.append((op, latency, status))
+
+    def record_result(self, op, result):
+        """
+        Records the result tuple of a client's register or query call.
+
+        Args:
+            op (str): 'register' or 'query'.
+            result (tuple): The call's result: the response time and the status code first.
+        """
+        self.record(op, result[0], result[1])
+
+    def start(self):
+        """
+        Starts the thread sending the windows.
+        """
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Sends the last partial window and stops the thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._send()
+        self._send()
+
+    def _send(self):
+        window = {op: {"requests": 0, "failed": 0, "latency": LatencyHistogram()} for op in OPERATIONS}
+        while self._events:
+            op, latency, status = self._events.popleft()
+            window[op]["requests"] += 1
+            window[op]["latency"].record(latency)
+            if status != STATUS_OK:
+                window[op]["failed"] += 1
+        for op in OPERATIONS:
+            window[op]["latency"] = window[op]["latency"].to_bytes()
+        self.conn.send(("progress", window))
+
+def connect_to_controller(address, authkey, timeout=CONNECT_TIMEOUT):
+    """
+    Connects to the controller, retrying until it is listening.
+
+    Args:
+        address (tuple): The controller's (host, port).
+        authkey (bytes): Shared secret of the control channel.
+        timeout (float): Seconds to keep retrying.
+
+    Returns:
+        Connection: The control connection.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return Client(address, authkey=authkey)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+def prepare_job(job):
+    """
+    Builds the client and tasks of an agent's share of the run and warms up its connection.
+
+    Args:
+        job (dict): The job sent by the controller, see run_controller.
+
+    Returns:
+        tuple: The client module, the stub or session, the tasks and their intended send
+            offsets (None for a closed-loop run).
+    """
+    transport, server_url = job["transport"], job["server_url"]
+    module, client = make_client(transport, server_url, job["cert"], job["insecure"], job["session_options"])
+    if job["plan"] is None:
+        tasks = prepare_worker_tasks(transport, client, server_url, job["requests"], job["mc_entries_per_register"],
+                                     decode_mode=job["decode_mode"])
+        return module, client, tasks, None
+
+    if transport == 'grpc':
+        client_rpc.query_aggregated_mission_control(client, 0)
+        tasks = client_rpc.tasks_from_plan(client, job["plan"])
+    else:
+        client_rest.query_aggregated_mission_control(client, server_url, 0)
+        tasks = client_rest.tasks_from_plan(client, server_url, job["plan"], decode_mode=job["decode_mode"])
+    arrivals = [planned["offset"] for planned in job["plan"]] if job["open_loop"] else None
+    return module, client, tasks, arrivals
+
+def run_job(conn, job, prepared, start_at):
+    """
+    Waits for the agreed start time, runs the agent's tasks and packs the results.
+
+    Args:
+        conn (Connection): Control connection to the controller, for progress windows.
+        job (dict): The job sent by the controller.
+        prepared (tuple): As returned by prepare_job.
+        start_at (float): Start time on this agent's wall clock.
+
+    Returns:
+        dict: Results as built by multiprocess_load.pack_results, plus the raw time
+            series columns when the controller asked for them.
+    """
+    module, client, tasks, arrivals = prepared
+    policy = RequestPolicy(**job["policy_options"])
+    profiler = ClientProfiler()
+    module.CLIENT_PROFILE = profiler.profile
+    progress = AgentProgress(conn, job["progress_interval"])
+    recorder = None
+    if job["timeseries"]:
+        recorder = TimeSeriesWriter(os.path.join(tempfile.mkdtemp(), "requests"), "npz")
+
+    delay = start_at - time.time()
+    if delay > 0:
+        time.sleep(delay)
+    start_time = time.time()
+    progress.start()
+    try:
+        with profiler:
+            if arrivals is None:
+                results = module.run_tasks(tasks, max_workers=job["max_workers"], reporter=progress, recorder=recorder,
+                                           policy=policy)
+            else:
+                summary = run_open_loop(tasks, arrivals, policy.wrap(module.execute_task),
+                                        max_workers=job["max_workers"] or 1000, reporter=progress, recorder=recorder,
+                                        profile=profiler.profile)
+                results = (summary["register"]["latency"], summary["query"]["latency"], summary["register"]["failed"],
+                           summary["query"]["failed"], summary["query_stream_metrics"], summary["errors"], summary["elapsed"])
+        end_time = time.time()
+    finally:
+        progress.stop()
+        policy.close()
+
+    transport_stats = client.transport_stats.to_dict() if job["transport"] == 'rest' else None
+    result = pack_results(job["agent"], results, policy.stats, profiler.profile, transport_stats, start_time, end_time)
+    if recorder is not None:
+        path = recorder.close()
+        result["timeseries"] = load_timeseries(path)
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    return result
+
+def run_agent(address, authkey, name=None):
+    """
+    Serves one controller: answers clock probes, prepares its job, runs it and reports back.
+
+    Args:
+        address (tuple): The controller's (host, port).
+        authkey (bytes): Shared secret of the control channel.
+        name (str): Name shown in the controller's report, defaults to host:pid.
+    """
+    conn = connect_to_controller(address, authkey)
+    conn.send(("hello", name or f"{socket.gethostname()}:{os.getpid()}"))
+    print(f"Connected to controller at {address[0]}:{address[1]}")
+    job, prepared = None, None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            print("Controller closed the connection")
+            break
+        kind = message[0]
+        if kind == "clock":
+            conn.send(("clock", time.time()))
+        elif kind == "job":
+            job = message[1]
+            try:
+                prepared = prepare_job(job)
+                conn.send(("ready", len(prepared[2])))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+        elif kind == "start":
+            print(f"Starting {len(prepared[2])} {job['transport']} requests")
+            try:
+                conn.send(("result", run_job(conn, job, prepared, message[1])))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+        elif kind == "done":
+            break
+    conn.close()
+
+def print_progress(elapsed, windows, duration, num_agents):
+    """
+    Prints the progress windows received from the agents since the last line.
+
+    Args:
+        elapsed (float): Seconds since the agreed start time.
+        windows (list): Progress windows sent by AgentProgress.
+        duration (float): Seconds covered by the windows.
+        num_agents (int): Number of agents still running.
+    """
+    parts = []
+    for op in OPERATIONS:
+        requests, failed, latency = 0, 0, LatencyHistogram()
+        for window in windows:
+            requests += window[op]["requests"]
+            failed += window[op]["failed"]
+            latency.merge(LatencyHistogram.from_bytes(window[op]["latency"]))
+        summary = latency.summary()
+        error_rate = failed / requests if requests else 0.0
+        parts.append(f"{op}: {requests / max(duration, 1e-9):.0f} req/s, {error_rate * 100:.2f}% errors, "
+                     f"p50 {summary['p50']:.4f}s, p99 {summary['p99']:.4f}s")
+    print(f"[{elapsed:7.1f}s] {num_agents} agents | " + " | ".join(parts), flush=True)
+
+def merge_timeseries(results, offsets, path, format=None):
+    """
+    Writes the agents' time series as one, with timestamps on the controller's clock.
+
+    Args:
+        results (list): Agent results carrying a 'timeseries' entry.
+        offsets (list): Clock offset of each agent, see estimate_clock_offset.
+        path (str): Output file.
+        format (str): One of timeseries.FORMATS.
+
+    Returns:
+        str: Path of the written file.
+    """
+    parts = []
+    for result, offset in zip(results, offsets):
+        columns = result.pop("timeseries")
+        rows = np.zeros(len(columns["send_time"]), dtype=COLUMNS)
+        for name in COLUMNS.names:
+            rows[name] = columns[name]
+        rows["intended_time"] -= offset
+        rows["send_time"] -= offset
+        rows["end_time"] -= offset
+        parts.append(rows)
+    rows = np.concatenate(parts) if parts else np.zeros(0, dtype=COLUMNS)
+    rows = rows[np.argsort(rows["send_time"], kind="stable")]
+    with TimeSeriesWriter(path, format) as writer:
+        writer.record_rows(rows)
+    return writer.path
+
+def receive(conn, expected):
+    """
+    Receives a reply from an agent, raising if the agent reported an error.
+
+    Args:
+        conn (Connection): Control connection to the agent.
+        expected (str): Kind of message expected.
+
+    Returns:
+        tuple: The message.
+    """
+    message = conn.recv()
+    if message[0] == "error":
+        raise RuntimeError(f"Agent failed: {message[1]}")
+    if message[0] != expected:
+        raise RuntimeError(f"Expected {expected!r} from agent, got {message[0]!r}")
+    return message
+
+def run_controller(listener, num_agents, job, shards, start_delay=START_DELAY, timeseries_path=None, timeseries_format=None):
+    """
+    Distributes a run across agents, starts them together and merges their results.
+
+    The controller waits for num_agents agents to connect, estimates the clock offset
+    of each, sends each its shard of the run, and once all are ready tells every agent
+    the same start time translated to its own clock. Progress windows are merged and
+    printed while the run is in progress; at the end the offsets are measured again
+    so clock drift during the run shows up in the report.
+
+    Args:
+        listener (Listener): Listening control socket.
+        num_agents (int): Number of agents to wait for.
+        job (dict): Settings shared by all agents: transport, server_url, cert, insecure,
+            session_options, policy_options, decode_mode, max_workers, mc_entries_per_register,
+            progress_interval and timeseries.
+        shards (list): Per-agent dicts with either 'requests' (a count of generated requests)
+            or 'plan' (planned requests, see workload.py) and 'open_loop'.
+        start_delay (float): Seconds between the start command and the start time.
+        timeseries_path (str): Optional file for the merged per-request time series.
+        timeseries_format (str): One of timeseries.FORMATS.
+
+    Returns:
+        tuple: Merged results as returned by multiprocess_load.merge_results, and the
+            per-agent summary (name, requests, clock offset, uncertainty and drift).
+    """
+    print(f"Waiting for {num_agents} agents on {listener.address[0]}:{listener.address[1]}")
+    conns, names = [], []
+    for _ in range(num_agents):
+        conn = listener.accept()
+        names.append(receive(conn, "hello")[1])
+        conns.append(conn)
+        print(f"Agent {names[-1]} connected from {listener.last_accepted[0]}")
+
+    try:
+        clocks = [estimate_clock_offset(conn) for conn in conns]
+        for name, (offset, uncertainty) in zip(names, clocks):
+            print(f"Agent {name}: clock offset {offset * 1000:+.3f}ms (+/- {uncertainty * 1000:.3f}ms)")
+
+        for conn, name, shard in zip(conns, names, shards):
+            conn.send(("job", {**job, "agent": name, "requests": shard.get("requests"), "plan": shard.get("plan"),
+                               "open_loop": shard.get("open_loop", False)}))
+        task_counts = [receive(conn, "ready")[1] for conn in conns]
+        print(f"All agents ready with {sum(task_counts)} requests")
+
+        start_at = time.time() + start_delay
+        for conn, (offset, _) in zip(conns, clocks):
+            conn.send(("start", start_at + offset))
+
+        results = [None] * num_agents
+        running = dict(zip(conns, range(num_agents)))
+        windows, last_print = [], max(start_at, time.time())
+        while running:
+            timeout = max(last_print + job["progress_interval"] - time.time(), 0)
+            for conn in wait(list(running), timeout):
+                message = conn.recv()
+                if message[0] == "progress":
+                    windows.append(message[1])
+                elif message[0] == "result":
+                    results[running.pop(conn)] = message[1]
+                else:
+                    raise RuntimeError(f"Agent {names[running[conn]]} failed: {message[1]}")
+            now = time.time()
+            if now >= last_print + job["progress_interval"] and windows:
+                print_progress(now - start_at, windows, now - last_print, len(running))
+                windows, last_print = [], now
+
+        drift = [estimate_clock_offset(conn)[0] - offset for conn, (offset, _) in zip(conns, clocks)]
+        for conn in conns:
+            conn.send(("done",))
+    finally:
+        for conn in conns:
+            conn.close()
+
+    # Every timestamp is moved onto the controller's clock before merging.
+    offsets = [offset for offset, _ in clocks]
+    for result, offset in zip(results, offsets):
+        result["start_time"] -= offset
+        result["end_time"] -= offset
+    agents = [{
+        "name": name,
+        "requests": count,
+        "clock_offset": offset,
+        "clock_uncertainty": uncertainty,
+        "clock_drift": agent_drift,
+        "start_time": result["start_time"] - start_at,
+        "elapsed": result["end_time"] - result["start_time"],
+        "saturation": result["client_profile"].saturation(),
+    } for name, count, (offset, uncertainty), agent_drift, result in zip(names, task_counts, clocks, drift, results)]
+
+    if timeseries_path is not None:
+        merge_timeseries(results, offsets, timeseries_path, timeseries_format)
+    return merge_results(results), agents
+
+def print_agents(agents):
+    """
+    Prints one line per agent with its share of the run and the state of its clock.
+
+    Args:
+        agents (list): Per-agent summary as returned by run_controller.
+    """
+    print("\nAgents:")
+    for agent in agents:
+        print(f"  {agent['name']}: {agent['requests']} requests in {agent['elapsed']:.2f}s, started "
+              f"{agent['start_time'] * 1000:+.1f}ms late, clock offset {agent['clock_offset'] * 1000:+.3f}ms "
+              f"(+/- {agent['clock_uncertainty'] * 1000:.3f}ms, drift {agent['clock_drift'] * 1000:+.3f}ms)")
+        if agent["saturation"]:
+            print(f"    WARNING: agent was saturated ({'; '.join(agent['saturation'])})")
+
+def make_shards(num_agents, num_requests=None, plan=None, open_loop=False):
+    """
+    Splits a run across agents.
+
+    Planned requests are dealt round-robin, so every agent gets an even share of
+    each phase of an open-loop schedule and together they keep its arrival rate.
+
+    Args:
+        num_agents (int): Number of agents.
+        num_requests (int): Number of generated requests, when there is no plan.
+        plan (list): Planned requests from workload.load_plan.
+        open_loop (bool): Whether the planned requests carry send offsets.
+
+    Returns:
+        list: One shard per agent, see run_controller.
+    """
+    if plan is None:
+        return [{"requests": count} for count in shard_requests(num_requests, num_agents)]
+    return [{"plan": plan[agent::num_agents], "open_loop": open_loop} for agent in range(num_agents)]
+
+def main():
+    """
+    Main function to run a distributed load test as controller, or to serve one as an agent.
+    """
+    parser = argparse.ArgumentParser(description="Generate load from several hosts with one controller and many agents.")
+    parser.add_argument("--authkey", default=os.environ.get("LOAD_AUTHKEY"),
+                        help="Shared secret of the control channel, required (default: $LOAD_AUTHKEY).")
+    subparsers = parser.add_subparsers(dest="role", required=True)
+
+    agent_parser = subparsers.add_parser("agent", help="Connect to a controller and run its jobs.")
+    agent_parser.add_argument("--controller", default=f"localhost:{DEFAULT_PORT}", help="Controller 'host:port'.")
+    agent_parser.add_argument("--name", default=None, help="Defaults to host:pid.")
+
+    controller_parser = subparsers.add_parser("controller", help="Distribute a run to agents and merge the results.")
+    controller_parser.add_argument("transport", choices=["grpc", "rest"])
+    controller_parser.add_argument("--agents", type=int, required=True, help="Number of agents to wait for.")
+    controller_parser.add_argument("--listen", default=f"127.0.0.1:{DEFAULT_PORT}",
+                                   help="'host:port' to accept agents on; use 0.0.0.0:port to accept remote agents.")
+    controller_parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    controller_parser.add_argument("--plan", default=None, help="Workload plan from workload.py compile, dealt across agents.")
+    controller_parser.add_argument("--requests", type=int, default=12, help="Generated requests when there is no plan.")
+    controller_parser.add_argument("--entries-per-register", type=int, default=3)
+    controller_parser.add_argument("--max-workers", type=int, default=None, help="Thread pool size on each agent.")
+    controller_parser.add_argument("--cert", default=None, help="Path to a self-signed certificate, on every agent.")
+    controller_parser.add_argument("--insecure", action="store_true")
+    controller_parser.add_argument("--http-backend", choices=BACKENDS, default="requests", help="REST transport backend.")
+    controller_parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="REST connections per host and agent.")
+    controller_parser.add_argument("--decode-mode", choices=DECODE_MODES, default=None, help="REST stream decoder (default: iter_lines + json).")
+    controller_parser.add_argument("--start-delay", type=float, default=START_DELAY, help="Seconds from the start command to the start.")
+    controller_parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL)
+    add_policy_arguments(controller_parser)
+    controller_parser.add_argument("--timeseries", default=None, help="Merge every agent's requests into this file.")
+    controller_parser.add_argument("--timeseries-format", choices=FORMATS, default=None, help="Defaults to parquet if pyarrow is installed, else npz.")
+    args = parser.parse_args()
+    # Every message on the control channel is unpickled, so a guessable secret would hand out code execution.
+    if not args.authkey:
+        parser.error("set a shared secret with --authkey or $LOAD_AUTHKEY")
+    authkey = args.authkey.encode()
+
+    if args.role == "agent":
+        run_agent(parse_address(args.controller, "localhost"), authkey, args.name)
+        return
+
+    server_url = args.server_url
+    if server_url is None:
+        server_url = "<your_ec_domain>:50050" if args.transport == "grpc" else "https://<your_ec_domain>:8081"
+    mc_entries_per_register, plan, open_loop = args.entries_per_register, None, False
+    if args.plan:
+        header, plan = load_plan(args.plan)
+        open_loop = header["open_loop"]
+        _, mc_entries_per_register = plan_entries(plan)
+    job = {
+        "transport": args.transport,
+        "server_url": server_url,
+        "cert": args.cert,
+        "insecure": args.insecure,
+        "session_options": {"backend": args.http_backend, "pool_size": args.pool_size},
+        "policy_options": policy_options_from_args(args),
+        "decode_mode": args.decode_mode,
+        "max_workers": args.max_workers,
+        "mc_entries_per_register": mc_entries_per_register,
+        "progress_interval": args.progress_interval,
+        "timeseries": args.timeseries is not None,
+    }
+    shards = make_shards(args.agents, args.requests, plan, open_loop)
+
+    with Listener(parse_address(args.listen, "127.0.0.1"), authkey=authkey) as listener:
+        (*results, transport_stats, policy_stats, client_profile, elapsed), agents = run_controller(
+            listener, args.agents, job, shards, args.start_delay, args.timeseries, args.timeseries_format)
+    print_agents(agents)
+    save_summary_to_json({"agents": agents}, filename=f"{args.transport}_distributed_agents.json")
+
+    filename = f"{args.transport}_distributed_response_times.json"
+    mc_entries_registered = entries_registered(plan, results[2]) if plan is not None else None
+    if args.transport == "grpc":
+        client_rpc.report_results(*results, elapsed, mc_entries_per_register=mc_entries_per_register, filename=filename,
+                                  policy_stats=policy_stats, client_profile=client_profile,
+                                  mc_entries_registered=mc_entries_registered)
+    else:
+        client_rest.report_results(*results, elapsed, mc_entries_per_register=mc_entries_per_register, filename=filename,
+                                   transport_stats=transport_stats, policy_stats=policy_stats, client_profile=client_profile,
+                                   mc_entries_registered=mc_entries_registered)
+
+if __name__ == '__main__':
+    main()
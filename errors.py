@@ -0,0 +1,182 @@
+import collections
+import ssl
+import threading
+import grpc
+import requests
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+STATUS_OK = 200
+# gRPC status codes are reported as GRPC_STATUS_BASE + code, so they never collide with HTTP status codes.
+GRPC_STATUS_BASE = 1000
+# Failures that never got a status from the server.
+STATUS_TIMEOUT = -1
+STATUS_CONNECTION_RESET = -2
+STATUS_TLS = -3
+STATUS_CONNECTION = -4
+STATUS_CLIENT_ERROR = -5
+CLIENT_ERROR_LABELS = {
+    STATUS_TIMEOUT: "timeout",
+    STATUS_CONNECTION_RESET: "connection_reset",
+    STATUS_TLS: "tls",
+    STATUS_CONNECTION: "connection",
+    STATUS_CLIENT_ERROR: "client_error",
+}
+GRPC_CODES = {code.value[0]: code for code in grpc.StatusCode}
+
+class StreamError(Exception):
+    """
+    An error message the REST gateway sent in the middle of a query stream.
+    """
+
+    def __init__(self, error):
+        """
+        Args:
+            error (dict or str): The 'error' member of the stream message.
+        """
+        super().__init__(error)
+        code = error.get("code") if isinstance(error, dict) else None
+        self.status = GRPC_STATUS_BASE + code if code in GRPC_CODES else STATUS_CLIENT_ERROR
+
+def _exception_chain(exc):
+    # requests and urllib3 wrap the socket error in args or `reason` rather than __cause__.
+    pending, seen = [exc], set()
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        yield current
+        linked = [current.__cause__, current.__context__, getattr(current, "reason", None), *current.args]
+        pending.extend(item for item in linked if isinstance(item, BaseException))
+
+def classify_exception(exc):
+    """
+    Maps an exception raised by a request to a status code.
+
+    Args:
+        exc (Exception): The exception raised while sending the request or reading the response.
+
+    Returns:
+        int: GRPC_STATUS_BASE + the gRPC status code, or one of the negative STATUS_* codes
+            for timeouts, connection resets, TLS and other connection or client errors.
+    """
+    if isinstance(exc, StreamError):
+        return exc.status
+    if isinstance(exc, grpc.RpcError) and callable(getattr(exc, "code", None)):
+        code = exc.code()
+        details = (exc.details() or "").lower()
+        if code == grpc.StatusCode.DEADLINE_EXCEEDED:
+            return STATUS_TIMEOUT
+        if code == grpc.StatusCode.UNAVAILABLE:
+            if "ssl" in details or "tls" in details or "handshake" in details:
+                return STATUS_TLS
+            if "reset" in details:
+                return STATUS_CONNECTION_RESET
+            if "failed to connect" in details or "connection refused" in details:
+                return STATUS_CONNECTION
+        return GRPC_STATUS_BASE + code.value[0]
+    if isinstance(exc, requests.exceptions.SSLError):
+        return STATUS_TLS
+    if isinstance(exc, requests.exceptions.Timeout) or (httpx is not None and isinstance(exc, httpx.TimeoutException)):
+        return STATUS_TIMEOUT
+
+    for cause in _exception_chain(exc):
+        if isinstance(cause, (ssl.SSLError, ssl.CertificateError)):
+            return STATUS_TLS
+        if isinstance(cause, TimeoutError):
+            return STATUS_TIMEOUT
+        if isinstance(cause, (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)):
+            return STATUS_CONNECTION_RESET
+
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError, ConnectionError)):
+        return STATUS_CONNECTION
+    if httpx is not None and isinstance(exc, httpx.TransportError):
+        return STATUS_CONNECTION
+    return STATUS_CLIENT_ERROR
+
+def status_label(status):
+    """
+    Args:
+        status (int): Status code of a request, see classify_exception.
+
+    Returns:
+        str: 'ok', 'http_<status>', 'grpc_<CODE>' or one of the CLIENT_ERROR_LABELS.
+    """
+    if status == STATUS_OK:
+        return "ok"
+    if status in CLIENT_ERROR_LABELS:
+        return CLIENT_ERROR_LABELS[status]
+    if status >= GRPC_STATUS_BASE:
+        code = GRPC_CODES.get(status - GRPC_STATUS_BASE)
+        return f"grpc_{code.name if code is not None else status - GRPC_STATUS_BASE}"
+    return f"http_{status}"
+
+class ErrorCounts:
+    """
+    Thread-safe counts of failed requests by operation and kind of failure.
+    """
+
+    def __init__(self):
+        self.counts = {op: collections.Counter() for op in ("register", "query")}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record(self, op, status):
+        """
+        Counts a request if it failed.
+
+        Args:
+            op (str): 'register' or 'query'.
+            status (int): Status code of the request.
+        """
+        if status != STATUS_OK:
+            with self._lock:
+                self.counts[op][status_label(status)] += 1
+
+    def merge(self, other):
+        """
+        Adds the counts of another ErrorCounts to this one.
+
+        Args:
+            other (ErrorCounts): Counts to add.
+
+        Returns:
+            ErrorCounts: This object.
+        """
+        with self._lock:
+            for op, counter in other.counts.items():
+                self.counts[op].update(counter)
+        return self
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: For each operation, failed requests by kind, most frequent first.
+        """
+        return {op: dict(counter.most_common()) for op, counter in self.counts.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Args:
+            data (dict): A dict produced by to_dict.
+
+        Returns:
+            ErrorCounts: The decoded counts.
+        """
+        errors = cls()
+        for op, counts in data.items():
+            errors.counts[op].update(counts)
+        return errors
@@ -0,0 +1,201 @@
+import base64
+import math
+import struct
+import threading
+import zlib
+from array import array
+
+MAGIC = b"LHG1"
+HEADER = struct.Struct("<4sdQQddd I")
+BUCKET = struct.Struct("<IQ")
+PERCENTILES = (50, 90, 99, 99.9)
+
+class LatencyHistogram:
+    """
+    Fixed-memory, log-bucketed latency histogram in the spirit of HdrHistogram.
+
+    Latencies are recorded in microseconds into buckets whose width grows
+    geometrically, so every recorded value is known to within `precision`
+    relative error no matter how many samples are recorded. Min, max, count
+    and sum are tracked exactly.
+
+    Recording is guarded by a lock, so one histogram can be shared by all
+    threads of a process. Histograms from different processes or hosts are
+    combined with merge(), or shipped around with to_bytes()/to_dict().
+    """
+
+    def __init__(self, precision=0.005, max_seconds=3 * 60 * 60):
+        """
+        Args:
+            precision (float): Maximum relative error of a reported percentile.
+            max_seconds (float): Largest latency that gets its own bucket; larger values
+                land in the last bucket (max is still tracked exactly).
+        """
+        self.precision = precision
+        self._log_base = math.log1p(2 * precision)
+        self._set_range(int(max_seconds * 1e6))
+        self._lock = threading.Lock()
+        self.count = 0
+        self.min = math.inf
+        self.max = 0.0
+        self.sum = 0.0
+
+    def _set_range(self, max_value):
+        # Sets the largest bucketed value in microseconds and clears the buckets.
+        self.max_value = max_value
+        self._num_buckets = int(math.log(self.max_value) / self._log_base) + 1
+        self._counts = array("Q", bytes(8 * self._num_buckets))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _bucket(self, seconds):
+        value = max(int(seconds * 1e6), 1)
+        return min(int(math.log(value) / self._log_base), self._num_buckets - 1)
+
+    def _bucket_value(self, index):
+        # Geometric midpoint of the bucket, in seconds.
+        return math.exp((index + 0.5) * self._log_base) / 1e6
+
+    def record(self, seconds, count=1):
+        """
+        Records a latency.
+
+        Args:
+            seconds (float): The latency in seconds.
+            count (int): Number of times to record it.
+        """
+        index = self._bucket(seconds)
+        with self._lock:
+            self._counts[index] += count
+            self.count += count
+            self.sum += seconds * count
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def merge(self, other):
+        """
+        Adds the samples of another histogram with the same layout to this one.
+
+        Args:
+            other (LatencyHistogram): The histogram to merge in.
+
+        Returns:
+            LatencyHistogram: This histogram.
+        """
+        if (other.precision, other.max_value) != (self.precision, self.max_value):
+            raise ValueError("Cannot merge histograms with different precision or range")
+        with self._lock:
+            for index, count in enumerate(other._counts):
+                if count:
+                    self._counts[index] += count
+            self.count += other.count
+            self.sum += other.sum
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, percentile):
+        """
+        Args:
+            percentile (float): Percentile between 0 and 100.
+
+        Returns:
+            float: The latency in seconds at the given percentile, 0.0 if empty.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def mean(self):
+        """
+        Returns:
+            float: The mean latency in seconds, 0.0 if empty.
+        """
+        return self.sum / self.count if self.count else 0.0
+
+    def buckets(self):
+        """
+        Returns:
+            list: (latency in seconds, count) tuples for every non-empty bucket, in order.
+        """
+        return [(self._bucket_value(index), count) for index, count in enumerate(self._counts) if count]
+
+    def summary(self):
+        """
+        Returns:
+            dict: Count, min, mean, p50, p90, p99, p99.9 and max, in seconds.
+        """
+        summary = {"count": self.count, "min": self.min if self.count else 0.0, "mean": self.mean()}
+        for percentile in PERCENTILES:
+            summary[f"p{percentile:g}"] = self.percentile(percentile)
+        summary["max"] = self.max
+        return summary
+
+    def to_bytes(self):
+        """
+        Returns:
+            bytes: A compact, zlib-compressed binary encoding of the histogram.
+        """
+        with self._lock:
+            nonzero = [(index, count) for index, count in enumerate(self._counts) if count]
+            header = HEADER.pack(MAGIC, self.precision, self.max_value, self.count,
+                                 self.min if self.count else 0.0, self.max, self.sum, len(nonzero))
+        return zlib.compress(header + b"".join(BUCKET.pack(index, count) for index, count in nonzero))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Args:
+            data (bytes): An encoding produced by to_bytes.
+
+        Returns:
+            LatencyHistogram: The decoded histogram.
+        """
+        data = zlib.decompress(data)
+        magic, precision, max_value, count, min_value, max_seen, total, num_buckets = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a latency histogram")
+        histogram = cls(precision=precision)
+        # max_value / 1e6 does not always convert back to the same integer, so set it directly.
+        histogram._set_range(max_value)
+        for index, bucket_count in BUCKET.iter_unpack(data[HEADER.size:HEADER.size + num_buckets * BUCKET.size]):
+            histogram._counts[index] = bucket_count
+        histogram.count, histogram.sum, histogram.max = count, total, max_seen
+        histogram.min = min_value if count else math.inf
+        return histogram
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: A JSON-serialisable form: the summary plus the base64 binary encoding.
+        """
+        return {"summary": self.summary(), "encoded": base64.b64encode(self.to_bytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Args:
+            data (dict): A dict produced by to_dict.
+
+        Returns:
+            LatencyHistogram: The decoded histogram.
+        """
+        return cls.from_bytes(base64.b64decode(data["encoded"]))
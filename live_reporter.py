@@ -0,0 +1,238 @@
+import collections
+import csv
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from errors import STATUS_OK, status_label
+from histogram import LatencyHistogram
+
+OPERATIONS = ("register", "query")
+
+class LiveReporter:
+    """
+    Prints rolling per-second throughput, error rate and latency while a run is in progress.
+
+    Request threads only append a tuple to a deque, which is thread-safe without a
+    lock; a background thread drains it every interval, aggregates the window and
+    writes it to the terminal, an optional CSV time series and an optional
+    Prometheus text endpoint.
+    """
+
+    def __init__(self, interval=1.0, csv_path=None, prometheus_port=None, output=sys.stdout, prometheus_host="127.0.0.1"):
+        """
+        Args:
+            interval (float): Seconds per reporting window.
+            csv_path (str): Optional CSV file to append one row per operation and window to.
+            prometheus_port (int): Optional port to serve /metrics in Prometheus text format on.
+            output (file): Where to print the rolling lines, None to stay quiet.
+            prometheus_host (str): Address the metrics endpoint listens on; local only by default.
+        """
+        self.interval = interval
+        self.csv_path = csv_path
+        self.prometheus_port = prometheus_port
+        self.prometheus_host = prometheus_host
+        self.output = output
+        self.totals = {op: {"requests": 0, "failed": 0, "latency": LatencyHistogram(), "errors": collections.Counter()}
+                       for op in OPERATIONS}
+        self.window = {op: {"requests": 0, "failed": 0, "rps": 0.0, "p50": 0.0, "p99": 0.0} for op in OPERATIONS}
+        self._events = collections.deque()
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+        self._csv_file = None
+        self._csv_writer = None
+        self._start_time = None
+
+    def record(self, op, latency, status):
+        """
+        Records one finished request. Safe to call from any thread.
+
+        Args:
+            op (str): 'register' or 'query'.
+            latency (float): Response time in seconds.
+            status (int): Status code of the request, STATUS_OK on success.
+        """
+        self._events.append((op, latency, status))
+
+    def record_result(self, op, result):
+        """
+        Records the result tuple of a client's register or query call.
+
+        Args:
+            op (str): 'register' or 'query'.
+            result (tuple): The call's result: the response time and the status code first.
+        """
+        self._events.append((op, result[0], result[1]))
+
+    def start(self):
+        """
+        Starts the reporting thread and, if configured, the CSV file and metrics endpoint.
+
+        Returns:
+            LiveReporter: This object.
+        """
+        self._start_time = time.perf_counter()
+        if self.csv_path:
+            directory = os.path.dirname(self.csv_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._csv_file = open(self.csv_path, 'w', newline='')
+            self._csv_writer = csv.writer(self._csv_file)
+            self._csv_writer.writerow(["elapsed", "op", "requests", "failed", "rps", "error_rate", "p50", "p99"])
+        if self.prometheus_port is not None:
+            self._server = ThreadingHTTPServer((self.prometheus_host, self.prometheus_port), make_metrics_handler(self))
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            if self.output is not None:
+                print(f"Serving metrics on http://{self.prometheus_host}:{self.prometheus_port}/metrics", file=self.output)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Reports the last partial window and shuts everything down.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._csv_file is not None:
+            self._csv_file.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        window_start = time.perf_counter()
+        while not self._stop.wait(max(window_start + self.interval - time.perf_counter(), 0)):
+            window_start = self._report(window_start)
+        self._report(window_start)
+
+    def _report(self, window_start):
+        now = time.perf_counter()
+        duration = max(now - window_start, 1e-9)
+        windows = {op: {"requests": 0, "failed": 0, "latency": LatencyHistogram()} for op in OPERATIONS}
+        while self._events:
+            op, latency, status = self._events.popleft()
+            window = windows[op]
+            window["requests"] += 1
+            window["latency"].record(latency)
+            if status != STATUS_OK:
+                window["failed"] += 1
+                self.totals[op]["errors"][status_label(status)] += 1
+
+        elapsed = now - self._start_time
+        parts = []
+        for op in OPERATIONS:
+            window, totals = windows[op], self.totals[op]
+            totals["requests"] += window["requests"]
+            totals["failed"] += window["failed"]
+            totals["latency"].merge(window["latency"])
+            summary = window["latency"].summary()
+            error_rate = window["failed"] / window["requests"] if window["requests"] else 0.0
+            self.window[op] = {"requests": window["requests"], "failed": window["failed"], "rps": window["requests"] / duration,
+                               "p50": summary["p50"], "p99": summary["p99"]}
+            parts.append(f"{op}: {self.window[op]['rps']:.0f} req/s, {error_rate * 100:.2f}% errors, "
+                         f"p50 {summary['p50']:.4f}s, p99 {summary['p99']:.4f}s")
+            if self._csv_writer is not None:
+                self._csv_writer.writerow([f"{elapsed:.3f}", op, window["requests"], window["failed"],
+                                           f"{self.window[op]['rps']:.3f}", f"{error_rate:.6f}", summary["p50"], summary["p99"]])
+
+        if self._csv_file is not None:
+            self._csv_file.flush()
+        if self.output is not None:
+            print(f"[{elapsed:7.1f}s] " + " | ".join(parts), file=self.output, flush=True)
+        return now
+
+    def prometheus_text(self):
+        """
+        Returns:
+            str: Cumulative counters, cumulative latency quantiles and last-window gauges
+                in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP ec_requests_total Requests finished, by operation and outcome.",
+            "# TYPE ec_requests_total counter",
+        ]
+        for op in OPERATIONS:
+            totals = self.totals[op]
+            lines.append(f'ec_requests_total{{op="{op}",outcome="ok"}} {totals["requests"] - totals["failed"]}')
+            lines.append(f'ec_requests_total{{op="{op}",outcome="error"}} {totals["failed"]}')
+        lines += ["# HELP ec_errors_total Failed requests, by operation and kind of failure.", "# TYPE ec_errors_total counter"]
+        for op in OPERATIONS:
+            for kind, count in sorted(self.totals[op]["errors"].items()):
+                lines.append(f'ec_errors_total{{op="{op}",kind="{kind}"}} {count}')
+        lines += ["# HELP ec_latency_seconds Response time over the whole run.", "# TYPE ec_latency_seconds summary"]
+        for op in OPERATIONS:
+            histogram = self.totals[op]["latency"]
+            for quantile in (0.5, 0.9, 0.99, 0.999):
+                lines.append(f'ec_latency_seconds{{op="{op}",quantile="{quantile}"}} {histogram.percentile(quantile * 100)}')
+            lines.append(f'ec_latency_seconds_sum{{op="{op}"}} {histogram.mean() * histogram.count}')
+            lines.append(f'ec_latency_seconds_count{{op="{op}"}} {histogram.count}')
+        for name, key, help_text in (("ec_window_rps", "rps", "Requests per second in the last window."),
+                                     ("ec_window_latency_p50_seconds", "p50", "Median response time in the last window."),
+                                     ("ec_window_latency_p99_seconds", "p99", "99th percentile response time in the last window.")):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for op in OPERATIONS:
+                lines.append(f'{name}{{op="{op}"}} {self.window[op][key]}')
+        return "\n".join(lines) + "\n"
+
+def make_metrics_handler(reporter):
+    """
+    Builds the request handler serving a reporter's metrics.
+
+    Args:
+        reporter (LiveReporter): The reporter to expose.
+
+    Returns:
+        type: A BaseHTTPRequestHandler subclass.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = reporter.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+def add_reporter_arguments(parser):
+    """
+    Adds the live reporting options to a command line parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument("--live", action="store_true", help="Print rolling per-second metrics during the run.")
+    parser.add_argument("--metrics-csv", default=None, help="Write the per-second metrics to this CSV file.")
+    parser.add_argument("--prometheus-port", type=int, default=None, help="Serve live metrics at http://<host>:<port>/metrics.")
+    parser.add_argument("--prometheus-host", default="127.0.0.1", help="Address to serve the metrics on; 0.0.0.0 for every interface.")
+    parser.add_argument("--log-requests", action="store_true", help="Print a line for every finished request.")
+
+def reporter_from_args(args):
+    """
+    Args:
+        args (argparse.Namespace): Parsed options added by add_reporter_arguments.
+
+    Returns:
+        LiveReporter: An unstarted reporter, or None when no live output was requested.
+    """
+    if not (args.live or args.metrics_csv or args.prometheus_port is not None):
+        return None
+    return LiveReporter(csv_path=args.metrics_csv, prometheus_port=args.prometheus_port,
+                        output=sys.stdout if args.live else None, prometheus_host=args.prometheus_host)
@@ -0,0 +1,353 @@
+import argparse
+import multiprocessing
+import queue
+import time
+import client_rest
+import client_rpc
+from client_profile import ClientProfile, ClientProfiler
+from errors import ErrorCounts
+from histogram import LatencyHistogram
+from stream_metrics import StreamMetrics
+from node_corpus import DISTRIBUTIONS, NodeCorpus
+from request_policy import PolicyStats, RequestPolicy, add_policy_arguments, policy_options_from_args
+from rest_stream import DECODE_MODES
+from rest_transport import BACKENDS, DEFAULT_POOL_SIZE, TransportStats
+
+# Seconds the workers may take to connect and prepare their tasks before the start is given up.
+DEFAULT_BARRIER_TIMEOUT = 600.0
+# Seconds between checks for workers that died without reporting.
+RESULT_POLL_INTERVAL = 0.5
+
+def shard_requests(num_requests, num_workers):
+    """
+    Splits the virtual users as evenly as possible across workers.
+
+    Args:
+        num_requests (int): Total number of requests.
+        num_workers (int): Number of worker processes.
+
+    Returns:
+        list: Number of requests assigned to each worker.
+    """
+    base, extra = divmod(num_requests, num_workers)
+    return [base + (1 if worker < extra else 0) for worker in range(num_workers)]
+
+def make_client(transport, server_url, cert=None, insecure=False, session_options=None, channel_options=None,
+                compression=None):
+    """
+    Creates the per-process client for the given transport.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        server_url (str): The server address ('host:port' for gRPC, 'https://host:port' for REST).
+        cert (str): Optional path to a self-signed certificate.
+        insecure (bool): Use a plaintext channel (gRPC) or skip verification (REST).
+        session_options (dict): REST transport options, see rest_transport.create_session.
+        channel_options (dict): gRPC flow control and message size options, see client_rpc.channel_options.
+        compression (grpc.Compression): Compression of the gRPC requests, None for none.
+
+    Returns:
+        tuple: The client module and the stub or session to send requests with.
+    """
+    if transport == 'grpc':
+        options = client_rpc.channel_options(**(channel_options or {}))
+        if insecure:
+            channel = client_rpc.get_insecure_channel(server_url, options, compression)
+        elif cert:
+            channel = client_rpc.get_self_signed_channel(server_url, cert, options, compression)
+        else:
+            channel = client_rpc.get_trusted_ca_channel(server_url, options, compression)
+        return client_rpc, client_rpc.PreSerializedStub(channel)
+
+    if transport == 'rest':
+        session_options = session_options or {}
+        if insecure:
+            session = client_rest.get_insecure_session(**session_options)
+        elif cert:
+            session = client_rest.get_self_signed_session(cert, **session_options)
+        else:
+            session = client_rest.get_trusted_ca_session(**session_options)
+        return client_rest, session
+
+    raise ValueError(f"Unknown transport: {transport}")
+
+def prepare_worker_tasks(transport, client, server_url, num_requests, mc_entries_per_register, corpus=None, decode_mode=None):
+    """
+    Prepares this worker's slice of tasks and warms up its connection.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        client: The stub or session returned by make_client.
+        server_url (str): The server address.
+        num_requests (int): Number of requests for this worker.
+        mc_entries_per_register (int): Number of entries per register request.
+        corpus (NodeCorpus): Optional pre-generated key corpus to draw nodes from.
+        decode_mode (str): REST stream decoder mode, None for the iter_lines() decoder.
+
+    Returns:
+        list: Tasks ready for the client module's run_tasks.
+    """
+    if transport == 'grpc':
+        client_rpc.query_aggregated_mission_control(stub=client, request_num=0)
+        return client_rpc.prepare_tasks(client, num_requests, mc_entries_per_register, verbose=False, corpus=corpus)
+    client_rest.query_aggregated_mission_control(client, server_url, 0)
+    return client_rest.prepare_tasks(client, server_url, num_requests, mc_entries_per_register, verbose=False, corpus=corpus,
+                                     decode_mode=decode_mode)
+
+def worker_main(worker_id, transport, server_url, num_requests, mc_entries_per_register, cert, insecure,
+                threads_per_worker, corpus_path, corpus_distribution, decode_mode, session_options, policy_options, barrier,
+                result_queue, channel_options=None, compression=None):
+    """
+    Entry point of a worker process.
+
+    The worker builds its own stub or session and its slice of tasks, waits on the
+    barrier so that every worker starts at the same moment, runs its tasks and
+    puts its raw measurements on the result queue.
+
+    Args:
+        worker_id (int): Index of this worker.
+        transport (str): Either 'grpc' or 'rest'.
+        server_url (str): The server address.
+        num_requests (int): Number of requests for this worker.
+        mc_entries_per_register (int): Number of entries per register request.
+        cert (str): Optional path to a self-signed certificate.
+        insecure (bool): Use a plaintext channel (gRPC) or skip verification (REST).
+        threads_per_worker (int): Thread pool size inside the worker, None for the default.
+        corpus_path (str): Optional node-key corpus file, shared by all workers through mmap.
+        corpus_distribution (str): Node distribution used when drawing from the corpus.
+        decode_mode (str): REST stream decoder mode, None for the iter_lines() decoder.
+        session_options (dict): REST transport options, see rest_transport.create_session.
+        policy_options (dict): Deadline, retry and hedging options, see request_policy.RequestPolicy.
+        barrier (multiprocessing.Barrier): Start barrier shared with the coordinator.
+        result_queue (multiprocessing.Queue): Queue the results are put on.
+        channel_options (dict): gRPC flow control and message size options, see client_rpc.channel_options.
+        compression (grpc.Compression): Compression of the gRPC requests, None for none.
+    """
+    try:
+        module, client = make_client(transport, server_url, cert, insecure, session_options, channel_options, compression)
+        corpus = NodeCorpus(corpus_path, distribution=corpus_distribution) if corpus_path else None
+        tasks = prepare_worker_tasks(transport, client, server_url, num_requests, mc_entries_per_register, corpus, decode_mode)
+        policy = RequestPolicy(**(policy_options or {}))
+        profiler = ClientProfiler()
+        module.CLIENT_PROFILE = profiler.profile
+        barrier.wait()
+        start_time = time.time()
+        with profiler:
+            results = module.run_tasks(tasks, max_workers=threads_per_worker, policy=policy)
+        end_time = time.time()
+        policy.close()
+    except Exception as e:
+        barrier.abort()
+        result_queue.put({"worker_id": worker_id, "error": repr(e)})
+        return
+
+    transport_stats = client.transport_stats.to_dict() if transport == 'rest' else None
+    result_queue.put(pack_results(worker_id, results, policy.stats, profiler.profile, transport_stats, start_time, end_time))
+
+def pack_results(worker_id, results, policy_stats, client_profile, transport_stats, start_time, end_time):
+    """
+    Packs the measurements of one worker into a picklable dict for merge_results.
+
+    Args:
+        worker_id: Index or name of the worker.
+        results (tuple): The tuple returned by a client's run_tasks.
+        policy_stats (PolicyStats): The worker's retry and hedging counters.
+        client_profile (ClientProfile): The worker's self-profile.
+        transport_stats (dict): REST transport counters as returned by TransportStats.to_dict, None for gRPC.
+        start_time (float): Wall-clock time the worker started sending.
+        end_time (float): Wall-clock time its last request finished.
+
+    Returns:
+        dict: The packed results.
+    """
+    register_histogram, query_histogram, register_failed_requests, query_failed_requests, query_stream_metrics, errors, _ = results
+    return {
+        "worker_id": worker_id,
+        "register_histogram": register_histogram.to_bytes(),
+        "query_histogram": query_histogram.to_bytes(),
+        "register_failed_requests": register_failed_requests,
+        "query_failed_requests": query_failed_requests,
+        "query_stream_metrics": query_stream_metrics,
+        "errors": errors,
+        "policy_stats": policy_stats,
+        "client_profile": client_profile,
+        "transport_stats": transport_stats,
+        "start_time": start_time,
+        "end_time": end_time,
+    }
+
+def merge_results(worker_results):
+    """
+    Merges the per-worker measurements into one set of results.
+
+    Args:
+        worker_results (list): Result dicts built by pack_results.
+
+    Returns:
+        tuple: Register and query response time histograms, failed register requests,
+            failed query requests, query streaming metrics, failed requests by kind, REST
+            transport counters (None for gRPC), retry and hedging counters, the workers'
+            combined self-profile and the wall-clock duration of the run.
+    """
+    register_histogram, query_histogram = LatencyHistogram(), LatencyHistogram()
+    query_stream_metrics = StreamMetrics()
+    errors = ErrorCounts()
+    policy_stats = PolicyStats()
+    client_profile = ClientProfile()
+    transport_stats = None
+    register_failed_requests, query_failed_requests = 0, 0
+    for result in worker_results:
+        register_histogram.merge(LatencyHistogram.from_bytes(result["register_histogram"]))
+        query_histogram.merge(LatencyHistogram.from_bytes(result["query_histogram"]))
+        query_stream_metrics.merge(result["query_stream_metrics"])
+        errors.merge(result["errors"])
+        policy_stats.merge(result["policy_stats"])
+        client_profile.merge(result["client_profile"])
+        if result["transport_stats"] is not None:
+            transport_stats = (transport_stats or TransportStats()).merge(result["transport_stats"])
+        register_failed_requests += result["register_failed_requests"]
+        query_failed_requests += result["query_failed_requests"]
+
+    start_time = min(result["start_time"] for result in worker_results)
+    end_time = max(result["end_time"] for result in worker_results)
+    return (register_histogram, query_histogram, register_failed_requests, query_failed_requests, query_stream_metrics,
+            errors, transport_stats, policy_stats, client_profile, end_time - start_time)
+
+def collect_results(processes, barrier, result_queue):
+    """
+    Waits for every worker's results, giving up if a worker exits without sending any.
+
+    A worker killed by a signal never puts its results on the queue. The others are
+    then released from the start barrier or terminated, so nothing waits forever.
+
+    Args:
+        processes (list): The worker processes, indexed by worker id.
+        barrier (multiprocessing.Barrier): The workers' start barrier.
+        result_queue (multiprocessing.Queue): Queue the workers put their results on.
+
+    Returns:
+        list: The result dicts, in the order they arrived.
+    """
+    worker_results = {}
+    exited = set()
+    while len(worker_results) < len(processes):
+        try:
+            result = result_queue.get(timeout=RESULT_POLL_INTERVAL)
+        except queue.Empty:
+            # Results are flushed to the queue before a worker exits, but may arrive after the
+            # exit is seen; a worker is only given up when it is still missing one poll later.
+            lost = [worker_id for worker_id in exited if worker_id not in worker_results]
+            if lost:
+                barrier.abort()
+                for process in processes:
+                    if process.is_alive():
+                        process.terminate()
+                    process.join()
+                raise RuntimeError(f"Worker {lost[0]} exited with code {processes[lost[0]].exitcode} without sending results")
+            exited = {worker_id for worker_id, process in enumerate(processes) if process.exitcode is not None}
+            continue
+        worker_results[result["worker_id"]] = result
+    return list(worker_results.values())
+
+def run_multiprocess(transport, server_url, num_requests, mc_entries_per_register, num_workers,
+                     cert=None, insecure=False, threads_per_worker=None, corpus_path=None, corpus_distribution="uniform",
+                     decode_mode=None, session_options=None, policy_options=None, channel_options=None, compression=None,
+                     barrier_timeout=DEFAULT_BARRIER_TIMEOUT):
+    """
+    Spawns the worker processes, starts them together and merges their results.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        server_url (str): The server address.
+        num_requests (int): Total number of requests across all workers.
+        mc_entries_per_register (int): Number of entries per register request.
+        num_workers (int): Number of worker processes.
+        cert (str): Optional path to a self-signed certificate.
+        insecure (bool): Use a plaintext channel (gRPC) or skip verification (REST).
+        threads_per_worker (int): Thread pool size inside each worker, None for the default.
+        corpus_path (str): Optional node-key corpus file to draw nodes from.
+        corpus_distribution (str): Node distribution used when drawing from the corpus.
+        decode_mode (str): REST stream decoder mode, None for the iter_lines() decoder.
+        session_options (dict): REST transport options, see rest_transport.create_session.
+        policy_options (dict): Deadline, retry and hedging options, see request_policy.RequestPolicy.
+        channel_options (dict): gRPC flow control and message size options, see client_rpc.channel_options.
+        compression (grpc.Compression): Compression of the gRPC requests, None for none.
+        barrier_timeout (float): Seconds the workers may take to get ready before the run is given up.
+
+    Returns:
+        tuple: Merged results as returned by merge_results.
+    """
+    # gRPC is not fork-safe once initialised, so workers always start from a clean interpreter.
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(num_workers, timeout=barrier_timeout)
+    result_queue = context.Queue()
+
+    processes = []
+    for worker_id, worker_requests in enumerate(shard_requests(num_requests, num_workers)):
+        process = context.Process(
+            target=worker_main,
+            args=(worker_id, transport, server_url, worker_requests, mc_entries_per_register, cert, insecure,
+                  threads_per_worker, corpus_path, corpus_distribution, decode_mode, session_options, policy_options,
+                  barrier, result_queue, channel_options, compression),
+        )
+        process.start()
+        processes.append(process)
+
+    # Drain the queue before joining, a worker blocks on exit until its results are consumed.
+    worker_results = collect_results(processes, barrier, result_queue)
+    for process in processes:
+        process.join()
+
+    errors = [result for result in worker_results if "error" in result]
+    if errors:
+        raise RuntimeError(f"{len(errors)} worker(s) failed: {errors[0]['error']}")
+
+    return merge_results(worker_results)
+
+def main():
+    """
+    Main function to run a multi-process load test and save the merged results.
+    """
+    parser = argparse.ArgumentParser(description="Shard virtual users across worker processes.")
+    parser.add_argument("transport", choices=["grpc", "rest"])
+    parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    parser.add_argument("--requests", type=int, default=12)
+    parser.add_argument("--entries-per-register", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--cert", default=None, help="Path to a self-signed certificate.")
+    parser.add_argument("--insecure", action="store_true")
+    parser.add_argument("--corpus", default=None, help="Node-key corpus built with node_corpus.py.")
+    parser.add_argument("--corpus-distribution", choices=DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--http-backend", choices=BACKENDS, default="requests", help="REST transport backend.")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="REST connections per host and worker.")
+    parser.add_argument("--decode-mode", choices=DECODE_MODES, default=None, help="REST stream decoder (default: iter_lines + json).")
+    parser.add_argument("--grpc-compression", choices=list(client_rpc.GRPC_COMPRESSION), default="none", help="Compression of the gRPC requests.")
+    add_policy_arguments(parser)
+    client_rpc.add_channel_arguments(parser)
+    args = parser.parse_args()
+
+    server_url = args.server_url
+    if server_url is None:
+        server_url = "<your_ec_domain>:50050" if args.transport == "grpc" else "https://<your_ec_domain>:8081"
+
+    print(f"Starting {args.workers} workers for {args.requests} {args.transport} requests")
+    *results, transport_stats, policy_stats, client_profile, elapsed = run_multiprocess(
+        args.transport, server_url, args.requests, args.entries_per_register, args.workers,
+        cert=args.cert, insecure=args.insecure, threads_per_worker=args.threads_per_worker,
+        corpus_path=args.corpus, corpus_distribution=args.corpus_distribution, decode_mode=args.decode_mode,
+        session_options={"backend": args.http_backend, "pool_size": args.pool_size},
+        policy_options=policy_options_from_args(args), channel_options=client_rpc.channel_options_from_args(args),
+        compression=client_rpc.GRPC_COMPRESSION[args.grpc_compression],
+    )
+    print(f"Completed {args.requests} requests in {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s)")
+
+    if args.transport == "grpc":
+        client_rpc.report_results(*results, elapsed, mc_entries_per_register=args.entries_per_register,
+                                  policy_stats=policy_stats, client_profile=client_profile)
+    else:
+        client_rest.report_results(*results, elapsed, mc_entries_per_register=args.entries_per_register,
+                                   transport_stats=transport_stats, policy_stats=policy_stats, client_profile=client_profile)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import mmap
+import multiprocessing
+import os
+import numpy as np
+from ecdsa import SigningKey, SECP256k1
+
+KEY_SIZE = 33
+DISTRIBUTIONS = ("uniform", "powerlaw", "graph")
+
+def generate_keys(count):
+    """
+    Generates compressed SECP256k1 public keys.
+
+    Args:
+        count (int): Number of keys to generate.
+
+    Returns:
+        bytes: `count` 33-byte compressed public keys, concatenated.
+    """
+    return b"".join(
+        SigningKey.generate(curve=SECP256k1).get_verifying_key().to_string("compressed")
+        for _ in range(count)
+    )
+
+def build_corpus(path, num_keys, processes=None, chunk_size=1000):
+    """
+    Builds a flat binary file of compressed public keys in parallel.
+
+    The file has no header: key `i` lives at offset `i * KEY_SIZE`.
+
+    Args:
+        path (str): Path of the corpus file to write.
+        num_keys (int): Number of keys to generate.
+        processes (int): Number of worker processes, None for one per core.
+        chunk_size (int): Number of keys generated per work item.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    chunks = [min(chunk_size, num_keys - start) for start in range(0, num_keys, chunk_size)]
+    written = 0
+    with multiprocessing.Pool(processes) as pool, open(path, "wb") as f:
+        for keys in pool.imap_unordered(generate_keys, chunks):
+            f.write(keys)
+            written += len(keys) // KEY_SIZE
+            print(f"Generated {written}/{num_keys} keys", end="\r")
+    print(f"\nCorpus of {num_keys} keys saved to {path}")
+
+class NodeCorpus:
+    """
+    Read-only, memory-mapped view over a corpus file built by build_corpus.
+
+    Keys are never loaded as a whole; each draw slices 33 bytes out of the
+    mapping, so many processes can share the same file through the page cache.
+
+    Node selection follows one of three distributions:
+      - 'uniform': every key is equally likely, pairs almost never repeat.
+      - 'powerlaw': keys are drawn with a Zipf-like weight, so a few hub nodes
+        show up in many pairs.
+      - 'graph': a fixed channel graph with power-law degrees is built once and
+        pairs are drawn from its edges, so the same (node_from, node_to) pairs
+        repeat the way they do on a real network.
+    """
+
+    def __init__(self, path, distribution="uniform", alpha=1.2, num_edges=None, seed=None, graph_seed=0):
+        """
+        Args:
+            path (str): Path of the corpus file.
+            distribution (str): One of 'uniform', 'powerlaw' or 'graph'.
+            alpha (float): Exponent of the power-law weights.
+            num_edges (int): Number of channels in the 'graph' distribution, defaults to 4x the key count.
+            seed (int): Seed for node selection.
+            graph_seed (int): Seed for the hub weights and channel graph. It is fixed by default so
+                that every process mapping the same corpus sees the same network.
+        """
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown distribution: {distribution}")
+        # An interrupted build leaves an empty file or a partial last key.
+        file_size = os.path.getsize(path)
+        if file_size == 0 or file_size % KEY_SIZE:
+            raise ValueError(f"{path} is not a corpus of {KEY_SIZE}-byte keys: {file_size} bytes")
+
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self._mmap) // KEY_SIZE
+        self.distribution = distribution
+        self._rng = np.random.default_rng(seed)
+        graph_rng = np.random.default_rng(graph_seed)
+
+        if distribution != "uniform":
+            weights = np.arange(1, self.size + 1, dtype=np.float64) ** -alpha
+            # Shuffle so the hubs are not simply the first keys of the file.
+            graph_rng.shuffle(weights)
+            self._cdf = np.cumsum(weights)
+            self._cdf /= self._cdf[-1]
+
+        if distribution == "graph":
+            num_edges = num_edges or 4 * self.size
+            self._edges = self._draw_indices(2 * num_edges, graph_rng).reshape(num_edges, 2)
+            # Drop self-loops, a node never has a channel to itself.
+            self._edges = self._edges[self._edges[:, 0] != self._edges[:, 1]]
+
+    def __len__(self):
+        return self.size
+
+    def _draw_indices(self, count, rng=None):
+        rng = rng or self._rng
+        if self.distribution == "uniform":
+            return rng.integers(0, self.size, size=count)
+        return np.searchsorted(self._cdf, rng.random(count), side="right")
+
+    def node(self, index):
+        """
+        Args:
+            index (int): Index of the key in the corpus.
+
+        Returns:
+            bytes: The 33-byte compressed public key.
+        """
+        offset = index * KEY_SIZE
+        return self._mmap[offset:offset + KEY_SIZE]
+
+    def node_view(self, index):
+        """
+        Args:
+            index (int): Index of the key in the corpus.
+
+        Returns:
+            memoryview: A zero-copy view of the key inside the mapping.
+        """
+        offset = index * KEY_SIZE
+        return memoryview(self._mmap)[offset:offset + KEY_SIZE]
+
+    def random_node(self):
+        """
+        Returns:
+            bytes: A key drawn according to the corpus distribution.
+        """
+        return self.node(int(self._draw_indices(1)[0]))
+
+    def random_pair(self):
+        """
+        Returns:
+            tuple: (node_from, node_to) keys drawn according to the corpus distribution.
+        """
+        if self.distribution == "graph":
+            node_from, node_to = self._edges[self._rng.integers(0, len(self._edges))]
+        else:
+            node_from, node_to = self._draw_indices(2)
+            while node_from == node_to:
+                node_to = self._draw_indices(1)[0]
+        return self.node(int(node_from)), self.node(int(node_to))
+
+    def close(self):
+        """
+        Unmaps and closes the corpus file.
+        """
+        self._mmap.close()
+        self._file.close()
+
+def main():
+    """
+    Main function to build a node-key corpus file.
+    """
+    parser = argparse.ArgumentParser(description="Build a memory-mappable corpus of compressed node keys.")
+    parser.add_argument("path", nargs="?", default="data/node_corpus.bin")
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    build_corpus(args.path, args.keys, processes=args.processes)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+import concurrent.futures
+import random
+import threading
+import time
+import grpc
+from errors import GRPC_STATUS_BASE, STATUS_CONNECTION, STATUS_CONNECTION_RESET, STATUS_OK, STATUS_TIMEOUT
+from histogram import LatencyHistogram
+
+DEFAULT_DEADLINE = 60.0
+# Failures worth another attempt: the coordinator was unreachable, overloaded or too slow.
+RETRYABLE_STATUSES = frozenset([
+    STATUS_TIMEOUT, STATUS_CONNECTION_RESET, STATUS_CONNECTION, 429, 502, 503, 504,
+    GRPC_STATUS_BASE + grpc.StatusCode.UNAVAILABLE.value[0],
+    GRPC_STATUS_BASE + grpc.StatusCode.RESOURCE_EXHAUSTED.value[0],
+])
+# Query latencies observed before a percentile hedge delay is trusted.
+MIN_HEDGE_SAMPLES = 100
+
+def parse_hedge_after(value):
+    """
+    Args:
+        value (str): Seconds ('0.05') or a percentile of the observed query latency ('p95').
+
+    Returns:
+        tuple: (seconds, None) or (None, percentile).
+    """
+    if value.startswith("p"):
+        return None, float(value[1:])
+    return float(value), None
+
+class PolicyStats:
+    """
+    Thread-safe cost and benefit counters of retries and hedged queries.
+    """
+
+    def __init__(self):
+        self.requests = {"register": 0, "query": 0}
+        self.attempts = {"register": 0, "query": 0}
+        self.retried = {"register": 0, "query": 0}
+        self.rescued = {"register": 0, "query": 0}
+        self.retry_bytes = {"register": 0, "query": 0}
+        self.hedges = 0
+        self.hedges_won = 0
+        self.hedge_bytes = 0
+        self.primary_latency = LatencyHistogram()
+        self.hedged_latency = LatencyHistogram()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record_request(self, op, attempts, status, retry_bytes):
+        """
+        Records a finished request.
+
+        Args:
+            op (str): 'register' or 'query'.
+            attempts (int): Attempts made, 1 if the request was not retried.
+            status (int): Status code of the last attempt.
+            retry_bytes (int): Bytes sent (register) or received (query) by the attempts that failed.
+        """
+        with self._lock:
+            self.requests[op] += 1
+            self.attempts[op] += attempts
+            if attempts > 1:
+                self.retried[op] += 1
+                self.rescued[op] += status == STATUS_OK
+                self.retry_bytes[op] += retry_bytes
+
+    def record_hedge(self, won):
+        with self._lock:
+            self.hedges += 1
+            self.hedges_won += won
+
+    def record_hedge_loser(self, num_bytes):
+        with self._lock:
+            self.hedge_bytes += num_bytes
+
+    def merge(self, other):
+        """
+        Adds the counters of another PolicyStats to this one.
+
+        Args:
+            other (PolicyStats): Counters to add.
+
+        Returns:
+            PolicyStats: This object.
+        """
+        with self._lock:
+            for name in ("requests", "attempts", "retried", "rescued", "retry_bytes"):
+                for op, count in getattr(other, name).items():
+                    getattr(self, name)[op] += count
+            self.hedges += other.hedges
+            self.hedges_won += other.hedges_won
+            self.hedge_bytes += other.hedge_bytes
+        self.primary_latency.merge(other.primary_latency)
+        self.hedged_latency.merge(other.hedged_latency)
+        return self
+
+    def summary(self):
+        """
+        Returns:
+            dict: Retry cost (extra attempts and bytes) and benefit (requests rescued) per operation,
+                and hedge cost (duplicate queries and bytes) and benefit (query latency seen by the
+                caller vs. the latency of the first attempt alone).
+        """
+        summary = {"retries": {}}
+        for op in ("register", "query"):
+            summary["retries"][op] = {
+                "requests": self.requests[op],
+                "extra_attempts": self.attempts[op] - self.requests[op],
+                "retried_requests": self.retried[op],
+                "rescued_requests": self.rescued[op],
+                "retry_bytes": self.retry_bytes[op],
+            }
+        summary["hedging"] = {
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "hedge_bytes": self.hedge_bytes,
+            "first_attempt_latency": self.primary_latency.summary(),
+            "hedged_latency": self.hedged_latency.summary(),
+        }
+        return summary
+
+class RequestPolicy:
+    """
+    Deadlines, retries with exponential backoff and full jitter, and hedged queries.
+
+    wrap() turns a client's execute_task into a function with the same signature that
+    applies the policy, so it can be handed to run_tasks or the open-loop scheduler.
+    Hedged queries run in an internal thread pool; the losing stream is left to finish
+    (and is counted) rather than cancelled, as neither client can abort a stream it
+    does not own.
+    """
+
+    def __init__(self, deadline=DEFAULT_DEADLINE, retries=0, backoff=0.05, max_backoff=2.0, hedge_after=None,
+                 hedge_workers=1000, seed=None):
+        """
+        Args:
+            deadline (float): Seconds each attempt may take, None to wait forever.
+            retries (int): Extra attempts after a retryable failure (see RETRYABLE_STATUSES).
+            backoff (float): Backoff before the first retry; it doubles with every retry.
+            max_backoff (float): Upper bound of the backoff.
+            hedge_after (str): Send a duplicate query when the first one has not finished after this
+                many seconds ('0.05') or this percentile of the observed query latency ('p95').
+                None disables hedging.
+            hedge_workers (int): Threads available for hedged queries.
+            seed (int): Seed for the backoff jitter.
+        """
+        self.deadline = deadline or None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_delay, self.hedge_percentile = parse_hedge_after(hedge_after) if hedge_after else (None, None)
+        self.hedging = hedge_after is not None
+        self.hedge_workers = hedge_workers
+        self.stats = PolicyStats()
+        self._rng = random.Random(seed)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def wrap(self, execute):
+        """
+        Args:
+            execute (callable): A client's execute_task(task, timeout).
+
+        Returns:
+            callable: execute(task) with the policy applied; the response time of its result
+                covers all attempts and backoffs.
+        """
+        return lambda task: self.execute(execute, task)
+
+    def execute(self, execute, task):
+        """
+        Sends a task, retrying and hedging according to the policy.
+
+        Args:
+            execute (callable): A client's execute_task(task, timeout).
+            task (tuple): The task to send.
+
+        Returns:
+            tuple: The result of the last attempt, with the total response time.
+        """
+        start_time = time.perf_counter()
+        retry_bytes = 0
+        for attempt in range(self.retries + 1):
+            if task[0] == 'query' and self.hedging:
+                result = self._hedged(execute, task)
+            else:
+                result = execute(task, self.deadline)
+            if result[1] == STATUS_OK or result[1] not in RETRYABLE_STATUSES or attempt == self.retries:
+                break
+            retry_bytes += len(task[-3]) if task[0] == 'register' else result[2].bytes
+            time.sleep(self._backoff(attempt))
+
+        self.stats.record_request(task[0], attempt + 1, result[1], retry_bytes)
+        return (time.perf_counter() - start_time, *result[1:])
+
+    def _backoff(self, attempt):
+        with self._lock:
+            return self._rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _current_hedge_delay(self):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if self.stats.primary_latency.count < MIN_HEDGE_SAMPLES:
+            return None
+        return self.stats.primary_latency.percentile(self.hedge_percentile)
+
+    def _hedged(self, execute, task):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.hedge_workers)
+        start_time = time.perf_counter()
+        delay = self._current_hedge_delay()
+        primary = self._executor.submit(execute, task, self.deadline)
+        primary.add_done_callback(lambda done: self.stats.primary_latency.record(done.result()[0]))
+        if delay is None or concurrent.futures.wait([primary], timeout=delay).done:
+            result = primary.result()
+            self.stats.hedged_latency.record(time.perf_counter() - start_time)
+            return result
+
+        hedge = self._executor.submit(execute, task, self.deadline)
+        done, _ = concurrent.futures.wait([primary, hedge], return_when=concurrent.futures.FIRST_COMPLETED)
+        winner, loser = (primary, hedge) if primary in done else (hedge, primary)
+        if winner.result()[1] != STATUS_OK:
+            # A fast failure does not beat a stream that may still succeed.
+            concurrent.futures.wait([loser])
+            if loser.result()[1] == STATUS_OK:
+                winner, loser = loser, winner
+        loser.add_done_callback(lambda done: self.stats.record_hedge_loser(done.result()[2].bytes))
+        self.stats.record_hedge(winner is hedge)
+        self.stats.hedged_latency.record(time.perf_counter() - start_time)
+        return winner.result()
+
+    def close(self):
+        """
+        Waits for outstanding hedged queries and stops the hedging threads.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+def print_policy_stats(stats):
+    """
+    Prints the cost and benefit of retries and hedging.
+
+    Args:
+        stats (PolicyStats): The counters of a run.
+    """
+    summary = stats.summary()
+    for op, retries in summary["retries"].items():
+        if retries["retried_requests"]:
+            print(f"{op.capitalize()} Retries: {retries['extra_attempts']} extra attempts for {retries['retried_requests']} "
+                  f"requests, {retries['rescued_requests']} rescued, {retries['retry_bytes']} bytes retried")
+    hedging = summary["hedging"]
+    if hedging["hedges"]:
+        first, hedged = hedging["first_attempt_latency"], hedging["hedged_latency"]
+        print(f"Hedged Queries: {hedging['hedges']} hedges sent, {hedging['hedges_won']} won, "
+              f"{hedging['hedge_bytes']} bytes received by losing streams")
+        print(f"Query Latency First Attempt vs Hedged: p99 {first['p99']:.4f}s vs {hedged['p99']:.4f}s, "
+              f"p99.9 {first['p99.9']:.4f}s vs {hedged['p99.9']:.4f}s")
+
+def add_policy_arguments(parser):
+    """
+    Adds the deadline, retry and hedging options to a command line parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE, help="Seconds per attempt, 0 to wait forever.")
+    parser.add_argument("--retries", type=int, default=0, help="Retries after a timeout, connection error, UNAVAILABLE or 429/502/503/504.")
+    parser.add_argument("--backoff", type=float, default=0.05, help="Backoff before the first retry in seconds, doubled per retry.")
+    parser.add_argument("--max-backoff", type=float, default=2.0)
+    parser.add_argument("--hedge-after", default=None, help="Duplicate a query still running after N seconds ('0.05') or pNN ('p95').")
+
+def policy_options_from_args(args):
+    """
+    Args:
+        args (argparse.Namespace): Parsed options added by add_policy_arguments.
+
+    Returns:
+        dict: Keyword arguments for RequestPolicy.
+    """
+    return {"deadline": args.deadline, "retries": args.retries, "backoff": args.backoff, "max_backoff": args.max_backoff,
+            "hedge_after": args.hedge_after}
@@ -0,0 +1,164 @@
+import base64
+import json
+import threading
+from client_profile import DECODE, RECEIVE
+from errors import StreamError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DECODE_MODES = ("count", "validate", "materialize")
+NODE_KEY_B64_LENGTH = 44  # base64 of a 33-byte compressed public key
+INITIAL_BUFFER_SIZE = 1 << 16
+
+_buffers = threading.local()
+
+def loads(view):
+    """
+    Parses one JSON document, using orjson when it is installed.
+
+    Args:
+        view (memoryview): The document bytes.
+
+    Returns:
+        object: The decoded document.
+    """
+    if orjson is not None:
+        # orjson reads straight from the memoryview, no intermediate copy.
+        return orjson.loads(view)
+    return json.loads(bytes(view))
+
+def get_buffer():
+    """
+    Returns:
+        bytearray: The calling thread's reusable read buffer.
+    """
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _buffers.buffer = bytearray(INITIAL_BUFFER_SIZE)
+    return buffer
+
+def get_reader(response):
+    """
+    Picks the cheapest way to read the body of a streaming requests.Response.
+
+    Each read returns as soon as one socket read's worth of data is available,
+    so message arrival times are not delayed by waiting for a full buffer. For
+    identity-encoded bodies the underlying http.client response is read
+    directly, which de-chunks without urllib3's extra buffering; compressed
+    bodies go through urllib3 so that they get decoded.
+
+    Args:
+        response (requests.Response): A response obtained with stream=True.
+
+    Returns:
+        callable: A readinto-style function filling a memoryview and returning the byte count.
+    """
+    raw = response.raw
+    fp = getattr(raw, "_fp", None)
+    if fp is not None and hasattr(fp, "readinto1") and not response.headers.get("Content-Encoding"):
+        return fp.readinto1
+
+    def read_decoded(view):
+        data = raw.read1(len(view))
+        view[:len(data)] = data
+        return len(data)
+    return read_decoded
+
+def handle_line(buffer, start, end, mode, pairs):
+    """
+    Decodes one newline-delimited gRPC-gateway message in place.
+
+    Args:
+        buffer (bytearray): The read buffer.
+        start (int): Offset of the first byte of the message.
+        end (int): Offset just past the last byte of the message.
+        mode (str): One of 'count', 'validate' or 'materialize'.
+        pairs (list): Decoded pairs are appended here in 'materialize' mode.
+
+    Returns:
+        int: Number of pairs in the message.
+    """
+    if mode == "count":
+        # Pairs and gateway errors are recognised by their keys, without parsing.
+        if buffer.find(b'"error"', start, end) == -1:
+            return buffer.count(b'"nodeFrom"', start, end)
+
+    chunk = loads(memoryview(buffer)[start:end])
+    if "error" in chunk:
+        raise StreamError(chunk["error"])
+    chunk_pairs = chunk["result"].get("pairs", [])
+
+    if mode == "validate":
+        for pair in chunk_pairs:
+            if len(pair["nodeFrom"]) != NODE_KEY_B64_LENGTH or len(pair["nodeTo"]) != NODE_KEY_B64_LENGTH or "history" not in pair:
+                raise ValueError(f"Malformed pair in stream: {pair}")
+    elif mode == "materialize":
+        for pair in chunk_pairs:
+            pair["nodeFrom"] = base64.b64decode(pair["nodeFrom"])
+            pair["nodeTo"] = base64.b64decode(pair["nodeTo"])
+            pairs.append(pair)
+
+    return len(chunk_pairs)
+
+def decode_stream(response, timer, stats, mode="count"):
+    """
+    Reads and decodes a newline-delimited gRPC-gateway stream.
+
+    The body is read into a per-thread buffer that is reused across requests;
+    messages are handed to the JSON parser as memoryviews into that buffer
+    instead of being copied out line by line as iter_lines() does.
+
+    Args:
+        response (requests.Response): A 200 response obtained with stream=True.
+        timer (PhaseTimer): The request's timer; reads are charged to receive, parsing to decode.
+        stats (StreamStats): Stream statistics to fill in.
+        mode (str): 'count' only counts pairs, 'validate' also checks their shape,
+            'materialize' decodes and returns them.
+
+    Returns:
+        list: The decoded pairs in 'materialize' mode, otherwise an empty list.
+    """
+    if mode not in DECODE_MODES:
+        raise ValueError(f"Unknown decode mode: {mode}")
+
+    readinto = get_reader(response)
+    buffer = get_buffer()
+    pairs = []
+    filled = 0
+    while True:
+        if filled == len(buffer):
+            # A single message is larger than the buffer, grow it for this and later streams.
+            buffer.extend(bytes(len(buffer)))
+            _buffers.buffer = buffer
+        read = readinto(memoryview(buffer)[filled:])
+        received_at = timer.mark(RECEIVE)
+        if not read:
+            break
+        scan_from, filled = filled, filled + read
+
+        start = 0
+        newline = buffer.find(b"\n", scan_from, filled)
+        while newline != -1:
+            if newline > start:
+                num_pairs = handle_line(buffer, start, newline, mode, pairs)
+                stats.add_message(timer.since_start(received_at), num_pairs, newline - start + 1)
+            start = newline + 1
+            newline = buffer.find(b"\n", start, filled)
+
+        # Move the incomplete tail to the front of the buffer.
+        if start:
+            buffer[:filled - start] = buffer[start:filled]
+            filled -= start
+        timer.mark(DECODE)
+
+    if filled:
+        num_pairs = handle_line(buffer, 0, filled, mode, pairs)
+        stats.add_message(timer.since_start(received_at), num_pairs, filled)
+        timer.mark(DECODE)
+
+    # The body was read below urllib3, so hand the connection back to the pool ourselves.
+    response.raw.release_conn()
+    return pairs
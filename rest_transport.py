@@ -0,0 +1,336 @@
+import socket
+import ssl
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+BACKENDS = ("requests", "httpx")
+DEFAULT_POOL_SIZE = 100
+
+class TransportStats:
+    """
+    Thread-safe counters of the connections and TLS handshakes made by a session.
+    """
+
+    def __init__(self):
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.tls_resumed = 0
+        self._lock = threading.Lock()
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+
+    def tls_handshake(self, resumed):
+        with self._lock:
+            self.tls_handshakes += 1
+            self.tls_resumed += bool(resumed)
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: Connections opened, TLS handshakes and how many of them resumed a session.
+        """
+        return {"connections": self.connections, "tls_handshakes": self.tls_handshakes, "tls_resumed": self.tls_resumed}
+
+    def merge(self, data):
+        """
+        Adds the counters of another session.
+
+        Args:
+            data (dict): Counters as returned by to_dict.
+
+        Returns:
+            TransportStats: This object.
+        """
+        with self._lock:
+            self.connections += data["connections"]
+            self.tls_handshakes += data["tls_handshakes"]
+            self.tls_resumed += data["tls_resumed"]
+        return self
+
+class CountingSSLContext(ssl.SSLContext):
+    """
+    SSLContext that counts handshakes and, optionally, resumes TLS sessions.
+
+    urllib3 has no notion of TLS session reuse, so every new pooled connection
+    pays for a full handshake. With reuse enabled the last resumable session seen
+    for a host is kept and offered on the next connection to it, turning
+    reconnects into abbreviated handshakes even after every earlier connection
+    to the host has closed.
+    """
+
+    def __new__(cls, stats, reuse_sessions=True):
+        return super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+
+    def __init__(self, stats, reuse_sessions=True):
+        """
+        Args:
+            stats (TransportStats): Counters to update on every handshake.
+            reuse_sessions (bool): Whether to offer previous sessions for resumption.
+        """
+        self.stats = stats
+        self.reuse_sessions = reuse_sessions
+        self._sessions = {}
+        self._session_lock = threading.Lock()
+
+    def remember_session(self, ssl_sock):
+        """
+        Keeps the session of a socket for the next connection to the same host.
+
+        TLS 1.3 tickets arrive after the handshake, with the first data read, so this is
+        called again once a response has been received and when the connection is released.
+
+        Args:
+            ssl_sock (ssl.SSLSocket): A connected socket made by this context.
+        """
+        if not self.reuse_sessions:
+            return
+        session = ssl_sock.session
+        # A TLS 1.3 session without a ticket cannot be resumed; do not let it replace one that can.
+        if session is None or (ssl_sock.version() == "TLSv1.3" and not session.has_ticket):
+            return
+        with self._session_lock:
+            self._sessions[ssl_sock.server_hostname] = session
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        if self.reuse_sessions and session is None:
+            with self._session_lock:
+                session = self._sessions.get(server_hostname)
+        ssl_sock = super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+        self.stats.tls_handshake(ssl_sock.session_reused)
+        self.remember_session(ssl_sock)
+        return ssl_sock
+
+def remember_tls_session(sock):
+    """
+    Hands the session of a pooled connection's socket to its CountingSSLContext, if any.
+
+    Args:
+        sock (socket.socket): The connection's socket, or None once closed.
+    """
+    context = getattr(sock, "context", None)
+    if isinstance(context, CountingSSLContext):
+        try:
+            context.remember_session(sock)
+        except (OSError, ValueError):
+            pass
+
+def counting_pool_classes(stats):
+    """
+    Builds urllib3 pool classes whose connections report to the given stats.
+
+    Args:
+        stats (TransportStats): Counters to update on every new connection.
+
+    Returns:
+        dict: Pool classes by URL scheme, for PoolManager.pool_classes_by_scheme.
+    """
+    class CountingHTTPConnection(HTTPConnection):
+        def connect(self):
+            super().connect()
+            stats.connection_opened()
+
+    class CountingHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            super().connect()
+            stats.connection_opened()
+
+        def getresponse(self, *args, **kwargs):
+            response = super().getresponse(*args, **kwargs)
+            remember_tls_session(self.sock)
+            return response
+
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = CountingHTTPConnection
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = CountingHTTPSConnection
+
+        def _put_conn(self, conn):
+            if conn is not None:
+                remember_tls_session(conn.sock)
+            super()._put_conn(conn)
+
+    return {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+class TransportAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with a sized connection pool, TCP keep-alive, TLS session reuse
+    and connection/handshake counting.
+    """
+
+    def __init__(self, stats, ssl_context, socket_options, server_hostname=None, **kwargs):
+        """
+        Args:
+            stats (TransportStats): Counters to update.
+            ssl_context (CountingSSLContext): Context used for every TLS connection.
+            socket_options (list): Socket options set on every new connection.
+            server_hostname (str): Name to send as SNI and to verify the certificate against instead
+                of the URL's host, e.g. when connecting through a local relay; None for the URL's host.
+            **kwargs: Passed on to HTTPAdapter (pool_connections, pool_maxsize, pool_block).
+        """
+        self.stats = stats
+        self.ssl_context = ssl_context
+        self.socket_options = socket_options
+        self.server_hostname = server_hostname
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs["ssl_context"] = self.ssl_context
+        pool_kwargs["socket_options"] = self.socket_options
+        if self.server_hostname is not None:
+            pool_kwargs["server_hostname"] = self.server_hostname
+            pool_kwargs["assert_hostname"] = self.server_hostname if self.ssl_context.check_hostname else False
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = counting_pool_classes(self.stats)
+
+def create_requests_session(verify=True, pool_size=DEFAULT_POOL_SIZE, pool_block=False, tcp_keepalive=True,
+                            tls_session_reuse=True, server_hostname=None):
+    """
+    Creates a requests.Session with a tuned, instrumented transport.
+
+    Args:
+        verify (bool or str): True for trusted CAs, False to skip verification, or a certificate path.
+        pool_size (int): Connections kept per host; should match the number of sending threads.
+        pool_block (bool): Wait for a free pooled connection instead of opening a throwaway one.
+        tcp_keepalive (bool): Enable TCP keep-alive probes on idle pooled connections.
+        tls_session_reuse (bool): Resume TLS sessions on reconnects.
+        server_hostname (str): TLS name of the server when the URLs point elsewhere, e.g. at a relay.
+
+    Returns:
+        requests.Session: The session, with its counters in `session.transport_stats`.
+    """
+    stats = TransportStats()
+    ssl_context = CountingSSLContext(stats, reuse_sessions=tls_session_reuse)
+    if verify is False:
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+
+    socket_options = list(HTTPConnection.default_socket_options)
+    if tcp_keepalive:
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+
+    adapter = TransportAdapter(stats, ssl_context, socket_options, server_hostname,
+                               pool_connections=1, pool_maxsize=pool_size, pool_block=pool_block)
+    session = requests.Session()
+    session.verify = verify
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.transport_stats = stats
+    return session
+
+class HttpxRaw:
+    """
+    Minimal stand-in for urllib3's raw response over an httpx streaming response,
+    so that rest_stream.decode_stream can read it.
+    """
+
+    _fp = None
+
+    def __init__(self, response):
+        self._response = response
+        self._chunks = response.iter_bytes()
+        self._pending = b""
+
+    def read1(self, amount):
+        if not self._pending:
+            self._pending = next(self._chunks, b"")
+        data, self._pending = self._pending[:amount], self._pending[amount:]
+        return data
+
+    def release_conn(self):
+        self._response.close()
+
+class HttpxStreamResponse:
+    """
+    Wraps an httpx streaming response with the parts of the requests.Response
+    interface that client_rest uses.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.raw = HttpxRaw(response)
+
+    def iter_lines(self):
+        pending = b""
+        for chunk in self._response.iter_bytes():
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            yield from lines
+        if pending:
+            yield pending
+        self._response.close()
+
+class HttpxSession:
+    """
+    HTTP/2 session built on httpx, exposing the get/post calls client_rest makes.
+
+    All requests to a host are multiplexed over one or a few HTTP/2 connections
+    instead of one HTTP/1.1 connection per in-flight request.
+    """
+
+    def __init__(self, verify=True, pool_size=DEFAULT_POOL_SIZE, http2=True):
+        """
+        Args:
+            verify (bool or str): True for trusted CAs, False to skip verification, or a certificate path.
+            pool_size (int): Maximum number of connections.
+            http2 (bool): Negotiate HTTP/2 (requires the `h2` package).
+        """
+        if httpx is None:
+            raise ImportError("The httpx backend requires `pip install httpx[http2]`")
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.client = httpx.Client(http2=http2, verify=verify, limits=limits, timeout=None)
+        self.verify = verify
+        self.transport_stats = TransportStats()
+        self._extensions = {"trace": self._trace}
+
+    def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self.transport_stats.connection_opened()
+        elif event_name == "connection.start_tls.complete":
+            ssl_object = info["return_value"].get_extra_info("ssl_object")
+            self.transport_stats.tls_handshake(getattr(ssl_object, "session_reused", False))
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        return self.client.post(url, headers=headers, content=data, extensions=self._extensions, timeout=timeout)
+
+    def get(self, url, stream=False, timeout=None):
+        request = self.client.build_request("GET", url, extensions=self._extensions, timeout=timeout)
+        response = self.client.send(request, stream=stream)
+        return HttpxStreamResponse(response) if stream else response
+
+def create_session(verify=True, backend="requests", pool_size=DEFAULT_POOL_SIZE, pool_block=False,
+                   tcp_keepalive=True, tls_session_reuse=True, server_hostname=None):
+    """
+    Creates an instrumented HTTP session for the REST client.
+
+    Args:
+        verify (bool or str): True for trusted CAs, False to skip verification, or a certificate path.
+        backend (str): 'requests' for HTTP/1.1 over urllib3, 'httpx' for HTTP/2 over httpx.
+        pool_size (int): Connections kept per host.
+        pool_block (bool): Wait for a free pooled connection instead of opening a throwaway one
+            ('requests' backend only).
+        tcp_keepalive (bool): Enable TCP keep-alive probes ('requests' backend only).
+        tls_session_reuse (bool): Resume TLS sessions on reconnects ('requests' backend only).
+        server_hostname (str): TLS name of the server when the URLs point elsewhere, e.g. at a relay
+            ('requests' backend only).
+
+    Returns:
+        requests.Session or HttpxSession: The session, with its counters in `session.transport_stats`.
+    """
+    if backend == "requests":
+        return create_requests_session(verify, pool_size, pool_block, tcp_keepalive, tls_session_reuse, server_hostname)
+    if backend == "httpx":
+        return HttpxSession(verify, pool_size)
+    raise ValueError(f"Unknown backend: {backend}")
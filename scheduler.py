@@ -0,0 +1,323 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import threading
+import time
+import client_rest
+import client_rpc
+from client_profile import add_profile_arguments, profiler_from_args
+from consistency import add_consistency_arguments, checker_from_args, print_consistency_summary
+from errors import STATUS_OK, ErrorCounts
+from histogram import LatencyHistogram
+from live_reporter import add_reporter_arguments, reporter_from_args
+from timeseries import FORMATS, TimeSeriesWriter
+from stream_metrics import StreamMetrics
+from multiprocess_load import make_client
+from rest_stream import DECODE_MODES
+from rest_transport import BACKENDS, DEFAULT_POOL_SIZE
+from request_policy import RequestPolicy, add_policy_arguments, policy_options_from_args
+
+PROFILES = ("constant", "poisson", "step", "ramp")
+
+def constant_arrivals(rate, duration):
+    """
+    Evenly spaced arrivals at a fixed rate.
+
+    Args:
+        rate (float): Target requests per second.
+        duration (float): Length of the schedule in seconds.
+
+    Returns:
+        list: Intended send offsets in seconds from the start of the run.
+    """
+    return [n / rate for n in range(int(rate * duration))]
+
+def poisson_arrivals(rate, duration, seed=None):
+    """
+    Arrivals of a Poisson process, i.e. exponentially distributed gaps.
+
+    Args:
+        rate (float): Mean requests per second.
+        duration (float): Length of the schedule in seconds.
+        seed (int): Seed for the inter-arrival gaps.
+
+    Returns:
+        list: Intended send offsets in seconds from the start of the run.
+    """
+    rng = random.Random(seed)
+    arrivals, offset = [], rng.expovariate(rate)
+    while offset < duration:
+        arrivals.append(offset)
+        offset += rng.expovariate(rate)
+    return arrivals
+
+def step_arrivals(stages):
+    """
+    Constant-rate stages run back to back.
+
+    Args:
+        stages (list): (rate, duration) tuples, one per stage.
+
+    Returns:
+        list: Intended send offsets in seconds from the start of the run.
+    """
+    arrivals, stage_start = [], 0.0
+    for rate, duration in stages:
+        arrivals.extend(stage_start + offset for offset in constant_arrivals(rate, duration))
+        stage_start += duration
+    return arrivals
+
+def ramp_arrivals(start_rate, end_rate, duration):
+    """
+    Arrivals whose rate grows (or shrinks) linearly from start_rate to end_rate.
+
+    Args:
+        start_rate (float): Requests per second at the start of the ramp.
+        end_rate (float): Requests per second at the end of the ramp.
+        duration (float): Length of the ramp in seconds.
+
+    Returns:
+        list: Intended send offsets in seconds from the start of the run.
+    """
+    arrivals, offset = [], 0.0
+    while offset < duration:
+        arrivals.append(offset)
+        rate = start_rate + (end_rate - start_rate) * offset / duration
+        offset += 1 / max(rate, 1e-9)
+    return arrivals
+
+def make_arrivals(profile, rate, duration, end_rate=None, stages=None, seed=None):
+    """
+    Builds the arrival schedule for the given profile.
+
+    Args:
+        profile (str): One of 'constant', 'poisson', 'step' or 'ramp'.
+        rate (float): Target (or starting, for 'ramp') requests per second.
+        duration (float): Length of the schedule in seconds, unused for 'step'.
+        end_rate (float): Final rate for the 'ramp' profile.
+        stages (list): (rate, duration) tuples for the 'step' profile.
+        seed (int): Seed for the 'poisson' profile.
+
+    Returns:
+        list: Intended send offsets in seconds from the start of the run.
+    """
+    if profile == "constant":
+        return constant_arrivals(rate, duration)
+    if profile == "poisson":
+        return poisson_arrivals(rate, duration, seed)
+    if profile == "step":
+        return step_arrivals(stages)
+    if profile == "ramp":
+        return ramp_arrivals(rate, end_rate, duration)
+    raise ValueError(f"Unknown profile: {profile}")
+
+def run_open_loop(tasks, arrivals, execute, max_workers=1000, reporter=None, recorder=None, profile=None):
+    """
+    Fires each task at its intended time regardless of how many are still in flight.
+
+    Latency is measured from the *intended* send time, not from when a worker thread
+    picked the request up, so time spent queueing inside the client while the
+    server is slow is charged to the server instead of being silently omitted.
+
+    Args:
+        tasks (list): Tasks as returned by a client's prepare_tasks.
+        arrivals (list): Intended send offsets in seconds, one per task.
+        execute (callable): Function sending a single task, e.g. client_rpc.execute_task.
+        max_workers (int): Thread pool size; should exceed rate x worst-case latency.
+        reporter (LiveReporter): Optional live reporter fed as requests finish.
+        recorder (TimeSeriesWriter): Optional per-request time series fed as requests finish.
+        profile (ClientProfile): Optional self-profile; gets how late each request was sent.
+
+    Returns:
+        dict: Per-operation latency histograms (from intended and from actual send time),
+            failure counts, failures by kind, query streaming metrics, and the target vs.
+            achieved rates.
+    """
+    results = {
+        op: {"latency": LatencyHistogram(), "service_time": LatencyHistogram(), "failed": 0}
+        for op in ("register", "query")
+    }
+    query_stream_metrics = StreamMetrics()
+    errors = ErrorCounts()
+    lock = threading.Lock()
+    max_send_lag = 0.0
+
+    def timed_call(task, intended_time):
+        send_time = time.perf_counter()
+        if profile is not None:
+            profile.record_queue_lag(send_time - intended_time)
+        result = execute(task)
+        end_time = time.perf_counter()
+        failed = result[1] != STATUS_OK
+        errors.record(task[0], result[1])
+        op = results[task[0]]
+        op["latency"].record(end_time - intended_time)
+        op["service_time"].record(end_time - send_time)
+        if task[0] == 'query':
+            query_stream_metrics.record(result[2])
+        if reporter is not None:
+            reporter.record(task[0], end_time - intended_time, result[1])
+        if recorder is not None:
+            # The time series keeps wall-clock times; move the intended time onto that clock.
+            recorder.record_result(task, result, intended_time=time.time() - (time.perf_counter() - intended_time))
+        if failed:
+            with lock:
+                op["failed"] += 1
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        start_time = time.perf_counter()
+        for task, offset in zip(tasks, arrivals):
+            intended_time = start_time + offset
+            delay = intended_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_send_lag = max(max_send_lag, -delay)
+            executor.submit(timed_call, task, intended_time)
+        dispatch_time = time.perf_counter() - start_time
+
+    elapsed = time.perf_counter() - start_time
+    sent = min(len(tasks), len(arrivals))
+    # N sends span N - 1 gaps; dividing N by the span would overstate the rate by N / (N - 1).
+    schedule_duration = arrivals[sent - 1] - arrivals[0] if sent > 1 else 0.0
+    return {
+        "register": results["register"],
+        "query": results["query"],
+        "query_stream_metrics": query_stream_metrics,
+        "errors": errors,
+        "requests": sent,
+        "target_rate": (sent - 1) / schedule_duration if schedule_duration else 0.0,
+        "send_rate": (sent - 1) / (dispatch_time - arrivals[0]) if sent > 1 and dispatch_time > arrivals[0] else 0.0,
+        "achieved_rate": sent / elapsed if elapsed else 0.0,
+        "max_send_lag": max_send_lag,
+        "elapsed": elapsed,
+    }
+
+def save_summary_to_json(summary, directory="data", filename="open_loop_summary.json"):
+    """
+    Saves the rate summary of an open-loop run to a JSON file.
+
+    Args:
+        summary (dict): Summary as returned by run_open_loop, without the latency histograms.
+        directory (str): Directory to save the file in.
+        filename (str): Name of the JSON file.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    filepath = os.path.join(directory, filename)
+    with open(filepath, 'w') as f:
+        json.dump(summary, f, indent=4)
+    print(f"Summary saved to {filepath}")
+
+def parse_stages(value):
+    """
+    Parses a 'rate:duration,rate:duration' stage list.
+
+    Args:
+        value (str): The stage list.
+
+    Returns:
+        list: (rate, duration) tuples.
+    """
+    return [tuple(float(part) for part in stage.split(":")) for stage in value.split(",")]
+
+def main():
+    """
+    Main function to run an open-loop, fixed-arrival-rate load test and save the results.
+    """
+    parser = argparse.ArgumentParser(description="Send requests at a target arrival rate (open loop).")
+    parser.add_argument("transport", choices=["grpc", "rest"])
+    parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    parser.add_argument("--profile", choices=PROFILES, default="constant")
+    parser.add_argument("--rate", type=float, default=100.0, help="Requests per second (start rate for 'ramp').")
+    parser.add_argument("--end-rate", type=float, default=None, help="Final rate for the 'ramp' profile.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds, unused for the 'step' profile.")
+    parser.add_argument("--stages", type=parse_stages, default=None, help="'rate:seconds,...' for the 'step' profile.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--entries-per-register", type=int, default=3)
+    parser.add_argument("--max-workers", type=int, default=1000)
+    parser.add_argument("--cert", default=None, help="Path to a self-signed certificate.")
+    parser.add_argument("--insecure", action="store_true")
+    parser.add_argument("--http-backend", choices=BACKENDS, default="requests", help="REST transport backend.")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="REST connections per host.")
+    parser.add_argument("--decode-mode", choices=DECODE_MODES, default=None, help="REST stream decoder (default: iter_lines + json).")
+    add_reporter_arguments(parser)
+    add_policy_arguments(parser)
+    add_consistency_arguments(parser)
+    add_profile_arguments(parser)
+    client_rpc.add_channel_arguments(parser)
+    parser.add_argument("--timeseries", default=None, help="Record every request to this file (columnar time series).")
+    parser.add_argument("--timeseries-format", choices=FORMATS, default=None, help="Defaults to parquet if pyarrow is installed, else npz.")
+    args = parser.parse_args()
+    if args.profile == "ramp" and args.end_rate is None:
+        parser.error("--profile ramp needs --end-rate")
+    if args.profile == "step" and not args.stages:
+        parser.error("--profile step needs --stages")
+    client_rpc.LOG_REQUESTS = client_rest.LOG_REQUESTS = args.log_requests
+    checker = client_rpc.CONSISTENCY_CHECKER = client_rest.CONSISTENCY_CHECKER = checker_from_args(args)
+
+    server_url = args.server_url
+    if server_url is None:
+        server_url = "<your_ec_domain>:50050" if args.transport == "grpc" else "https://<your_ec_domain>:8081"
+
+    arrivals = make_arrivals(args.profile, args.rate, args.duration, end_rate=args.end_rate, stages=args.stages, seed=args.seed)
+    session_options = {"backend": args.http_backend, "pool_size": args.pool_size}
+    module, client = make_client(args.transport, server_url, args.cert, args.insecure, session_options,
+                                 client_rpc.channel_options_from_args(args))
+
+    print("Making 1st request for TLS handshake!")
+    if args.transport == "grpc":
+        client_rpc.query_aggregated_mission_control(client, 0)
+        tasks = client_rpc.prepare_tasks(client, len(arrivals), args.entries_per_register, verbose=False)
+    else:
+        client_rest.query_aggregated_mission_control(client, server_url, 0)
+        tasks = client_rest.prepare_tasks(client, server_url, len(arrivals), args.entries_per_register, verbose=False,
+                                          decode_mode=args.decode_mode)
+
+    print(f"Sending {len(tasks)} requests with a {args.profile} arrival profile")
+    reporter = reporter_from_args(args)
+    if reporter is not None:
+        reporter.start()
+    recorder = TimeSeriesWriter(args.timeseries, args.timeseries_format) if args.timeseries else None
+    policy = RequestPolicy(**policy_options_from_args(args))
+    profiler = profiler_from_args(args)
+    profile = client_rpc.CLIENT_PROFILE = client_rest.CLIENT_PROFILE = profiler.profile if profiler is not None else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        summary = run_open_loop(tasks, arrivals, policy.wrap(module.execute_task), max_workers=args.max_workers,
+                                reporter=reporter, recorder=recorder, profile=profile)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        policy.close()
+        if reporter is not None:
+            reporter.stop()
+        if recorder is not None:
+            recorder.close()
+    print(f"Target Rate: {summary['target_rate']:.1f} req/s, Send Rate: {summary['send_rate']:.1f} req/s, "
+          f"Achieved Rate: {summary['achieved_rate']:.1f} req/s, Max Send Lag: {summary['max_send_lag']:.4f}s")
+
+    register, query = summary.pop("register"), summary.pop("query")
+    query_stream_metrics, errors = summary.pop("query_stream_metrics"), summary.pop("errors")
+    summary["register_service_time"] = register["service_time"].summary()
+    summary["query_service_time"] = query["service_time"].summary()
+    if checker is not None:
+        print_consistency_summary(checker)
+        summary["consistency"] = checker.summary()
+    save_summary_to_json(summary, filename=f"{args.transport}_open_loop_summary.json")
+    results = (register["latency"], query["latency"], register["failed"], query["failed"], query_stream_metrics, errors,
+               summary["elapsed"])
+    filename = f"{args.transport}_open_loop_response_times.json"
+    if args.transport == "grpc":
+        client_rpc.report_results(*results, mc_entries_per_register=args.entries_per_register, filename=filename,
+                                  policy_stats=policy.stats, client_profile=profile)
+    else:
+        client_rest.report_results(*results, mc_entries_per_register=args.entries_per_register, filename=filename,
+                                   transport_stats=client.transport_stats, policy_stats=policy.stats, client_profile=profile)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+import argparse
+import threading
+import time
+import client_rpc
+from capacity import build_task_pools, parse_mix, run_rate_step
+from errors import STATUS_OK, classify_exception
+from external_coordinator_pb2 import QueryAggregatedMissionControlRequest
+from histogram import LatencyHistogram
+from multiprocess_load import make_client
+from request_policy import RequestPolicy, add_policy_arguments, policy_options_from_args, print_policy_stats
+from rest_stream import DECODE_MODES
+from rest_transport import BACKENDS, DEFAULT_POOL_SIZE
+from stream_metrics import StreamStats
+from scheduler import save_summary_to_json
+
+SUMMARY_VERSION = 1
+OUTCOMES = ("completed", "abandoned", "cancelled", "failed")
+DEFAULT_SHARES = (0.0, 0.1, 0.25, 0.5)
+# Bytes requests reads from the socket per iter_lines() step, the same as its default.
+DEFAULT_READ_CHUNK = 512
+
+class ReadThrottle:
+    """
+    Decides how a slow reader consumes a query stream.
+
+    The reader calls after_message with the size of every message it took off the
+    stream; the throttle sleeps to hold the read rate down and tells the reader when
+    to stop. Sleeps wake up early when the stop event is set, so a step can end
+    without waiting for slow streams to drain.
+    """
+
+    def __init__(self, bytes_per_second=None, message_pause=0.0, abandon_after=None, abandon_hold=30.0,
+                 cancel_after_first=False, stop=None):
+        """
+        Args:
+            bytes_per_second (float): Read rate to hold the stream to, None for no limit.
+            message_pause (float): Extra seconds to wait after every message.
+            abandon_after (int): Stop reading after this many messages but keep the stream open,
+                as a client that hangs midway does. None to read to the end.
+            abandon_hold (float): Seconds an abandoned stream is held open before it is closed.
+            cancel_after_first (bool): Cancel the stream right after the first message.
+            stop (threading.Event): Ends pauses and held streams early when set.
+        """
+        self.bytes_per_second = bytes_per_second
+        self.message_pause = message_pause
+        self.abandon_after = abandon_after
+        self.abandon_hold = abandon_hold
+        self.cancel_after_first = cancel_after_first
+        self.stop = stop or threading.Event()
+
+    def start(self):
+        """
+        Resets the read rate accounting at the start of a stream.
+        """
+        self._start = time.perf_counter()
+        self._bytes = 0
+        self._messages = 0
+
+    def after_message(self, num_bytes):
+        """
+        Waits as long as the throttle asks for after reading a message.
+
+        Args:
+            num_bytes (int): Size of the message just read.
+
+        Returns:
+            str: None to keep reading, or 'abandoned' or 'cancelled' once the reader should stop.
+        """
+        self._bytes += num_bytes
+        self._messages += 1
+        if self.cancel_after_first:
+            return "cancelled"
+        delay = self.message_pause
+        if self.bytes_per_second:
+            delay = max(delay, self._start + self._bytes / self.bytes_per_second - time.perf_counter())
+        if delay > 0 and self.stop.wait(delay):
+            return "cancelled"
+        if self.abandon_after is not None and self._messages >= self.abandon_after:
+            self.stop.wait(self.abandon_hold)
+            return "abandoned"
+        return None
+
+def slow_query_grpc(stub, throttle, timeout=None):
+    """
+    Runs one QueryAggregatedMissionControl stream at the pace of a throttle.
+
+    Args:
+        stub (PreSerializedStub): The gRPC stub, on a channel of this reader's own.
+        throttle (ReadThrottle): How to read the stream.
+        timeout (float): Deadline of the whole stream in seconds, None to wait forever.
+
+    Returns:
+        tuple: Time the stream was open, status code, StreamStats of the messages read and
+            the outcome, one of OUTCOMES.
+    """
+    stats = StreamStats()
+    start_time = time.perf_counter()
+    throttle.start()
+    outcome = "completed"
+    try:
+        responses = stub.QueryAggregatedMissionControl(QueryAggregatedMissionControlRequest(), timeout=timeout)
+        for response in responses:
+            num_bytes = response.ByteSize()
+            stats.add_message(time.perf_counter() - start_time, len(response.pairs), num_bytes)
+            outcome = throttle.after_message(num_bytes) or outcome
+            if outcome != "completed":
+                responses.cancel()
+                break
+    except Exception as e:
+        elapsed = time.perf_counter() - start_time
+        return elapsed, classify_exception(e), stats.finish(elapsed), "failed"
+    elapsed = time.perf_counter() - start_time
+    return elapsed, STATUS_OK, stats.finish(elapsed), outcome
+
+def slow_query_rest(session, server_url, throttle, timeout=None, read_chunk=DEFAULT_READ_CHUNK):
+    """
+    Runs one REST query stream through iter_lines() at the pace of a throttle.
+
+    Args:
+        session (requests.Session): The HTTP session, of this reader's own.
+        server_url (str): The server URL.
+        throttle (ReadThrottle): How to read the stream.
+        timeout (float): Seconds to wait for the connection and for each read, None to wait forever.
+        read_chunk (int): Bytes read from the socket at a time.
+
+    Returns:
+        tuple: Time the stream was open, status code, StreamStats of the messages read and
+            the outcome, one of OUTCOMES.
+    """
+    stats = StreamStats()
+    start_time = time.perf_counter()
+    throttle.start()
+    outcome = "completed"
+    try:
+        response = session.get(f"{server_url}/v1/query_aggregated_mission_control", stream=True, timeout=timeout)
+        # Closing a response that was not read to the end drops its connection instead of reusing it.
+        with response:
+            if response.status_code != STATUS_OK:
+                elapsed = time.perf_counter() - start_time
+                return elapsed, response.status_code, stats.finish(elapsed), "failed"
+            for line in response.iter_lines(chunk_size=read_chunk):
+                if not line:
+                    continue
+                stats.add_message(time.perf_counter() - start_time, line.count(b'"nodeFrom"'), len(line) + 1)
+                outcome = throttle.after_message(len(line) + 1) or outcome
+                if outcome != "completed":
+                    break
+    except Exception as e:
+        elapsed = time.perf_counter() - start_time
+        return elapsed, classify_exception(e), stats.finish(elapsed), "failed"
+    elapsed = time.perf_counter() - start_time
+    return elapsed, STATUS_OK, stats.finish(elapsed), outcome
+
+class SlowReaders:
+    """
+    A group of slow readers, each on its own connection, querying in a loop until stopped.
+    """
+
+    def __init__(self, clients, query, throttle_options, close=None):
+        """
+        Args:
+            clients (list): (stub or session, server_url) per reader.
+            query (callable): slow_query_grpc-like function taking (client, server_url, throttle).
+            throttle_options (dict): Keyword arguments for ReadThrottle.
+            close (callable): Closes a reader's stub or session once it has stopped, None to leave it open.
+        """
+        self.clients = clients
+        self.query = query
+        self.close = close
+        self.stop = threading.Event()
+        self.throttle_options = throttle_options
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.bytes = 0
+        self.open_time = LatencyHistogram()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _read(self, client, server_url):
+        throttle = ReadThrottle(stop=self.stop, **self.throttle_options)
+        while not self.stop.is_set():
+            elapsed, _, stats, outcome = self.query(client, server_url, throttle)
+            with self._lock:
+                self.outcomes[outcome] += 1
+                self.bytes += stats.bytes
+                self.open_time.record(elapsed)
+            if outcome == "failed":
+                # Back off so a refused reader does not turn into a request flood.
+                self.stop.wait(0.1)
+
+    def start(self):
+        """
+        Starts one thread per reader.
+        """
+        for client, server_url in self.clients:
+            thread = threading.Thread(target=self._read, args=(client, server_url), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop_and_join(self):
+        """
+        Stops the readers, cancelling the streams they have open, and closes their connections.
+        """
+        self.stop.set()
+        for thread in self._threads:
+            thread.join()
+        if self.close is not None:
+            for client, _ in self.clients:
+                self.close(client)
+
+    def summary(self, elapsed):
+        """
+        Args:
+            elapsed (float): Seconds the readers were running.
+
+        Returns:
+            dict: Streams by outcome, read rate per reader and how long streams were open.
+        """
+        return {
+            "readers": len(self.clients),
+            "streams": dict(self.outcomes),
+            "read_rate": self.bytes / elapsed / len(self.clients) if self.clients and elapsed else 0.0,
+            "open_time": self.open_time.summary(),
+        }
+
+def make_slow_readers(transport, server_url, count, cert, insecure, channel_options, throttle_options, timeout, read_chunk):
+    """
+    Connects the slow readers of a step, each with a connection of its own.
+
+    A slow reader that shared a connection with the measured traffic would stall it
+    in the client, through the connection's flow-control window or the session's pool.
+
+    Args:
+        transport (str): Either 'grpc' or 'rest'.
+        server_url (str): The server address.
+        count (int): Number of readers.
+        cert (str): Optional path to a self-signed certificate.
+        insecure (bool): Use a plaintext channel (gRPC) or skip verification (REST).
+        channel_options (dict): gRPC flow control and message size options, see client_rpc.channel_options.
+        throttle_options (dict): Keyword arguments for ReadThrottle.
+        timeout (float): Deadline or read timeout of every stream, None to wait forever.
+        read_chunk (int): Bytes read from the socket at a time (REST).
+
+    Returns:
+        SlowReaders: The unstarted readers; stop_and_join closes their connections.
+    """
+    clients = []
+    for _ in range(count):
+        _, client = make_client(transport, server_url, cert, insecure, {"pool_size": 1},
+                                {**channel_options, "own_connection": True})
+        clients.append((client, server_url))
+    if transport == 'grpc':
+        def query(stub, _, throttle):
+            return slow_query_grpc(stub, throttle, timeout)
+
+        def close(stub):
+            stub.channel.close()
+    else:
+        def query(session, url, throttle):
+            return slow_query_rest(session, url, throttle, timeout, read_chunk)
+
+        def close(session):
+            session.close()
+    return SlowReaders(clients, query, throttle_options, close)
+
+def run_share_step(share, clients, make_readers, pools, register_fraction, execute, rate, window, warmup, max_workers):
+    """
+    Measures the regular traffic while a share of the clients read their query streams slowly.
+
+    Args:
+        share (float): Fraction of the clients that are slow readers.
+        clients (int): Number of clients the share applies to.
+        make_readers (callable): Returns the SlowReaders for a number of readers.
+        pools (dict): Task pools of the regular traffic, see capacity.build_task_pools.
+        register_fraction (float): Fraction of regular requests that are registers.
+        execute (callable): Function sending a single task, e.g. client_rpc.execute_task.
+        rate (float): Arrival rate of the regular traffic in requests per second.
+        window (float): Seconds the regular traffic is measured for.
+        warmup (float): Seconds the slow readers run before the measurement starts.
+        max_workers (int): Thread pool size of the open-loop scheduler.
+
+    Returns:
+        dict: Latency, throughput and errors of the regular traffic, and the slow readers' summary.
+    """
+    readers = make_readers(round(share * clients))
+    start_time = time.perf_counter()
+    readers.start()
+    time.sleep(warmup if readers.clients else 0)
+    step = run_rate_step(pools, register_fraction, execute, rate, window, max_workers)
+    readers.stop_and_join()
+    elapsed = max(step["elapsed"], 1e-9)
+    result = {"share": share, "slow_readers": readers.summary(time.perf_counter() - start_time)}
+    for op in ("register", "query"):
+        stats = step[op]
+        result[op] = {
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "throughput": (stats["completed"] - stats["failed"]) / elapsed,
+            "latency": stats["latency"].summary(),
+        }
+    return result
+
+def print_share_step(result, baseline):
+    """
+    Prints one line per step, with p99 latencies relative to the first step.
+
+    Args:
+        result (dict): The step as returned by run_share_step.
+        baseline (dict): The first step, usually without slow readers, or None.
+    """
+    parts = []
+    for op in ("register", "query"):
+        if not result[op]["completed"]:
+            continue
+        p99 = result[op]["latency"]["p99"]
+        ratio = ""
+        if baseline is not None and baseline[op]["latency"]["p99"]:
+            ratio = f" (x{p99 / baseline[op]['latency']['p99']:.2f})"
+        parts.append(f"{op} p99 {p99:.4f}s{ratio}, {result[op]['failed']} failed")
+    streams = ", ".join(f"{count} {outcome}" for outcome, count in result["slow_readers"]["streams"].items() if count)
+    print(f"Slow share {result['share']:.0%} ({result['slow_readers']['readers']} readers): " + ", ".join(parts) +
+          f" | slow streams: {streams or 'none'}")
+
+def parse_shares(value):
+    """
+    Args:
+        value (str): Comma-separated fractions, e.g. '0,0.1,0.5'.
+
+    Returns:
+        list: The shares as floats.
+    """
+    return [float(share) for share in value.split(",")]
+
+def main():
+    """
+    Main function to measure how slow query readers degrade the coordinator for everyone else.
+    """
+    parser = argparse.ArgumentParser(description="Measure the impact of slow query stream readers on other clients.")
+    parser.add_argument("transport", choices=["grpc", "rest"])
+    parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    parser.add_argument("--clients", type=int, default=50, help="Clients the slow-reader shares apply to.")
+    parser.add_argument("--shares", type=parse_shares, default=list(DEFAULT_SHARES), help="Comma-separated fractions of slow readers.")
+    parser.add_argument("--rate", type=float, default=50.0, help="Requests per second of the regular traffic.")
+    parser.add_argument("--mix", default="1:1", help="'register', 'query' or 'register:query' mix of the regular traffic.")
+    parser.add_argument("--window", type=float, default=10.0, help="Seconds the regular traffic is measured per step.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds the slow readers run before each measurement.")
+    parser.add_argument("--read-rate", type=float, default=None, help="Slow readers' read rate in bytes per second.")
+    parser.add_argument("--message-pause", type=float, default=0.0, help="Seconds slow readers wait after every message.")
+    parser.add_argument("--abandon-after", type=int, default=None, help="Stop reading after this many messages and hold the stream.")
+    parser.add_argument("--abandon-hold", type=float, default=30.0, help="Seconds an abandoned stream is held open.")
+    parser.add_argument("--cancel-after-first", action="store_true", help="Cancel every slow stream after its first message.")
+    parser.add_argument("--read-chunk", type=int, default=DEFAULT_READ_CHUNK, help="Bytes per socket read of REST slow readers.")
+    parser.add_argument("--slow-timeout", type=float, default=None, help="Deadline of every slow stream in seconds.")
+    client_rpc.add_channel_arguments(parser)
+    parser.add_argument("--entries-per-register", type=int, default=3)
+    parser.add_argument("--pool-tasks", type=int, default=1000, help="Prepared tasks per operation, reused across steps.")
+    parser.add_argument("--max-workers", type=int, default=1000)
+    parser.add_argument("--cert", default=None, help="Path to a self-signed certificate.")
+    parser.add_argument("--insecure", action="store_true")
+    parser.add_argument("--http-backend", choices=BACKENDS, default="requests", help="REST transport backend of the regular traffic.")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="REST connections per host.")
+    parser.add_argument("--decode-mode", choices=DECODE_MODES, default=None, help="REST stream decoder of the regular traffic.")
+    add_policy_arguments(parser)
+    args = parser.parse_args()
+
+    server_url = args.server_url
+    if server_url is None:
+        server_url = "<your_ec_domain>:50050" if args.transport == "grpc" else "https://<your_ec_domain>:8081"
+    channel_options = client_rpc.channel_options_from_args(args)
+    module, client = make_client(args.transport, server_url, args.cert, args.insecure,
+                                 {"backend": args.http_backend, "pool_size": args.pool_size}, channel_options)
+
+    print("Making 1st request for TLS handshake!")
+    pools = build_task_pools(args.transport, client, server_url, args.pool_tasks, args.entries_per_register,
+                             decode_mode=args.decode_mode)
+    throttle_options = {"bytes_per_second": args.read_rate, "message_pause": args.message_pause,
+                        "abandon_after": args.abandon_after, "abandon_hold": args.abandon_hold,
+                        "cancel_after_first": args.cancel_after_first}
+
+    def make_readers(count):
+        return make_slow_readers(args.transport, server_url, count, args.cert, args.insecure, channel_options,
+                                 throttle_options, args.slow_timeout, args.read_chunk)
+
+    # The policy applies to the regular traffic; slow streams have --slow-timeout.
+    policy = RequestPolicy(**policy_options_from_args(args))
+    execute = policy.wrap(module.execute_task)
+    steps, baseline = [], None
+    try:
+        for share in args.shares:
+            result = run_share_step(share, args.clients, make_readers, pools, parse_mix(args.mix), execute,
+                                    args.rate, args.window, args.warmup, args.max_workers)
+            print_share_step(result, baseline)
+            baseline = baseline or result
+            steps.append(result)
+    finally:
+        policy.close()
+    print_policy_stats(policy.stats)
+
+    save_summary_to_json({
+        "version": SUMMARY_VERSION,
+        "timestamp": int(time.time()),
+        "transport": args.transport,
+        "server_url": server_url,
+        "clients": args.clients,
+        "rate": args.rate,
+        "mix": args.mix,
+        "window": args.window,
+        "throttle": throttle_options,
+        "channel_options": channel_options,
+        "request_policy": policy.stats.summary(),
+        "steps": steps,
+    }, filename=f"{args.transport}_slow_consumers.json")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import threading
+import time
+import client_rest
+import client_rpc
+from client_profile import add_profile_arguments, profiler_from_args
+from errors import STATUS_OK, ErrorCounts
+from histogram import LatencyHistogram
+from live_reporter import add_reporter_arguments, reporter_from_args
+from multiprocess_load import make_client
+from node_corpus import NodeCorpus
+from request_policy import RequestPolicy, add_policy_arguments, policy_options_from_args
+from rest_stream import DECODE_MODES
+from rest_transport import BACKENDS, DEFAULT_POOL_SIZE
+from stream_metrics import StreamMetrics
+
+CHECKPOINT_VERSION = 1
+DURATION_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+def parse_duration(value):
+    """
+    Args:
+        value (str): Seconds, or a number followed by 's', 'm', 'h' or 'd' (e.g. '24h').
+
+    Returns:
+        float: The duration in seconds.
+    """
+    if value[-1] in DURATION_UNITS:
+        return float(value[:-1]) * DURATION_UNITS[value[-1]]
+    return float(value)
+
+def current_rss():
+    """
+    Returns:
+        int: Resident memory of this process in bytes, or None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+class SoakState:
+    """
+    Cumulative and per-window aggregates of a soak run.
+
+    Everything is kept in fixed-size histograms and counters, so memory does not grow
+    with the number of requests; the whole state is written to the checkpoint file.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.elapsed = 0.0
+        self.windows = 0
+        self.totals = {op: {"latency": LatencyHistogram(), "failed": 0} for op in ("register", "query")}
+        self.query_stream_metrics = StreamMetrics()
+        self.errors = ErrorCounts()
+        self._window = self._new_window()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_window():
+        return {op: {"latency": LatencyHistogram(), "failed": 0} for op in ("register", "query")}
+
+    def record(self, op, result):
+        """
+        Records a finished request. Safe to call from any thread.
+
+        Args:
+            op (str): 'register' or 'query'.
+            result (tuple): The result of the register or query call.
+        """
+        failed = result[1] != STATUS_OK
+        self.errors.record(op, result[1])
+        if op == 'query':
+            self.query_stream_metrics.record(result[2])
+        with self._lock:
+            self.requests += 1
+            for aggregate in (self.totals[op], self._window[op]):
+                aggregate["latency"].record(result[0])
+                aggregate["failed"] += failed
+
+    def close_window(self, start_time, end_time):
+        """
+        Summarizes the requests finished since the last call and starts a new window.
+
+        Args:
+            start_time (float): Wall-clock start of the window.
+            end_time (float): Wall-clock end of the window.
+
+        Returns:
+            dict: Per-operation rate, failures and latency of the window, and the client's memory.
+        """
+        with self._lock:
+            window, self._window = self._window, self._new_window()
+            self.windows += 1
+        duration = max(end_time - start_time, 1e-9)
+        summary = {"window": self.windows, "start": start_time, "end": end_time, "elapsed": self.elapsed,
+                   "client_rss_bytes": current_rss()}
+        for op, aggregate in window.items():
+            summary[op] = {
+                "requests": aggregate["latency"].count,
+                "failed": aggregate["failed"],
+                "rps": aggregate["latency"].count / duration,
+                "latency": aggregate["latency"].summary(),
+            }
+        return summary
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: The cumulative state in a JSON-serialisable form.
+        """
+        with self._lock:
+            return {
+                "version": CHECKPOINT_VERSION,
+                "requests": self.requests,
+                "elapsed": self.elapsed,
+                "windows": self.windows,
+                "totals": {op: {"latency": aggregate["latency"].to_dict(), "failed": aggregate["failed"]}
+                           for op, aggregate in self.totals.items()},
+                "query_stream_metrics": self.query_stream_metrics.to_dict(),
+                "errors": self.errors.to_dict(),
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Args:
+            data (dict): A dict produced by to_dict.
+
+        Returns:
+            SoakState: The restored state.
+        """
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version: {data.get('version')}")
+        state = cls()
+        state.requests = data["requests"]
+        state.elapsed = data["elapsed"]
+        state.windows = data["windows"]
+        for op, aggregate in data["totals"].items():
+            state.totals[op] = {"latency": LatencyHistogram.from_dict(aggregate["latency"]), "failed": aggregate["failed"]}
+        state.query_stream_metrics = StreamMetrics.from_dict(data["query_stream_metrics"])
+        state.errors = ErrorCounts.from_dict(data["errors"])
+        return state
+
+def save_checkpoint(state, path):
+    """
+    Writes the state atomically, so a crash mid-write leaves the previous checkpoint intact.
+
+    Args:
+        state (SoakState): The state to save.
+        path (str): Checkpoint file.
+    """
+    with open(path + ".tmp", 'w') as f:
+        json.dump(state.to_dict(), f)
+    os.replace(path + ".tmp", path)
+
+def load_checkpoint(path):
+    """
+    Args:
+        path (str): Checkpoint file written by save_checkpoint.
+
+    Returns:
+        SoakState: The restored state, or a fresh one if there is no checkpoint yet.
+    """
+    if not os.path.exists(path):
+        return SoakState()
+    with open(path) as f:
+        return SoakState.from_dict(json.load(f))
+
+def print_window(window):
+    """
+    Prints the one-line summary of a checkpoint window.
+
+    Args:
+        window (dict): The window as returned by SoakState.close_window.
+    """
+    parts = [f"{op}: {window[op]['rps']:.0f} req/s, {window[op]['failed']} failed, "
+             f"p50 {window[op]['latency']['p50']:.4f}s, p99 {window[op]['latency']['p99']:.4f}s"
+             for op in ("register", "query")]
+    rss = f"{window['client_rss_bytes'] / 1e6:.0f} MB" if window["client_rss_bytes"] is not None else "n/a"
+    print(f"[{window['elapsed'] / 3600:6.2f}h] window {window['window']} | " + " | ".join(parts) + f" | client RSS {rss}")
+
+def run_soak(tasks, execute, state, duration, max_in_flight, checkpoint_path, windows_path, checkpoint_interval=60.0,
+             rate=None, reporter=None, profile=None):
+    """
+    Sends tasks from a generator for the given duration with a bounded number of requests in flight.
+
+    Only the in-flight requests are held in memory: a task is generated when a slot is
+    free and dropped as soon as its result has been recorded. Every checkpoint_interval
+    the window is appended to the windows file and the cumulative state is saved, so an
+    interrupted run can be resumed from the last checkpoint.
+
+    Args:
+        tasks (iterator): Tasks, e.g. from a client's generate_tasks.
+        execute (callable): Function sending a single task, e.g. client_rpc.execute_task.
+        state (SoakState): State to add to, fresh or loaded from a checkpoint.
+        duration (float): Total length of the run in seconds, including time already run before a resume.
+        max_in_flight (int): Maximum number of requests in flight.
+        checkpoint_path (str): File the state is saved to.
+        windows_path (str): JSON lines file the per-window summaries are appended to.
+        checkpoint_interval (float): Seconds between checkpoints.
+        rate (float): Optional target requests per second; without it every free slot is refilled at once.
+        reporter (LiveReporter): Optional live reporter fed as requests finish.
+        profile (ClientProfile): Optional self-profile; gets how long each task waited for a thread.
+
+    Returns:
+        SoakState: The final state.
+    """
+    slots = threading.BoundedSemaphore(max_in_flight)
+
+    def timed_call(task, submit_time):
+        profile.record_queue_lag(time.perf_counter() - submit_time)
+        return execute(task)
+
+    def finished(op, future):
+        # The slot is freed even if the task raised, or the sender would block on it forever.
+        try:
+            result = future.result()
+            state.record(op, result)
+            if reporter is not None:
+                reporter.record(op, result[0], result[1])
+        finally:
+            slots.release()
+
+    resumed_elapsed = state.elapsed
+    start_time = window_start = time.time()
+    sent = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight) as executor, open(windows_path, 'a') as windows_file:
+        def checkpoint(now):
+            state.elapsed = resumed_elapsed + now - start_time
+            window = state.close_window(window_start, now)
+            windows_file.write(json.dumps(window) + "\n")
+            windows_file.flush()
+            save_checkpoint(state, checkpoint_path)
+            print_window(window)
+
+        try:
+            for task in tasks:
+                now = time.time()
+                if resumed_elapsed + now - start_time >= duration:
+                    break
+                if now - window_start >= checkpoint_interval:
+                    checkpoint(now)
+                    window_start = now
+                if rate:
+                    delay = start_time + sent / rate - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                slots.acquire()
+                future = executor.submit(execute, task) if profile is None else executor.submit(timed_call, task, time.perf_counter())
+                future.add_done_callback(lambda future, op=task[0]: finished(op, future))
+                sent += 1
+        except KeyboardInterrupt:
+            print("Interrupted, waiting for the requests in flight")
+        executor.shutdown(wait=True)
+        checkpoint(time.time())
+    return state
+
+def main():
+    """
+    Main function to run, or resume, a long soak test with flat client memory.
+    """
+    parser = argparse.ArgumentParser(description="Run a long soak test with bounded memory and periodic checkpoints.")
+    parser.add_argument("transport", choices=["grpc", "rest"])
+    parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    parser.add_argument("--duration", type=parse_duration, default=parse_duration("1h"), help="Total run time, e.g. 3600, 90m or 24h.")
+    parser.add_argument("--max-in-flight", type=int, default=100, help="Maximum requests in flight.")
+    parser.add_argument("--rate", type=float, default=None, help="Target requests per second (default: as fast as the in-flight limit allows).")
+    parser.add_argument("--checkpoint-interval", type=parse_duration, default=60.0, help="Seconds between checkpoints.")
+    parser.add_argument("--state", default=None, help="Path prefix of the checkpoint and windows files (default data/<transport>_soak).")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint instead of starting over.")
+    parser.add_argument("--entries-per-register", type=int, default=3)
+    parser.add_argument("--corpus", default=None, help="Node-key corpus built with node_corpus.py.")
+    parser.add_argument("--cert", default=None, help="Path to a self-signed certificate.")
+    parser.add_argument("--insecure", action="store_true")
+    parser.add_argument("--http-backend", choices=BACKENDS, default="requests", help="REST transport backend.")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="REST connections per host.")
+    parser.add_argument("--decode-mode", choices=DECODE_MODES, default=None, help="REST stream decoder (default: iter_lines + json).")
+    add_reporter_arguments(parser)
+    add_policy_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    client_rpc.LOG_REQUESTS = client_rest.LOG_REQUESTS = args.log_requests
+
+    server_url = args.server_url
+    if server_url is None:
+        server_url = "<your_ec_domain>:50050" if args.transport == "grpc" else "https://<your_ec_domain>:8081"
+    prefix = args.state or os.path.join("data", f"{args.transport}_soak")
+    directory = os.path.dirname(prefix)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    checkpoint_path, windows_path = prefix + ".checkpoint.json", prefix + "_windows.jsonl"
+    if not args.resume:
+        for path in (checkpoint_path, windows_path):
+            if os.path.exists(path):
+                os.remove(path)
+    state = load_checkpoint(checkpoint_path)
+    if state.requests:
+        print(f"Resuming after {state.requests} requests and {state.elapsed:.0f}s")
+
+    session_options = {"backend": args.http_backend, "pool_size": args.pool_size}
+    module, client = make_client(args.transport, server_url, args.cert, args.insecure, session_options)
+    corpus = NodeCorpus(args.corpus) if args.corpus else None
+
+    print("Making 1st request for TLS handshake!")
+    if args.transport == "grpc":
+        client_rpc.query_aggregated_mission_control(client, 0)
+        tasks = client_rpc.generate_tasks(client, args.entries_per_register, corpus=corpus, first_request=state.requests + 1)
+    else:
+        client_rest.query_aggregated_mission_control(client, server_url, 0)
+        tasks = client_rest.generate_tasks(client, server_url, args.entries_per_register, corpus=corpus,
+                                           decode_mode=args.decode_mode, first_request=state.requests + 1)
+
+    print(f"Soaking for {args.duration:.0f}s with up to {args.max_in_flight} requests in flight")
+    reporter = reporter_from_args(args)
+    if reporter is not None:
+        reporter.start()
+    policy = RequestPolicy(**policy_options_from_args(args))
+    profiler = profiler_from_args(args)
+    profile = client_rpc.CLIENT_PROFILE = client_rest.CLIENT_PROFILE = profiler.profile if profiler is not None else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        state = run_soak(tasks, policy.wrap(module.execute_task), state, args.duration, args.max_in_flight, checkpoint_path,
+                         windows_path, args.checkpoint_interval, args.rate, reporter, profile)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        policy.close()
+        if reporter is not None:
+            reporter.stop()
+    print(f"Windows saved to {windows_path}, checkpoint saved to {checkpoint_path}")
+
+    register, query = state.totals["register"], state.totals["query"]
+    results = (register["latency"], query["latency"], register["failed"], query["failed"], state.query_stream_metrics,
+               state.errors, state.elapsed)
+    filename = f"{os.path.basename(prefix)}_response_times.json"
+    if args.transport == "grpc":
+        client_rpc.report_results(*results, mc_entries_per_register=args.entries_per_register, directory=directory or ".",
+                                  filename=filename, policy_stats=policy.stats, client_profile=profile)
+    else:
+        client_rest.report_results(*results, mc_entries_per_register=args.entries_per_register, directory=directory or ".",
+                                   filename=filename, transport_stats=client.transport_stats, policy_stats=policy.stats,
+                                   client_profile=profile)
+
+if __name__ == '__main__':
+    main()
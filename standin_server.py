@@ -0,0 +1,387 @@
+import argparse
+import base64
+import json
+import random
+import ssl
+import threading
+import time
+import zlib
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import grpc
+from external_coordinator_pb2 import (RegisterMissionControlResponse, QueryAggregatedMissionControlResponse, PairHistory,
+                                      PairData)
+from external_coordinator_pb2_grpc import ExternalCoordinatorServicer, add_ExternalCoordinatorServicer_to_server
+
+NODE_KEY_SIZE = 33
+HISTORY_FIELDS = ("fail_time", "fail_amt_sat", "fail_amt_msat", "success_time", "success_amt_sat", "success_amt_msat")
+REGISTER_PATHS = ("/v1/register_mission_control", "/v1/registermissioncontrol")
+QUERY_PATHS = ("/v1/query_aggregated_mission_control", "/v1/queryaggregatedmissioncontrol")
+COMPRESSIONS = {"none": grpc.Compression.NoCompression, "gzip": grpc.Compression.Gzip, "deflate": grpc.Compression.Deflate}
+# zlib window bits of the HTTP content codings: gzip framing, or the zlib format HTTP calls deflate.
+CONTENT_ENCODING_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+# HTTP status codes the gRPC gateway maps gRPC status codes to.
+HTTP_STATUS = {
+    grpc.StatusCode.INVALID_ARGUMENT: 400,
+    grpc.StatusCode.NOT_FOUND: 404,
+    grpc.StatusCode.DEADLINE_EXCEEDED: 504,
+    grpc.StatusCode.RESOURCE_EXHAUSTED: 429,
+    grpc.StatusCode.INTERNAL: 500,
+    grpc.StatusCode.UNAVAILABLE: 503,
+}
+
+def merge_history(current, new):
+    """
+    Aggregates a newly registered history into the stored one for a pair.
+
+    The most recent failure and the most recent success win independently, as
+    in LND's mission control.
+
+    Args:
+        current (tuple): Stored history as a HISTORY_FIELDS tuple, or None.
+        new (tuple): Newly registered history as a HISTORY_FIELDS tuple.
+
+    Returns:
+        tuple: The aggregated history.
+    """
+    if current is None:
+        return new
+    fail = new[0:3] if new[0] >= current[0] else current[0:3]
+    success = new[3:6] if new[3] >= current[3] else current[3:6]
+    return fail + success
+
+class MissionControlStore:
+    """
+    In-memory, thread-safe aggregate of PairHistory records keyed by (node_from, node_to).
+    """
+
+    def __init__(self):
+        self._pairs = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def register(self, pairs):
+        """
+        Args:
+            pairs (list): (node_from, node_to, history tuple) entries to aggregate.
+        """
+        with self._lock:
+            for node_from, node_to, history in pairs:
+                key = (node_from, node_to)
+                self._pairs[key] = merge_history(self._pairs.get(key), history)
+
+    def snapshot(self):
+        """
+        Returns:
+            list: ((node_from, node_to), history tuple) items at this point in time.
+        """
+        with self._lock:
+            return list(self._pairs.items())
+
+class FaultInjector:
+    """
+    Adds latency and random errors to requests handled by the stand-in.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_code=grpc.StatusCode.UNAVAILABLE, seed=None):
+        """
+        Args:
+            latency (float): Fixed delay in seconds added to every request.
+            jitter (float): Upper bound of an extra uniformly distributed delay in seconds.
+            error_rate (float): Probability that a request fails.
+            error_code (grpc.StatusCode): Status returned for injected failures.
+            seed (int): Seed for jitter and failures.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """
+        Sleeps for the configured latency plus jitter.
+        """
+        with self._lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def should_fail(self):
+        """
+        Returns:
+            bool: Whether the current request should fail.
+        """
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+class StandInCoordinator(ExternalCoordinatorServicer):
+    """
+    ExternalCoordinator implementation backed by a MissionControlStore.
+    """
+
+    def __init__(self, store, chunk_size=1000, faults=None):
+        """
+        Args:
+            store (MissionControlStore): Where registered pairs are aggregated.
+            chunk_size (int): Pairs per QueryAggregatedMissionControlResponse message.
+            faults (FaultInjector): Optional latency and error injection.
+        """
+        self.store = store
+        self.chunk_size = chunk_size
+        self.faults = faults or FaultInjector()
+
+    def _inject(self, context):
+        self.faults.delay()
+        if self.faults.should_fail():
+            context.abort(self.faults.error_code, "Injected failure")
+
+    def RegisterMissionControl(self, request, context):
+        self._inject(context)
+        pairs = []
+        for pair in request.pairs:
+            if len(pair.node_from) != NODE_KEY_SIZE or len(pair.node_to) != NODE_KEY_SIZE:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Node keys must be 33-byte compressed public keys")
+            history = tuple(getattr(pair.history, field) for field in HISTORY_FIELDS)
+            pairs.append((pair.node_from, pair.node_to, history))
+        self.store.register(pairs)
+        return RegisterMissionControlResponse(success_message=f"Registered {len(pairs)} pairs")
+
+    def QueryAggregatedMissionControl(self, request, context):
+        self._inject(context)
+        snapshot = self.store.snapshot()
+        for start in range(0, len(snapshot), self.chunk_size):
+            yield QueryAggregatedMissionControlResponse(pairs=[
+                PairHistory(node_from=node_from, node_to=node_to, history=PairData(**dict(zip(HISTORY_FIELDS, history))))
+                for (node_from, node_to), history in snapshot[start:start + self.chunk_size]
+            ])
+
+def to_camel_case(name):
+    """
+    Args:
+        name (str): A snake_case proto field name.
+
+    Returns:
+        str: The lowerCamelCase JSON name the gateway uses for it.
+    """
+    first, *rest = name.split("_")
+    return first + "".join(part.capitalize() for part in rest)
+
+def parse_rest_pair(pair):
+    """
+    Parses one pair of a gateway JSON register body.
+
+    Accepts snake_case and camelCase keys and int64 values as numbers or
+    strings, like the gRPC gateway does.
+
+    Args:
+        pair (dict): The JSON pair.
+
+    Returns:
+        tuple: (node_from, node_to, history tuple).
+    """
+    node_from = base64.b64decode(pair.get("nodeFrom", pair.get("node_from", "")))
+    node_to = base64.b64decode(pair.get("nodeTo", pair.get("node_to", "")))
+    if len(node_from) != NODE_KEY_SIZE or len(node_to) != NODE_KEY_SIZE:
+        raise ValueError("Node keys must be 33-byte compressed public keys")
+    history = pair.get("history", {})
+    return node_from, node_to, tuple(int(history.get(field, history.get(to_camel_case(field), 0))) for field in HISTORY_FIELDS)
+
+def format_rest_pair(node_from, node_to, history):
+    """
+    Formats one pair the way the gRPC gateway marshals PairHistory to JSON.
+
+    Args:
+        node_from (bytes): Compressed public key of the source node.
+        node_to (bytes): Compressed public key of the destination node.
+        history (tuple): History as a HISTORY_FIELDS tuple.
+
+    Returns:
+        dict: The JSON pair, with base64 keys and int64 values as strings.
+    """
+    return {
+        "nodeFrom": base64.b64encode(node_from).decode("ascii"),
+        "nodeTo": base64.b64encode(node_to).decode("ascii"),
+        "history": {to_camel_case(field): str(value) for field, value in zip(HISTORY_FIELDS, history)},
+    }
+
+def make_rest_handler(store, chunk_size, faults, compression="none"):
+    """
+    Builds an HTTP handler class serving the gateway's /v1/... endpoints.
+
+    Request bodies are decompressed according to their Content-Encoding. Query
+    streams are compressed only when the client accepts the configured coding,
+    and are flushed after every line so the client can decode each as it arrives.
+
+    Args:
+        store (MissionControlStore): Shared with the gRPC servicer.
+        chunk_size (int): Pairs per streamed JSON line.
+        faults (FaultInjector): Latency and error injection.
+        compression (str): 'gzip' or 'deflate' to compress query streams, 'none' not to.
+
+    Returns:
+        type: A BaseHTTPRequestHandler subclass.
+    """
+    class GatewayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; with Nagle's algorithm on, every
+        # response after the first on a keep-alive connection waits for a delayed ACK.
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_error_json(self, code, message):
+            self.send_json(HTTP_STATUS.get(code, 500), {"code": code.value[0], "message": message, "details": []})
+
+        def inject(self):
+            faults.delay()
+            if faults.should_fail():
+                self.send_error_json(faults.error_code, "Injected failure")
+                return True
+            return False
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            encoding = self.headers.get("Content-Encoding", "identity")
+            if self.path not in REGISTER_PATHS:
+                self.send_error_json(grpc.StatusCode.NOT_FOUND, "Not Found")
+                return
+            if encoding in CONTENT_ENCODING_WBITS:
+                try:
+                    body = zlib.decompress(body, CONTENT_ENCODING_WBITS[encoding])
+                except zlib.error as e:
+                    self.send_error_json(grpc.StatusCode.INVALID_ARGUMENT, f"Invalid {encoding} body: {e}")
+                    return
+            if self.inject():
+                return
+            try:
+                pairs = [parse_rest_pair(pair) for pair in json.loads(body).get("pairs", [])]
+            except (ValueError, TypeError, AttributeError) as e:
+                self.send_error_json(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+                return
+            store.register(pairs)
+            self.send_json(200, {"successMessage": f"Registered {len(pairs)} pairs"})
+
+        def do_GET(self):
+            if self.path not in QUERY_PATHS:
+                self.send_error_json(grpc.StatusCode.NOT_FOUND, "Not Found")
+                return
+            if self.inject():
+                return
+            snapshot = store.snapshot()
+            accepted = [coding.split(";")[0].strip() for coding in self.headers.get("Accept-Encoding", "").split(",")]
+            compressor = None
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            if compression in accepted:
+                compressor = zlib.compressobj(wbits=CONTENT_ENCODING_WBITS[compression])
+                self.send_header("Content-Encoding", compression)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(snapshot), chunk_size):
+                line = json.dumps({"result": {"pairs": [
+                    format_rest_pair(node_from, node_to, history)
+                    for (node_from, node_to), history in snapshot[start:start + chunk_size]
+                ]}}).encode() + b"\n"
+                if compressor is not None:
+                    line = compressor.compress(line) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            if compressor is not None:
+                tail = compressor.flush()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(tail), tail))
+            self.wfile.write(b"0\r\n\r\n")
+
+    return GatewayHandler
+
+def serve(grpc_address="127.0.0.1:50050", rest_address=None, chunk_size=1000, faults=None, max_workers=32,
+          cert=None, key=None, store=None, compression="none"):
+    """
+    Starts the stand-in coordinator.
+
+    Args:
+        grpc_address (str): 'host:port' for the gRPC server.
+        rest_address (tuple): Optional (host, port) for the REST front end.
+        chunk_size (int): Pairs per streamed query message.
+        faults (FaultInjector): Optional latency and error injection.
+        max_workers (int): gRPC server thread pool size.
+        cert (str): Optional certificate chain file to serve TLS with.
+        key (str): Private key file for `cert`.
+        store (MissionControlStore): Store to serve, a new empty one by default.
+        compression (str): One of COMPRESSIONS; responses are compressed with it when the client accepts it.
+
+    Returns:
+        tuple: The grpc.Server, the ThreadingHTTPServer (or None) and the MissionControlStore.
+    """
+    store = store if store is not None else MissionControlStore()
+    faults = faults or FaultInjector()
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers), compression=COMPRESSIONS[compression])
+    add_ExternalCoordinatorServicer_to_server(StandInCoordinator(store, chunk_size, faults), server)
+    if cert:
+        with open(cert, 'rb') as f, open(key, 'rb') as k:
+            credentials = grpc.ssl_server_credentials([(k.read(), f.read())])
+        server.add_secure_port(grpc_address, credentials)
+    else:
+        server.add_insecure_port(grpc_address)
+    server.start()
+
+    http_server = None
+    if rest_address is not None:
+        http_server = ThreadingHTTPServer(rest_address, make_rest_handler(store, chunk_size, faults, compression))
+        http_server.daemon_threads = True
+        if cert:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert, key)
+            http_server.socket = context.wrap_socket(http_server.socket, server_side=True)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+
+    return server, http_server, store
+
+def main():
+    """
+    Main function to run the stand-in coordinator until interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Run an in-memory stand-in External Coordinator.")
+    parser.add_argument("--grpc-address", default="127.0.0.1:50050")
+    parser.add_argument("--rest-port", type=int, default=None, help="Also serve the /v1/... REST gateway paths.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Pairs per streamed query message.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected delay per request in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random delay in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failed on purpose.")
+    parser.add_argument("--error-code", default="UNAVAILABLE", choices=[code.name for code in grpc.StatusCode])
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument("--cert", default=None)
+    parser.add_argument("--key", default=None)
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="none", help="Compress responses the client accepts this way.")
+    args = parser.parse_args()
+
+    faults = FaultInjector(args.latency, args.jitter, args.error_rate, grpc.StatusCode[args.error_code])
+    rest_address = ("127.0.0.1", args.rest_port) if args.rest_port else None
+    server, http_server, store = serve(args.grpc_address, rest_address, args.chunk_size, faults, args.max_workers,
+                                       args.cert, args.key, compression=args.compression)
+    print(f"Stand-in coordinator listening on {args.grpc_address}" + (f" and REST port {args.rest_port}" if rest_address else ""))
+    try:
+        server.wait_for_termination()
+    except KeyboardInterrupt:
+        print(f"Stopping with {len(store)} aggregated pairs")
+        server.stop(0)
+        if http_server is not None:
+            http_server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import threading
+from histogram import LatencyHistogram
+
+class StreamStats:
+    """
+    Measurements of a single QueryAggregatedMissionControl stream.
+
+    Times are seconds since the request was sent. Bytes are payload bytes: the
+    serialized protobuf size for gRPC, the newline-delimited JSON body for REST.
+    """
+
+    __slots__ = ("time_to_first_message", "total_time", "chunks", "pairs", "bytes", "chunk_gaps", "_last_message")
+
+    def __init__(self):
+        self.time_to_first_message = None
+        self.total_time = 0.0
+        self.chunks = 0
+        self.pairs = 0
+        self.bytes = 0
+        self.chunk_gaps = []
+        self._last_message = None
+
+    def add_message(self, elapsed, pairs, num_bytes):
+        """
+        Records one received stream message.
+
+        Args:
+            elapsed (float): Seconds since the request was sent.
+            pairs (int): Number of pairs in the message.
+            num_bytes (int): Payload size of the message.
+        """
+        if self._last_message is None:
+            self.time_to_first_message = elapsed
+        else:
+            self.chunk_gaps.append(elapsed - self._last_message)
+        self._last_message = elapsed
+        self.chunks += 1
+        self.pairs += pairs
+        self.bytes += num_bytes
+
+    def finish(self, elapsed):
+        """
+        Marks the end of the stream.
+
+        Args:
+            elapsed (float): Seconds since the request was sent.
+
+        Returns:
+            StreamStats: This object.
+        """
+        self.total_time = elapsed
+        return self
+
+class StreamMetrics:
+    """
+    Thread-safe aggregate of StreamStats across all query streams of a run.
+
+    Besides totals it keeps stream times bucketed by snapshot size (powers of
+    two of the number of pairs received), which shows how the query scales as
+    the coordinator accumulates more mission control entries.
+    """
+
+    def __init__(self):
+        self.time_to_first_message = LatencyHistogram()
+        self.stream_time = LatencyHistogram()
+        self.chunk_gap = LatencyHistogram()
+        self.by_snapshot_size = {}
+        self.streams = 0
+        self.chunks = 0
+        self.pairs = 0
+        self.bytes = 0
+        self.transfer_time = 0.0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record(self, stats):
+        """
+        Adds the measurements of one stream.
+
+        Args:
+            stats (StreamStats): The finished stream's measurements.
+        """
+        self.stream_time.record(stats.total_time)
+        if stats.time_to_first_message is not None:
+            self.time_to_first_message.record(stats.time_to_first_message)
+        for gap in stats.chunk_gaps:
+            self.chunk_gap.record(gap)
+
+        size_bucket = stats.pairs.bit_length()
+        with self._lock:
+            self.streams += 1
+            self.chunks += stats.chunks
+            self.pairs += stats.pairs
+            self.bytes += stats.bytes
+            if stats.time_to_first_message is not None:
+                self.transfer_time += stats.total_time - stats.time_to_first_message
+            if size_bucket not in self.by_snapshot_size:
+                self.by_snapshot_size[size_bucket] = LatencyHistogram()
+        self.by_snapshot_size[size_bucket].record(stats.total_time)
+
+    def merge(self, other):
+        """
+        Adds the streams of another StreamMetrics to this one.
+
+        Args:
+            other (StreamMetrics): The metrics to merge in.
+
+        Returns:
+            StreamMetrics: This object.
+        """
+        self.time_to_first_message.merge(other.time_to_first_message)
+        self.stream_time.merge(other.stream_time)
+        self.chunk_gap.merge(other.chunk_gap)
+        with self._lock:
+            self.streams += other.streams
+            self.chunks += other.chunks
+            self.pairs += other.pairs
+            self.bytes += other.bytes
+            self.transfer_time += other.transfer_time
+            for size_bucket, histogram in other.by_snapshot_size.items():
+                self.by_snapshot_size.setdefault(size_bucket, LatencyHistogram()).merge(histogram)
+        return self
+
+    def summary(self):
+        """
+        Returns:
+            dict: Totals, per-stream averages, transfer throughput and latency summaries.
+        """
+        streams = max(self.streams, 1)
+        by_snapshot_size = []
+        for size_bucket in sorted(self.by_snapshot_size):
+            histogram = self.by_snapshot_size[size_bucket].summary()
+            by_snapshot_size.append({
+                "min_pairs": (1 << (size_bucket - 1)) if size_bucket else 0,
+                "max_pairs": (1 << size_bucket) - 1,
+                "streams": histogram["count"],
+                "p50": histogram["p50"],
+                "p99": histogram["p99"],
+            })
+        return {
+            "streams": self.streams,
+            "chunks": self.chunks,
+            "pairs": self.pairs,
+            "bytes": self.bytes,
+            "chunks_per_stream": self.chunks / streams,
+            "pairs_per_stream": self.pairs / streams,
+            "bytes_per_stream": self.bytes / streams,
+            "transfer_bytes_per_second": self.bytes / self.transfer_time if self.transfer_time else 0.0,
+            "time_to_first_message": self.time_to_first_message.summary(),
+            "stream_time": self.stream_time.summary(),
+            "chunk_gap": self.chunk_gap.summary(),
+            "by_snapshot_size": by_snapshot_size,
+        }
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: A JSON-serialisable form that from_dict can restore.
+        """
+        return {
+            "summary": self.summary(),
+            "time_to_first_message": self.time_to_first_message.to_dict(),
+            "stream_time": self.stream_time.to_dict(),
+            "chunk_gap": self.chunk_gap.to_dict(),
+            "by_snapshot_size": {str(size_bucket): histogram.to_dict() for size_bucket, histogram in self.by_snapshot_size.items()},
+            "transfer_time": self.transfer_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Args:
+            data (dict): A dict produced by to_dict.
+
+        Returns:
+            StreamMetrics: The restored metrics.
+        """
+        metrics = cls()
+        summary = data["summary"]
+        metrics.streams, metrics.chunks = summary["streams"], summary["chunks"]
+        metrics.pairs, metrics.bytes = summary["pairs"], summary["bytes"]
+        metrics.transfer_time = data["transfer_time"]
+        metrics.time_to_first_message = LatencyHistogram.from_dict(data["time_to_first_message"])
+        metrics.stream_time = LatencyHistogram.from_dict(data["stream_time"])
+        metrics.chunk_gap = LatencyHistogram.from_dict(data["chunk_gap"])
+        metrics.by_snapshot_size = {int(size_bucket): LatencyHistogram.from_dict(histogram)
+                                    for size_bucket, histogram in data["by_snapshot_size"].items()}
+        return metrics
@@ -0,0 +1,99 @@
+import json
+import sys
+import numpy as np
+import pytest
+import ab_compare
+from ab_compare import TrialSamples, classify_delta, compare, metric_value, trial_order
+from test_workload import SPEC, write_spec
+
+def make_trial(register, query, elapsed=1.0, failed=0):
+    samples = TrialSamples()
+    for latency in register:
+        samples.record("register", latency, 200)
+    for latency in query:
+        samples.record("query", latency, 200)
+    for _ in range(failed):
+        samples.record("query", 0.001, 503)
+    return samples.trial(elapsed)
+
+def test_failed_requests_are_left_out_of_latencies_and_throughput():
+    trial = make_trial([0.1, 0.2], [0.3], elapsed=2.0, failed=2)
+    assert trial["requests"] == 5
+    assert trial["query"]["failed"] == 2
+    assert trial["query"]["latencies"].tolist() == [0.3]
+    assert trial["throughput"] == 1.5
+    assert ab_compare.trial_summary(trial)["query"]["requests"] == 3
+
+def test_trial_order_runs_both_sides_every_round():
+    order = trial_order(20, seed=1)
+    assert len(order) == 40
+    assert all(sorted(order[index:index + 2]) == ["a", "b"] for index in range(0, 40, 2))
+    assert order == trial_order(20, seed=1)
+    assert order != trial_order(20, seed=2)
+
+@pytest.mark.parametrize("metric, low, high, result", [
+    ("query_p99", 0.1, 0.3, "regression"),
+    ("query_p99", 0.01, 0.3, "worse"),
+    ("query_p99", -0.3, -0.1, "improvement"),
+    ("query_p99", -0.1, 0.1, "no change"),
+    ("throughput", -0.3, -0.1, "regression"),
+    ("throughput", 0.1, 0.3, "improvement"),
+])
+def test_classify_delta(metric, low, high, result):
+    assert classify_delta(metric, low, high, threshold=0.05) == result
+
+def test_metric_value_without_trials_is_nan():
+    assert np.isnan(metric_value([], "query", 99))
+    assert np.isnan(metric_value([], None, None))
+
+def test_compare_flags_a_slower_candidate():
+    rng = np.random.default_rng(0)
+    trials_a = [make_trial(rng.uniform(0.01, 0.02, 200), rng.uniform(0.05, 0.1, 200)) for _ in range(5)]
+    trials_b = [make_trial(rng.uniform(0.01, 0.02, 200), rng.uniform(0.1, 0.2, 200)) for _ in range(5)]
+    comparison = compare(trials_a, trials_b, threshold=0.05, resamples=200, seed=0)
+    assert comparison["metrics"]["query_p50"]["result"] == "regression"
+    assert comparison["metrics"]["register_p50"]["result"] != "regression"
+    assert "query_p99" in comparison["regressions"]
+    assert comparison["verdict"] == "fail"
+    assert comparison["failures"] == {"a": {"register": 0, "query": 0}, "b": {"register": 0, "query": 0}}
+
+def test_compare_ungated_regressions_pass():
+    rng = np.random.default_rng(0)
+    trials_a = [make_trial(rng.uniform(0.01, 0.02, 200), rng.uniform(0.05, 0.1, 200)) for _ in range(5)]
+    trials_b = [make_trial(rng.uniform(0.01, 0.02, 200), rng.uniform(0.1, 0.2, 200)) for _ in range(5)]
+    comparison = compare(trials_a, trials_b, threshold=0.05, resamples=200, seed=0, gate=["register_p50"])
+    assert comparison["verdict"] == "pass"
+
+def test_zero_trials_are_rejected(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["ab_compare.py", "plan.jsonl", "--a", "grpc", "--b", "rest", "--trials", "0"])
+    with pytest.raises(SystemExit):
+        ab_compare.main()
+
+def test_compare_two_sides_against_the_standin(standin, tmp_path, monkeypatch):
+    spec = write_spec(tmp_path, SPEC)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", [
+        "ab_compare.py", spec, "--a", f"grpc --server-url {standin['grpc_address']} --insecure",
+        "--b", f"rest --server-url {standin['rest_url']} --insecure", "--trials", "2", "--warmup-trials", "0",
+        "--resamples", "50", "--threshold", "100"])
+    ab_compare.main()
+
+    with open(tmp_path / "data" / "ab_grpc_vs_rest.json") as f:
+        summary = json.load(f)
+    assert summary["verdict"] == "pass"
+    assert summary["failures"] == {"a": {"register": 0, "query": 0}, "b": {"register": 0, "query": 0}}
+    assert [trial["requests"] for trial in summary["trials"]["a"]] == [SPEC["requests"]] * 2
+
+def test_a_gated_metric_missing_on_the_candidate_fails(capsys):
+    rng = np.random.default_rng(0)
+    trials_a = [make_trial(rng.uniform(0.01, 0.02, 50), rng.uniform(0.05, 0.1, 50)) for _ in range(3)]
+    trials_b = [make_trial(rng.uniform(0.01, 0.02, 50), [], failed=50) for _ in range(3)]
+    comparison = compare(trials_a, trials_b, threshold=0.05, resamples=50, seed=0)
+    assert comparison["metrics"]["query_p99"]["result"] == "missing"
+    assert "query_p99" in comparison["regressions"]
+    assert "register_p99" not in comparison["regressions"]
+    assert comparison["verdict"] == "fail"
+    ab_compare.print_comparison(comparison, ("a", "b"), 0.05, 0.95)
+    assert "FAIL" in capsys.readouterr().out
+
+    assert compare(trials_a, trials_b, threshold=0.05, resamples=50, seed=0, gate=["register_p50"])["verdict"] == "pass"
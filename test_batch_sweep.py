@@ -0,0 +1,58 @@
+import os
+import time
+import pytest
+import batch_sweep
+import standin_server
+from conftest import free_port
+from multiprocess_load import make_client
+from request_policy import RequestPolicy
+
+def random_keys():
+    return os.urandom(33), os.urandom(33)
+
+def test_split_snapshot_respects_the_message_size():
+    chunks = batch_sweep.split_snapshot(list(range(10)), [30] * 10, 100)
+    assert chunks == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+
+def test_split_snapshot_keeps_an_oversized_pair_alone():
+    assert batch_sweep.split_snapshot(["a", "b"], [500, 10], 100) == [["a"], ["b"]]
+
+def test_snapshot_time_ignores_wall_clock_steps(monkeypatch):
+    wall_clock = iter([1000.0, 10.0])
+    monkeypatch.setattr(time, "time", lambda: next(wall_clock))
+
+    def execute(task):
+        time.sleep(0.01)
+        return 0.01, 200
+
+    latency, ok = batch_sweep.send_snapshot(execute, batch_sweep.client_rpc, None, None, [b"", b""])
+    assert ok
+    assert 0.02 <= latency < 1
+
+@pytest.mark.parametrize("transport", ["grpc", "rest"])
+def test_prepared_requests_stay_under_the_limit(transport):
+    snapshots = batch_sweep.prepare_snapshots(transport, 200, 2, random_keys, 4096)
+    assert all(len(payload) <= 4096 for payloads in snapshots for payload in payloads)
+    assert all(len(payloads) > 1 for payloads in snapshots)
+
+@pytest.mark.parametrize("transport", ["grpc", "rest"])
+def test_sweep_registers_every_pair(standin, transport):
+    server_url = standin["grpc_address"] if transport == "grpc" else standin["rest_url"]
+    _, client = make_client(transport, server_url, insecure=True)
+    results = batch_sweep.run_sweep(transport, client, server_url, [1, 50], 3, 2, 2048, key_pool_size=50)
+    assert [result["failed_snapshots"] for result in results] == [0, 0]
+    assert results[1]["requests_per_snapshot"] > 1
+    assert len(standin["store"]) <= 3 + 150
+
+def test_deadline_fails_snapshots_on_a_stalled_server():
+    grpc_address = f"127.0.0.1:{free_port()}"
+    server, _, _ = standin_server.serve(grpc_address, faults=standin_server.FaultInjector(latency=2))
+    try:
+        module, stub = make_client("grpc", grpc_address, insecure=True)
+        snapshots = batch_sweep.prepare_snapshots("grpc", 10, 2, random_keys, 4096)
+        start = time.perf_counter()
+        result = batch_sweep.run_batch_size(module, stub, grpc_address, snapshots, 10, 2, RequestPolicy(deadline=0.2))
+        assert time.perf_counter() - start < 1
+        assert result["failed_snapshots"] == 2
+    finally:
+        server.stop(0)
@@ -0,0 +1,68 @@
+import time
+import grpc
+import capacity
+import standin_server
+from conftest import free_port
+from histogram import LatencyHistogram
+from multiprocess_load import make_client
+from request_policy import RequestPolicy
+
+def fake_step(limit):
+    def run_step(load):
+        return {"load": load, "passed": load <= limit}
+    return run_step
+
+def test_find_capacity_ramps_then_bisects():
+    best, steps = capacity.find_capacity(fake_step(300), 50, 2, 10000, refine_steps=4)
+    assert [step["load"] for step in steps[:4]] == [50, 100, 200, 400]
+    assert 200 <= best["load"] <= 300
+    assert all(step["passed"] == (step["load"] <= 300) for step in steps)
+
+def test_find_capacity_integer_ramp_always_grows():
+    best, steps = capacity.find_capacity(fake_step(6), 4, 1.1, 100, refine_steps=4, integer=True)
+    assert [step["load"] for step in steps] == [4, 5, 6, 7]
+    assert best["load"] == 6
+
+def test_find_capacity_bisects_below_a_breaching_first_step():
+    best, steps = capacity.find_capacity(fake_step(10), 50, 2, 1000, refine_steps=3)
+    assert [step["load"] for step in steps] == [50, 25, 12.5, 6.25]
+    assert best["load"] == 6.25
+    assert capacity.find_capacity(fake_step(10), 50, 2, 1000, refine_steps=0)[0] is None
+
+def test_find_capacity_stops_at_max_load():
+    best, steps = capacity.find_capacity(fake_step(10000), 50, 2, 300, refine_steps=3)
+    assert best["load"] == 200
+    assert len(steps) == 3
+
+def test_evaluate_step_flags_every_breach():
+    histogram = LatencyHistogram()
+    histogram.record(0.5, count=100)
+    step = {
+        "elapsed": 1.0,
+        "register": {"latency": histogram, "completed": 100, "failed": 10},
+        "query": {"latency": LatencyHistogram(), "completed": 0, "failed": 0},
+    }
+    result = capacity.evaluate_step("rate", 200, step, latency_slo=0.2, percentile=99, error_slo=0.01)
+    assert not result["passed"]
+    assert len(result["breaches"]) == 3
+
+def test_parse_mix():
+    assert capacity.parse_mix("register") == 1.0
+    assert capacity.parse_mix("query") == 0.0
+    assert capacity.parse_mix("1:3") == 0.25
+
+def test_deadline_bounds_a_step_against_a_stalled_server():
+    grpc_address = f"127.0.0.1:{free_port()}"
+    server, _, _ = standin_server.serve(grpc_address, faults=standin_server.FaultInjector(latency=1))
+    try:
+        module, stub = make_client("grpc", grpc_address, insecure=True)
+        pools = capacity.build_task_pools("grpc", stub, grpc_address, 10, 3)
+        policy = RequestPolicy(deadline=0.2)
+        start = time.perf_counter()
+        step = capacity.run_concurrency_step(pools, 0.5, policy.wrap(module.execute_task), 4, 0.5)
+        assert time.perf_counter() - start < 2
+        assert step["register"]["completed"] + step["query"]["completed"] >= 4
+        assert step["register"]["failed"] == step["register"]["completed"]
+        assert step["query"]["failed"] == step["query"]["completed"]
+    finally:
+        server.stop(0)
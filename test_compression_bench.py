@@ -0,0 +1,33 @@
+import pytest
+import compression_bench
+import standin_server
+from conftest import free_port
+
+def test_server_address_and_relay_url():
+    assert compression_bench.server_address("https://example.com:8081/v1") == ("example.com", 8081)
+    assert compression_bench.server_address("example.com:50050") == ("example.com", 50050)
+    assert compression_bench.relay_url("rest", "https://example.com:8081", 9000) == "https://127.0.0.1:9000"
+    assert compression_bench.relay_url("grpc", "example.com:50050", 9000) == "127.0.0.1:9000"
+
+@pytest.mark.parametrize("transport", ["grpc", "rest"])
+def test_cells_verify_tls_through_the_relay(tls_standin, transport):
+    server_url = tls_standin["grpc_address"] if transport == "grpc" else tls_standin["rest_url"]
+    cells = compression_bench.run_matrix(transport, server_url, ["none", "gzip"], [10], 2, 1, 2, cert=tls_standin["cert"],
+                                         key_pool_size=50, timeout=10)
+    assert len(cells) == 2
+    for cell in cells:
+        assert cell["register"]["failed"] == 0
+        assert cell["query"]["failed"] == 0
+        assert cell["register"]["wire_bytes_sent"] > 0
+        # Pairs drawn from a small key pool can repeat, and the store keeps them once.
+        assert 0 < cell["query"]["pairs"] == len(tls_standin["store"]) <= 20
+
+def test_failed_warm_up_aborts_the_matrix():
+    grpc_address = f"127.0.0.1:{free_port()}"
+    server, _, _ = standin_server.serve(grpc_address, faults=standin_server.FaultInjector(error_rate=1))
+    try:
+        with pytest.raises(RuntimeError):
+            compression_bench.run_matrix("grpc", grpc_address, ["none"], [10], 2, 1, 2, insecure=True, key_pool_size=50,
+                                         timeout=10)
+    finally:
+        server.stop(0)
@@ -0,0 +1,130 @@
+import os
+import time
+import numpy as np
+import client_rest
+import client_rpc
+import consistency
+from consistency import AckTimes, ConsistencyChecker, PairColumns, PairIndex
+from multiprocess_load import make_client
+from test_standin_server import random_pairs
+
+def columns(keys, histories):
+    from_keys = b"".join(key[0] for key in keys)
+    to_keys = b"".join(key[1] for key in keys)
+    return from_keys, to_keys, histories
+
+def random_keys(count):
+    return [(os.urandom(33), os.urandom(33)) for _ in range(count)]
+
+def test_index_finds_inserted_pairs_after_growing():
+    index = PairIndex(capacity=16)
+    keys = random_keys(1000)
+    pairs = PairColumns(*columns(keys, [(1, 2, 3, 4)] * 1000))
+    index.insert(pairs, np.arange(1000, dtype=np.float64))
+    assert len(index) == 1000
+    assert index.capacity >= 2000
+    slots = index.find(pairs.fingerprints)
+    assert (slots >= 0).all()
+    assert (index.acked_at[slots] == np.arange(1000)).all()
+    unknown = PairColumns(*columns(random_keys(10), [(1, 2, 3, 4)] * 10))
+    assert (index.find(unknown.fingerprints) == -1).all()
+
+def test_index_keeps_the_latest_failure_and_success_and_the_first_ack():
+    index = PairIndex()
+    keys = random_keys(1)
+    index.insert(PairColumns(*columns(keys, [(10, 1, 20, 2)])), np.array([1.0]))
+    index.insert(PairColumns(*columns(keys * 2, [(30, 3, 5, 9), (15, 4, 40, 5)])), np.array([2.0, 3.0]))
+    slot = index.find(PairColumns(*columns(keys, [(0, 0, 0, 0)])).fingerprints)[0]
+    assert len(index) == 1
+    assert (index.fail_time[slot], index.fail_amt[slot]) == (30, 3)
+    assert (index.success_time[slot], index.success_amt[slot]) == (40, 5)
+    assert (index.first_acked_at[slot], index.acked_at[slot]) == (1.0, 3.0)
+    assert len(index.ack_times) == 1
+
+def test_ack_times_count_out_of_order_batches():
+    times = AckTimes(capacity=4)
+    rng = np.random.default_rng(1)
+    added = []
+    for _ in range(50):
+        batch = rng.uniform(0, 100, 7)
+        times.add(batch)
+        added.extend(batch)
+    added = np.array(added)
+    for time_point in (-1.0, 0.5, 33.3, 50.0, 99.9, 101.0):
+        assert times.count_until(time_point) == np.count_nonzero(added <= time_point)
+
+def test_checker_classifies_stale_corrupt_unknown_and_missing():
+    checker = ConsistencyChecker()
+    keys = random_keys(5)
+    checker.record_register(columns(keys, [(10, 1, 20, 2)] * 5), 1.0)
+    query = checker.begin_query(2.0)
+    returned = [
+        (keys[0], (10, 1, 20, 2)),  # matched
+        (keys[1], (5, 1, 20, 2)),  # stale
+        (keys[2], (10, 7, 20, 2)),  # corrupt
+        (random_keys(1)[0], (1, 1, 1, 1)),  # unknown
+    ]
+    query.check(columns([key for key, _ in returned], [history for _, history in returned]), 2.5)
+    query.finish()
+
+    summary = checker.summary()
+    assert summary["checked_pairs"] == 4
+    assert summary["matched_pairs"] == 1
+    assert summary["stale_pairs"] == 1
+    assert summary["corrupt_pairs"] == 1
+    assert summary["unknown_pairs"] == 1
+    # keys[3] and keys[4] were not returned.
+    assert summary["missing_pairs"] == 2
+    assert summary["violating_queries"] == 1
+    assert summary["visibility_latency"]["count"] == 1
+
+def test_registers_acknowledged_after_the_query_was_sent_are_not_expected():
+    checker = ConsistencyChecker()
+    early, late = random_keys(3), random_keys(3)
+    checker.record_register(columns(early, [(10, 1, 20, 2)] * 3), 1.0)
+    checker.record_register(columns(late, [(10, 1, 20, 2)] * 3), 5.0)
+    # Re-registered after the query was sent: still expected, but not judged stale.
+    checker.record_register(columns(early[:1], [(30, 1, 40, 2)]), 6.0)
+    query = checker.begin_query(2.0)
+    query.check(columns(early, [(10, 1, 20, 2)] * 3), 2.5)
+    query.finish()
+
+    summary = checker.summary()
+    assert summary["matched_pairs"] == 3
+    assert summary["stale_pairs"] == 0
+    assert summary["missing_pairs"] == 0
+    assert summary["violating_queries"] == 0
+
+def test_grpc_query_is_checked_against_registers(standin, monkeypatch):
+    checker = ConsistencyChecker()
+    monkeypatch.setattr(client_rpc, "CONSISTENCY_CHECKER", checker)
+    _, stub = make_client("grpc", standin["grpc_address"], insecure=True)
+    payload = client_rpc.serialize_register_request(random_pairs("grpc", 250))
+    assert client_rpc.register_mission_control(stub, payload, 1)[1] == 200
+    assert client_rpc.query_aggregated_mission_control(stub, 2)[1] == 200
+
+    summary = checker.summary()
+    assert summary["indexed_pairs"] == 250
+    assert summary["matched_pairs"] == 250
+    assert summary["missing_pairs"] == 0
+
+def test_rest_check_is_not_charged_to_query_latency(standin, monkeypatch):
+    checker = ConsistencyChecker()
+    monkeypatch.setattr(client_rest, "CONSISTENCY_CHECKER", checker)
+    _, session = make_client("rest", standin["rest_url"], insecure=True)
+    body = client_rest.serialize_register_request(random_pairs("rest", 250))
+    assert client_rest.register_mission_control(session, standin["rest_url"], body, 1)[1] == 200
+
+    check = consistency.QueryCheck.check
+    def slow_check(self, pairs, received_at):
+        time.sleep(0.1)
+        check(self, pairs, received_at)
+    monkeypatch.setattr(consistency.QueryCheck, "check", slow_check)
+    start = time.perf_counter()
+    latency, status, stats = client_rest.query_aggregated_mission_control(session, standin["rest_url"], 2)
+    assert status == 200
+    # The stand-in streams 250 pairs in three messages, each checked for 0.1 s.
+    assert stats.chunks == 3
+    assert time.perf_counter() - start >= 0.3
+    assert latency < 0.1
+    assert checker.summary()["matched_pairs"] == 250
@@ -0,0 +1,72 @@
+import sys
+import threading
+from multiprocessing.connection import Listener
+import pytest
+import distributed
+
+AUTHKEY = b"test-secret"
+
+def make_job(transport, server_url, timeseries=False):
+    return {
+        "transport": transport,
+        "server_url": server_url,
+        "cert": None,
+        "insecure": True,
+        "session_options": {},
+        "policy_options": {"deadline": 10},
+        "decode_mode": None,
+        "max_workers": 4,
+        "mc_entries_per_register": 3,
+        "progress_interval": 0.2,
+        "timeseries": timeseries,
+    }
+
+def run_with_agents(listener, job, shards, **kwargs):
+    agents = [threading.Thread(target=distributed.run_agent, args=(listener.address, AUTHKEY, f"agent-{n}"), daemon=True)
+              for n in range(len(shards))]
+    for agent in agents:
+        agent.start()
+    try:
+        return distributed.run_controller(listener, len(shards), job, shards, start_delay=0.2, **kwargs)
+    finally:
+        for agent in agents:
+            agent.join(10)
+
+def test_parse_address():
+    assert distributed.parse_address("7070", "127.0.0.1") == ("127.0.0.1", 7070)
+    assert distributed.parse_address(":7070", "127.0.0.1") == ("127.0.0.1", 7070)
+    assert distributed.parse_address("0.0.0.0:7070") == ("0.0.0.0", 7070)
+
+def test_make_shards_deals_plans_round_robin():
+    assert distributed.make_shards(3, num_requests=10) == [{"requests": 4}, {"requests": 3}, {"requests": 3}]
+    shards = distributed.make_shards(2, plan=list(range(5)), open_loop=True)
+    assert [shard["plan"] for shard in shards] == [[0, 2, 4], [1, 3]]
+
+@pytest.mark.parametrize("transport", ["grpc", "rest"])
+def test_two_agents_on_localhost(standin, transport):
+    server_url = standin["grpc_address"] if transport == "grpc" else standin["rest_url"]
+    with Listener(("127.0.0.1", 0), authkey=AUTHKEY) as listener:
+        results, agents = run_with_agents(listener, make_job(transport, server_url), distributed.make_shards(2, num_requests=21))
+    register_histogram, query_histogram, register_failed, query_failed = results[:4]
+    assert register_histogram.count + query_histogram.count == 21
+    assert register_failed == query_failed == 0
+    assert sorted(agent["name"] for agent in agents) == ["agent-0", "agent-1"]
+    assert [agent["requests"] for agent in agents] == [11, 10]
+    for agent in agents:
+        # Both agents share this host's clock.
+        assert abs(agent["clock_offset"]) <= agent["clock_uncertainty"] + 0.01
+        assert abs(agent["clock_drift"]) < 0.01
+
+def test_merged_timeseries_has_every_request(standin, tmp_path):
+    path = str(tmp_path / "requests")
+    with Listener(("127.0.0.1", 0), authkey=AUTHKEY) as listener:
+        run_with_agents(listener, make_job("grpc", standin["grpc_address"], timeseries=True),
+                        distributed.make_shards(2, num_requests=10), timeseries_path=path, timeseries_format="npz")
+    columns = distributed.load_timeseries(path + ".npz")
+    assert len(columns["end_time"]) == 10
+
+def test_a_shared_secret_is_required(monkeypatch):
+    monkeypatch.delenv("LOAD_AUTHKEY", raising=False)
+    monkeypatch.setattr(sys, "argv", ["distributed.py", "agent"])
+    with pytest.raises(SystemExit):
+        distributed.main()
@@ -0,0 +1,85 @@
+import ssl
+import grpc
+import pytest
+import requests
+import urllib3
+from conftest import free_port
+from errors import (GRPC_STATUS_BASE, STATUS_CLIENT_ERROR, STATUS_CONNECTION, STATUS_CONNECTION_RESET, STATUS_OK, STATUS_TIMEOUT,
+                    STATUS_TLS, ErrorCounts, StreamError, classify_exception, status_label)
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code, details=""):
+        self._code, self._details = code, details
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._details
+
+def wrapped(reason):
+    # How requests reports a failure urllib3 gave up on.
+    return requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(None, "/", reason=reason))
+
+@pytest.mark.parametrize("exc, status, label", [
+    (FakeRpcError(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline Exceeded"), STATUS_TIMEOUT, "timeout"),
+    (FakeRpcError(grpc.StatusCode.UNAVAILABLE, "Ssl handshake failed: SSL_ERROR_SSL"), STATUS_TLS, "tls"),
+    (FakeRpcError(grpc.StatusCode.UNAVAILABLE, "Connection reset by peer"), STATUS_CONNECTION_RESET, "connection_reset"),
+    (FakeRpcError(grpc.StatusCode.UNAVAILABLE, "failed to connect to all addresses"), STATUS_CONNECTION, "connection"),
+    (FakeRpcError(grpc.StatusCode.UNAVAILABLE, "Injected failure"), GRPC_STATUS_BASE + 14, "grpc_UNAVAILABLE"),
+    (FakeRpcError(grpc.StatusCode.RESOURCE_EXHAUSTED, None), GRPC_STATUS_BASE + 8, "grpc_RESOURCE_EXHAUSTED"),
+    (FakeRpcError(grpc.StatusCode.INVALID_ARGUMENT), GRPC_STATUS_BASE + 3, "grpc_INVALID_ARGUMENT"),
+    (requests.exceptions.ReadTimeout(), STATUS_TIMEOUT, "timeout"),
+    (requests.exceptions.ConnectTimeout(), STATUS_TIMEOUT, "timeout"),
+    (requests.exceptions.SSLError(), STATUS_TLS, "tls"),
+    (wrapped(ssl.SSLCertVerificationError("certificate verify failed")), STATUS_TLS, "tls"),
+    (requests.exceptions.ConnectionError(urllib3.exceptions.ProtocolError(
+        "Connection aborted.", ConnectionResetError(104, "Connection reset by peer"))), STATUS_CONNECTION_RESET, "connection_reset"),
+    (requests.exceptions.ChunkedEncodingError(urllib3.exceptions.ProtocolError(
+        "Connection broken", BrokenPipeError())), STATUS_CONNECTION_RESET, "connection_reset"),
+    (wrapped(urllib3.exceptions.NewConnectionError(None, "Connection refused")), STATUS_CONNECTION, "connection"),
+    (requests.exceptions.ChunkedEncodingError("Connection broken: IncompleteRead"), STATUS_CONNECTION, "connection"),
+    (ConnectionRefusedError(), STATUS_CONNECTION, "connection"),
+    (TimeoutError(), STATUS_TIMEOUT, "timeout"),
+    (StreamError({"code": 14, "message": "unavailable"}), GRPC_STATUS_BASE + 14, "grpc_UNAVAILABLE"),
+    (StreamError("broken"), STATUS_CLIENT_ERROR, "client_error"),
+    (ValueError("Malformed pair in stream"), STATUS_CLIENT_ERROR, "client_error"),
+])
+def test_classify_exception(exc, status, label):
+    assert classify_exception(exc) == status
+    assert status_label(status) == label
+
+@pytest.mark.parametrize("status, label", [
+    (STATUS_OK, "ok"),
+    (429, "http_429"),
+    (500, "http_500"),
+    (503, "http_503"),
+    (GRPC_STATUS_BASE + 4, "grpc_DEADLINE_EXCEEDED"),
+    (GRPC_STATUS_BASE + 99, "grpc_99"),
+])
+def test_status_label(status, label):
+    assert status_label(status) == label
+
+def test_httpx_errors():
+    httpx = pytest.importorskip("httpx")
+    assert classify_exception(httpx.ReadTimeout("timed out")) == STATUS_TIMEOUT
+    assert classify_exception(httpx.ConnectError("refused")) == STATUS_CONNECTION
+
+def test_refused_connections_are_classified():
+    port = free_port()
+    with pytest.raises(requests.exceptions.ConnectionError) as raised:
+        requests.get(f"http://127.0.0.1:{port}/", timeout=5)
+    assert classify_exception(raised.value) == STATUS_CONNECTION
+
+    channel = grpc.insecure_channel(f"127.0.0.1:{port}")
+    with pytest.raises(grpc.RpcError) as raised:
+        channel.unary_unary("/ecrpc.ExternalCoordinator/QueryAggregatedMissionControl")(b"", timeout=5)
+    channel.close()
+    assert classify_exception(raised.value) == STATUS_CONNECTION
+
+def test_error_counts_skip_successes_and_merge():
+    errors = ErrorCounts()
+    for status in (STATUS_OK, 503, 503, STATUS_TIMEOUT):
+        errors.record("query", status)
+    other = ErrorCounts.from_dict({"register": {"grpc_UNAVAILABLE": 2}, "query": {"http_503": 1}})
+    assert errors.merge(other).to_dict() == {"register": {"grpc_UNAVAILABLE": 2}, "query": {"http_503": 3, "timeout": 1}}
@@ -0,0 +1,66 @@
+import math
+import pickle
+import zlib
+import pytest
+from histogram import LatencyHistogram
+
+def test_percentiles_are_within_precision():
+    histogram = LatencyHistogram()
+    for n in range(1, 1001):
+        histogram.record(n / 1000)
+    assert histogram.count == 1000
+    assert histogram.min == 0.001
+    assert histogram.max == 1.0
+    assert histogram.mean() == pytest.approx(0.5005)
+    for percentile in (50, 90, 99):
+        assert histogram.percentile(percentile) == pytest.approx(percentile / 100, rel=0.01)
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) == 0.0
+    assert histogram.summary()["min"] == 0.0
+    restored = LatencyHistogram.from_bytes(histogram.to_bytes())
+    assert restored.count == 0
+    assert restored.min == math.inf
+
+def test_values_above_the_range_keep_their_max():
+    histogram = LatencyHistogram(max_seconds=1)
+    histogram.record(5.0)
+    assert histogram.max == 5.0
+    assert histogram.percentile(100) == 5.0
+
+def test_encoding_round_trips_every_range():
+    for n in range(1, 2000):
+        histogram = LatencyHistogram(max_seconds=n * 0.001 + 0.000001 * n)
+        histogram.record(n * 0.0005)
+        restored = LatencyHistogram.from_bytes(histogram.to_bytes())
+        assert restored.max_value == histogram.max_value
+        assert restored.summary() == histogram.summary()
+        restored.merge(histogram)
+        assert restored.count == 2
+
+def test_dict_and_pickle_round_trip():
+    histogram = LatencyHistogram()
+    for n in range(100):
+        histogram.record(0.01 * n, count=2)
+    for restored in (LatencyHistogram.from_dict(histogram.to_dict()), pickle.loads(pickle.dumps(histogram))):
+        assert restored.summary() == histogram.summary()
+        assert restored.buckets() == histogram.buckets()
+        restored.record(1.0)
+
+def test_merge_adds_samples_and_rejects_other_layouts():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    first.record(0.1)
+    second.record(0.3, count=3)
+    first.merge(second)
+    assert first.count == 4
+    assert (first.min, first.max) == (0.1, 0.3)
+    assert first.sum == pytest.approx(1.0)
+    with pytest.raises(ValueError):
+        first.merge(LatencyHistogram(precision=0.01))
+    with pytest.raises(ValueError):
+        first.merge(LatencyHistogram(max_seconds=60))
+
+def test_from_bytes_rejects_other_data():
+    with pytest.raises(ValueError):
+        LatencyHistogram.from_bytes(zlib.compress(b"\0" * 64))
@@ -0,0 +1,40 @@
+import argparse
+import csv
+import io
+import time
+import requests
+from conftest import free_port
+from live_reporter import LiveReporter, add_reporter_arguments, reporter_from_args
+
+def test_metrics_endpoint_is_local_by_default():
+    port = free_port()
+    output = io.StringIO()
+    with LiveReporter(interval=0.05, prometheus_port=port, output=output) as reporter:
+        assert reporter._server.server_address[0] == "127.0.0.1"
+        reporter.record("register", 0.01, 200)
+        reporter.record("query", 0.02, 503)
+        time.sleep(0.2)
+        text = requests.get(f"http://127.0.0.1:{port}/metrics").text
+    assert 'ec_requests_total{op="register",outcome="ok"} 1' in text
+    assert 'ec_requests_total{op="query",outcome="error"} 1' in text
+    assert f"http://127.0.0.1:{port}/metrics" in output.getvalue()
+
+def test_windows_are_written_to_csv(tmp_path):
+    path = tmp_path / "live" / "metrics.csv"
+    with LiveReporter(interval=10, csv_path=str(path), output=None) as reporter:
+        for _ in range(3):
+            reporter.record_result("register", (0.01, 200))
+    assert reporter.totals["register"]["requests"] == 3
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert [row["op"] for row in rows] == ["register", "query"]
+    assert rows[0]["requests"] == "3"
+
+def test_reporter_from_args():
+    parser = argparse.ArgumentParser()
+    add_reporter_arguments(parser)
+    assert reporter_from_args(parser.parse_args([])) is None
+    reporter = reporter_from_args(parser.parse_args(["--prometheus-port", "9100"]))
+    assert reporter.prometheus_host == "127.0.0.1"
+    reporter = reporter_from_args(parser.parse_args(["--prometheus-port", "9100", "--prometheus-host", "0.0.0.0"]))
+    assert reporter.prometheus_host == "0.0.0.0"
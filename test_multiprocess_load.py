@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import grpc
+import pytest
+import client_rpc
+from multiprocess_load import make_client, run_multiprocess, shard_requests
+from test_standin_server import random_pairs
+
+def test_shard_requests_spreads_the_remainder():
+    assert shard_requests(10, 4) == [3, 3, 2, 2]
+    assert sum(shard_requests(12345, 7)) == 12345
+
+def test_make_client_rejects_unknown_transports():
+    with pytest.raises(ValueError):
+        make_client("smtp", "localhost:25")
+
+def test_workers_use_the_channel_options_and_compression(standin):
+    _, stub = make_client("grpc", standin["grpc_address"], insecure=True)
+    payload = client_rpc.serialize_register_request(random_pairs("grpc", 100))
+    assert client_rpc.register_mission_control(stub, payload, 0)[1] == 200
+    # A receive limit below the size of 100 pairs fails every query, so the option must reach the workers.
+    results = run_multiprocess("grpc", standin["grpc_address"], 40, 10, 2, insecure=True,
+                               channel_options={"max_message_size": 2000}, compression=grpc.Compression.Gzip)
+    register_histogram, query_histogram, register_failed, query_failed = results[:4]
+    assert register_histogram.count + query_histogram.count == 40
+    assert register_failed == 0
+    assert query_failed == query_histogram.count
+
+def test_a_killed_worker_fails_the_run_instead_of_hanging(standin):
+    def kill_first_worker():
+        while not multiprocessing.active_children():
+            time.sleep(0.01)
+        os.kill(multiprocessing.active_children()[0].pid, signal.SIGKILL)
+
+    killer = threading.Thread(target=kill_first_worker)
+    killer.start()
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError, match="without sending results"):
+        run_multiprocess("grpc", standin["grpc_address"], 20, 3, 2, insecure=True)
+    killer.join()
+    assert time.perf_counter() - start < 30
+    assert not multiprocessing.active_children()
@@ -0,0 +1,66 @@
+import collections
+import os
+import pytest
+from ecdsa import SECP256k1, VerifyingKey
+from node_corpus import DISTRIBUTIONS, KEY_SIZE, NodeCorpus, build_corpus
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    path = tmp_path / "corpus.bin"
+    path.write_bytes(os.urandom(100 * KEY_SIZE))
+    return str(path)
+
+def test_built_corpus_holds_compressed_public_keys(tmp_path):
+    path = str(tmp_path / "data" / "corpus.bin")
+    build_corpus(path, 25, processes=2, chunk_size=10)
+    assert os.path.getsize(path) == 25 * KEY_SIZE
+
+    corpus = NodeCorpus(path)
+    assert len(corpus) == 25
+    keys = {corpus.node(index) for index in range(len(corpus))}
+    assert len(keys) == 25
+    for key in keys:
+        VerifyingKey.from_string(key, curve=SECP256k1)
+    assert bytes(corpus.node_view(3)) == corpus.node(3)
+    corpus.close()
+
+def test_uniform_draws_spread_over_every_key(corpus_path):
+    corpus = NodeCorpus(corpus_path, seed=1)
+    counts = collections.Counter(corpus.random_node() for _ in range(10000))
+    assert len(counts) == 100
+    assert max(counts.values()) < 3 * 10000 / 100
+    assert all(node_from != node_to for node_from, node_to in (corpus.random_pair() for _ in range(1000)))
+
+def test_powerlaw_draws_favour_hub_nodes(corpus_path):
+    corpus = NodeCorpus(corpus_path, distribution="powerlaw", seed=1)
+    counts = collections.Counter(corpus.random_node() for _ in range(10000))
+    # With alpha 1.2 over 100 keys, the top hub gets over a quarter of the draws.
+    assert counts.most_common(1)[0][1] > 0.1 * 10000
+    assert all(node_from != node_to for node_from, node_to in (corpus.random_pair() for _ in range(1000)))
+
+def draw_pairs(path, distribution, seed, count, **kwargs):
+    corpus = NodeCorpus(path, distribution=distribution, seed=seed, **kwargs)
+    return [corpus.random_pair() for _ in range(count)]
+
+def test_graph_pairs_repeat_the_fixed_channels(corpus_path):
+    pairs = draw_pairs(corpus_path, "graph", 1, 5000, num_edges=50)
+    assert len(set(pairs)) <= 50
+    assert all(node_from != node_to for node_from, node_to in pairs)
+    # Every process mapping the corpus sees the same graph, whatever its selection seed.
+    assert set(draw_pairs(corpus_path, "graph", 2, 5000, num_edges=50)) == set(pairs)
+
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+def test_draws_are_reproducible_with_a_seed(corpus_path, distribution):
+    assert draw_pairs(corpus_path, distribution, 7, 20) == draw_pairs(corpus_path, distribution, 7, 20)
+    assert draw_pairs(corpus_path, distribution, 7, 20) != draw_pairs(corpus_path, distribution, 8, 20)
+
+@pytest.mark.parametrize("size", [0, 3 * KEY_SIZE + 5, KEY_SIZE - 1])
+def test_empty_or_truncated_files_are_rejected(tmp_path, size):
+    path = tmp_path / "corpus.bin"
+    path.write_bytes(os.urandom(size))
+    with pytest.raises(ValueError):
+        NodeCorpus(str(path))
+
+def test_unknown_distributions_are_rejected(corpus_path):
+    with pytest.raises(ValueError):
+        NodeCorpus(corpus_path, distribution="zipf")
@@ -0,0 +1,108 @@
+import grpc
+import pytest
+import client_rest
+import client_rpc
+import standin_server
+from conftest import free_port
+from multiprocess_load import make_client
+from request_policy import RequestPolicy
+from test_standin_server import random_pairs
+
+class CountingFaults(standin_server.FaultInjector):
+    """
+    Counts the requests that reached the stand-in.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    def should_fail(self):
+        with self._lock:
+            self.calls += 1
+        return super().should_fail()
+
+@pytest.fixture
+def faulty_standin(request):
+    grpc_address = f"127.0.0.1:{free_port()}"
+    faults = CountingFaults(**request.param)
+    server, http_server, store = standin_server.serve(grpc_address, ("127.0.0.1", 0), faults=faults)
+    try:
+        yield {"grpc_address": grpc_address, "rest_url": f"http://127.0.0.1:{http_server.server_address[1]}",
+               "faults": faults, "store": store}
+    finally:
+        server.stop(0)
+        http_server.shutdown()
+        http_server.server_close()
+
+def register_task(transport, standin):
+    server_url = standin["grpc_address"] if transport == "grpc" else standin["rest_url"]
+    module, client = make_client(transport, server_url, insecure=True)
+    if transport == "grpc":
+        return module, ('register', client, client_rpc.serialize_register_request(random_pairs(transport, 10)), 0, 10)
+    return module, ('register', client, server_url, client_rest.serialize_register_request(random_pairs(transport, 10)), 0, 10)
+
+def query_task(transport, standin):
+    server_url = standin["grpc_address"] if transport == "grpc" else standin["rest_url"]
+    module, client = make_client(transport, server_url, insecure=True)
+    if transport == "grpc":
+        return module, ('query', client, 0)
+    return module, ('query', client, server_url, 0, None)
+
+@pytest.mark.parametrize("transport", ["grpc", "rest"])
+@pytest.mark.parametrize("faulty_standin", [{"error_rate": 1}], indirect=True)
+def test_retries_stop_at_the_limit(faulty_standin, transport):
+    module, task = register_task(transport, faulty_standin)
+    policy = RequestPolicy(deadline=5, retries=2, backoff=0.01)
+    result = policy.wrap(module.execute_task)(task)
+    policy.close()
+
+    assert result[1] != 200
+    assert faulty_standin["faults"].calls == 3
+    retries = policy.stats.summary()["retries"]["register"]
+    assert retries == {"requests": 1, "extra_attempts": 2, "retried_requests": 1, "rescued_requests": 0,
+                       "retry_bytes": 2 * len(task[-3])}
+
+@pytest.mark.parametrize("transport", ["grpc", "rest"])
+@pytest.mark.parametrize("faulty_standin", [{"error_rate": 0.5, "seed": 3}], indirect=True)
+def test_retries_rescue_intermittent_failures(faulty_standin, transport):
+    module, task = register_task(transport, faulty_standin)
+    policy = RequestPolicy(deadline=5, retries=10, backoff=0.001)
+    execute = policy.wrap(module.execute_task)
+    assert all(execute(task)[1] == 200 for _ in range(10))
+    policy.close()
+
+    retries = policy.stats.summary()["retries"]["register"]
+    assert retries["requests"] == 10
+    assert retries["retried_requests"] == retries["rescued_requests"] > 0
+    assert faulty_standin["faults"].calls == 10 + retries["extra_attempts"]
+
+@pytest.mark.parametrize("faulty_standin", [{"error_rate": 1, "error_code": grpc.StatusCode.INVALID_ARGUMENT}], indirect=True)
+def test_errors_that_are_not_retryable_are_returned_at_once(faulty_standin):
+    module, task = register_task("grpc", faulty_standin)
+    policy = RequestPolicy(deadline=5, retries=3, backoff=0.01)
+    policy.wrap(module.execute_task)(task)
+    policy.close()
+
+    assert faulty_standin["faults"].calls == 1
+    assert policy.stats.summary()["retries"]["register"]["extra_attempts"] == 0
+
+@pytest.mark.parametrize("transport", ["grpc", "rest"])
+@pytest.mark.parametrize("faulty_standin", [{"latency": 0.2}], indirect=True)
+def test_slow_queries_are_hedged_and_counted_apart_from_retries(faulty_standin, transport):
+    history = (0,) * len(standin_server.HISTORY_FIELDS)
+    faulty_standin["store"].register([(bytes([n]) * 33, bytes([n + 1]) * 33, history) for n in range(5)])
+    module, task = query_task(transport, faulty_standin)
+    policy = RequestPolicy(deadline=5, retries=2, hedge_after="0.05")
+    result = policy.wrap(module.execute_task)(task)
+    policy.close()
+
+    assert result[1] == 200
+    assert result[2].pairs == 5
+    assert faulty_standin["faults"].calls == 2
+    summary = policy.stats.summary()
+    assert summary["hedging"]["hedges"] == 1
+    assert summary["hedging"]["hedge_bytes"] == result[2].bytes > 0
+    assert summary["hedging"]["first_attempt_latency"]["count"] == 1
+    assert summary["retries"]["query"] == {"requests": 1, "extra_attempts": 0, "retried_requests": 0,
+                                           "rescued_requests": 0, "retry_bytes": 0}
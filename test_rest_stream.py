@@ -0,0 +1,144 @@
+import base64
+import itertools
+import json
+import os
+import threading
+import pytest
+import client_rest
+import client_rpc
+import rest_stream
+from client_profile import PhaseTimer
+from errors import StreamError
+from multiprocess_load import make_client
+from rest_stream import DECODE_MODES, decode_stream
+from stream_metrics import StreamStats
+from test_standin_server import random_pairs
+
+class FakeFile:
+    def __init__(self, body, read_sizes):
+        self.body = memoryview(body)
+        self.read_sizes = itertools.cycle(read_sizes)
+
+    def readinto1(self, view):
+        size = min(len(view), next(self.read_sizes), len(self.body))
+        view[:size] = self.body[:size]
+        self.body = self.body[size:]
+        return size
+
+class FakeRaw:
+    def __init__(self, body, read_sizes):
+        self._fp = FakeFile(body, read_sizes)
+        self.released = False
+
+    def release_conn(self):
+        self.released = True
+
+class FakeResponse:
+    """
+    The parts of a streaming requests.Response that decode_stream reads, handing out the
+    body in reads of the given sizes.
+    """
+
+    def __init__(self, body, read_sizes=(1 << 16,)):
+        self.headers = {}
+        self.raw = FakeRaw(body, read_sizes)
+
+def make_body(pairs_per_message, trailing_newline=True):
+    lines = []
+    for count in pairs_per_message:
+        pairs = [{"nodeFrom": base64.b64encode(os.urandom(33)).decode(), "nodeTo": base64.b64encode(os.urandom(33)).decode(),
+                  "history": {"failTime": "1", "successAmtSat": "2"}} for _ in range(count)]
+        lines.append(json.dumps({"result": {"pairs": pairs}}))
+    return ("\n".join(lines) + ("\n" if trailing_newline else "")).encode()
+
+def iter_lines_reference(body):
+    """
+    Returns:
+        tuple: The pairs, messages and bytes that client_rest's iter_lines() + json path sees.
+    """
+    pairs, messages, num_bytes = [], 0, 0
+    for line in body.splitlines():
+        if line:
+            pairs += json.loads(line)["result"].get("pairs", [])
+            messages += 1
+            num_bytes += len(line) + 1
+    return pairs, messages, num_bytes
+
+def decode(body, mode, read_sizes=(1 << 16,)):
+    response, stats = FakeResponse(body, read_sizes), StreamStats()
+    pairs = decode_stream(response, PhaseTimer(), stats, mode)
+    assert response.raw.released
+    return pairs, stats
+
+@pytest.fixture
+def small_buffer(monkeypatch):
+    monkeypatch.setattr(rest_stream, "_buffers", threading.local())
+    monkeypatch.setattr(rest_stream, "INITIAL_BUFFER_SIZE", 64)
+
+@pytest.mark.parametrize("mode", DECODE_MODES)
+@pytest.mark.parametrize("read_sizes", [(1,), (7,), (100, 3, 1000)])
+def test_lines_split_across_reads(mode, read_sizes):
+    body = make_body([3, 0, 5, 1])
+    expected_pairs, messages, num_bytes = iter_lines_reference(body)
+    pairs, stats = decode(body, mode, read_sizes)
+    assert stats.pairs == len(expected_pairs) == 9
+    assert stats.chunks == messages == 4
+    assert stats.bytes == num_bytes
+
+@pytest.mark.parametrize("mode", DECODE_MODES)
+def test_last_message_without_a_newline(mode):
+    body = make_body([2, 4], trailing_newline=False)
+    _, stats = decode(body, mode, (10,))
+    assert (stats.pairs, stats.chunks) == (6, 2)
+    assert stats.bytes == len(body)
+
+@pytest.mark.parametrize("mode", DECODE_MODES)
+def test_the_buffer_grows_for_messages_larger_than_it(small_buffer, mode):
+    body = make_body([1, 20, 2])
+    _, stats = decode(body, mode, (50,))
+    assert (stats.pairs, stats.chunks) == (23, 3)
+    # The grown buffer is kept for the thread's later streams.
+    assert len(rest_stream.get_buffer()) >= max(len(line) for line in body.splitlines())
+
+    _, stats = decode(body, mode)
+    assert (stats.pairs, stats.chunks) == (23, 3)
+
+def test_materialize_decodes_the_same_pairs_as_iter_lines():
+    body = make_body([3, 2])
+    expected_pairs, _, _ = iter_lines_reference(body)
+    pairs, _ = decode(body, "materialize", (13,))
+    for pair, expected in zip(pairs, expected_pairs, strict=True):
+        assert pair["nodeFrom"] == base64.b64decode(expected["nodeFrom"])
+        assert pair["nodeTo"] == base64.b64decode(expected["nodeTo"])
+        assert pair["history"] == expected["history"]
+    assert decode(body, "count")[0] == decode(body, "validate")[0] == []
+
+@pytest.mark.parametrize("mode", DECODE_MODES)
+def test_error_lines_inside_the_stream_raise(mode):
+    error = json.dumps({"error": {"grpc_code": 14, "http_code": 503, "message": "unavailable"}}).encode()
+    body = make_body([2]) + error + b"\n" + make_body([2])
+    with pytest.raises(StreamError):
+        decode(body, mode, (9,))
+
+def test_validate_rejects_malformed_pairs():
+    body = json.dumps({"result": {"pairs": [{"nodeFrom": "AA==", "nodeTo": "AA==", "history": {}}]}}).encode() + b"\n"
+    assert decode(body, "count")[1].pairs == 1
+    with pytest.raises(ValueError):
+        decode(body, "validate")
+
+def test_unknown_modes_are_rejected():
+    with pytest.raises(ValueError):
+        decode(make_body([1]), "parse")
+
+def test_modes_match_iter_lines_against_the_standin(standin):
+    _, stub = make_client("grpc", standin["grpc_address"], insecure=True)
+    assert client_rpc.register_mission_control(stub, client_rpc.serialize_register_request(random_pairs("grpc", 250)), 0)[1] == 200
+    _, session = make_client("rest", standin["rest_url"], insecure=True)
+
+    _, status, expected = client_rest.query_aggregated_mission_control(session, standin["rest_url"], 0)
+    assert status == 200
+    assert (expected.pairs, expected.chunks) == (250, 3)
+    for mode in DECODE_MODES:
+        _, status, stats = client_rest.query_aggregated_mission_control(session, standin["rest_url"], 0, decode_mode=mode)
+        assert status == 200
+        assert (stats.pairs, stats.chunks, stats.bytes) == (expected.pairs, expected.chunks, expected.bytes)
@@ -0,0 +1,26 @@
+from rest_transport import TransportStats, create_requests_session
+
+def reconnect(session, url, times):
+    for _ in range(times):
+        assert session.get(url).status_code == 200
+        # Drops every pooled connection, like an idle close by the server.
+        session.close()
+
+def test_tls_sessions_resume_after_all_connections_closed(tls_standin):
+    session = create_requests_session(verify=tls_standin["cert"])
+    reconnect(session, f"{tls_standin['rest_url']}/v1/query_aggregated_mission_control", 4)
+    stats = session.transport_stats.to_dict()
+    assert stats["tls_handshakes"] == 4
+    assert stats["tls_resumed"] == 3
+
+def test_tls_sessions_are_not_resumed_when_disabled(tls_standin):
+    session = create_requests_session(verify=tls_standin["cert"], tls_session_reuse=False)
+    reconnect(session, f"{tls_standin['rest_url']}/v1/query_aggregated_mission_control", 3)
+    assert session.transport_stats.tls_resumed == 0
+
+def test_transport_stats_merge():
+    stats = TransportStats()
+    stats.connection_opened()
+    stats.tls_handshake(resumed=True)
+    merged = TransportStats().merge(stats.to_dict()).merge(stats.to_dict())
+    assert merged.to_dict() == {"connections": 2, "tls_handshakes": 2, "tls_resumed": 2}
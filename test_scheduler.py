@@ -0,0 +1,63 @@
+import sys
+import time
+import pytest
+import scheduler
+from scheduler import constant_arrivals, make_arrivals, parse_stages, poisson_arrivals, ramp_arrivals, run_open_loop, step_arrivals
+
+def test_constant_arrivals_are_evenly_spaced():
+    arrivals = constant_arrivals(100, 2)
+    assert len(arrivals) == 200
+    assert arrivals[0] == 0
+    assert arrivals[1] - arrivals[0] == pytest.approx(0.01)
+
+def test_poisson_arrivals_have_the_mean_rate_and_are_seeded():
+    arrivals = poisson_arrivals(1000, 10, seed=3)
+    assert len(arrivals) == pytest.approx(10000, rel=0.05)
+    assert arrivals == poisson_arrivals(1000, 10, seed=3)
+    assert arrivals != poisson_arrivals(1000, 10, seed=4)
+    assert all(0 < offset < 10 for offset in arrivals)
+
+def test_step_arrivals_run_stages_back_to_back():
+    arrivals = step_arrivals([(10, 1), (100, 1)])
+    assert len(arrivals) == 110
+    assert arrivals[10] == 1.0
+    assert arrivals[11] - arrivals[10] == pytest.approx(0.01)
+
+def test_ramp_arrivals_speed_up():
+    arrivals = ramp_arrivals(10, 100, 10)
+    assert len(arrivals) == pytest.approx(550, rel=0.05)
+    assert arrivals[1] - arrivals[0] > arrivals[-1] - arrivals[-2]
+
+def test_make_arrivals_rejects_unknown_profiles():
+    assert make_arrivals("step", None, None, stages=parse_stages("10:1,20:1")) == step_arrivals([(10, 1), (20, 1)])
+    with pytest.raises(ValueError):
+        make_arrivals("burst", 10, 1)
+
+def test_open_loop_reports_the_configured_rate():
+    arrivals = constant_arrivals(200, 0.5)
+    tasks = [("register", n) for n in range(len(arrivals))]
+    summary = run_open_loop(tasks, arrivals, lambda task: (0.0, 200), max_workers=10)
+    assert summary["requests"] == 100
+    assert summary["target_rate"] == pytest.approx(200)
+    assert summary["send_rate"] == pytest.approx(200, rel=0.05)
+    assert summary["register"]["latency"].count == 100
+
+def test_open_loop_latency_includes_queueing():
+    arrivals = constant_arrivals(100, 0.1)
+
+    def execute(task):
+        time.sleep(0.05)
+        return 0.05, 200
+
+    summary = run_open_loop([("register", n) for n in range(len(arrivals))], arrivals, execute, max_workers=1)
+    register = summary["register"]
+    # With one worker the tenth request waits for the nine before it.
+    assert register["latency"].max >= 0.4
+    assert register["service_time"].max < 0.1
+
+@pytest.mark.parametrize("profile, option", [("ramp", "--end-rate"), ("step", "--stages")])
+def test_profiles_without_their_options_are_rejected(profile, option, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["scheduler.py", "grpc", "--profile", profile])
+    with pytest.raises(SystemExit):
+        scheduler.main()
+    assert option in capsys.readouterr().err
@@ -0,0 +1,58 @@
+import threading
+import time
+import pytest
+import client_rpc
+import slow_consumer
+from errors import STATUS_OK
+from slow_consumer import ReadThrottle
+
+def read(throttle, sizes):
+    throttle.start()
+    for count, num_bytes in enumerate(sizes, 1):
+        outcome = throttle.after_message(num_bytes)
+        if outcome is not None:
+            return count, outcome
+    return len(sizes), "completed"
+
+def test_throttle_holds_the_read_rate():
+    start = time.perf_counter()
+    assert read(ReadThrottle(bytes_per_second=1000), [50] * 4) == (4, "completed")
+    assert 0.2 <= time.perf_counter() - start < 0.4
+
+def test_throttle_pauses_after_every_message():
+    start = time.perf_counter()
+    assert read(ReadThrottle(message_pause=0.05), [1] * 3) == (3, "completed")
+    assert 0.15 <= time.perf_counter() - start < 0.3
+
+def test_throttle_abandons_and_holds_the_stream():
+    start = time.perf_counter()
+    assert read(ReadThrottle(abandon_after=2, abandon_hold=0.1), [1] * 5) == (2, "abandoned")
+    assert 0.1 <= time.perf_counter() - start < 0.3
+
+def test_throttle_cancels_after_the_first_message():
+    start = time.perf_counter()
+    assert read(ReadThrottle(cancel_after_first=True, message_pause=10), [1] * 5) == (1, "cancelled")
+    assert time.perf_counter() - start < 0.1
+
+def test_stopping_wakes_a_paused_reader():
+    stop = threading.Event()
+    threading.Timer(0.05, stop.set).start()
+    start = time.perf_counter()
+    assert read(ReadThrottle(message_pause=10, stop=stop), [1] * 5) == (1, "cancelled")
+    assert time.perf_counter() - start < 1
+
+@pytest.mark.parametrize("transport", ["grpc", "rest"])
+def test_readers_are_closed_when_they_stop(standin, transport):
+    server_url = standin["grpc_address"] if transport == "grpc" else standin["rest_url"]
+    readers = slow_consumer.make_slow_readers(transport, server_url, 2, None, True, {}, {"message_pause": 0.01}, 5, 512)
+    readers.start()
+    time.sleep(0.2)
+    readers.stop_and_join()
+
+    assert readers.outcomes["completed"] + readers.outcomes["cancelled"] > 0
+    assert readers.outcomes["failed"] == 0
+    for client, _ in readers.clients:
+        if transport == "grpc":
+            assert client_rpc.query_aggregated_mission_control(client, 0, 1)[1] != STATUS_OK
+        else:
+            assert all(not adapter.poolmanager.pools for adapter in client.adapters.values())
@@ -0,0 +1,49 @@
+import json
+import sys
+import threading
+import pytest
+import soak
+from soak import SoakState, parse_duration, run_soak
+
+def test_parse_duration():
+    assert parse_duration("90") == 90
+    assert parse_duration("90m") == 90 * 60
+    assert parse_duration("24h") == 24 * 60 * 60
+
+def test_failing_tasks_free_their_slots(tmp_path):
+    def execute(task):
+        raise RuntimeError("boom")
+
+    tasks = (("register", n) for n in range(20))
+    thread = threading.Thread(target=run_soak, args=(tasks, execute, SoakState(), 60, 2, str(tmp_path / "soak.checkpoint.json"),
+                                                     str(tmp_path / "soak_windows.jsonl")), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+
+def test_checkpoint_round_trip(tmp_path):
+    state = SoakState()
+    state.record("register", (0.01, 200))
+    state.elapsed = 12.5
+    soak.save_checkpoint(state, str(tmp_path / "soak.checkpoint.json"))
+    restored = soak.load_checkpoint(str(tmp_path / "soak.checkpoint.json"))
+    assert restored.requests == 1
+    assert restored.elapsed == 12.5
+    assert restored.totals["register"]["latency"].count == 1
+
+def test_soak_writes_every_file_next_to_the_state(standin, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["soak.py", "grpc", "--server-url", standin["grpc_address"], "--insecure",
+                                      "--duration", "1", "--max-in-flight", "4", "--rate", "50", "--state", "runs/night"])
+    soak.main()
+    assert sorted(path.name for path in (tmp_path / "runs").iterdir()) == [
+        "night.checkpoint.json", "night_response_times.json", "night_windows.jsonl"]
+    assert not (tmp_path / "data").exists()
+    with open(tmp_path / "runs" / "night.checkpoint.json") as f:
+        assert json.load(f)["requests"] > 0
+
+def test_soak_rejects_verify(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["soak.py", "grpc", "--verify"])
+    with pytest.raises(SystemExit):
+        soak.main()
@@ -0,0 +1,47 @@
+import gzip
+import os
+import time
+import requests
+import client_rest
+import client_rpc
+from batch_sweep import make_pair
+from multiprocess_load import make_client
+
+def random_pairs(transport, count):
+    return [make_pair(transport, os.urandom(33), os.urandom(33))[0] for _ in range(count)]
+
+def test_keep_alive_requests_are_not_delayed(standin):
+    session = requests.Session()
+    url = f"{standin['rest_url']}/v1/register_mission_control"
+    session.post(url, data=b'{"pairs": []}')
+    start = time.perf_counter()
+    for _ in range(10):
+        assert session.post(url, data=b'{"pairs": []}').status_code == 200
+    # Nagle's algorithm plus delayed ACKs would add about 40 ms to every request.
+    assert (time.perf_counter() - start) / 10 < 0.02
+
+def test_unknown_paths_return_404(standin):
+    assert requests.get(f"{standin['rest_url']}/v1/nothing").status_code == 404
+    assert requests.post(f"{standin['rest_url']}/v1/nothing", data=b"{}").status_code == 404
+
+def test_corrupt_compressed_body_returns_400(standin):
+    url = f"{standin['rest_url']}/v1/register_mission_control"
+    response = requests.post(url, data=b"not gzip", headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 400
+
+def test_compressed_register_is_accepted(standin):
+    body = client_rest.serialize_register_request(random_pairs("rest", 1))
+    url = f"{standin['rest_url']}/v1/register_mission_control"
+    response = requests.post(url, data=gzip.compress(body), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert len(standin["store"]) == 1
+
+def test_pairs_registered_over_grpc_come_back_over_rest(standin):
+    _, stub = make_client("grpc", standin["grpc_address"], insecure=True)
+    payload = client_rpc.serialize_register_request(random_pairs("grpc", 250))
+    assert client_rpc.register_mission_control(stub, payload, 0)[1] == 200
+
+    _, session = make_client("rest", standin["rest_url"], insecure=True)
+    _, status, stats = client_rest.query_aggregated_mission_control(session, standin["rest_url"], 0)
+    assert status == 200
+    assert stats.pairs == 250
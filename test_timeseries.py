@@ -0,0 +1,50 @@
+import time
+import numpy as np
+import pytest
+import timeseries
+from scheduler import run_open_loop
+from stream_metrics import StreamStats
+
+FORMATS = [format for format in timeseries.FORMATS if format != "parquet" or timeseries.pyarrow is not None]
+
+@pytest.mark.parametrize("format", FORMATS)
+def test_rows_round_trip(tmp_path, format):
+    with timeseries.TimeSeriesWriter(str(tmp_path / "requests"), format, chunk_rows=4) as writer:
+        for index in range(10):
+            writer.record("register" if index % 2 else "query", 100.0 + index, 100.5 + index, 200, index, 10 * index,
+                          intended_time=99.0 + index)
+    columns = timeseries.load_timeseries(writer.path)
+    assert writer.rows == 10
+    assert columns["send_time"].tolist() == [100.0 + index for index in range(10)]
+    assert columns["intended_time"].tolist() == [99.0 + index for index in range(10)]
+    assert timeseries.latencies(columns).tolist() == [1.5] * 10
+    assert columns["bytes"].tolist() == [10 * index for index in range(10)]
+
+def test_intended_time_defaults_to_the_send_time(tmp_path):
+    with timeseries.TimeSeriesWriter(str(tmp_path / "requests"), "csv") as writer:
+        writer.record("query", 5.0, 6.0, 200, 1, 1)
+    assert timeseries.load_timeseries(writer.path)["intended_time"].tolist() == [5.0]
+
+def test_files_without_intended_time_still_load(tmp_path):
+    path = tmp_path / "old.csv"
+    path.write_text("send_time,end_time,op,status,pairs,bytes\n2.0,3.0,1,200,3,100\n1.0,1.5,0,503,3,90\n")
+    columns = timeseries.load_timeseries(str(path))
+    assert columns["send_time"].tolist() == [1.0, 2.0]
+    assert columns["intended_time"].tolist() == [1.0, 2.0]
+
+def test_open_loop_rows_count_latency_from_the_intended_time(tmp_path):
+    def execute(task):
+        time.sleep(0.05)
+        return 0.05, 200, StreamStats()
+
+    # One worker and 20 requests per second of 50 ms each: every request queues behind the last.
+    tasks = [("query", None, index) for index in range(10)]
+    arrivals = [index * 0.01 for index in range(10)]
+    with timeseries.TimeSeriesWriter(str(tmp_path / "requests"), "npz") as writer:
+        summary = run_open_loop(tasks, arrivals, execute, max_workers=1, recorder=writer)
+    columns = timeseries.load_timeseries(writer.path)
+
+    recorded = np.sort(timeseries.latencies(columns))
+    assert recorded[-1] > 0.35
+    assert recorded[-1] == pytest.approx(summary["query"]["latency"].max, abs=0.02)
+    assert np.all(columns["send_time"] - columns["intended_time"] >= -1e-6)
@@ -0,0 +1,9 @@
+import sys
+import pytest
+import visualize
+
+@pytest.mark.parametrize("labels", ["a", "a,b,c"])
+def test_labels_must_match_the_files(monkeypatch, labels):
+    monkeypatch.setattr(sys, "argv", ["visualize.py", "a.npz", "b.npz", "--labels", labels, "--output", "plot.png"])
+    with pytest.raises(SystemExit):
+        visualize.main()
@@ -0,0 +1,59 @@
+import json
+import sys
+import workload
+
+SPEC = {
+    "seed": 7,
+    "requests": 40,
+    "register_ratio": "1:1",
+    "pairs_per_register": {"distribution": "uniform", "min": 1, "max": 5},
+    "history": {"base_time": 1700000000},
+    "concurrency": 4,
+}
+
+def write_spec(tmp_path, spec):
+    path = tmp_path / "spec.json"
+    path.write_text(json.dumps(spec))
+    return str(path)
+
+def test_same_seed_gives_the_same_plan(tmp_path):
+    spec = workload.load_spec(write_spec(tmp_path, SPEC))
+    assert workload.compile_plan(spec) == workload.compile_plan(spec)
+
+def test_other_seed_gives_another_plan(tmp_path):
+    first = workload.compile_plan(workload.load_spec(write_spec(tmp_path, SPEC)))
+    second = workload.compile_plan(workload.load_spec(write_spec(tmp_path, {**SPEC, "seed": 8})))
+    assert first[1] != second[1]
+
+def test_saved_plan_loads_back(tmp_path):
+    header, requests = workload.compile_plan(workload.load_spec(write_spec(tmp_path, SPEC)))
+    workload.save_plan(header, requests, str(tmp_path / "plan.jsonl"))
+    assert workload.load_plan(str(tmp_path / "plan.jsonl")) == (header, requests)
+
+def test_open_loop_plan_has_offsets(tmp_path):
+    spec = {**SPEC, "arrivals": {"profile": "poisson", "rate": 100, "duration": 1}}
+    header, requests = workload.compile_plan(workload.load_spec(write_spec(tmp_path, spec)))
+    offsets = [planned["offset"] for planned in requests]
+    assert header["open_loop"]
+    assert offsets == sorted(offsets)
+
+def test_plan_entries_sum_variable_register_sizes():
+    requests = [{"op": "register", "pairs": [[]] * 2}, {"op": "query"}, {"op": "register", "pairs": [[]] * 5}]
+    assert workload.plan_entries(requests) == (7, 4)
+    assert workload.entries_registered(requests, 0) == 7
+    assert workload.entries_registered(requests, 1) == 4
+    assert workload.entries_registered([{"op": "query"}], 0) == 0
+
+def test_run_saves_results_for_a_uniform_spec(standin, tmp_path, monkeypatch):
+    plan_path = str(tmp_path / "plan.jsonl")
+    workload.save_plan(*workload.compile_plan(workload.load_spec(write_spec(tmp_path, SPEC))), plan_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["workload.py", "run", plan_path, "grpc", "--server-url", standin["grpc_address"],
+                                      "--insecure"])
+    workload.main()
+
+    with open(tmp_path / "data" / "grpc_plan_response_times.json") as f:
+        data = json.load(f)
+    total, _ = workload.plan_entries(workload.load_plan(plan_path)[1])
+    assert data["mc_entries_registered"] == total
+    assert len(standin["store"]) == total
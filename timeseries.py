@@ -0,0 +1,271 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+OPERATIONS = ("register", "query")
+FORMATS = ("parquet", "npz", "csv")
+COLUMNS = np.dtype([
+    ("intended_time", "<f8"),
+    ("send_time", "<f8"),
+    ("end_time", "<f8"),
+    ("op", "u1"),
+    ("status", "<i2"),
+    ("pairs", "<i4"),
+    ("bytes", "<i8"),
+])
+CHUNK_ROWS = 1 << 16
+
+def default_format():
+    """
+    Returns:
+        str: 'parquet' when pyarrow is installed, otherwise 'npz'.
+    """
+    return "parquet" if pyarrow is not None else "npz"
+
+def task_record(task, result):
+    """
+    Extracts the status, pairs and payload bytes of a finished request.
+
+    Register tasks of every client end in (payload, request_num, num_pairs); query
+    results carry the StreamStats of the stream as their third item.
+
+    Args:
+        task (tuple): The task as prepared by a client.
+        result (tuple): The result of the register or query call.
+
+    Returns:
+        tuple: Status code, number of pairs and number of payload bytes.
+    """
+    if task[0] == 'register':
+        return result[1], task[-1], len(task[-3])
+    return result[1], result[2].pairs, result[2].bytes
+
+class TimeSeriesWriter:
+    """
+    Records one row per request and streams them to disk in a columnar format.
+
+    Rows are appended to a preallocated NumPy chunk under a lock; full chunks
+    are written out as a Parquet row group, as raw records (turned into an .npz
+    by close()), or as CSV lines, so memory stays flat however long the run is.
+    """
+
+    def __init__(self, path, format=None, chunk_rows=CHUNK_ROWS):
+        """
+        Args:
+            path (str): Output file; the extension is replaced to match the format.
+            format (str): One of FORMATS, by default parquet if available, else npz.
+            chunk_rows (int): Rows buffered in memory between writes.
+        """
+        self.format = format or default_format()
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown format: {self.format}")
+        if self.format == "parquet" and pyarrow is None:
+            raise ImportError("Parquet output requires `pip install pyarrow`")
+        self.path = os.path.splitext(path)[0] + "." + self.format
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.rows = 0
+        self._chunk = np.zeros(chunk_rows, dtype=COLUMNS)
+        self._filled = 0
+        self._lock = threading.Lock()
+        self._parquet_writer = None
+        if self.format == "npz":
+            self._file = open(self.path + ".part", 'wb')
+        elif self.format == "csv":
+            self._file = open(self.path, 'w', newline='')
+            csv.writer(self._file).writerow(COLUMNS.names)
+
+    def record(self, op, send_time, end_time, status, pairs, num_bytes, intended_time=None):
+        """
+        Records one request. Safe to call from any thread.
+
+        Args:
+            op (str): 'register' or 'query'.
+            send_time (float): Wall-clock time the request was sent.
+            end_time (float): Wall-clock time the response was complete.
+            status (int): Status code, 200 on success; see errors.status_label for the others.
+            pairs (int): Pairs sent (register) or received (query).
+            num_bytes (int): Payload bytes sent (register) or received (query).
+            intended_time (float): Wall-clock time an open-loop schedule meant to send the
+                request at; the send time if None.
+        """
+        if intended_time is None:
+            intended_time = send_time
+        with self._lock:
+            self._chunk[self._filled] = (intended_time, send_time, end_time, OPERATIONS.index(op), status, pairs, num_bytes)
+            self._filled += 1
+            self.rows += 1
+            if self._filled == len(self._chunk):
+                self._flush()
+
+    def record_result(self, task, result, intended_time=None):
+        """
+        Records a finished task, timestamped now.
+
+        Args:
+            task (tuple): The task as prepared by a client.
+            result (tuple): The result of the register or query call.
+            intended_time (float): Wall-clock time an open-loop schedule meant to send the
+                task at; the actual send time if None.
+        """
+        end_time = time.time()
+        self.record(task[0], end_time - result[0], end_time, *task_record(task, result), intended_time=intended_time)
+
+    def record_rows(self, rows):
+        """
+        Records many requests at once, e.g. time series merged from several runs.
+
+        Args:
+            rows (np.ndarray): Records with the COLUMNS dtype.
+        """
+        with self._lock:
+            written = 0
+            while written < len(rows):
+                count = min(len(self._chunk) - self._filled, len(rows) - written)
+                self._chunk[self._filled:self._filled + count] = rows[written:written + count]
+                self._filled += count
+                self.rows += count
+                written += count
+                if self._filled == len(self._chunk):
+                    self._flush()
+
+    def _flush(self):
+        rows = self._chunk[:self._filled]
+        if self.format == "parquet":
+            table = pyarrow.table({name: rows[name] for name in COLUMNS.names})
+            if self._parquet_writer is None:
+                self._parquet_writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        elif self.format == "npz":
+            rows.tofile(self._file)
+        else:
+            csv.writer(self._file).writerows(rows.tolist())
+        self._filled = 0
+
+    def close(self):
+        """
+        Writes the remaining rows and finalizes the file.
+
+        Returns:
+            str: Path of the written file.
+        """
+        with self._lock:
+            if self._filled or (self.format == "parquet" and self._parquet_writer is None):
+                self._flush()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+            if self.format == "npz":
+                self._file.close()
+                records = np.fromfile(self.path + ".part", dtype=COLUMNS)
+                np.savez_compressed(self.path, **{name: records[name] for name in COLUMNS.names})
+                os.remove(self.path + ".part")
+            elif self.format == "csv":
+                self._file.close()
+        print(f"{self.rows} request records saved to {self.path}")
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def load_timeseries(path):
+    """
+    Loads a request time series written by TimeSeriesWriter.
+
+    Files written before the intended_time column existed get it filled in with the send time.
+
+    Args:
+        path (str): A .parquet, .npz or .csv file.
+
+    Returns:
+        dict: One NumPy array per column, sorted by send time.
+    """
+    if path.endswith(".parquet"):
+        if pyarrow is None:
+            raise ImportError("Reading Parquet requires `pip install pyarrow`")
+        table = pyarrow.parquet.read_table(path)
+        columns = {name: table.column(name).to_numpy() for name in table.column_names}
+    elif path.endswith(".npz"):
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files}
+    else:
+        with open(path, newline='') as f:
+            header = next(csv.reader(f))
+        records = np.loadtxt(path, delimiter=",", skiprows=1, dtype=[(name, COLUMNS[name]) for name in header], ndmin=1)
+        columns = {name: records[name] for name in header}
+    if "intended_time" not in columns:
+        columns["intended_time"] = columns["send_time"].copy()
+
+    order = np.argsort(columns["send_time"], kind="stable")
+    return {name: columns[name][order] for name in COLUMNS.names}
+
+def latencies(columns):
+    """
+    Args:
+        columns (dict): Columns as returned by load_timeseries.
+
+    Returns:
+        np.ndarray: Latency of every request from its intended send time, as in the open-loop histograms.
+    """
+    return columns["end_time"] - columns["intended_time"]
+
+def export_legacy_json(columns, path, mc_entries_per_register=None):
+    """
+    Writes a time series in the original response-times JSON schema read by visualize.py.
+
+    Args:
+        columns (dict): Columns as returned by load_timeseries.
+        path (str): Output JSON file.
+        mc_entries_per_register (int): Entries per register request; derived from the data if None.
+    """
+    data = {}
+    for index, op in enumerate(OPERATIONS):
+        selected = columns["op"] == index
+        # Completion order, like the old clients that appended as futures finished.
+        order = np.argsort(columns["end_time"][selected], kind="stable")
+        op_latencies = latencies(columns)[selected][order]
+        failed = np.count_nonzero(columns["status"][selected] != 200)
+        data[f"{op}_response_times"] = op_latencies.tolist()
+        data[f"{op}_failure_rate"] = failed / max(len(op_latencies), 1)
+
+    register_pairs = columns["pairs"][columns["op"] == 0]
+    if mc_entries_per_register is None:
+        mc_entries_per_register = int(round(register_pairs.mean())) if len(register_pairs) else 0
+    data["mc_entries_per_register"] = mc_entries_per_register
+    data["mc_entries_registered"] = int(register_pairs.sum())
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    print(f"Data saved to {path}")
+
+def main():
+    """
+    Main function to convert a request time series to the legacy JSON schema.
+    """
+    parser = argparse.ArgumentParser(description="Export a request time series to the legacy response-times JSON.")
+    parser.add_argument("timeseries", help="A .parquet, .npz or .csv file written during a run.")
+    parser.add_argument("output", help="JSON file to write.")
+    parser.add_argument("--entries-per-register", type=int, default=None)
+    args = parser.parse_args()
+
+    export_legacy_json(load_timeseries(args.timeseries), args.output, args.entries_per_register)
+
+if __name__ == '__main__':
+    main()
@@ -1,43 +1,19 @@
+import argparse
+import base64
+import io
 import json
+import os
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
-import sys
-import os
-
-def plot_response_times(register_response_times, query_response_times, mc_entries_registered, mc_entries_per_register, register_failure_rate, query_failure_rate, api_type):
-    """
-    Plots the response times for register and query operations.
-
-    Args:
-        register_response_times (list): List of response times for register operations.
-        query_response_times (list): List of response times for query operations.
-        mc_entries_registered (int): Number of mission control entries registered.
-        mc_entries_per_register (int): Number of entries per register request.
-        register_failure_rate (float): Failure rate for register requests.
-        query_failure_rate (float): Failure rate for query requests.
-        api_type (str): Type of API ('REST' or 'gRPC').
+from histogram import LatencyHistogram
+from timeseries import OPERATIONS, latencies, load_timeseries
 
-    """
-    fig = plt.figure(figsize=(10, 5))
-    fig.canvas.manager.set_window_title(f'Response Times Plot [{api_type}]')
-
-    total_ops = len(register_response_times) + len(query_response_times)
-    register_label = f'Register Failure Rate: {register_failure_rate*100:.2f}%'
-    query_label = f'Query Failure Rate: {query_failure_rate*100:.2f}%'
-    
-    plt.plot(register_response_times, label=register_label, color='b')
-    plt.plot(query_response_times, label=query_label, color='r')
-    
-    plt.xlabel('Request Number')
-    plt.ylabel('Response Time (seconds)')
-    plt.title(f'Response Times [{api_type}] - Total Ops: {total_ops}, Register Ops: {len(register_response_times)}, Query Ops: {len(query_response_times)}')
-    plt.axhline(y=np.median(register_response_times), color='b', linestyle='-.', label=f'Register Median: {np.median(register_response_times):.2f}')
-    plt.axhline(y=np.median(query_response_times), color='r', linestyle='-.', label=f'Query Median: {np.median(query_response_times):.2f}')
-    plt.legend()
-    plt.grid(True)
-    plt.text(0.5, 0.95, f'MC Entries Registered: {mc_entries_registered}', horizontalalignment='center', verticalalignment='center', transform=plt.gca().transAxes)
-    plt.text(0.5, 0.90, f'MC Entries per Register: {mc_entries_per_register}', horizontalalignment='center', verticalalignment='center', transform=plt.gca().transAxes)
-    plt.show()
+TIMESERIES_EXTENSIONS = (".npz", ".parquet", ".csv")
+OP_STYLES = {"register": "-", "query": "--"}
+# Percentiles shown on the tail axis, as 1 / (1 - quantile).
+TAIL_TICKS = ([1, 2, 10, 100, 1000, 10000], ['0%', '50%', '90%', '99%', '99.9%', '99.99%'])
+TAIL_POINTS = 2000
 
 def extract_api_type(file_name):
     """
@@ -56,25 +32,275 @@ def extract_api_type(file_name):
     else:
         return "Unknown"
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python visualize.py <response_times_file>")
-        sys.exit(1)
+def load_run(path, label=None):
+    """
+    Loads the results of one run into NumPy arrays.
 
-    FILE = sys.argv[1]
-    API_TYPE = extract_api_type(os.path.basename(FILE))
+    Supports per-request time series (.npz/.parquet/.csv), the legacy JSON with
+    response time lists, and the JSON with latency histograms.
 
-    # Read the JSON file.
-    with open(FILE, 'r') as file:
+    Args:
+        path (str): The results file.
+        label (str): Name of the run in legends, by default the file name.
+
+    Returns:
+        dict: 'label', 'api_type', 'failure_rates' and, per operation, either
+            {'time', 'latency', 'failed'} arrays ('time' is None for legacy lists) or
+            {'histogram'} for histogram results.
+    """
+    name = os.path.basename(path)
+    run = {"label": label or os.path.splitext(name)[0], "api_type": extract_api_type(name), "failure_rates": {}}
+
+    if path.endswith(TIMESERIES_EXTENSIONS):
+        columns = load_timeseries(path)
+        start_time = columns["intended_time"].min() if len(columns["intended_time"]) else 0.0
+        for index, op in enumerate(OPERATIONS):
+            selected = columns["op"] == index
+            failed = columns["status"][selected] != 200
+            run[op] = {
+                "time": columns["end_time"][selected] - start_time,
+                "latency": latencies(columns)[selected],
+                "failed": failed,
+            }
+            run["failure_rates"][op] = failed.mean() if len(failed) else 0.0
+        return run
+
+    with open(path, 'r') as file:
         data = json.load(file)
+    for op in OPERATIONS:
+        run["failure_rates"][op] = data[f"{op}_failure_rate"]
+        if f"{op}_histogram" in data:
+            # Histogram results only keep the latency distribution, not per-request samples.
+            run[op] = {"histogram": LatencyHistogram.from_dict(data[f"{op}_histogram"])}
+        else:
+            latency = np.asarray(data[f"{op}_response_times"], dtype=np.float64)
+            run[op] = {"time": None, "latency": latency, "failed": np.zeros(len(latency), dtype=bool)}
+    return run
+
+def decimate_minmax(x, y, num_buckets):
+    """
+    Reduces a series to the minimum and maximum of each of num_buckets equal-width x ranges.
+
+    Drawn as a line, the result looks the same as the full series at a resolution of
+    num_buckets pixels, including every spike, at a fraction of the points.
+
+    Args:
+        x (np.ndarray): Sorted x values.
+        y (np.ndarray): y values.
+        num_buckets (int): Number of x ranges, typically the plot width in pixels.
+
+    Returns:
+        tuple: The decimated x and y arrays.
+    """
+    if len(x) <= 2 * num_buckets:
+        return x, y
+    edges = np.linspace(x[0], x[-1], num_buckets + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1], side="left"))
+    starts = starts[starts < len(x)]
+    minimums = np.minimum.reduceat(y, starts)
+    maximums = np.maximum.reduceat(y, starts)
+    centers = x[starts]
+    # Alternate min and max so the line sweeps the full range of every bucket.
+    return np.repeat(centers, 2), np.column_stack((minimums, maximums)).ravel()
+
+def tail_curve(op_data):
+    """
+    Computes the latency-by-percentile curve of one operation.
+
+    Args:
+        op_data (dict): Operation data as returned in load_run.
+
+    Returns:
+        tuple: 1 / (1 - quantile) and latency arrays, or None without samples.
+    """
+    if "histogram" in op_data:
+        histogram = op_data["histogram"]
+        if not histogram.count:
+            return None
+        buckets = np.array(histogram.buckets())
+        quantiles = np.cumsum(buckets[:, 1]) / histogram.count
+        return 1 / np.maximum(1 - quantiles, 1 / (10 * histogram.count)), buckets[:, 0]
+
+    total = len(op_data["latency"])
+    if not total:
+        return None
+    # Evaluate at log-spaced tail positions instead of drawing one step per sample.
+    inverse_tail = np.logspace(0, np.log10(total), TAIL_POINTS)
+    return inverse_tail, np.quantile(op_data["latency"], 1 - 1 / inverse_tail)
+
+def summarize(op_data):
+    """
+    Args:
+        op_data (dict): Operation data as returned in load_run.
+
+    Returns:
+        dict: Count, p50, p99 and max latency.
+    """
+    if "histogram" in op_data:
+        summary = op_data["histogram"].summary()
+        return {"count": summary["count"], "p50": summary["p50"], "p99": summary["p99"], "max": summary["max"]}
+    latency = op_data["latency"]
+    if not len(latency):
+        return {"count": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    p50, p99 = np.percentile(latency, [50, 99])
+    return {"count": len(latency), "p50": p50, "p99": p99, "max": latency.max()}
+
+def plot_runs(runs, width_pixels=1600, throughput_bin=1.0):
+    """
+    Draws latency over time, latency percentiles and throughput for one or more runs.
+
+    Args:
+        runs (list): Runs as returned by load_run; they are overlaid in every panel.
+        width_pixels (int): Horizontal resolution the latency series are decimated to.
+        throughput_bin (float): Seconds per throughput sample.
+
+    Returns:
+        matplotlib.figure.Figure: The figure.
+    """
+    fig, (latency_axis, tail_axis, throughput_axis) = plt.subplots(3, 1, figsize=(width_pixels / 100, 13))
+    fig.canvas.manager.set_window_title(f"Response Times [{', '.join(sorted({run['api_type'] for run in runs}))}]")
+    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    timed, untimed = False, False
+
+    for index, run in enumerate(runs):
+        color = colors[index % len(colors)]
+        for op in OPERATIONS:
+            op_data = run[op]
+            label = f"{run['label']} {op} (errors {run['failure_rates'][op]*100:.2f}%)"
+
+            if "latency" in op_data and len(op_data["latency"]):
+                if op_data["time"] is not None:
+                    order = np.argsort(op_data["time"], kind="stable")
+                    x, y = op_data["time"][order], op_data["latency"][order]
+                    timed = True
+                else:
+                    x, y = np.arange(len(op_data["latency"]), dtype=np.float64), op_data["latency"]
+                    untimed = True
+                x, y = decimate_minmax(x, y, width_pixels)
+                latency_axis.plot(x, y, OP_STYLES[op], color=color, linewidth=0.8, label=label)
 
-    # Extract the required fields.
-    register_response_times = data['register_response_times']
-    query_response_times = data['query_response_times']
-    register_failure_rate = data['register_failure_rate']
-    query_failure_rate = data['query_failure_rate']
-    mc_entries_per_register = data['mc_entries_per_register']
-    mc_entries_registered = data['mc_entries_registered']
+            curve = tail_curve(op_data)
+            if curve is not None:
+                tail_axis.step(*curve, OP_STYLES[op], where='post', color=color, label=label)
 
-    # Plot the response times.
-    plot_response_times(register_response_times, query_response_times, mc_entries_registered, mc_entries_per_register, register_failure_rate, query_failure_rate, API_TYPE)
+            if op_data.get("time") is not None and len(op_data["time"]):
+                bins = np.arange(0, op_data["time"].max() + throughput_bin, throughput_bin)
+                completed, _ = np.histogram(op_data["time"], bins=bins)
+                errors, _ = np.histogram(op_data["time"][op_data["failed"]], bins=bins)
+                throughput_axis.plot(bins[:-1], completed / throughput_bin, OP_STYLES[op], color=color, label=f"{run['label']} {op}")
+                if errors.any():
+                    throughput_axis.plot(bins[:-1], errors / throughput_bin, ':', color=color, label=f"{run['label']} {op} errors")
+
+    latency_axis.set_xlabel(' / '.join(name for name, shown in (('Seconds since Start', timed), ('Request Number', untimed)) if shown))
+    latency_axis.set_ylabel('Response Time (seconds)')
+    latency_axis.set_title('Latency over Time (min/max per pixel)')
+    tail_axis.set_xscale('log')
+    tail_axis.set_xticks(*TAIL_TICKS)
+    tail_axis.set_xlabel('Percentile')
+    tail_axis.set_ylabel('Response Time (seconds)')
+    tail_axis.set_title('Latency by Percentile')
+    throughput_axis.set_xlabel('Seconds since Start')
+    throughput_axis.set_ylabel('Requests per Second')
+    throughput_axis.set_title('Throughput' if timed else 'Throughput (needs per-request time series)')
+    for axis in (latency_axis, tail_axis, throughput_axis):
+        axis.grid(True)
+        if axis.has_data():
+            axis.legend(fontsize='small')
+    fig.tight_layout()
+    return fig
+
+def plot_batch_sweep(results, max_message_size, api_type):
+    """
+    Plots register throughput and latency against the number of pairs per snapshot.
+
+    Args:
+        results (list): Per batch size results saved by batch_sweep.py.
+        max_message_size (int): Largest request size the snapshots were split by.
+        api_type (str): Type of API ('REST' or 'gRPC').
+
+    Returns:
+        matplotlib.figure.Figure: The figure.
+    """
+    fig, throughput_axis = plt.subplots(figsize=(10, 5))
+    fig.canvas.manager.set_window_title(f'Batch Size Sweep [{api_type}]')
+
+    batch_sizes = [result['batch_size'] for result in results]
+    throughput_axis.plot(batch_sizes, [result['entries_per_second'] for result in results], 'b-o', label='Entries/s')
+    throughput_axis.set_xscale('log')
+    throughput_axis.set_xlabel('Pairs per Snapshot')
+    throughput_axis.set_ylabel('Entries per Second', color='b')
+
+    latency_axis = throughput_axis.twinx()
+    for quantile, style in (('p50', 'r-.'), ('p99', 'r:')):
+        latencies = [LatencyHistogram.from_dict(result['latency']).summary()[quantile] for result in results]
+        latency_axis.plot(batch_sizes, latencies, style, label=f'Snapshot Latency {quantile}')
+    latency_axis.set_yscale('log')
+    latency_axis.set_ylabel('Snapshot Latency (seconds)', color='r')
+
+    plt.title(f'Register Throughput vs Batch Size [{api_type}] - Max Message Size: {max_message_size / 2**20:.1f} MiB')
+    fig.legend(loc='upper left')
+    throughput_axis.grid(True)
+    return fig
+
+def save_html(fig, runs, path):
+    """
+    Writes the figure and a per-run summary table to a self-contained HTML file.
+
+    Args:
+        fig (matplotlib.figure.Figure): The figure to embed.
+        runs (list): The plotted runs, summarized in the table.
+        path (str): Output HTML file.
+    """
+    image = io.BytesIO()
+    fig.savefig(image, format='png')
+    rows = []
+    for run in runs:
+        for op in OPERATIONS:
+            summary = summarize(run[op])
+            rows.append(f"<tr><td>{run['label']}</td><td>{op}</td><td>{summary['count']}</td><td>{summary['p50']:.4f}</td>"
+                        f"<td>{summary['p99']:.4f}</td><td>{summary['max']:.4f}</td><td>{run['failure_rates'][op]*100:.2f}%</td></tr>")
+    with open(path, 'w') as f:
+        f.write("<!DOCTYPE html><html><head><meta charset='utf-8'><title>Response Times</title></head><body>\n"
+                "<table border='1' cellpadding='4'><tr><th>Run</th><th>Operation</th><th>Requests</th><th>p50 (s)</th>"
+                "<th>p99 (s)</th><th>Max (s)</th><th>Errors</th></tr>\n" + "\n".join(rows) + "</table>\n"
+                f"<img src='data:image/png;base64,{base64.b64encode(image.getvalue()).decode('ascii')}'>\n</body></html>\n")
+
+def main():
+    """
+    Main function to plot one or more result files, on screen or to a PNG/SVG/HTML file.
+    """
+    parser = argparse.ArgumentParser(description="Plot and compare load test results.")
+    parser.add_argument("files", nargs="+", help="Result files: time series (.npz/.parquet/.csv) or response-times JSON.")
+    parser.add_argument("--labels", default=None, help="Comma-separated run names for the legends.")
+    parser.add_argument("--output", default=None, help="Write a .png, .svg or .html file instead of opening a window.")
+    parser.add_argument("--width", type=int, default=1600, help="Plot width in pixels; latency series are decimated to it.")
+    parser.add_argument("--throughput-bin", type=float, default=1.0, help="Seconds per throughput sample.")
+    args = parser.parse_args()
+
+    if args.output:
+        # Render without a display, e.g. for CI artifacts.
+        matplotlib.use("Agg")
+
+    runs = []
+    if args.files[0].endswith("batch_sweep.json"):
+        with open(args.files[0], 'r') as file:
+            data = json.load(file)
+        fig = plot_batch_sweep(data['batch_sweep'], data['max_message_size'], extract_api_type(os.path.basename(args.files[0])))
+    else:
+        labels = args.labels.split(",") if args.labels else [None] * len(args.files)
+        if len(labels) != len(args.files):
+            parser.error(f"--labels names {len(labels)} runs for {len(args.files)} files")
+        runs = [load_run(path, label) for path, label in zip(args.files, labels)]
+        fig = plot_runs(runs, args.width, args.throughput_bin)
+
+    if not args.output:
+        plt.show()
+    elif args.output.endswith(".html"):
+        save_html(fig, runs, args.output)
+        print(f"Plot saved to {args.output}")
+    else:
+        fig.savefig(args.output)
+        print(f"Plot saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
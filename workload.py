@@ -0,0 +1,337 @@
+import argparse
+import base64
+import json
+import math
+import os
+import random
+import time
+import client_rest
+import client_rpc
+from ecdsa import SigningKey, SECP256k1
+from live_reporter import add_reporter_arguments, reporter_from_args
+from timeseries import FORMATS, TimeSeriesWriter
+from multiprocess_load import make_client
+from node_corpus import NodeCorpus
+from request_policy import RequestPolicy, add_policy_arguments, policy_options_from_args
+from scheduler import make_arrivals, run_open_loop
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+PLAN_VERSION = 1
+ONE_WEEK = 7 * 24 * 60 * 60
+
+DEFAULT_SPEC = {
+    "seed": 0,
+    "requests": 12,
+    "register_ratio": 0.5,
+    "pairs_per_register": {"distribution": "constant", "value": 3},
+    "history": {
+        "base_time": None,
+        "age": {"distribution": "uniform", "min": 0, "max": ONE_WEEK},
+        "amount_sat": {"distribution": "uniform", "min": 1, "max": 10000},
+    },
+    "concurrency": None,
+    "arrivals": None,
+    "nodes": None,
+}
+
+def load_spec(path):
+    """
+    Loads a workload spec from a JSON, YAML or TOML file and fills in defaults.
+
+    Args:
+        path (str): Path of the spec; the format is picked by extension.
+
+    Returns:
+        dict: The complete spec.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise ImportError("YAML workload specs require `pip install pyyaml`")
+        spec = yaml.safe_load(data)
+    elif path.endswith(".toml"):
+        if tomllib is None:
+            raise ImportError("TOML workload specs require Python 3.11+")
+        spec = tomllib.loads(data.decode())
+    else:
+        spec = json.loads(data)
+
+    merged = {**DEFAULT_SPEC, **spec}
+    merged["history"] = {**DEFAULT_SPEC["history"], **spec.get("history", {})}
+    return merged
+
+def parse_ratio(ratio):
+    """
+    Args:
+        ratio (float or str): Fraction of register requests, or a 'register:query' ratio string.
+
+    Returns:
+        float: Fraction of requests that are registers.
+    """
+    if isinstance(ratio, str) and ":" in ratio:
+        register, query = (float(part) for part in ratio.split(":"))
+        return register / (register + query)
+    return float(ratio)
+
+def sample(distribution, rng):
+    """
+    Draws an integer from a distribution described in the spec.
+
+    Args:
+        distribution (dict or int): {'distribution': 'constant'|'uniform'|'poisson'|'lognormal', ...}
+            or a plain integer for a constant.
+        rng (random.Random): Seeded random number generator.
+
+    Returns:
+        int: The sample.
+    """
+    if isinstance(distribution, (int, float)):
+        return int(distribution)
+    kind = distribution["distribution"]
+    if kind == "constant":
+        return int(distribution["value"])
+    if kind == "uniform":
+        return rng.randint(int(distribution["min"]), int(distribution["max"]))
+    if kind == "poisson":
+        mean = distribution["mean"]
+        if mean > 50:
+            return max(int(round(rng.gauss(mean, math.sqrt(mean)))), 0)
+        # Knuth's algorithm, fine for small means.
+        threshold, count, product = math.exp(-mean), 0, rng.random()
+        while product > threshold:
+            count += 1
+            product *= rng.random()
+        return count
+    if kind == "lognormal":
+        return int(round(rng.lognormvariate(distribution["mu"], distribution["sigma"])))
+    raise ValueError(f"Unknown distribution: {kind}")
+
+def make_node_pair_source(spec, rng):
+    """
+    Builds the deterministic node-pair generator described by spec['nodes'].
+
+    Args:
+        spec (dict): The workload spec.
+        rng (random.Random): Seeded random number generator.
+
+    Returns:
+        callable: Returns a (node_from, node_to) tuple of 33-byte keys on every call.
+    """
+    nodes = spec.get("nodes") or {}
+    if nodes.get("corpus"):
+        corpus = NodeCorpus(nodes["corpus"], distribution=nodes.get("distribution", "uniform"), seed=spec["seed"])
+        return corpus.random_pair
+
+    def random_key():
+        # Keys derived from seeded secret exponents, so the same seed gives the same nodes.
+        secret_exponent = rng.randrange(1, SECP256k1.order)
+        return SigningKey.from_secret_exponent(secret_exponent, curve=SECP256k1).get_verifying_key().to_string("compressed")
+
+    return lambda: (random_key(), random_key())
+
+def compile_plan(spec):
+    """
+    Expands a workload spec into a concrete, replayable request plan.
+
+    Args:
+        spec (dict): The workload spec as returned by load_spec.
+
+    Returns:
+        tuple: The plan header (dict) and the list of planned requests. A planned register is
+            {'op': 'register', 'pairs': [[node_from_b64, node_to_b64, [6 history ints]], ...]},
+            a planned query is {'op': 'query'}; both carry an 'offset' when arrivals are planned.
+    """
+    rng = random.Random(spec["seed"])
+    register_ratio = parse_ratio(spec["register_ratio"])
+    history = spec["history"]
+    base_time = history["base_time"] if history["base_time"] is not None else int(time.time())
+    next_pair = make_node_pair_source(spec, rng)
+
+    arrivals = None
+    if spec.get("arrivals"):
+        arrival_spec = spec["arrivals"]
+        arrivals = make_arrivals(arrival_spec.get("profile", "constant"), arrival_spec.get("rate"), arrival_spec.get("duration"),
+                                 end_rate=arrival_spec.get("end_rate"), stages=arrival_spec.get("stages"), seed=spec["seed"])
+    num_requests = len(arrivals) if arrivals is not None else spec["requests"]
+
+    requests = []
+    for request in range(num_requests):
+        if rng.random() < register_ratio:
+            pairs = []
+            for _ in range(max(sample(spec["pairs_per_register"], rng), 1)):
+                node_from, node_to = next_pair()
+                fail_amt_sat, success_amt_sat = sample(history["amount_sat"], rng), sample(history["amount_sat"], rng)
+                pairs.append([
+                    base64.b64encode(node_from).decode("ascii"),
+                    base64.b64encode(node_to).decode("ascii"),
+                    [base_time - sample(history["age"], rng), fail_amt_sat, fail_amt_sat * 1000,
+                     base_time - sample(history["age"], rng), success_amt_sat, success_amt_sat * 1000],
+                ])
+            planned = {"op": "register", "pairs": pairs}
+        else:
+            planned = {"op": "query"}
+        if arrivals is not None:
+            planned["offset"] = arrivals[request]
+        requests.append(planned)
+
+    header = {
+        "version": PLAN_VERSION,
+        "spec": {**spec, "history": {**history, "base_time": base_time}},
+        "requests": num_requests,
+        "concurrency": spec.get("concurrency"),
+        "open_loop": arrivals is not None,
+    }
+    return header, requests
+
+def save_plan(header, requests, path):
+    """
+    Writes a plan as JSON lines: the header first, then one line per request.
+
+    Args:
+        header (dict): The plan header.
+        requests (list): The planned requests.
+        path (str): Path of the plan file.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        f.write(json.dumps(header, separators=(",", ":")) + "\n")
+        for planned in requests:
+            f.write(json.dumps(planned, separators=(",", ":")) + "\n")
+    print(f"Plan with {len(requests)} requests saved to {path}")
+
+def load_plan(path):
+    """
+    Args:
+        path (str): Path of a plan written by save_plan.
+
+    Returns:
+        tuple: The plan header and the list of planned requests.
+    """
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get("version") != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version: {header.get('version')}")
+        return header, [json.loads(line) for line in f]
+
+def plan_entries(requests):
+    """
+    Args:
+        requests (list): The planned requests.
+
+    Returns:
+        tuple: Total pairs in the planned register requests, and the mean pairs per register rounded.
+    """
+    entries = [len(planned["pairs"]) for planned in requests if planned["op"] == "register"]
+    return sum(entries), round(sum(entries) / len(entries)) if entries else 0
+
+def entries_registered(requests, register_failed_requests):
+    """
+    Estimates the entries registered in a replay of a plan.
+
+    Pair counts may vary between registers, and the results do not tell which ones failed,
+    so each failed register is charged the mean pairs per register.
+
+    Args:
+        requests (list): The planned requests.
+        register_failed_requests (int): Number of register requests that failed.
+
+    Returns:
+        int: Entries registered by the successful register requests.
+    """
+    total, _ = plan_entries(requests)
+    registers = sum(1 for planned in requests if planned["op"] == "register")
+    if not registers:
+        return 0
+    return round(total * (registers - register_failed_requests) / registers)
+
+def main():
+    """
+    Main function to compile a workload spec into a plan, or replay a plan against a coordinator.
+    """
+    parser = argparse.ArgumentParser(description="Compile and replay deterministic workload plans.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = subparsers.add_parser("compile", help="Compile a spec into a plan file.")
+    compile_parser.add_argument("spec")
+    compile_parser.add_argument("plan")
+
+    run_parser = subparsers.add_parser("run", help="Replay a plan file.")
+    run_parser.add_argument("plan")
+    run_parser.add_argument("transport", choices=["grpc", "rest"])
+    run_parser.add_argument("--server-url", default=None, help="Defaults to the URL used by the selected client.")
+    run_parser.add_argument("--cert", default=None, help="Path to a self-signed certificate.")
+    run_parser.add_argument("--insecure", action="store_true")
+    add_reporter_arguments(run_parser)
+    add_policy_arguments(run_parser)
+    run_parser.add_argument("--timeseries", default=None, help="Record every request to this file (columnar time series).")
+    run_parser.add_argument("--timeseries-format", choices=FORMATS, default=None, help="Defaults to parquet if pyarrow is installed, else npz.")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        header, requests = compile_plan(load_spec(args.spec))
+        save_plan(header, requests, args.plan)
+        return
+
+    client_rpc.LOG_REQUESTS = client_rest.LOG_REQUESTS = args.log_requests
+    header, requests = load_plan(args.plan)
+    server_url = args.server_url
+    if server_url is None:
+        server_url = "<your_ec_domain>:50050" if args.transport == "grpc" else "https://<your_ec_domain>:8081"
+    module, client = make_client(args.transport, server_url, args.cert, args.insecure)
+
+    print("Making 1st request for TLS handshake!")
+    if args.transport == "grpc":
+        client_rpc.query_aggregated_mission_control(client, 0)
+        tasks = client_rpc.tasks_from_plan(client, requests)
+    else:
+        client_rest.query_aggregated_mission_control(client, server_url, 0)
+        tasks = client_rest.tasks_from_plan(client, server_url, requests)
+
+    _, mc_entries_per_register = plan_entries(requests)
+    filename = f"{args.transport}_{os.path.splitext(os.path.basename(args.plan))[0]}_response_times.json"
+
+    reporter = reporter_from_args(args)
+    if reporter is not None:
+        reporter.start()
+    recorder = TimeSeriesWriter(args.timeseries, args.timeseries_format) if args.timeseries else None
+    policy = RequestPolicy(**policy_options_from_args(args))
+    try:
+        if header["open_loop"]:
+            summary = run_open_loop(tasks, [planned["offset"] for planned in requests], policy.wrap(module.execute_task),
+                                    max_workers=header["concurrency"] or 1000, reporter=reporter, recorder=recorder)
+            results = (summary["register"]["latency"], summary["query"]["latency"], summary["register"]["failed"],
+                       summary["query"]["failed"], summary["query_stream_metrics"], summary["errors"], summary["elapsed"])
+            print(f"Target Rate: {summary['target_rate']:.1f} req/s, Achieved Rate: {summary['achieved_rate']:.1f} req/s")
+        else:
+            results = module.run_tasks(tasks, max_workers=header["concurrency"], reporter=reporter, recorder=recorder,
+                                       policy=policy)
+    finally:
+        policy.close()
+        if reporter is not None:
+            reporter.stop()
+        if recorder is not None:
+            recorder.close()
+
+    mc_entries_registered = entries_registered(requests, results[2])
+    if args.transport == "grpc":
+        client_rpc.report_results(*results, mc_entries_per_register=mc_entries_per_register, filename=filename,
+                                  policy_stats=policy.stats, mc_entries_registered=mc_entries_registered)
+    else:
+        client_rest.report_results(*results, mc_entries_per_register=mc_entries_per_register, filename=filename,
+                                   transport_stats=client.transport_stats, policy_stats=policy.stats,
+                                   mc_entries_registered=mc_entries_registered)
+
+if __name__ == '__main__':
+    main()